@@ -6,6 +6,7 @@
 STRUCT_ANALYZE_PROMPT = """
 Проанализируй следующую информацию о файле:
 {file_info}
+Если дан профиль столбцов, в нем перечислены только столбцы, тип которых не удалось определить автоматически: опиши только их.
 Определи названия столбцов и их типы данных (числовой, категориальный, дата, булевый и т.д.).
 Особое внимание уделите столбцам, которые могут содержать дату/время.
 
@@ -93,6 +94,8 @@ DATA_ANALYZE_PROMPT = """
 Ниже приведены рассчитанные метрики для каждого столбца:
 {metrics_results_raw}
 
+Метрики сведены в таблицы: строка - столбец датафрейма, числа округлены, метрики, выводимые из других (например, var из std), опущены. Значения с пометкой ~ посчитаны приближенно, метод и граница ошибки перечислены после таблиц: relative_std_error - относительная стандартная ошибка числа уникальных значений, rank_error - допустимая ошибка ранга квантиля, max_undercount - на сколько частота моды может быть занижена. Явно отмечай такие значения как приближенные и не делай выводов, которые зависят от различий меньше указанной ошибки.
+
 Твоя задача - провести глубокий и содержательный анализ этих метрик и предоставить интерпретацию на русском языке. Подробно проанализируй каждый столбец, учитывая все необходимые метрики. Обычно объем отчета - 40-50 предложений.
 """
 
@@ -120,7 +123,7 @@ METRICS_CODE_GEN_PROMPT = """
 - Рассчитывай ТОЛЬКО те метрики, которые указаны в `{metrics_plan}` для каждого столбца.
 - ПРЕЖДЕ чем обращаться к `df["имя_столбца"]`, ОБЯЗАТЕЛЬНО проверяй, существует ли столбец в `df.columns`. Если нет — пропусти.
 - Для каждого столбца:
-  - Создай копию: `series = df[col].copy()`
+  - Бери столбец без копии: `series = df[col]` (copy-on-write: изменение series не меняет df)
   - Все пропущенные значения (NaN, NaT) должны быть обработаны как `None` в результате. Не оставляй `nan`, `nat` или `np.nan`.
   #
 - Для метрик, требующих resample (например, dates_per_month, dates_per_year):
@@ -200,8 +203,70 @@ VISUALIZATION_CODE_PROMPT = """
 - Используй `palette='tab10'`, `cmap='viridis'`
 - Для оси X с >5 меток: `rotation=45`, `ha='right'`
 - Всегда `plt.tight_layout()`
-- Создай папку: `os.makedirs('{output_dir}', exist_ok=True)`
+- Папка `{output_dir}` уже создана; не импортируй `os` и `subprocess`
 - Не изменяй `df`, не загружай заново
 - Верни ТОЛЬКО код ({num_plots} графиков!!! с комментариями вроде #График 1: ... ). 
 """
 
+
+# Промпт для компактного плана графиков (тип и столбцы), код по плану генерируется группами
+VISUALIZATION_PLAN_PROMPT = """
+# 🎯 ЦЕЛЬ
+Составь план из {num_plots} графиков, иллюстрирующих ОСНОВНЫЕ закономерности в данных. Каждый график должен показывать УНИКАЛЬНЫЙ инсайт. НЕ ДУБЛИРУЙ ИДЕИ.
+
+# 📊 ТИПЫ ГРАФИКОВ (рекомендуемое распределение)
+- Распределения числовых переменных (hist, kde, box, violin)
+- Связь числовой и категориальной (boxplot/violinplot)
+- Связь двух числовых (scatter с hue, regplot)
+- Категориальные (barplot, countplot)
+- Временные ряды (агрегация по периодам)
+- Взаимосвязи (heatmap корреляций, crosstab)
+- Уникальные инсайты (аномалии, сравнения групп)
+
+# 📥 Входные данные
+- Структура: {df_structure_info}
+- Метрики: {metrics_results_raw}
+
+# 📤 ФОРМАТ ОТВЕТА
+Верни ТОЛЬКО блок плана, по одной строке на график, без кода:
+---PLOT_PLAN_START---
+График 1: <тип графика> | <столбцы через запятую> | <инсайт в одно предложение>
+График 2: ...
+---PLOT_PLAN_END---
+"""
+
+# Промпт для генерации кода небольшой группы графиков из плана
+VISUALIZATION_GROUP_CODE_PROMPT = """
+# 🎯 ЦЕЛЬ
+Напиши код ТОЛЬКО для графиков из списка ниже. Другие графики не строй.
+
+# 📋 ГРАФИКИ
+{plot_specs}
+
+# 📥 Входные данные
+- DataFrame `df`
+- Структура: {df_structure_info}
+
+# 🎨 ЦВЕТОВЫЕ ТРЕБОВАНИЯ
+- Все графики должны быть цветными: `palette='tab10'`, `cmap='viridis'`, `hue=...`.
+- В barplot КАЖДЫЙ столбец должен иметь свой цвет.
+- Пропуск графиков из-за большого количества категорий запрещен — используй top-N.
+
+# ✅ ТЕХНИЧЕСКИЕ ТРЕБОВАНИЯ
+- Используй `matplotlib`, `seaborn`
+- Сохраняй в `{output_dir}` как `plot_{{столбцы}}_{{тип}}.png`
+- Не используй `plt.show()`, только `plt.savefig()` и `plt.close()`
+- Для каждого графика используй `try-except`
+- Для оси X с >5 меток: `rotation=45`, `ha='right'`
+- Всегда `plt.tight_layout()`
+- Папка `{output_dir}` уже создана; не импортируй `os` и `subprocess`
+- Не изменяй `df`, не загружай заново
+- Перед каждым графиком комментарий с его номером из списка: `# График N: ...`
+- Каждый график строится независимо от других (в отдельном процессе): не используй переменные, созданные в коде других графиков; общие импорты и переменные размещай до первого комментария `# График`
+- Для больших данных используй готовые функции (импортировать не нужно; на небольших данных они возвращают данные без изменений):
+  - scatter: `data = sample_for_scatter(df, by='<столбец hue или None>')`
+  - линии и временные ряды: `data = decimate_for_line(df, x='<столбец x>', y='<столбец y>')`
+  - гистограммы: `counts, edges = binned_hist(df['<столбец>'], bins=30)`, затем `plt.stairs(counts, edges, fill=True)`
+- Для тепловой карты корреляций не вызывай `df.corr()`: используй готовую матрицу `corr = corr_matrix()` (или `corr_matrix(['a', 'b'])` для подмножества столбцов)
+- Верни ТОЛЬКО код
+"""
@@ -15,6 +15,14 @@ OLLAMA_MODEL_ANALYST = os.getenv("OLLAMA_MODEL_ANALYST", "llama2:latest")
 OLLAMA_MODEL_CODER = os.getenv("OLLAMA_MODEL_CODER", "qwen3-coder:latest")
 OLLAMA_TEMPERATURE_ANALYST = float(os.getenv("OLLAMA_TEMPERATURE_ANALYST", "0.55"))
 OLLAMA_TEMPERATURE_CODER = float(os.getenv("OLLAMA_TEMPERATURE_CODER", "0.2"))
+# Максимум одновременных запросов к каждой модели (согласуйте с OLLAMA_NUM_PARALLEL)
+LLM_MAX_CONCURRENCY = {
+    "analyst": int(os.getenv("LLM_MAX_CONCURRENCY_ANALYST", "1")),
+    "coder": int(os.getenv("LLM_MAX_CONCURRENCY_CODER", "4")),
+}
+
+# Параллельный запуск независимых этапов анализа
+PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "8"))
 
 # Настройки логирования
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -24,19 +32,115 @@ LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 DEFAULT_OUTPUT_DIR = os.getenv("OUTPUT_DIR", "./outputs")
 OUTPUT_DIR = Path(DEFAULT_OUTPUT_DIR)
 
+# Колоночный кэш исходных файлов (Feather)
+FILE_CACHE_DIR = OUTPUT_DIR / ".cache" / "files"
+FILE_CACHE_ENABLED = os.getenv("FILE_CACHE_ENABLED", "true").lower() == "true"
+
+# Кэш ответов LLM (SQLite, вытеснение давно не использованных записей)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = OUTPUT_DIR / ".cache" / "llm_responses.sqlite"
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "256"))
+# Этапы, для которых ответ всегда генерируется заново (через запятую)
+LLM_CACHE_FRESH_STAGES = [
+    stage.strip() for stage in os.getenv("LLM_CACHE_FRESH_STAGES", "").split(",") if stage.strip()
+]
+
+# Временные файлы с подготовленным DataFrame для процессов построения графиков и выполнения кода
+FRAME_TRANSPORT_DIR = OUTPUT_DIR / ".cache" / "frames"
+# Разделяемая память для тех же файлов (src.utils.frame_transport); если каталога нет
+# или в нем мало места, используется FRAME_TRANSPORT_DIR
+FRAME_SHM_DIR = Path(os.getenv("FRAME_SHM_DIR", "/dev/shm"))
+
 # Поддерживаемые форматы файлов
 SUPPORTED_FILE_FORMATS = [".csv", ".xlsx", ".xls"]
 MAX_FILE_SIZE_MB = 100
 
+# Потоковый режим для CSV больше MAX_FILE_SIZE_MB
+STREAMING_CHUNK_ROWS = int(os.getenv("STREAMING_CHUNK_ROWS", "200000"))
+STREAMING_SAMPLE_ROWS = int(os.getenv("STREAMING_SAMPLE_ROWS", "50000"))
+STREAMING_MAX_DISTINCT = 100_000  # предел точной таблицы частот на столбец
+QUANTILE_SKETCH_K = 200  # точность KLL-скетча (ошибка ранга ~1.7/k)
+# Встроенный расчет метрик: числовые столбцы переводятся в массив float64 блоками по стольку столбцов,
+# пиковая память - несколько размеров блока, а не всех числовых столбцов
+NUMERIC_BLOCK_COLUMNS = int(os.getenv("NUMERIC_BLOCK_COLUMNS", "16"))
+# Приближенный режим метрик (по выбору пользователя) для столбцов от APPROX_METRICS_MIN_ROWS значений:
+# nunique - HyperLogLog, квантили - KLL, mode - Space-Saving; границы ошибок пишутся в metrics_results
+APPROX_METRICS_ENABLED = os.getenv("APPROX_METRICS_ENABLED", "false").lower() == "true"
+APPROX_METRICS_MIN_ROWS = int(os.getenv("APPROX_METRICS_MIN_ROWS", "100000"))
+HLL_PRECISION = 14  # 2^14 регистров, относительная ошибка nunique ~0.8%
+HEAVY_HITTERS_CAPACITY = 1000  # счетчиков Space-Saving на столбец
+# Инкрементальный пересчет метрик: аккумуляторы сохраняются в <директория результатов>/.metrics_state,
+# при повторном запуске по дописанному файлу обрабатываются только новые строки
+INCREMENTAL_METRICS_ENABLED = os.getenv("INCREMENTAL_METRICS_ENABLED", "true").lower() == "true"
+# То же для файлов, загружаемых в память целиком (CSV, .xlsx): метрики считаются аккумуляторами
+# потокового режима. Моменты, границы и метрики дат точные, поэтому при точных метриках в интерфейсе
+# режим используется для планов только из таких метрик (src.data.streaming.is_exact_plan);
+# квантили, nunique и мода считаются инкрементально, только если разрешены приближенные метрики
+INCREMENTAL_METRICS_FOR_LOADED_FILES = os.getenv("INCREMENTAL_METRICS_FOR_LOADED_FILES", "true").lower() == "true"
+METRICS_STATE_DIRNAME = ".metrics_state"
+
+# Кэш статистик датасета (корреляции, describe, пропуски): число хранимых датасетов
+STATS_CACHE_MAX_ENTRIES = int(os.getenv("STATS_CACHE_MAX_ENTRIES", "16"))
+
+# Сжатие типов после загрузки: понижение разрядности целых, category для текста
+# с малым числом уникальных значений, Arrow-строки для остального текста
+DTYPE_OPTIMIZATION_ENABLED = os.getenv("DTYPE_OPTIMIZATION_ENABLED", "true").lower() == "true"
+# Нижняя граница разрядности целых: int8/int16 легко переполняются в арифметике сгенерированного кода
+DTYPE_MIN_INT_BITS = int(os.getenv("DTYPE_MIN_INT_BITS", "32"))
+# float32 только без потери значений; по умолчанию выключено - агрегаты pandas по float32 теряют точность
+DTYPE_DOWNCAST_FLOATS = os.getenv("DTYPE_DOWNCAST_FLOATS", "false").lower() == "true"
+CATEGORY_MAX_UNIQUE_RATIO = 0.5  # доля уникальных значений, до которой текст становится category
+
+# Вывод формата дат по выборке значений столбца (src.data.datetimes)
+DATETIME_FORMAT_SAMPLE_SIZE = 1000
+DATETIME_FORMAT_MIN_MATCH = 0.9  # доля значений выборки, которую формат должен разобрать
+
+# Профиль столбцов перед анализом структуры (src.core.profiler): однозначные столбцы
+# описываются без LLM, в промпт попадают только неоднозначные
+PROFILE_STRUCTURE_ENABLED = os.getenv("PROFILE_STRUCTURE_ENABLED", "true").lower() == "true"
+PROFILE_SAMPLE_ROWS = 5000  # выборка строк для долей чисел и дат
+PROFILE_CONCLUSIVE_RATE = 0.95  # доля значений, при которой вид столбца считается определенным
+PROFILE_CATEGORY_MAX_UNIQUE = 20  # до стольких уникальных значений текст - категория
+
+# Бюджет промптов (src.llm.budget): метрики в промптах анализа и плана графиков сжимаются в таблицы,
+# при превышении бюджета остаются самые информативные столбцы; анализ для отчета сокращается по абзацам
+PROMPT_METRICS_TOKEN_BUDGET = int(os.getenv("PROMPT_METRICS_TOKEN_BUDGET", "3000"))
+PROMPT_SUMMARY_TOKEN_BUDGET = int(os.getenv("PROMPT_SUMMARY_TOKEN_BUDGET", "3000"))
+PROMPT_SIGNIFICANT_DIGITS = 4  # значащих цифр у чисел в таблице метрик
+PROMPT_MAX_LIST_ITEMS = 5  # элементов списков (dates_per_month и т.п.) в таблице метрик
+
 # Настройки Streamlit
 STREAMLIT_PAGE_TITLE = "Анализ данных с LangChain"
 STREAMLIT_PAGE_LAYOUT = "wide"
 
 # Настройки выполнения кода
 CODE_EXECUTION_TIMEOUT = 300  # секунды
-ALLOWED_IMPORTS = ["pandas", "numpy", "matplotlib", "seaborn", "scipy"]
+# Пул прогретых процессов для сгенерированного кода (src.utils.code_executor)
+CODE_EXECUTOR_WORKERS = int(os.getenv("CODE_EXECUTOR_WORKERS", "2"))
+# Ограничение памяти процесса-исполнителя (RLIMIT_DATA, только POSIX); 0 - без ограничения
+CODE_EXECUTION_MEMORY_MB = int(os.getenv("CODE_EXECUTION_MEMORY_MB", "8192"))
+# Модули, которые может импортировать сгенерированный код (src.utils.code_validator);
+# os сюда не входит и не загружается в процессе-исполнителе: папка для графиков создается заранее,
+# а обращение к имени os без импорта тоже отклоняется
+ALLOWED_IMPORTS = ["pandas", "numpy", "matplotlib", "seaborn", "scipy",
+                   "math", "statistics", "datetime", "collections", "itertools", "warnings", "json"]
 
 # Настройки визуализации
 DEFAULT_NUM_PLOTS = 30
+# План графиков делится на группы, код для групп генерируется параллельно
+VIZ_PLOTS_PER_GROUP = int(os.getenv("VIZ_PLOTS_PER_GROUP", "5"))
 PLOT_FORMAT = "png"
 PLOT_DPI = 100
+# Процессов для параллельного построения графиков (0 - по числу ядер)
+PLOT_WORKERS = int(os.getenv("PLOT_WORKERS", "0")) or (os.cpu_count() or 1)
+# Прореживание данных для графиков: выше порога строк диаграммы рассеяния
+# строятся по стратифицированной выборке, линии - по LTTB/min-max, гистограммы - по готовым интервалам
+PLOT_DOWNSAMPLE_THRESHOLD = int(os.getenv("PLOT_DOWNSAMPLE_THRESHOLD", "50000"))
+PLOT_SCATTER_POINTS = int(os.getenv("PLOT_SCATTER_POINTS", "10000"))
+PLOT_LINE_POINTS = int(os.getenv("PLOT_LINE_POINTS", "2000"))
+# Режим отрисовки интерактивных графиков: до PLOT_WEBGL_THRESHOLD точек - SVG,
+# до PLOT_RASTER_THRESHOLD - WebGL (Scattergl), выше - растр (2D гистограмма плотности)
+PLOT_WEBGL_THRESHOLD = int(os.getenv("PLOT_WEBGL_THRESHOLD", "5000"))
+PLOT_RASTER_THRESHOLD = int(os.getenv("PLOT_RASTER_THRESHOLD", "1000000"))
+PLOT_WEBGL_MAX_POINTS = int(os.getenv("PLOT_WEBGL_MAX_POINTS", "500000"))
+PLOT_RASTER_SIZE = (800, 500)  # ширина и высота растра в ячейках
@@ -4,16 +4,74 @@ import pandas as pd
 from io import BytesIO, StringIO
 import json
 import logging
-from dateutil.parser import parse
 import numpy as np
 import re
-import ast
 import textwrap
+import threading
 
 from langchain_community.llms import Ollama
 from langchain_core.prompts import PromptTemplate
 from langchain.chains import LLMChain
-from langchain_experimental.utilities import PythonREPL
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from config.settings import (
+    APPROX_METRICS_ENABLED,
+    APPROX_METRICS_MIN_ROWS,
+    DEFAULT_NUM_PLOTS,
+    DTYPE_OPTIMIZATION_ENABLED,
+    INCREMENTAL_METRICS_ENABLED,
+    INCREMENTAL_METRICS_FOR_LOADED_FILES,
+    LLM_CACHE_FRESH_STAGES,
+    LLM_MAX_CONCURRENCY,
+    MAX_FILE_SIZE_MB,
+    METRICS_STATE_DIRNAME,
+    PIPELINE_MAX_WORKERS,
+    PROFILE_STRUCTURE_ENABLED,
+    PROMPT_METRICS_TOKEN_BUDGET,
+    PROMPT_SUMMARY_TOKEN_BUDGET,
+    STREAMING_SAMPLE_ROWS,
+)
+from src.core.pipeline import AnalysisPipeline
+from src.core.metrics_engine import (
+    compute_catalogue_metrics,
+    merge_metrics_results,
+    parse_metrics_output,
+    split_metrics_plan,
+)
+from src.core.profiler import format_profiles, merge_structure, profile_dataframe, split_profiles
+from src.data.dtypes import type_hints_from_structure
+from src.data.incremental import compute_incremental_csv_metrics, compute_incremental_frame_metrics
+from src.data.preprocessor import get_df_info
+from src.data.store import DatasetStore
+from src.data.visualizer import PlotRenderer, format_plot_specs, plot_group_count, split_plot_plan
+from src.data.streaming import compute_streaming_metrics, is_exact_plan
+from src.llm.budget import fit_metrics_to_budget, fit_text_to_budget, log_prompt_tokens
+from src.llm.cache import LLM_STAGES, for_stage
+from src.llm.chains import StreamBuffer, stream_chain
+from src.llm.models import get_llms
+from src.llm.parsers import StreamingBlockParser, parse_columns_block, parse_plot_plan_response
+from src.llm.prompts import (
+    get_data_analyze_prompt,
+    get_final_report_prompt,
+    get_metrics_plan_prompt,
+    get_structure_analyze_prompt,
+    get_visualization_group_prompt,
+    get_visualization_plan_prompt,
+)
+from src.utils.code_executor import CodeExecutor
+from src.utils.code_validator import validate_code
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Результаты этапов запуска анализа: сбрасываются перед новым запуском,
+# чтобы значения прошлого запуска (другого файла) не попали в промпты и вывод
+RUN_STATE_KEYS = (
+    "data_structure", "data_structure_raw", "parsed_data_structure",
+    "metrics_plan", "metrics_plan_dict", "residual_metrics_plan", "calculation_code",
+    "metrics_results", "metrics_results_raw", "dataset_rows", "analysis_summary",
+    "viz_plan", "viz_code", "final_report",
+)
 
 
 # -----------------------------------------
@@ -203,206 +261,73 @@ def parse_metrics_plan_response(response_text):
 
 
 # --- ИЗМЕНЕНИЕ и ДОПОЛНЕНИЕ: safe_code_execution с перезагрузкой df ---
-def static_code_analysis(code_str, context_name=""):
-    """
-    Выполняет базовую статическую проверку кода.
-    Возвращает список предупреждений.
-    """
-    warnings = []
-    try:
-        # 1. Проверка синтаксиса с помощью ast
-        ast.parse(code_str)
-        logger.info(f"Статический анализ ({context_name}): Синтаксис корректен.")
-    except SyntaxError as e:
-        warnings.append(f"Синтаксическая ошибка: {e}")
-        logger.warning(f"Статический анализ ({context_name}): Синтаксическая ошибка: {e}")
-        return warnings  # Дальнейший анализ бессмысленен при синтаксической ошибке
-
-    # 2. Проверка на потенциально опасные паттерны (упрощенная)
-    lines = code_str.split('\n')
-    for i, line in enumerate(lines):
-        # Проверка на resample без явного указания индекса
-        if '.resample(' in line and not (
-                'set_index(' in code_str and code_str.find('set_index(') < code_str.find('.resample(')):
-            if line.strip().startswith('df.') or '.resample(' in line.split('=')[-1]:
-                warnings.append(
-                    f"Потенциальная проблема в строке {i + 1}: Использование 'resample' без предшествующего 'set_index' на datetime-столбце может вызвать TypeError. "
-                    f"Убедитесь, что индекс является DatetimeIndex или используйте df.set_index('date_column').resample(...). "
-                    f"Строка: {line.strip()}"
-                )
-            logger.warning(
-                f"Статический анализ ({context_name}): Потенциальная проблема resample в строке {i + 1}: {line.strip()}")
-
-    if not warnings:
-        logger.info(f"Статический анализ ({context_name}): Потенциальные проблемы не обнаружены.")
-    else:
-        logger.warning(f"Статический анализ ({context_name}): Обнаружены потенциальные проблемы: {warnings}")
-    return warnings
-
-
-def load_df_from_state():
-    """Загружает df из st.session_state по сохраненному пути или файлу."""
-    if "uploaded_file" in st.session_state and st.session_state["uploaded_file"] is not None:
-        # Загрузка из загруженного файла
-        uploaded_file = st.session_state["uploaded_file"]
-        try:
-            if uploaded_file.name.endswith(".csv"):
-                try:
-                    df = pd.read_csv(uploaded_file, encoding='utf-8')
-                except UnicodeDecodeError:
-                    try:
-                        uploaded_file.seek(0)
-                        df = pd.read_csv(uploaded_file, encoding='latin1')
-                    except:
-                        uploaded_file.seek(0)
-                        df = pd.read_csv(uploaded_file, encoding='cp1251')
-            elif uploaded_file.name.endswith(".xlsx"):
-                df = pd.read_excel(uploaded_file)
-            else:
-                raise ValueError("Неподдерживаемый формат файла.")
-            return df
-        except Exception as e:
-            st.error(f"Ошибка повторной загрузки загруженного файла: {e}")
-            return None
-    elif "file_path" in st.session_state and st.session_state["file_path"]:
-        # Загрузка по пути
-        file_path = st.session_state["file_path"]
-        try:
-            if file_path.endswith(".csv"):
-                try:
-                    df = pd.read_csv(file_path, encoding='utf-8')
-                except UnicodeDecodeError:
-                    try:
-                        df = pd.read_csv(file_path, encoding='latin1')
-                    except:
-                        df = pd.read_csv(file_path, encoding='cp1251')
-            elif file_path.endswith(".xlsx"):
-                df = pd.read_excel(file_path)
-            else:
-                raise ValueError("Неподдерживаемый формат файла.")
-            return df
-        except Exception as e:
-            st.error(f"Ошибка повторной загрузки файла по пути {file_path}: {e}")
-            return None
-    else:
-        st.error("Путь к файлу или загруженный файл не найдены в состоянии приложения.")
-        return None
-
-
-# --- НОВАЯ ФУНКЦИЯ: Преобразование дат на основе списка от LLM ---
-def preprocess_dates_based_on_llm(df: pd.DataFrame, datetime_columns: list) -> pd.DataFrame:
-    """
-    Преобразует указанные столбцы в datetime.
-    Args:
-        df (pd.DataFrame): Исходный DataFrame.
-        datetime_columns (list): Список имен столбцов для преобразования.
-    Returns:
-        pd.DataFrame: DataFrame с преобразованными столбцами.
-    """
-    df_processed = df.copy()
-    successfully_converted = []
-    if not datetime_columns:
-        logger.info("Список datetime-столбцов пуст. Преобразование не требуется.")
-        st.info("LLM не идентифицировала столбцы с датами для преобразования.")
-        return df_processed
-
-    logger.info(f"Начало обработки дат для столбцов: {datetime_columns}")
-    st.info(
-        f"LLM идентифицировала потенциальные столбцы с датами: {', '.join(datetime_columns)}. Начинается преобразование...")
-
-    for col in datetime_columns:
-        if col not in df_processed.columns:
-            logger.warning(f"Столбец '{col}', указанный LLM как datetime, не найден в DataFrame.")
-            st.warning(f"Столбец '{col}', указанный как datetime, не найден в данных.")
-            continue
-        try:
-            logger.debug(f"Преобразование столбца '{col}'...")
-            df_processed[col] = pd.to_datetime(
-                df_processed[col],
-                # infer_datetime_format=True, # Может быть deprecated
-                errors='coerce'  # Преобразует недействительные значения в NaT
-            )
-            successfully_converted.append(col)
-            logger.info(f"Столбец '{col}' успешно преобразован в формат datetime64[ns].")
-            st.success(f"Столбец '{col}' успешно преобразован в datetime.")
-        except Exception as e:
-            logger.error(f"Не удалось преобразовать столбец '{col}' в datetime: {e}")
-            st.error(f"Не удалось преобразовать столбец '{col}' в datetime: {e}")
-
-    if successfully_converted:
-        success_msg = f"Преобразованы следующие столбцы в datetime: {', '.join(successfully_converted)}"
-        logger.info(success_msg)
-        st.success(success_msg)
-    else:
-        logger.info("Ни один из указанных столбцов не был успешно преобразован.")
-        st.info("Указанные столбцы не были преобразованы из-за ошибок.")
-
-    return df_processed
+def show_code_validation(validation, context_name=""):
+    """Выводит результат проверки сгенерированного кода: ошибки, переписанные шаблоны и предупреждения."""
+    if not validation.ok:
+        st.error(f"Код для **{context_name}** отклонен проверкой:")
+        for error in validation.errors:
+            st.markdown(f"* {error}")
+        return
+    if validation.rewrites:
+        st.info(f"ℹ️ В коде для **{context_name}** переписаны медленные шаблоны ({len(validation.rewrites)}):")
+        for rewrite in validation.rewrites:
+            st.markdown(f"* {rewrite}")
+    if validation.warnings:
+        st.warning(f"Найдены потенциальные проблемы в коде для **{context_name}**:")
+        for w in validation.warnings:
+            st.markdown(f"* {w}")
+        # Логика принятия решения (упрощенная: автоматическое продолжение с предупреждением)
+        st.info("ℹ️ Выполнение продолжается, но имейте в виду предупреждения выше...")
+    elif not validation.rewrites:
+        st.success(f"Код для **{context_name}** прошёл проверку.")
+
+
+def show_incremental_update(update):
+    """Сообщает, пересчитаны ли метрики полностью или только по новым строкам."""
+    if update.mode == "unchanged":
+        st.info(f"ℹ️ Файл не изменился с прошлого запуска: метрики по {update.total_rows} строкам взяты из сохраненного состояния.")
+    elif update.mode == "append":
+        st.info(f"ℹ️ К файлу добавлено {update.new_rows} строк: пересчитаны только они "
+                f"(всего {update.total_rows} строк).")
+    logger.info(f"Расчет метрик: режим {update.mode}, новых строк {update.new_rows}, всего {update.total_rows}")
+
+
+def get_dataset_store():
+    """Возвращает хранилище датасета текущего запуска (создает при необходимости)."""
+    store = st.session_state.get("dataset_store")
+    if store is None:
+        store = DatasetStore(
+            file_path=st.session_state.get("file_path") or None,
+            uploaded_file=st.session_state.get("uploaded_file"),
+        )
+        st.session_state["dataset_store"] = store
+    return store
 
 
-# --- НОВАЯ ФУНКЦИЯ: Обработка пропусков перед анализом ---
-def handle_missing_values_before_analysis(df: pd.DataFrame, metrics_plan_dict: dict) -> pd.DataFrame:
-    """
-    Обрабатывает пропущенные значения в DataFrame перед анализом/визуализацией.
-    Применяется только к столбцам, упомянутым в metrics_plan_dict.
+@st.cache_resource
+def get_code_executor():
+    """Пул прогретых процессов для выполнения сгенерированного кода (общий для сеансов приложения)."""
+    return CodeExecutor()
 
-    Args:
-        df (pd.DataFrame): Исходный DataFrame.
-        metrics_plan_dict (dict): Словарь {столбец: [метрики]} от LLM.
 
-    Returns:
-        pd.DataFrame: DataFrame с обработанными пропусками.
-    """
-    if not metrics_plan_dict:
-        logger.info("План метрик пуст. Обработка пропусков не требуется.")
-        return df.copy()
-
-    df_handled = df.copy()
-    columns_to_process = list(metrics_plan_dict.keys())
-    logger.info(f"Начало обработки пропусков для столбцов: {columns_to_process}")
-    st.info(f"Начало обработки пропусков для столбцов, участвующих в анализе: {', '.join(columns_to_process)}")
-
-    for col in columns_to_process:
-        if col not in df_handled.columns:
-            logger.warning(f"Столбец '{col}' из плана метрик не найден в DataFrame. Пропущен.")
-            st.warning(f"Столбец '{col}' из плана метрик не найден в данных. Пропущен.")
-            continue
-
-        dtype = df_handled[col].dtype
-        logger.debug(f"Обработка столбца '{col}' (тип: {dtype})")
-
-        # 1. Удаление строк с пустыми значениями в datetime столбцах
-        if pd.api.types.is_datetime64_any_dtype(dtype):
-            initial_rows = len(df_handled)
-            df_handled = df_handled.dropna(subset=[col])
-            final_rows = len(df_handled)
-            logger.info(f"Столбец '{col}' (datetime): удалено {initial_rows - final_rows} строк с NaT.")
-            st.info(f"✅ Столбец '{col}' (datetime): удалено {initial_rows - final_rows} строк с пропущенными датами.")
-            continue  # Переходим к следующему столбцу
-
-        # 2. Заполнение для остальных типов
-        if df_handled[col].isna().any():
-            if pd.api.types.is_numeric_dtype(dtype):
-                # Заполняем числовые столбцы 0
-                fill_value = 0
-                df_handled[col] = df_handled[col].fillna(fill_value)
-                logger.info(f"Столбец '{col}' (числовой): заполнены пропуски значением {fill_value}.")
-                st.info(f"✅ Столбец '{col}' (числовой): заполнены пропуски значением {fill_value}.")
-            else:
-                # Заполняем нечисловые столбцы 'нет данных'
-                fill_value = 'нет данных'
-                df_handled[col] = df_handled[col].fillna(fill_value)
-                logger.info(f"Столбец '{col}' (другой тип): заполнены пропуски значением '{fill_value}'.")
-                st.info(f"Столбец '{col}' (другой тип): заполнены пропуски значением '{fill_value}'.")
-        else:
-            logger.debug(f"Столбец '{col}' не содержит пропусков.")
+def release_run_frames():
+    """Освобождает DataFrame, опубликованные для процессов выполнения кода за время запуска анализа."""
+    for frame in st.session_state.pop("run_frames", []):
+        frame.release()
+    get_code_executor().detach()
 
-    logger.info("Обработка пропусков перед анализом завершена.")
-    st.success("Обработка пропусков для участвующих в анализе столбцов завершена.")
-    return df_handled
 
+def load_df_from_state():
+    """Возвращает исходный df из хранилища датасета текущего запуска."""
+    if not st.session_state.get("uploaded_file") and not st.session_state.get("file_path"):
+        st.error("Путь к файлу или загруженный файл не найдены в состоянии приложения.")
+        return None
+    try:
+        return get_dataset_store().raw()
+    except Exception as e:
+        st.error(f"Ошибка повторной загрузки файла: {e}")
+        return None
 
-# --- КОНЕЦ НОВОЙ ФУНКЦИИ ---
 
 def safe_code_execution(code, context_name="", required_imports=None):
     """
@@ -417,66 +342,73 @@ def safe_code_execution(code, context_name="", required_imports=None):
         clean_code = extract_python_code(code)
         logger.debug(f"Извлеченный код ({context_name}):\n{textwrap.shorten(clean_code, width=200, placeholder='...')}")
 
+        # --- ДОБАВЛЕНИЕ: Статическая перепроверка ---
+        # Проверка по AST: запрещенные импорты отклоняют код, медленные шаблоны pandas переписываются
+        st.write(f"🔍 Перепроверка сгенерированного кода для **{context_name}**...")
+        validation = validate_code(clean_code, context_name)
+        show_code_validation(validation, context_name)
+        if not validation.ok:
+            with st.expander("Отклоненный код"):
+                st.code(clean_code, language="python")
+            return f"Ошибка выполнения: код отклонен проверкой: {'; '.join(validation.errors)}"
+        # --- КОНЕЦ ДОБАВЛЕНИЯ ---
+
         # 2. Формируем финальный код с обязательными импортами
         final_code_lines = []
         # Добавляем обязательные импорты в начало
         for imp in required_imports:
             final_code_lines.append(imp)
-        # Добавляем извлеченный код, разбив его на строки
-        final_code_lines.extend(clean_code.split('\n'))  # Исправлено: split('\n')
+        # Добавляем проверенный код, разбив его на строки
+        final_code_lines.extend(validation.code.split('\n'))  # Исправлено: split('\n')
         final_code_to_execute = "\n".join(final_code_lines)  # Исправлено: "\n".join()
         logger.debug(
             f"Финальный код для выполнения ({context_name}):\n{textwrap.shorten(final_code_to_execute, width=300, placeholder='...')}")
 
-        # --- ДОБАВЛЕНИЕ: Статическая перепроверка ---
-        st.write(f"🔍 Перепроверка сгенерированного кода для **{context_name}**...")
-        warnings = static_code_analysis(final_code_to_execute, context_name)
-        if warnings:
-            st.warning(f"Найдены потенциальные проблемы в коде для **{context_name}**:")
-            for w in warnings:
-                st.markdown(f"* {w}")
-            # Логика принятия решения (упрощенная: автоматическое продолжение с предупреждением)
-            st.info("ℹ️ Выполнение продолжается, но имейте в виду предупреждения выше...")
-        else:
-            st.success(f"Код для **{context_name}** прошёл проверку.")
-        # --- КОНЕЦ ДОБАВЛЕНИЯ ---
-
         # --- ИЗМЕНЕНИЕ: Перезагрузка и подготовка df перед выполнением ---
         st.info(f"🔄 Подготовка данных для **{context_name}**...")
-        df = load_df_from_state()
+        # Данные берутся из хранилища запуска: файл читается один раз,
+        # обработка дат и пропусков кэшируется по плану метрик.
+        datetime_candidates = st.session_state.get("parsed_data_structure", {}).get("datetime_candidates", [])
+        if not datetime_candidates:
+            logger.info("Список datetime-кандидатов не найден. Пропуск обработки дат.")
+        metrics_plan_dict = None
+        if context_name in ["расчета метрик", "визуализации"]:
+            metrics_plan_dict = st.session_state.get("metrics_plan_dict", {})
+            if not metrics_plan_dict:
+                logger.warning("План метрик не найден в состоянии. Обработка пропусков пропущена.")
+                st.warning("План метрик не найден. Обработка пропусков пропущена.")
+        try:
+            df = get_dataset_store().prepared(datetime_candidates, metrics_plan_dict)
+        except Exception as e:
+            logger.error(f"Не удалось подготовить данные для {context_name}: {e}")
+            df = None
         if df is not None:
-            # 1. Обработка дат (как и раньше)
-            # Получаем список datetime-кандидатов из состояния (если есть)
-            datetime_candidates = st.session_state.get("parsed_data_structure", {}).get("datetime_candidates", [])
-            if datetime_candidates:
-                df = preprocess_dates_based_on_llm(df, datetime_candidates)
-            else:
-                logger.info("Список datetime-кандидатов не найден. Пропуск обработки дат.")
-
-            # 2. НОВАЯ ЛОГИКА: Обработка пропусков перед выполнением кода анализа/визуализации
-            # Проверяем, если это этапы, где это необходимо (расчет метрик или визуализация)
-            if context_name in ["расчета метрик", "визуализации"]:
-                # Получаем план метрик из состояния (он должен быть уже создан к этому моменту)
-                metrics_plan_dict = st.session_state.get("metrics_plan_dict", {})
-                if metrics_plan_dict:
-                    df = handle_missing_values_before_analysis(df, metrics_plan_dict)
-                else:
-                    logger.warning("План метрик не найден в состоянии. Обработка пропусков пропущена.")
-                    st.warning("План метрик не найден. Обработка пропусков пропущена.")
-
-            # 3. Передаем подготовленный df в среду выполнения
-            repl.locals["df"] = df
-            logger.info(f"DF успешно подготовлен и передан в repl.locals для {context_name}.")
+            # 3. Передаем подготовленный df процессам-исполнителям: публикация в разделяемой памяти
+            # держится до конца запуска; по ключу подготовленного кадра повторные вызовы и
+            # построение графиков по тому же кадру используют тот же файл
+            frame = get_code_executor().publish(
+                df, get_dataset_store().frame_key(datetime_candidates, metrics_plan_dict))
+            st.session_state.setdefault("run_frames", []).append(frame)
+            logger.info(f"DF успешно подготовлен и передан процессам выполнения кода для {context_name}.")
             st.success(f"Данные подготовлены и загружены для **{context_name}**.")
         else:
             st.error(f"Не удалось перезагрузить данные для **{context_name}**. Выполнение пропущено.")
             return f"Ошибка: Не удалось перезагрузить данные для {context_name}."
         # --- КОНЕЦ ИЗМЕНЕНИЯ ---
 
-        # 3. Выполняем код
-        output = repl.run(final_code_to_execute)
-        logger.info(f"{context_name} выполнен успешно.")
-        return output.strip()
+        # 3. Выполняем код в отдельном процессе с ограничением времени и памяти
+        result = get_code_executor().run(final_code_to_execute, frame, stage=context_name)
+        if result.peak_rss_mb is not None:
+            st.caption(f"Пик памяти процесса выполнения ({context_name}): {result.peak_rss_mb:.0f} МБ")
+        if not result.ok:
+            error_msg = f"Ошибка при выполнении {context_name}: {result.error}"
+            logger.error(error_msg)
+            st.error(error_msg)
+            with st.expander("Код, вызвавший ошибку"):
+                st.code(final_code_to_execute, language="python")
+            return f"{result.output}\nОшибка выполнения: {result.error}".strip()
+        logger.info(f"{context_name} выполнен успешно за {result.duration:.2f} с.")
+        return result.output.strip()
     except Exception as e:
         error_msg = f"Ошибка при выполнении {context_name}: {str(e)}"
         logger.error(error_msg)
@@ -493,25 +425,79 @@ def safe_code_execution(code, context_name="", required_imports=None):
 
 # --- КОНЕЦ ИЗМЕНЕНИЯ и ДОПОЛНЕНИЯ ---
 
-def get_df_info(df, title="DataFrame"):
-    """Получает строковое представление информации о DataFrame для отладки."""
-    if df is None:
-        return f"{title} is None"
-    if df.empty:
-        return f"{title} is empty"
-    buffer = StringIO()
-    df.info(buf=buffer)
-    info_str = buffer.getvalue()
-    return (
-        f"--- {title} ---\n"
-        f"Shape: {df.shape}\n"
-        f"Columns: {list(df.columns)}\n"
-        f"Dtypes:\n{df.dtypes.to_string()}\n"
-        f"Head:\n{df.head(2).to_string()}\n"
-        f"Info:\n{info_str}\n"
-        f"-------------------\n"
-    )
 
+def save_report_files(content, output_dir, filename_base, heading, label):
+    """
+    Сохраняет текстовый отчёт в TXT и DOCX в директорию результатов.
+
+    Args:
+        content: Текст отчёта
+        output_dir: Директория для сохранения
+        filename_base: Имя файла без расширения
+        heading: Заголовок документа DOCX
+        label: Название отчёта для сообщений
+    """
+    content = content if isinstance(content, str) else str(convert_numpy_types(content))
+    txt_path = os.path.join(output_dir, f"{filename_base}.txt")
+    docx_path = os.path.join(output_dir, f"{filename_base}.docx")
+    try:
+        with open(txt_path, "w", encoding="utf-8") as f_txt:
+            f_txt.write(content)
+        logger.info(f"{label} сохранен в TXT: {txt_path}")
+        st.success(f"✅ {label} сохранен в TXT: {txt_path}")
+    except Exception as e_txt:
+        error_msg_txt = f"❌ Ошибка при сохранении файла {txt_path}: {e_txt}"
+        logger.error(error_msg_txt)
+        st.error(error_msg_txt)
+    try:
+        from docx import Document  # Импортируем внутри блока try, чтобы не ломать всё при отсутствии библиотеки
+
+        doc = Document()
+        doc.add_heading(heading, level=1)
+        for line in content.splitlines():
+            if line.strip():  # Добавляем только непустые строки как отдельные параграфы
+                doc.add_paragraph(line)
+        doc.save(docx_path)
+        logger.info(f"{label} сохранен в DOCX: {docx_path}")
+        st.success(f"✅ {label} сохранен в DOCX: {docx_path}")
+    except ImportError as e_import:
+        error_msg_import = f"❌ Библиотека python-docx не установлена. {label} в DOCX не сохранен: {e_import}"
+        logger.error(error_msg_import)
+        st.error(error_msg_import)
+    except Exception as e_docx:
+        error_msg_docx = f"❌ Ошибка при сохранении файла {docx_path}: {e_docx}"
+        logger.error(error_msg_docx)
+        st.error(error_msg_docx)
+
+
+def save_viz_code(viz_code_content, output_dir):
+    """Сохраняет сгенерированный код визуализации в .py файл."""
+    viz_code_path = os.path.join(output_dir, "generated_visualization_code.py")
+    try:
+        with open(viz_code_path, "w", encoding="utf-8") as f_py:
+            f_py.write("# Сгенерированный код для визуализации\n")
+            f_py.write("# ----------------------------------\n\n")
+            f_py.write(str(viz_code_content))
+        logger.info(f"Сгенерированный код визуализации сохранен в PY: {viz_code_path}")
+        st.success(f"✅ Сгенерированный код визуализации сохранен в PY: {viz_code_path}")
+    except Exception as e_viz_code_save:
+        error_msg_viz_code_save = f"❌ Ошибка при сохранении сгенерированного кода визуализации в PY: {e_viz_code_save}"
+        logger.error(error_msg_viz_code_save)
+        st.error(error_msg_viz_code_save)
+
+
+def streamlit_thread_initializer():
+    """
+    Возвращает инициализатор потоков пайплайна, передающий им контекст скрипта
+    Streamlit (для доступа к st.session_state и вывода из этапов).
+    """
+    script_ctx = get_script_run_ctx()
+
+    def initializer():
+        if script_ctx is not None:
+            add_script_run_ctx(threading.current_thread(), script_ctx)
+
+    return initializer
 
 # -----------------------------------------
 # Ввод: путь к файлу или загрузка
@@ -539,20 +525,20 @@ if not os.path.exists(file_path):
     st.error("Файл не найден. Проверьте путь.")
     st.stop()
 
+# Хранилище датасета на текущий запуск скрипта: все этапы ниже читают файл через него
+dataset_store = DatasetStore(file_path=file_path)
+st.session_state["dataset_store"] = dataset_store
+
+if not file_path.endswith((".csv", ".xlsx")):
+    st.error("Поддерживаются только .csv и .xlsx файлы.")
+    st.stop()
+
+if dataset_store.streaming:
+    st.info(f"ℹ️ Файл больше {MAX_FILE_SIZE_MB} МБ: метрики будут рассчитаны потоково по всему файлу, "
+            f"структура и графики строятся по выборке из {STREAMING_SAMPLE_ROWS} строк.")
+
 try:
-    if file_path.endswith(".csv"):
-        try:
-            df = pd.read_csv(file_path, encoding='utf-8')
-        except UnicodeDecodeError:
-            try:
-                df = pd.read_csv(file_path, encoding='latin1')
-            except:
-                df = pd.read_csv(file_path, encoding='cp1251')
-    elif file_path.endswith(".xlsx"):
-        df = pd.read_excel(file_path)
-    else:
-        st.error("Поддерживаются только .csv и .xlsx файлы.")
-        st.stop()
+    df = dataset_store.raw()
 except Exception as e:
     st.error(f"Ошибка чтения файла по пути: {e}")
     st.exception(e)
@@ -597,7 +583,21 @@ st.session_state["output_dir"] = output_dir
 # Готовим цепочку LangChain
 # -----------------------------------------
 st.header("3. Запуск анализа")
+llm_analyst, llm_coder = get_llms()
+fresh_stages = st.multiselect(
+    "Этапы без кэша ответов LLM (ответ генерируется заново):",
+    options=list(LLM_STAGES),
+    default=[stage for stage in LLM_CACHE_FRESH_STAGES if stage in LLM_STAGES],
+)
+approximate_metrics = st.checkbox(
+    f"Приближенные nunique, квантили и мода для столбцов от {APPROX_METRICS_MIN_ROWS:,} значений (скетчи)",
+    value=APPROX_METRICS_ENABLED,
+)
 if st.button("🚀 Запустить анализ"):
+    # Публикации DataFrame прерванного предыдущего запуска и результаты этапов прошлого запуска
+    release_run_frames()
+    for key in RUN_STATE_KEYS:
+        st.session_state.pop(key, None)
     with st.spinner("Выполняется анализ..."):
         # Загружаем df для получения информации о структуре
         df_for_info = load_df_from_state()
@@ -607,66 +607,108 @@ if st.button("🚀 Запустить анализ"):
 
         # --- Шаг 0: Получение базовой информации о df для промпта LLM ---
         logger.info("DF перед началом анализа:\n" + get_df_info(df_for_info, "df перед началом анализа"))
-        buffer = StringIO()
-        df_for_info.info(buf=buffer)
-        df_info = buffer.getvalue()
-        file_info_summary = (
-            f"DataFrame Info (сырые данные):\n{df_info}\n"
-            f"DataFrame Head:\n{df_for_info.head(10).to_string()}\n"
-            f"DataFrame Dtypes:\n{df_for_info.dtypes.to_string()}\n"
-            f"DataFrame Shape: {df_for_info.shape}\n"
-        )
+        profiles, known_structure, ambiguous_profiles = None, None, []
+        if PROFILE_STRUCTURE_ENABLED:
+            # Однозначные столбцы описываются по профилю, в промпт идут только неоднозначные
+            profiles = profile_dataframe(df_for_info)
+            known_structure, ambiguous_profiles = split_profiles(profiles)
+            file_info_summary = format_profiles(ambiguous_profiles, len(df_for_info))
+        else:
+            buffer = StringIO()
+            df_for_info.info(buf=buffer)
+            df_info = buffer.getvalue()
+            file_info_summary = (
+                f"DataFrame Info (сырые данные):\n{df_info}\n"
+                f"DataFrame Head:\n{df_for_info.head(10).to_string()}\n"
+                f"DataFrame Dtypes:\n{df_for_info.dtypes.to_string()}\n"
+                f"DataFrame Shape: {df_for_info.shape}\n"
+            )
         logger.info("Подготовлена сводная информация о сырых данных.")
 
         # --- Шаг 1: Анализ структуры с помощью LLM ---
-        with st.spinner("Анализ структуры данных LLM..."):
-            prompt_structure = PromptTemplate.from_template(struct_analyze)
-            chain_structure = LLMChain(llm=llm_analyst, prompt=prompt_structure, output_key="data_structure")
-            try:
-                # --- ВАЖНО: Получаем "сырой" ответ ---
-                result_structure_raw = chain_structure.run(file_info=file_info_summary)
-                logger.info(f"Ответ LLM (анализ структуры):\n{result_structure_raw}")
-
-                # --- ИЗМЕНЕНИЕ: Используем новый парсер строк ---
-                parsed_structure = parse_struct_analyze_response(result_structure_raw)
-                # --- КОНЕЦ ИЗМЕНЕНИЯ ---
+        if profiles is not None and not ambiguous_profiles:
+            parsed_structure = merge_structure(profiles, known_structure, None)
+            st.session_state["data_structure_raw"] = file_info_summary
+            st.session_state["data_structure"] = json.dumps(parsed_structure, indent=2, ensure_ascii=False)
+            st.session_state["parsed_data_structure"] = parsed_structure
+            logger.info("Структура данных определена профилированием, запрос к LLM не нужен.")
+            st.success("Структура данных определена профилированием столбцов (без LLM).")
+        else:
+            with st.spinner("Анализ структуры данных LLM..."):
+                prompt_structure = get_structure_analyze_prompt()
+                # Ответ читается потоково: таблица столбцов показывается, как только закрыт блок COLUMNS
+                structure_parser = StreamingBlockParser()
+                structure_preview = st.empty()
 
-                if not parsed_structure:
-                    st.error("Не удалось распарсить строковый ответ от LLM по структуре данных.")
-                    # Отображаем необработанный ответ для отладки
-                    with st.expander("Необработанный ответ LLM (Структура)"):
-                        st.code(result_structure_raw, language="text")
-                    st.stop()  # Останавливаем выполнение, если структура не получена
-
-                # --- Сохраняем как сырые данные, так и распарсенный словарь ---
-                st.session_state["data_structure_raw"] = result_structure_raw  # Сохраняем для отладки
-                st.session_state["data_structure"] = json.dumps(parsed_structure, indent=2,
-                                                                ensure_ascii=False)  # Для отображения
-                st.session_state[
-                    "parsed_data_structure"] = parsed_structure  # Сохраняем распарсенный словарь для дальнейшего использования
-                logger.info("Структура данных проанализирована LLM.")
-                st.success("Структура данных проанализирована LLM.")
+                def on_structure_chunk(chunk):
+                    for block_name, block_content in structure_parser.feed(chunk):
+                        if block_name == "COLUMNS":
+                            structure_preview.dataframe(pd.DataFrame(parse_columns_block(block_content)))
 
-            except Exception as e:
-                st.error(f"Ошибка при анализе структуры LLM: {e}")
-                # Отображаем необработанный ответ даже при других ошибках
-                if 'result_structure_raw' in locals():
-                    with st.expander("Необработанный ответ LLM (Структура)"):
-                        st.code(result_structure_raw, language="text")
-                st.stop()
+                try:
+                    # --- ВАЖНО: Получаем "сырой" ответ ---
+                    result_structure_raw = stream_chain(for_stage(llm_analyst, "structure", fresh_stages),
+                                                        prompt_structure, {"file_info": file_info_summary},
+                                                        on_chunk=on_structure_chunk, stage="structure")
+                    logger.info(f"Ответ LLM (анализ структуры):\n{result_structure_raw}")
+
+                    # --- ИЗМЕНЕНИЕ: Используем новый парсер строк ---
+                    parsed_structure = parse_struct_analyze_response(result_structure_raw)
+                    # --- КОНЕЦ ИЗМЕНЕНИЯ ---
+
+                    if not parsed_structure:
+                        st.error("Не удалось распарсить строковый ответ от LLM по структуре данных.")
+                        # Отображаем необработанный ответ для отладки
+                        with st.expander("Необработанный ответ LLM (Структура)"):
+                            st.code(result_structure_raw, language="text")
+                        st.stop()  # Останавливаем выполнение, если структура не получена
+                    if profiles is not None:
+                        # LLM описывала только неоднозначные столбцы: добавляем определенные профилем
+                        parsed_structure = merge_structure(profiles, known_structure, parsed_structure)
+
+                    # --- Сохраняем как сырые данные, так и распарсенный словарь ---
+                    st.session_state["data_structure_raw"] = result_structure_raw  # Сохраняем для отладки
+                    st.session_state["data_structure"] = json.dumps(parsed_structure, indent=2,
+                                                                    ensure_ascii=False)  # Для отображения
+                    st.session_state[
+                        "parsed_data_structure"] = parsed_structure  # Сохраняем распарсенный словарь для дальнейшего использования
+                    logger.info("Структура данных проанализирована LLM.")
+                    st.success("Структура данных проанализирована LLM.")
+
+                except Exception as e:
+                    st.error(f"Ошибка при анализе структуры LLM: {e}")
+                    # Отображаем необработанный ответ даже при других ошибках
+                    if 'result_structure_raw' in locals():
+                        with st.expander("Необработанный ответ LLM (Структура)"):
+                            st.code(result_structure_raw, language="text")
+                    st.stop()
+
+        if profiles is not None:
+            # Форматы дат из профиля; форматы из метаданных кэша датасета имеют приоритет
+            store_formats = get_dataset_store().datetime_formats
+            for profile in profiles:
+                if profile.is_datetime and profile.date_format:
+                    store_formats.setdefault(profile.name, profile.date_format)
 
         # --- Шаг 2: Метрики (используем обработанный df для получения актуальной структуры) ---
         with st.spinner("Генерация плана метрик..."):
             # Обновляем информацию о структуре df для промпта метрик
-            # Загружаем df заново и применяем преобразование дат
-            df_for_processing = load_df_from_state()
-            if df_for_processing is None:
-                st.error("Не удалось загрузить данные для подготовки к генерации плана метрик.")
-                st.stop()
-
             # Применяем преобразование типов дат на основе анализа LLM
             datetime_candidates = st.session_state.get("parsed_data_structure", {}).get("datetime_candidates", [])
-            df_processed = preprocess_dates_based_on_llm(df_for_processing, datetime_candidates)
+            if DTYPE_OPTIMIZATION_ENABLED:
+                # Сжатие типов до подготовки кадров: все копии и проходы метрик идут по сжатому кадру
+                type_hints = type_hints_from_structure(st.session_state["parsed_data_structure"].get("columns", []))
+                type_hints.update({col: "datetime" for col in datetime_candidates})
+                try:
+                    dtype_report = get_dataset_store().optimize_dtypes(type_hints)
+                    st.info(f"ℹ️ {dtype_report.summary()}")
+                except Exception as e:
+                    logger.warning(f"Не удалось сжать типы столбцов: {e}")
+            try:
+                df_processed = get_dataset_store().prepared(datetime_candidates)
+            except Exception as e:
+                st.error(f"Не удалось загрузить данные для подготовки к генерации плана метрик: {e}")
+                st.stop()
 
             buffer_processed = StringIO()
             df_processed.info(buf=buffer_processed)
@@ -679,11 +721,12 @@ if st.button("🚀 Запустить анализ"):
             )
 
             # --- ИЗМЕНЕНИЕ: Ужесточенный промпт ---
-            prompt_metrics = PromptTemplate.from_template(m_plan)
+            prompt_metrics = get_metrics_plan_prompt()
             # --- КОНЕЦ ИЗМЕНЕНИЯ ---
-            chain_metrics_plan = LLMChain(llm=llm_analyst, prompt=prompt_metrics, output_key="metrics_plan")
+            chain_metrics_plan = LLMChain(llm=for_stage(llm_analyst, "metrics_plan", fresh_stages), prompt=prompt_metrics, output_key="metrics_plan")
             try:
                 # Передаем обновленную информацию о структуре
+                log_prompt_tokens("metrics_plan", prompt_metrics, {"data_structure": file_info_summary_processed})
                 result_metrics_plan_raw = chain_metrics_plan.run(data_structure=file_info_summary_processed)
                 logger.info(
                     f"Ответ LLM (план метрик):\n{result_metrics_plan_raw}")  # --- ДОБАВЛЕНИЕ: Логируем ответ ---
@@ -740,7 +783,7 @@ if st.button("🚀 Запустить анализ"):
 - Рассчитывай ТОЛЬКО те метрики, которые указаны в `{metrics_plan}` для каждого столбца.
 - ПРЕЖДЕ чем обращаться к `df["имя_столбца"]`, ОБЯЗАТЕЛЬНО проверяй, существует ли столбец в `df.columns`. Если нет — пропусти.
 - Для каждого столбца:
-  - Создай копию: `series = df[col].copy()`
+  - Бери столбец без копии: `series = df[col]` (copy-on-write: изменение series не меняет df)
   - Все пропущенные значения (NaN, NaT) должны быть обработаны как `None` в результате. Не оставляй `nan`, `nat` или `np.nan`.
   #
 - Для метрик, требующих resample (например, dates_per_month, dates_per_year):
@@ -774,17 +817,30 @@ if st.button("🚀 Запустить анализ"):
             )
 
             # --- КОНЕЦ ИЗМЕНЕНИЯ ПРОМПТА ---
-            chain_code_gen = LLMChain(llm=llm_coder, prompt=prompt_code_gen, output_key="calculation_code")
-            metrics_plan_for_prompt = st.session_state.get("metrics_plan", "{}")
-            if "metrics_plan_dict" in st.session_state and st.session_state["metrics_plan_dict"]:
-                metrics_plan_for_prompt = json.dumps(st.session_state["metrics_plan_dict"], indent=2,
-                                                     ensure_ascii=False)
+            chain_code_gen = LLMChain(llm=for_stage(llm_coder, "code_gen", fresh_stages), prompt=prompt_code_gen, output_key="calculation_code")
+            # Метрики каталога считает встроенный движок, LLM пишет код только для остальных
+            builtin_plan, residual_plan = split_metrics_plan(df_processed,
+                                                             st.session_state.get("metrics_plan_dict", {}))
+            st.session_state["residual_metrics_plan"] = residual_plan
+            metrics_plan_for_prompt = json.dumps(residual_plan, indent=2, ensure_ascii=False)
             try:
-                result_code_gen = chain_code_gen.run(metrics_plan=metrics_plan_for_prompt,
-                                                     df_structure_info=df_structure_info)
-                st.session_state["calculation_code"] = result_code_gen
-                logger.info("Код для расчёта метрик сгенерирован.")
-                st.success("✅ Код для расчёта метрик сгенерирован.")
+                if get_dataset_store().streaming:
+                    # В потоковом режиме df - лишь выборка, метрики считаются по всему файлу без LLM-кода
+                    st.session_state["calculation_code"] = "# Потоковый режим: метрики рассчитаны src.data.streaming"
+                    st.info("ℹ️ Файл обрабатывается в потоковом режиме, генерация кода метрик не требуется.")
+                elif not residual_plan:
+                    st.session_state["calculation_code"] = "# Все метрики плана рассчитаны src.core.metrics_engine"
+                    logger.info("Все метрики плана входят в каталог, генерация кода не требуется.")
+                    st.success("✅ Все метрики плана рассчитываются встроенным движком, генерация кода не требуется.")
+                else:
+                    logger.info(f"Метрики вне каталога для генерации кода: {residual_plan}")
+                    log_prompt_tokens("code_gen", prompt_code_gen, {"metrics_plan": metrics_plan_for_prompt,
+                                                                    "df_structure_info": df_structure_info})
+                    result_code_gen = chain_code_gen.run(metrics_plan=metrics_plan_for_prompt,
+                                                         df_structure_info=df_structure_info)
+                    st.session_state["calculation_code"] = result_code_gen
+                    logger.info("Код для расчёта метрик сгенерирован.")
+                    st.success("✅ Код для расчёта метрик сгенерирован.")
             except Exception as e:
                 st.error(f"❌ Ошибка при генерации кода расчёта метрик: {e}")
                 st.session_state["calculation_code"] = "# Код не был сгенерирован из-за ошибки."
@@ -798,12 +854,75 @@ if st.button("🚀 Запустить анализ"):
                 "import numpy as np",
                 # json и ast не требуются, если мы не парсим
             ]
-            # Выполняем код и получаем вывод как строку
-            metrics_results_raw_output = safe_code_execution(
-                st.session_state["calculation_code"],
-                "расчета метрик",
-                required_imports=required_imports_for_metrics
-            )
+            metrics_state_dir = os.path.join(output_dir, METRICS_STATE_DIRNAME)
+            if get_dataset_store().streaming:
+                # Один проход по файлу частями со сливаемыми аккумуляторами;
+                # при повторном запуске по дописанному файлу читаются только новые строки
+                try:
+                    if INCREMENTAL_METRICS_ENABLED:
+                        streaming_metrics, metrics_update = compute_incremental_csv_metrics(
+                            get_dataset_store().file_path,
+                            metrics_state_dir,
+                            st.session_state.get("metrics_plan_dict", {}),
+                            st.session_state.get("parsed_data_structure", {}).get("datetime_candidates", []),
+                        )
+                        show_incremental_update(metrics_update)
+                        st.session_state["dataset_rows"] = metrics_update.total_rows
+                    else:
+                        row_counter = {"rows": 0}
+                        streaming_metrics = compute_streaming_metrics(
+                            get_dataset_store().file_path,
+                            st.session_state.get("metrics_plan_dict", {}),
+                            st.session_state.get("parsed_data_structure", {}).get("datetime_candidates", []),
+                            counter=row_counter,
+                        )
+                        st.session_state["dataset_rows"] = row_counter["rows"]
+                    st.session_state["metrics_results"] = convert_numpy_types(streaming_metrics)
+                    metrics_results_raw_output = str(st.session_state["metrics_results"])
+                except Exception as e:
+                    metrics_results_raw_output = f"Ошибка выполнения: {e}"
+            else:
+                metrics_plan_dict = st.session_state.get("metrics_plan_dict", {})
+                datetime_candidates = st.session_state.get("parsed_data_structure", {}).get("datetime_candidates", [])
+                try:
+                    # Аккумуляторы инкрементального режима точны для моментов и дат, а квантили и моду
+                    # дают приближенно: при точных метриках он используется только для таких планов
+                    if INCREMENTAL_METRICS_ENABLED and INCREMENTAL_METRICS_FOR_LOADED_FILES and (
+                            approximate_metrics or is_exact_plan(metrics_plan_dict)):
+                        metrics_results, metrics_update = compute_incremental_frame_metrics(
+                            get_dataset_store().raw(),
+                            os.path.abspath(get_dataset_store().file_path),
+                            metrics_state_dir,
+                            metrics_plan_dict,
+                            datetime_candidates,
+                        )
+                        show_incremental_update(metrics_update)
+                    else:
+                        metrics_results = compute_catalogue_metrics(
+                            get_dataset_store().prepared(datetime_candidates, metrics_plan_dict),
+                            metrics_plan_dict,
+                            approximate=approximate_metrics,
+                        )
+                    # Корреляции и describe для графиков считаются в фоне, пока LLM анализирует метрики
+                    get_dataset_store().stats(datetime_candidates, metrics_plan_dict, background=True)
+                    if st.session_state.get("residual_metrics_plan"):
+                        # Выполняем код LLM для метрик вне каталога и добавляем результат
+                        residual_output = safe_code_execution(
+                            st.session_state["calculation_code"],
+                            "расчета метрик",
+                            required_imports=required_imports_for_metrics
+                        )
+                        residual_results = parse_metrics_output(residual_output)
+                        if residual_results is None:
+                            st.warning("⚠️ Не удалось рассчитать метрики вне каталога, используются встроенные метрики.")
+                            with st.expander("Вывод кода расчета метрик вне каталога"):
+                                st.code(residual_output, language="text")
+                        else:
+                            metrics_results = merge_metrics_results(metrics_results, residual_results)
+                    st.session_state["metrics_results"] = metrics_results
+                    metrics_results_raw_output = str(metrics_results)
+                except Exception as e:
+                    metrics_results_raw_output = f"Ошибка выполнения: {e}"
 
             # Сохраняем "сырой" вывод как строку, без попыток парсинга
             st.session_state["metrics_results_raw"] = metrics_results_raw_output
@@ -855,281 +974,199 @@ if st.button("🚀 Запустить анализ"):
                 st.stop()  # Останавливаем, если код не выполнился успешно
             # --- Конец проверки ---
 
-        # --- Шаг 5: Анализ результатов и сохранение отчета ---
-        with st.spinner("🔍 Анализ рассчитанных метрик..."):
-            prompt_analysis = PromptTemplate.from_template(data_analyze)
-            # Передаем оригинальный "сырой" вывод в промпт анализа
-            prompt_analysis = prompt_analysis.partial(metrics_results_raw=st.session_state["metrics_results_raw"])
-            chain_analysis = LLMChain(llm=llm_analyst, prompt=prompt_analysis, output_key="analysis_summary")
-            try:
-                result_analysis = chain_analysis.invoke({})
-                raw_analysis_summary = result_analysis.get("analysis_summary", "Анализ не выполнен.")
-                st.session_state["analysis_summary"] = convert_numpy_types(raw_analysis_summary)
+        # --- Шаги 5-8: анализ метрик, код визуализации, графики и итоговый отчёт ---
+        # Этапы выполняются как граф зависимостей: анализ метрик (llm_analyst) и код
+        # визуализации (llm_coder) не зависят друг от друга и идут параллельно,
+        # так же как построение графиков и итоговый отчёт.
+        # В промпты идут сжатые метрики в пределах бюджета токенов, а не полный вывод словаря
+        # Число строк всего файла: при потоковом чтении df_processed - только выборка,
+        # а count в метриках посчитан по всему файлу
+        metrics_for_prompt, dropped_columns = fit_metrics_to_budget(
+            st.session_state.get("metrics_results") or {}, PROMPT_METRICS_TOKEN_BUDGET,
+            rows=st.session_state.get("dataset_rows") or df_processed.shape[0])
+        if dropped_columns:
+            st.info(f"Метрики не помещаются в бюджет промпта: {len(dropped_columns)} менее информативных "
+                    f"столбцов не переданы в анализ и план графиков.")
+        required_imports_for_viz = [
+            "import pandas as pd",
+            "import numpy as np",
+            "import matplotlib",
+            "matplotlib.use('Agg')",
+            "import matplotlib.pyplot as plt",
+            "import seaborn as sns",
+            "import json"
+        ]
+
+        def run_analysis_step(_inputs):
+            prompt_analysis = get_data_analyze_prompt().partial(metrics_results_raw=metrics_for_prompt)
+            analysis_summary = stream_chain(for_stage(llm_analyst, "analysis", fresh_stages), prompt_analysis,
+                                            stage="analysis")
+            return analysis_summary or "Анализ не выполнен."
+
+        def run_viz_plan_step(_inputs):
+            # Компактный план графиков строится по структуре и метрикам, без ожидания текстового анализа
+            prompt_viz_plan = get_visualization_plan_prompt(DEFAULT_NUM_PLOTS).partial(
+                df_structure_info=df_structure_info,
+                metrics_results_raw=metrics_for_prompt
+            )
+            plot_plan = parse_plot_plan_response(
+                stream_chain(for_stage(llm_coder, "viz_plan", fresh_stages), prompt_viz_plan, stage="viz_plan"))
+            if not plot_plan:
+                raise ValueError("LLM не вернула план графиков.")
+            return split_plot_plan(plot_plan, DEFAULT_NUM_PLOTS)
+
+        def make_viz_code_step(group_index):
+            def run_viz_code_step(inputs):
+                plot_groups = inputs["viz_plan"]
+                if group_index >= len(plot_groups):
+                    return ""
+                prompt_viz = get_visualization_group_prompt().partial(
+                    plot_specs=format_plot_specs(plot_groups[group_index]),
+                    df_structure_info=df_structure_info,
+                    output_dir=output_dir
+                )
+                return stream_chain(for_stage(llm_coder, "viz_code", fresh_stages), prompt_viz,
+                                    on_chunk=viz_code_streams[group_index].append, stage="viz_code")
+            return run_viz_code_step
+
+        def make_plots_step(group_index):
+            def run_plots_step(inputs):
+                viz_code_group = extract_python_code(inputs[f"viz_code_{group_index}"])
+                if not viz_code_group.strip():
+                    return []
+                # Код каждого графика проверяется и переписывается в PlotRenderer (src.utils.code_validator)
+                return plot_renderer.render(viz_code_group, required_imports=required_imports_for_viz)
+            return run_plots_step
+
+        def run_report_step(inputs):
+            prompt_report = get_final_report_prompt().partial(
+                analysis_summary=fit_text_to_budget(inputs["analysis"], PROMPT_SUMMARY_TOKEN_BUDGET))
+            final_report_text = stream_chain(for_stage(llm_analyst, "final_report", fresh_stages), prompt_report,
+                                             on_chunk=report_stream.append, stage="final_report")
+            return final_report_text or "Итоговый отчет не сгенерирован."
+
+        def on_step_done(name, value, error):
+            """Вывод результатов этапа; вызывается в потоке скрипта Streamlit."""
+            if name == "analysis":
+                if error is not None:
+                    st.error(f"❌ Ошибка при анализе метрик: {error}")
+                    st.session_state["analysis_summary"] = "Ошибка анализа."
+                    return
+                st.session_state["analysis_summary"] = value
                 logger.info("Анализ метрик завершён.")
                 st.success("✅ Анализ метрик завершён.")
-
-                # --- НОВОЕ: Сохранение отчета об анализе метрик ---
-                # Получаем директорию для сохранения из состояния
-                output_dir_for_analysis = st.session_state.get("output_dir", ".")
-                analysis_report_filename_base = "analysis_summary_report"
-                analysis_report_txt_path = os.path.join(output_dir_for_analysis, f"{analysis_report_filename_base}.txt")
-                analysis_report_docx_path = os.path.join(output_dir_for_analysis,
-                                                         f"{analysis_report_filename_base}.docx")
-
-                # Убедимся, что содержимое для сохранения - это строка
-                analysis_content_to_save = st.session_state["analysis_summary"]
-                if not isinstance(analysis_content_to_save, str):
-                    analysis_content_to_save = str(convert_numpy_types(analysis_content_to_save))
-
-                # Сохранение в .txt
-                try:
-                    with open(analysis_report_txt_path, "w", encoding="utf-8") as f_txt:
-                        f_txt.write(analysis_content_to_save)
-                    logger.info(f"Отчет об анализе метрик сохранен в TXT: {analysis_report_txt_path}")
-                    st.success(f"✅ Отчет об анализе метрик сохранен в TXT: {analysis_report_txt_path}")
-                except Exception as e_txt:
-                    error_msg_txt = f"❌ Ошибка при сохранении отчета об анализе метрик в TXT: {e_txt}"
-                    logger.error(error_msg_txt)
-                    st.error(error_msg_txt)
-
-                # Сохранение в .docx
-                try:
-                    from docx import \
-                        Document  # Импортируем внутри блока try, чтобы не ломать всё при отсутствии библиотеки
-
-                    doc = Document()
-                    # Добавляем заголовок
-                    doc.add_heading('Анализ рассчитанных метрик', level=1)
-                    # Добавляем содержимое отчета как параграф(ы)
-                    # splitlines и добавление построчно может помочь с форматированием
-                    for line in analysis_content_to_save.splitlines():
-                        if line.strip():  # Добавляем только непустые строки как отдельные параграфы
-                            doc.add_paragraph(line)
-                        # Если весь текст нужно в один параграф, используйте:
-                        # doc.add_paragraph(analysis_content_to_save)
-                    doc.save(analysis_report_docx_path)
-                    logger.info(f"Отчет об анализе метрик сохранен в DOCX: {analysis_report_docx_path}")
-                    st.success(f"✅ Отчет об анализе метрик сохранен в DOCX: {analysis_report_docx_path}")
-                except ImportError as e_import:
-                    error_msg_import = f"❌ Библиотека python-docx не установлена. Отчет в DOCX не сохранен: {e_import}"
-                    logger.error(error_msg_import)
-                    st.error(error_msg_import)
-                except Exception as e_docx:
-                    error_msg_docx = f"❌ Ошибка при сохранении отчета об анализе метрик в DOCX: {e_docx}"
-                    logger.error(error_msg_docx)
-                    st.error(error_msg_docx)
-                # --- КОНЕЦ НОВОГО ---
-
-            except Exception as e:
-                st.error(f"❌ Ошибка при анализе метрик: {e}")
-                st.session_state["analysis_summary"] = "Ошибка анализа."
-
-        # --- Шаг 6: Генерация кода визуализации ---
-        with st.spinner("🎨 Генерация кода визуализации..."):
-
-            prompt_viz = PromptTemplate.from_template(
-                """# 🎯 ЦЕЛЬ
- Построй графики, иллюстрирующие ОСНОВНЫЕ закономерности из анализа метрик. Каждый график должен показывать УНИКАЛЬНУЙ инсайт. НЕ ДУБЛИРУЙ ИДЕИ.
- 
- # ⚠️ ОГРАНИЧЕНИЯ
- - Построй ровно 30 графиков, не больше, не меньше
- 
- # 📊 ТИПЫ ГРАФИКОВ (рекомендуемое распределение)
- - Распределения числовых переменных (hist, kde, box, violin)
- - Связь числовой и categorиальной (boxplot/violinplot)
- - Связь двух числовых (scatter с hue, regplot)
- - Категориальные (barplot, countplot)
- - Временные ряды (агрегация по периодам)
- - Взаимосвязи (heatmap корреляций, crosstab)
- - Уникальные инсайты (аномалии, сравнения групп)
- 
- # 🎨 ЦВЕТОВЫЕ ТРЕБОВАНИЯ
- - Все графики должны быть цветными.
- - В barplot и аналогичных графиках КАЖДЫЙ столбец должен иметь свой цвет (используй palette, hue, или color для каждого столбца)
- - Используй палитры: `palette='tab10'`, `cmap='viridis'`, `color=...`, `hue=...`.
- - Применяй `hue`, `palette`, `cmap` везде, где возможно.
- - Не оставляй графики черно-белыми или однотонными.
- - В barplot используй `palette` или передавай список цветов, чтобы каждый столбец был разного цвета.
- 
- # 🚫 ЗАПРЕЩЕНО
- - Дублирование идей (например, несколько графиков для одного столбца без новой информации)
- - Графики без инсайтов
- - Пропуск графиков из-за большого количества категорий — используй top-N
- - Более 30 графиков
- - Однотонные barplot (все столбцы одного цвета)
- 
- # 📥 Входные данные
- У тебя есть:
- - DataFrame `df`
- - Структура: {df_structure_info}
- - Метрики: {metrics_results_raw}
- - Анализ: {analysis_summary}
- 
- # ✅ ТЕХНИЧЕСКИЕ ТРЕБОВАНИЯ
- - Используй `matplotlib`, `seaborn`
- - Сохраняй в `{output_dir}` как `plot_{{столбцы}}_{{тип}}.png`
- - Не используй `plt.show()`, только `plt.savefig()`
- - Для каждого графика используй `try-except`
- - Используй `palette='tab10'`, `cmap='viridis'`
- - Для оси X с >5 меток: `rotation=45`, `ha='right'`
- - Всегда `plt.tight_layout()`
- - Создай папку: `os.makedirs('{output_dir}', exist_ok=True)`
- - Не изменяй `df`, не загружай заново
- - Верни ТОЛЬКО код (30 графиков!!! с комментариями вроде #График 1: ... ). 
- """
-            )
-
-        prompt_viz = prompt_viz.partial(
-            df_structure_info=df_structure_info,
-            metrics_results_raw=st.session_state["metrics_results_raw"],
-            analysis_summary=st.session_state["analysis_summary"],
-            output_dir=output_dir
-        )
-        chain_viz_code = LLMChain(llm=llm_coder, prompt=prompt_viz, output_key="viz_code")
-        try:
-            result_viz_code = chain_viz_code.invoke({})
-            raw_viz_code = result_viz_code.get("viz_code", "# Код визуализации не сгенерирован.")
-            if not isinstance(raw_viz_code, str):
-                st.session_state["viz_code"] = str(convert_numpy_types(raw_viz_code))
-            else:
-                st.session_state["viz_code"] = raw_viz_code
-            logger.info("Код визуализации сгенерирован.")
-            st.success("✅ Код визуализации сгенерирован.")
-        except Exception as e:
-            st.error(f"❌ Ошибка при генерации кода визуализации: {e}")
-            st.session_state["viz_code"] = f"# Ошибка генерации: {e}\n# Код визуализации не сгенерирован из-за ошибки."
-
-        # --- Шаг 7: Выполнение кода визуализации ---
-        with st.spinner("🖼️ Выполняется построение графиков..."):
-            required_imports_for_viz = [
-                "import pandas as pd",
-                "import numpy as np",
-                "import matplotlib",
-                "matplotlib.use('Agg')",
-                "import matplotlib.pyplot as plt",
-                "import seaborn as sns",
-                "import json",
-                "import os"
-            ]
-            viz_output = safe_code_execution(
-                st.session_state["viz_code"],
-                "визуализации",
-                required_imports=required_imports_for_viz
-            )
-            if "error" not in viz_output.lower() and "отменено" not in viz_output.lower():
-                st.success("✅ Графики сохранены.")
-            logger.info("Визуализация завершена.")
-        try:
-            # Получаем директорию для сохранения из состояния
-            output_dir_for_viz_code = st.session_state.get("output_dir", ".")
-            viz_code_filename = "generated_visualization_code.py"
-            viz_code_path = os.path.join(output_dir_for_viz_code, viz_code_filename)
-
-            # Получаем содержимое кода
-            viz_code_content = st.session_state.get("viz_code", "# Код визуализации не был сгенерирован.")
-
-            # Убедимся, что содержимое - это строка
-            if not isinstance(viz_code_content, str):
-                viz_code_content = str(viz_code_content)
-
-            # Записываем код в файл .py
-            with open(viz_code_path, "w", encoding="utf-8") as f_py:
-                # Можно добавить комментарий в начало файла
-                f_py.write("# Сгенерированный код для визуализации\n")
-                f_py.write("# ----------------------------------\n\n")
-                f_py.write(viz_code_content)
-
-            logger.info(f"Сгенерированный код визуализации сохранен в PY: {viz_code_path}")
-            # Опционально: вывести сообщение об успехе
-            st.success(f"✅ Сгенерированный код визуализации сохранен в PY: {viz_code_path}")
-        except Exception as e_viz_code_save:
-            error_msg_viz_code_save = f"❌ Ошибка при сохранении сгенерированного кода визуализации в PY: {e_viz_code_save}"
-            logger.error(error_msg_viz_code_save)
-            st.error(error_msg_viz_code_save)
-
-        # --- Шаг 8: Генерация итогового отчёта ---
-        with st.spinner("📄 Генерация итогового отчёта..."):
-            # Проверка наличия необходимых данных для генерации отчета
-            if "analysis_summary" not in st.session_state or not st.session_state["analysis_summary"]:
-                error_msg = "❌ Невозможно сгенерировать итоговый отчёт: анализ метрик не был выполнен или отсутствует."
-                st.error(error_msg)
-                st.session_state["final_report"] = error_msg  # Записываем ошибку в состояние
-                logger.error(
-                    "Попытка генерации итогового отчёта без анализа (analysis_summary отсутствует в st.session_state).")
-                st.stop()  # Останавливаем выполнение
-
-            prompt_report = PromptTemplate.from_template(final_rep)
-            # Добавляем partial для передачи analysis_summary в промпт
-            prompt_report = prompt_report.partial(analysis_summary=st.session_state["analysis_summary"])
-            chain_report = LLMChain(llm=llm_analyst, prompt=prompt_report, output_key="final_report")
-            try:
-                # --- ИЗМЕНЕНИЕ: Сначала выполняем цепочку, чтобы получить результат ---
-                # Используем invoke, как в других местах, и передаем пустой словарь
-                result_report = chain_report.invoke({})  # Выполняем генерацию
-                # Получаем сгенерированный отчет из результата
-                raw_final_report = result_report.get("final_report", "Итоговый отчет не сгенерирован.")
-                # Конвертируем numpy типы, если необходимо
-                final_report_content = convert_numpy_types(raw_final_report)
-                # Сохраняем сгенерированный отчет в st.session_state
-                st.session_state["final_report"] = final_report_content
-                # --- КОНЕЦ ИЗМЕНЕНИЯ ---
-
-                # --- НОВОЕ: Теперь, когда отчет есть в состоянии, сохраняем его в файлы ---
-                # Получаем директорию для сохранения из состояния
-                output_dir = st.session_state.get("output_dir", ".")  # Убедитесь, что output_dir уже установлен
-                final_report_filename_base = "final_report"
-                final_report_txt_path = os.path.join(output_dir, f"{final_report_filename_base}.txt")
-                final_report_docx_path = os.path.join(output_dir, f"{final_report_filename_base}.docx")
-
-                # Убедимся, что содержимое для сохранения - это строка
-                # final_report_content уже конвертирован выше
-                if not isinstance(final_report_content, str):
-                    final_report_content_to_save = str(final_report_content)
+                save_report_files(value, output_dir, "analysis_summary_report",
+                                  "Анализ рассчитанных метрик", "Отчет об анализе метрик")
+            elif name == "viz_plan":
+                if error is not None:
+                    st.error(f"❌ Ошибка при генерации плана графиков: {error}")
                 else:
-                    final_report_content_to_save = final_report_content
-
-                # Сохранение в .txt
-                try:
-                    with open(final_report_txt_path, "w", encoding="utf-8") as f_txt:
-                        f_txt.write(final_report_content_to_save)
-                    logger.info(f"Итоговый отчет сохранен в TXT: {final_report_txt_path}")
-                    st.success(f"✅ Итоговый отчет сохранен в TXT: {final_report_txt_path}")
-                except Exception as e_txt:
-                    error_msg_txt = f"❌ Ошибка при сохранении итогового отчета в TXT: {e_txt}"
-                    logger.error(error_msg_txt)
-                    st.error(error_msg_txt)
-
-                # Сохранение в .docx
-                try:
-                    from docx import Document  # Импортируем внутри блока try
-
-                    doc = Document()
-                    # Добавляем заголовок
-                    doc.add_heading('Итоговый аналитический отчет', level=1)
-                    # Добавляем содержимое отчета построчно
-                    for line in final_report_content_to_save.splitlines():
-                        if line.strip():
-                            doc.add_paragraph(line)
-                    doc.save(final_report_docx_path)
-                    logger.info(f"Итоговый отчет сохранен в DOCX: {final_report_docx_path}")
-                    st.success(f"✅ Итоговый отчет сохранен в DOCX: {final_report_docx_path}")
-                except ImportError as e_import:
-                    error_msg_import = f"❌ Библиотека python-docx не установлена. Итоговый отчет в DOCX не сохранен: {e_import}"
-                    logger.error(error_msg_import)
-                    st.error(error_msg_import)
-                except Exception as e_docx:
-                    error_msg_docx = f"❌ Ошибка при сохранении итогового отчета в DOCX: {e_docx}"
-                    logger.error(error_msg_docx)
-                    st.error(error_msg_docx)
-
-                # Сообщение об успешном завершении анализа и сохранении результатов
+                    st.session_state["viz_plan"] = value
+                    logger.info(f"План графиков: {sum(len(group) for group in value)} графиков, {len(value)} групп.")
+            elif name.startswith("viz_code_"):
+                group_index = int(name.rsplit("_", 1)[1])
+                if error is not None:
+                    st.error(f"❌ Ошибка при генерации кода визуализации (группа {group_index + 1}): {error}")
+                    viz_code_groups[group_index] = f"# Ошибка генерации: {error}\n# Код группы графиков не сгенерирован из-за ошибки."
+                elif value:
+                    viz_code_groups[group_index] = value
+                    logger.info(f"Код визуализации сгенерирован (группа {group_index + 1}).")
+            elif name.startswith("plots_"):
+                group_number = int(name.rsplit("_", 1)[1]) + 1
+                if error is not None:
+                    st.error(f"❌ Ошибка при построении графиков (группа {group_number}): {error}")
+                    return
+                failed_plots = [result for result in value if not result.ok]
+                if value:
+                    peaks = [result.peak_rss_mb for result in value if result.peak_rss_mb is not None]
+                    st.success(f"✅ Графики группы {group_number}: построено {len(value) - len(failed_plots)} из {len(value)}"
+                               f"{f' (пик памяти процесса {max(peaks):.0f} МБ)' if peaks else ''}.")
+                rewrites = [f"график {result.number}, {rewrite}" for result in value for rewrite in result.rewrites]
+                if rewrites:
+                    st.info(f"ℹ️ В коде графиков группы {group_number} переписаны медленные шаблоны ({len(rewrites)}):")
+                    for rewrite in rewrites:
+                        st.markdown(f"* {rewrite}")
+                for result in failed_plots:
+                    st.warning(f"⚠️ График {result.number} не построен: {result.error}")
+            elif name == "report":
+                if error is not None:
+                    error_msg = f"❌ Ошибка при генерации отчёта: {error}"
+                    logger.error(error_msg)
+                    st.session_state["final_report"] = error_msg
+                    st.error(error_msg)
+                    return
+                st.session_state["final_report"] = value
+                save_report_files(value, output_dir, "final_report",
+                                  "Итоговый аналитический отчет", "Итоговый отчет")
                 st.success("✅ Анализ завершён! Результаты сохранены.")
 
-            except Exception as e:  # Этот except ловит ошибки, возникающие при генерации отчета или его сохранении
-                error_msg = f"❌ Ошибка при генерации отчёта: {e}"
-                logger.error(error_msg, exc_info=True)  # Добавляем exc_info для более подробного лога
-                st.session_state["final_report"] = error_msg  # Записываем ошибку в состояние
-                st.error(error_msg)  # Показываем ошибку пользователю
+        # Потоковый вывод длинных генераций: этапы дописывают фрагменты в буферы,
+        # поток скрипта перерисовывает их в области результатов
+        viz_groups_count = plot_group_count(DEFAULT_NUM_PLOTS)
+        viz_code_streams = [StreamBuffer() for _ in range(viz_groups_count)]
+        viz_code_groups = {}
+        report_stream = StreamBuffer()
+        st.write("#### 📄 Итоговый отчёт (генерация):")
+        report_placeholder = st.empty()
+        with st.expander("🎨 Код визуализации (генерация)"):
+            viz_code_placeholder = st.empty()
+        rendered_versions = {}
+
+        def render_streams():
+            report_version = report_stream.version
+            if report_version != rendered_versions.get("report"):
+                rendered_versions["report"] = report_version
+                report_placeholder.markdown(report_stream.text)
+            viz_version = tuple(stream_buffer.version for stream_buffer in viz_code_streams)
+            if viz_version != rendered_versions.get("viz_code"):
+                rendered_versions["viz_code"] = viz_version
+                viz_code_placeholder.code(
+                    "\n\n".join(stream_buffer.text for stream_buffer in viz_code_streams if stream_buffer.version),
+                    language="python")
+
+        # Графики строятся в пуле процессов (зависший график прерывается); df передается процессам через файл
+        datetime_candidates = st.session_state.get("parsed_data_structure", {}).get("datetime_candidates", [])
+        plot_metrics_plan = st.session_state.get("metrics_plan_dict") or None
+        plot_renderer = PlotRenderer(get_dataset_store().prepared(datetime_candidates, plot_metrics_plan),
+                                     stats=get_dataset_store().stats(datetime_candidates, plot_metrics_plan),
+                                     frame_key=get_dataset_store().frame_key(datetime_candidates, plot_metrics_plan))
+
+        # Граф этапов: план графиков -> код групп графиков (параллельно) -> построение
+        # каждой группы сразу по готовности ее кода; анализ метрик -> итоговый отчёт.
+        pipeline = AnalysisPipeline(model_limits=LLM_MAX_CONCURRENCY,
+                                    max_workers=PIPELINE_MAX_WORKERS,
+                                    thread_initializer=streamlit_thread_initializer())
+        pipeline.add_step("analysis", run_analysis_step, model="analyst")
+        pipeline.add_step("viz_plan", run_viz_plan_step, model="coder")
+        for group_index in range(viz_groups_count):
+            pipeline.add_step(f"viz_code_{group_index}", make_viz_code_step(group_index),
+                              depends_on=("viz_plan",), model="coder")
+            pipeline.add_step(f"plots_{group_index}", make_plots_step(group_index),
+                              depends_on=(f"viz_code_{group_index}",))
+        pipeline.add_step("report", run_report_step, depends_on=("analysis",), model="analyst")
+
+        try:
+            with st.spinner("🔍 Анализ метрик, генерация графиков и итогового отчёта..."):
+                pipeline_result = pipeline.execute(on_step_done=on_step_done, on_tick=render_streams)
+        finally:
+            plot_renderer.close()
+            release_run_frames()
+        render_streams()
+        logger.info(f"Длительность этапов (с): {pipeline_result.durations}")
+
+        if viz_code_groups:
+            st.session_state["viz_code"] = "\n\n".join(viz_code_groups[i] for i in sorted(viz_code_groups))
+            st.success(f"✅ Код визуализации сгенерирован ({len(viz_code_groups)} групп графиков).")
+        else:
+            st.session_state["viz_code"] = "# Код визуализации не сгенерирован."
+        save_viz_code(st.session_state["viz_code"], output_dir)
+        logger.info("Визуализация завершена.")
+
+        if "report" in pipeline_result.skipped:
+            error_msg = "❌ Невозможно сгенерировать итоговый отчёт: анализ метрик не был выполнен."
+            logger.error(error_msg)
+            st.session_state["final_report"] = error_msg
+            st.error(error_msg)
 
 # -----------------------------------------
 # Отображение результатов
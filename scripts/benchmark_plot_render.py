@@ -0,0 +1,122 @@
+"""
+Бенчмарк режимов отрисовки интерактивных графиков (SVG, WebGL, растр).
+
+Для каждого режима на DataFrame из N точек (по умолчанию 1 000 000) измеряется:
+- время построения фигуры и сериализации в JSON (то, что Streamlit отправляет в браузер);
+- размер JSON;
+- если установлен Playwright (pip install playwright && playwright install chromium):
+  время первой отрисовки в headless Chromium и время кадра при масштабировании.
+
+Запуск:
+    python scripts/benchmark_plot_render.py --rows 1000000
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.ui.charts import line_figure, scatter_figure  # noqa: E402
+
+# Масштабирование к разным участкам оси X и возврат к полному диапазону
+ZOOM_SCRIPT = """
+async () => {
+    const gd = document.querySelector('.plotly-graph-div');
+    const [lo, hi] = gd._fullLayout.xaxis.range.map(Number);
+    const frames = [];
+    for (const [a, b] of [[0, 0.5], [0.25, 0.75], [0.4, 0.45], [0, 1]]) {
+        const started = performance.now();
+        await Plotly.relayout(gd, {'xaxis.range': [lo + (hi - lo) * a, lo + (hi - lo) * b]});
+        await new Promise(resolve => requestAnimationFrame(() => resolve()));
+        frames.push(performance.now() - started);
+    }
+    return frames;
+}
+"""
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    """Синтетический журнал: время, значение с трендом и шумом, категория."""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "time": pd.date_range("2024-01-01", periods=rows, freq="s"),
+        "x": rng.normal(size=rows),
+        "value": np.cumsum(rng.normal(size=rows)),
+        "level": rng.choice(["INFO", "WARN", "ERROR"], size=rows, p=[0.9, 0.09, 0.01]),
+    })
+
+
+def browser_timings(fig, timeout_ms: int):
+    """Время первой отрисовки и кадров масштабирования в headless Chromium (мс) или None."""
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        return None
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "chart.html"
+        fig.write_html(str(path), include_plotlyjs=True, full_html=True)
+        with sync_playwright() as p:
+            browser = p.chromium.launch(args=["--use-gl=swiftshader", "--enable-webgl"])
+            page = browser.new_page()
+            try:
+                started = time.perf_counter()
+                page.goto(path.as_uri(), timeout=timeout_ms)
+                page.wait_for_function(
+                    "() => { const gd = document.querySelector('.plotly-graph-div');"
+                    " return gd && gd._fullLayout && gd._fullLayout.xaxis; }",
+                    timeout=timeout_ms,
+                )
+                first_render = (time.perf_counter() - started) * 1000
+                frames = page.evaluate(ZOOM_SCRIPT)
+                return first_render, frames
+            except Exception as e:
+                print(f"  браузер: {type(e).__name__}: {e}")
+                return None
+            finally:
+                browser.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Число точек")
+    parser.add_argument("--skip-full-svg", action="store_true",
+                        help="Не строить SVG по всем точкам (может подвесить браузер)")
+    parser.add_argument("--browser-timeout", type=int, default=120_000, help="Таймаут браузера, мс")
+    args = parser.parse_args()
+
+    df = make_frame(args.rows)
+    cases = {
+        "scatter svg (все точки)": lambda: px.scatter(df, x="x", y="value", color="level", render_mode="svg"),
+        "scatter svg (выборка)": lambda: scatter_figure(df, "x", "value", color="level", mode="svg"),
+        "scatter webgl": lambda: scatter_figure(df, "x", "value", color="level", mode="webgl"),
+        "scatter растр": lambda: scatter_figure(df, "x", "value", mode="raster"),
+        "line svg (LTTB)": lambda: line_figure(df, "time", "value", mode="svg"),
+        "line webgl": lambda: line_figure(df, "time", "value", mode="webgl"),
+    }
+    if args.skip_full_svg:
+        cases.pop("scatter svg (все точки)")
+
+    print(f"Точек: {args.rows:,}")
+    print(f"{'режим':<26}{'фигура, с':>10}{'JSON, с':>10}{'JSON, МБ':>10}{'отрисовка, мс':>15}{'кадр, мс':>10}")
+    for name, build in cases.items():
+        started = time.perf_counter()
+        fig = build()
+        built = time.perf_counter() - started
+        started = time.perf_counter()
+        payload = fig.to_json()
+        serialized = time.perf_counter() - started
+        timings = browser_timings(fig, args.browser_timeout)
+        first_render, frame = ("-", "-") if timings is None else \
+            (f"{timings[0]:.0f}", f"{np.median(timings[1]):.0f}")
+        print(f"{name:<26}{built:>10.2f}{serialized:>10.2f}{len(payload) / 2 ** 20:>10.1f}"
+              f"{first_render:>15}{frame:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""
+Встроенный расчет стандартных метрик по плану без генерации кода LLM.
+
+Метрики из каталога METRICS_PLAN_PROMPT (меры центральной тенденции,
+изменчивости, формы, квантили, частоты, метрики дат) считаются
+векторизованно по группам столбцов одного типа. Через LLM-код
+рассчитываются только метрики вне каталога.
+
+В приближенном режиме (approximate=True) для больших столбцов nunique,
+квантили и мода считаются скетчами (src.data.sketches) без сортировки
+и полной таблицы частот; границы ошибок записываются в metrics_results
+под ключом APPROX_ERRORS_KEY.
+"""
+import ast
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from config.settings import (
+    APPROX_METRICS_MIN_ROWS,
+    HEAVY_HITTERS_CAPACITY,
+    HLL_PRECISION,
+    NUMERIC_BLOCK_COLUMNS,
+    QUANTILE_SKETCH_K,
+    STREAMING_CHUNK_ROWS,
+)
+from src.data.sketches import HyperLogLog, KLLSketch, SpaceSaving
+from src.data.streaming import quantile_level
+from src.utils.type_converter import convert_numpy_types
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+FREQUENCY_METRICS = {"count", "nunique", "mode", "mode_count", "mode_rel_freq"}
+NUMERIC_METRICS = FREQUENCY_METRICS | {
+    "mean", "median", "std", "var", "mad", "skew", "kurtosis", "min", "max", "iqr",
+}
+DATETIME_METRICS = FREQUENCY_METRICS | {
+    "min_date", "max_date", "date_range_days", "unique_dates", "dates_per_month",
+}
+MODE_METRICS = {"mode", "mode_count", "mode_rel_freq"}
+# Ключ в метриках столбца с описанием приближенных значений: {метрика: {метод, граница ошибки}}
+APPROX_ERRORS_KEY = "approx_errors"
+
+
+def is_catalogue_metric(metric: str) -> bool:
+    """True, если метрика входит в каталог встроенных метрик."""
+    return (metric in NUMERIC_METRICS or metric in DATETIME_METRICS
+            or quantile_level(metric) is not None)
+
+
+def _column_kind(series: pd.Series, metrics: List[str]) -> Tuple[str, pd.Series]:
+    """
+    Определяет тип столбца для расчета: numeric, datetime или categorical.
+
+    Текстовые столбцы, для которых запрошены числовые метрики, приводятся
+    через pd.to_numeric(errors='coerce'); если после этого все значения -
+    NaN, столбец считается категориальным.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "datetime", series
+    if pd.api.types.is_bool_dtype(series):
+        return "categorical", series
+    if pd.api.types.is_numeric_dtype(series):
+        return "numeric", series
+    wants_numeric = any(m in NUMERIC_METRICS - FREQUENCY_METRICS or quantile_level(m) is not None
+                        for m in metrics)
+    if wants_numeric:
+        coerced = pd.to_numeric(series, errors="coerce")
+        if coerced.notna().any():
+            return "numeric", coerced
+    return "categorical", series
+
+
+def split_metrics_plan(df: pd.DataFrame,
+                       metrics_plan: Dict[str, List[str]]) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+    """
+    Делит план метрик на встроенную часть и остаток для генерации кода LLM.
+
+    Столбцы, отсутствующие в df, пропускаются.
+
+    Returns:
+        Кортеж (встроенный план, остаток плана)
+    """
+    builtin, residual = {}, {}
+    for col, metrics in metrics_plan.items():
+        if col not in df.columns:
+            logger.warning(f"Столбец '{col}' из плана метрик не найден в DataFrame. Пропущен.")
+            continue
+        known = [m for m in metrics if is_catalogue_metric(m)]
+        unknown = [m for m in metrics if not is_catalogue_metric(m)]
+        if known:
+            builtin[col] = known
+        if unknown:
+            residual[col] = unknown
+    return builtin, residual
+
+
+def _frequency_metrics(series: pd.Series, metrics: List[str]) -> Dict[str, Any]:
+    result: Dict[str, Any] = {}
+    non_null = series.dropna()
+    count = int(len(non_null))
+    if "count" in metrics:
+        result["count"] = count
+    if "nunique" in metrics:
+        result["nunique"] = int(non_null.nunique())
+    if {"mode", "mode_count", "mode_rel_freq"} & set(metrics):
+        counts = non_null.value_counts(sort=False)
+        # У category value_counts включает значения с нулевой частотой
+        counts = counts[counts.to_numpy() > 0]
+        if len(counts):
+            mode_count = int(counts.max())
+            tied = counts.index[counts.to_numpy() == mode_count]
+            try:
+                # Как series.mode(): при равных частотах - наименьшее значение
+                mode_value = min(tied)
+            except TypeError:
+                mode_value = tied[0]
+        else:
+            mode_value, mode_count = None, None
+        if "mode" in metrics:
+            result["mode"] = str(mode_value) if isinstance(mode_value, pd.Timestamp) else mode_value
+        if "mode_count" in metrics:
+            result["mode_count"] = mode_count
+        if "mode_rel_freq" in metrics:
+            result["mode_rel_freq"] = mode_count / count if count else None
+    return result
+
+
+def _block_moments(values: np.ndarray, counts: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Первые четыре момента и mad для всех столбцов блока.
+
+    Оценки совпадают с pandas: несмещенные var/std, skew и kurtosis
+    (эксцесс) с поправкой на размер выборки, 0 для постоянных столбцов.
+    Степени отклонений считаются на месте в двух рабочих массивах
+    размера блока.
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        n = counts.astype(float)
+        mean = np.nansum(values, axis=0) / n
+        delta = values - mean
+        delta[np.isnan(values)] = 0.0
+        work = np.abs(delta)
+        mad = work.sum(axis=0) / n
+        np.multiply(delta, delta, out=work)
+        m2 = work.sum(axis=0)
+        np.multiply(work, delta, out=delta)
+        m3 = delta.sum(axis=0)
+        np.multiply(work, work, out=work)
+        m4 = work.sum(axis=0)
+        del delta, work
+        var = np.where(n > 1, m2 / (n - 1), np.nan)
+        constant = m2 == 0
+        g1 = np.sqrt(n) * m3 / m2 ** 1.5
+        skew = np.where(n < 3, np.nan, np.where(constant, 0.0, np.sqrt(n * (n - 1)) / (n - 2) * g1))
+        g2 = n * m4 / m2 ** 2 - 3
+        kurt = np.where(n < 4, np.nan,
+                        np.where(constant, 0.0, ((n + 1) * g2 + 6) * (n - 1) / ((n - 2) * (n - 3))))
+    return {"mean": mean, "var": var, "std": np.sqrt(var), "skew": skew, "kurtosis": kurt, "mad": mad}
+
+
+def _block_quantiles(values: np.ndarray, counts: np.ndarray, levels: List[float]) -> np.ndarray:
+    """
+    Квантили (линейная интерполяция, как в pandas) по столбцам блока.
+
+    np.nanquantile выбирает порядковые статистики частичной сортировкой
+    (np.partition) копии одного столбца без NaN, а не сортировкой блока.
+
+    Returns:
+        Массив формы (len(levels), число столбцов)
+    """
+    result = np.full((len(levels), values.shape[1]), np.nan)
+    for j in np.flatnonzero(counts):
+        result[:, j] = np.nanquantile(values[:, j], levels)
+    return result
+
+
+def _sorted_mode(column: np.ndarray, count: int):
+    """Мода и ее частота по отсортированному столбцу (наименьшее при равенстве)."""
+    if count == 0:
+        return None, None
+    values = column[:count]
+    starts = np.concatenate(([0], np.flatnonzero(values[1:] != values[:-1]) + 1))
+    lengths = np.diff(np.concatenate((starts, [count])))
+    best = int(np.argmax(lengths))
+    return values[starts[best]], int(lengths[best])
+
+
+def _numeric_block_metrics(columns: Dict[str, pd.Series], plan: Dict[str, List[str]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Метрики для всех числовых столбцов плана блоками по NUMERIC_BLOCK_COLUMNS столбцов.
+
+    Каждый блок - двумерный массив float64: один проход дает моменты,
+    min/max и квантили всех его столбцов. Пиковая память - несколько
+    размеров блока, а не всех числовых столбцов.
+    """
+    names = list(plan)
+    results: Dict[str, Dict[str, Any]] = {}
+    for start in range(0, len(names), NUMERIC_BLOCK_COLUMNS):
+        batch = names[start:start + NUMERIC_BLOCK_COLUMNS]
+        results.update(_numeric_batch_metrics({col: columns[col] for col in batch}, {col: plan[col] for col in batch}))
+    return results
+
+
+def _numeric_batch_metrics(columns: Dict[str, pd.Series], plan: Dict[str, List[str]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Метрики одного блока числовых столбцов.
+
+    Моменты считаются по центрированным значениям, квантили - np.nanquantile
+    по столбцу, min/max - без сортировки. Полная сортировка нужна только для
+    nunique и моды и выполняется по одному столбцу. Результаты раскладываются
+    в формат {столбец: {метрика: значение}}.
+    """
+    requested = set(m for metrics in plan.values() for m in metrics)
+    rows = len(next(iter(columns.values())))
+    # Порядок Fortran: столбцы лежат в памяти подряд, выборка столбца не копирует данные
+    values = np.empty((rows, len(columns)), order="F")
+    for j, series in enumerate(columns.values()):
+        values[:, j] = series.to_numpy(dtype=float, na_value=np.nan)
+    counts = (~np.isnan(values)).sum(axis=0)
+    aggregates: Dict[str, np.ndarray] = {"count": counts}
+
+    if requested & {"mean", "std", "var", "skew", "kurtosis", "mad"}:
+        aggregates.update(_block_moments(values, counts))
+
+    levels = sorted({quantile_level(m) for m in requested if quantile_level(m) is not None}
+                    | ({0.25, 0.75} if "iqr" in requested else set()))
+    quantiles = {}
+    if levels:
+        quantiles = dict(zip(levels, _block_quantiles(values, counts, levels)))
+    if "iqr" in requested:
+        aggregates["iqr"] = quantiles[0.75] - quantiles[0.25]
+    if requested & {"min", "max"}:
+        present = counts > 0
+        aggregates["min"] = np.full(len(counts), np.nan)
+        aggregates["max"] = np.full(len(counts), np.nan)
+        aggregates["min"][present] = [np.nanmin(values[:, j]) for j in np.flatnonzero(present)]
+        aggregates["max"][present] = [np.nanmax(values[:, j]) for j in np.flatnonzero(present)]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for j, (col, metrics) in enumerate(plan.items()):
+        column_values: Dict[str, Any] = {}
+        if ({"nunique"} | MODE_METRICS) & set(metrics):
+            # NaN после сортировки оказываются в конце столбца
+            column = np.sort(values[:, j])
+            count = int(counts[j])
+            present = column[:count]
+            column_values["nunique"] = int(np.count_nonzero(present[1:] != present[:-1]) + (count > 0))
+            if MODE_METRICS & set(metrics):
+                mode_value, mode_count = _sorted_mode(column, count)
+                if mode_value is not None and pd.api.types.is_integer_dtype(columns[col].dtype):
+                    mode_value = int(mode_value)
+                column_values.update({
+                    "mode": mode_value,
+                    "mode_count": mode_count,
+                    "mode_rel_freq": mode_count / count if mode_count else None,
+                })
+            del column, present
+        for metric in metrics:
+            if metric in aggregates:
+                column_values[metric] = aggregates[metric][j]
+            elif quantile_level(metric) is not None:
+                column_values[metric] = quantiles[quantile_level(metric)][j]
+        results[col] = {m: column_values.get(m) for m in metrics}
+    return results
+
+
+def _datetime_metrics(series: pd.Series, metrics: List[str]) -> Dict[str, Any]:
+    values = _frequency_metrics(series, metrics)
+    dates = series.dropna()
+    if len(dates):
+        min_date, max_date = dates.min(), dates.max()
+        values.update({
+            "min_date": str(min_date),
+            "max_date": str(max_date),
+            "min": str(min_date),
+            "max": str(max_date),
+            "date_range_days": int((max_date - min_date).days),
+            "unique_dates": int(dates.dt.normalize().nunique()),
+        })
+        if "dates_per_month" in metrics:
+            values["dates_per_month"] = float(pd.Series(1, index=dates).resample("MS").count().mean())
+        # median и quantile_NN входят в каталог и для дат: считаются здесь, а не кодом LLM
+        levels = {m: quantile_level(m) for m in metrics if quantile_level(m) is not None}
+        if levels:
+            quantiles = dates.quantile(sorted(set(levels.values())))
+            values.update({m: str(quantiles[level]) for m, level in levels.items()})
+    return {m: values.get(m) for m in metrics}
+
+
+def _approximate_metrics(series: pd.Series, kind: str, metrics: List[str]) -> Dict[str, Any]:
+    """
+    Метрики большого столбца со скетчами вместо сортировки и полной таблицы частот.
+
+    count, min, max и моменты считаются точно; nunique - HyperLogLog,
+    квантили, median и iqr - KLL, mode/mode_count/mode_rel_freq - Space-Saving.
+    Столбец обрабатывается частями по STREAMING_CHUNK_ROWS строк.
+    """
+    requested = set(metrics)
+    values: Dict[str, Any] = {}
+    errors: Dict[str, Dict[str, Any]] = {}
+    hll = HyperLogLog(HLL_PRECISION) if "nunique" in requested else None
+    heavy = SpaceSaving(HEAVY_HITTERS_CAPACITY) if requested & MODE_METRICS else None
+    levels = sorted({quantile_level(m) for m in requested if quantile_level(m) is not None}
+                    | ({0.25, 0.75} if "iqr" in requested else set()))
+    sketch = KLLSketch(k=QUANTILE_SKETCH_K, seed=0) if kind == "numeric" and levels else None
+
+    for start in range(0, len(series), STREAMING_CHUNK_ROWS):
+        chunk = series.iloc[start:start + STREAMING_CHUNK_ROWS].dropna()
+        if hll is not None:
+            hll.update(chunk)
+        if heavy is not None:
+            heavy.update(chunk)
+        if sketch is not None:
+            sketch.update(chunk.to_numpy(dtype=float))
+
+    count = int(series.notna().sum())
+    values["count"] = count
+    if kind == "numeric":
+        column = series.to_numpy(dtype=float, na_value=np.nan)[:, None]
+        counts = np.array([count])
+        if requested & {"mean", "std", "var", "skew", "kurtosis", "mad"}:
+            values.update({name: aggregate[0] for name, aggregate in _block_moments(column, counts).items()})
+        if count:
+            values["min"], values["max"] = np.nanmin(column), np.nanmax(column)
+    if hll is not None:
+        values["nunique"] = min(hll.estimate(), count)
+        errors["nunique"] = {"method": "HyperLogLog", "relative_std_error": round(hll.relative_error, 4)}
+    if heavy is not None:
+        mode_value, mode_count = heavy.mode()
+        if mode_value is not None and pd.api.types.is_integer_dtype(series.dtype):
+            mode_value = int(mode_value)
+        values.update({
+            "mode": mode_value,
+            "mode_count": mode_count,
+            "mode_rel_freq": mode_count / count if count and mode_count else None,
+        })
+        if heavy.error:
+            bound = {"method": "Space-Saving", "max_undercount": int(heavy.error)}
+            errors.update({m: bound for m in requested & MODE_METRICS})
+    if sketch is not None:
+        quantiles = dict(zip(levels, sketch.quantiles(levels)))
+        for metric in requested:
+            if quantile_level(metric) is not None:
+                values[metric] = quantiles[quantile_level(metric)]
+        if "iqr" in requested and quantiles.get(0.25) is not None:
+            values["iqr"] = quantiles[0.75] - quantiles[0.25]
+        if len(sketch.levels) > 1:
+            bound = {"method": "KLL", "rank_error": round(sketch.rank_error, 4)}
+            errors.update({m: bound for m in requested if quantile_level(m) is not None or m == "iqr"})
+
+    result = {m: values.get(m) for m in metrics}
+    if errors:
+        result[APPROX_ERRORS_KEY] = {m: errors[m] for m in metrics if m in errors}
+    return result
+
+
+def _to_python(value: Any) -> Any:
+    """NaN/NaT -> None, numpy/pandas скаляры -> стандартные типы Python."""
+    if value is None:
+        return None
+    if isinstance(value, (float, np.floating)) and (np.isnan(value) or np.isinf(value)):
+        return None
+    if value is pd.NaT:
+        return None
+    return convert_numpy_types(value)
+
+
+def compute_catalogue_metrics(df: pd.DataFrame, metrics_plan: Dict[str, List[str]],
+                              approximate: bool = False,
+                              approx_min_rows: int = APPROX_METRICS_MIN_ROWS) -> Dict[str, Dict[str, Any]]:
+    """
+    Рассчитывает метрики каталога по плану.
+
+    Args:
+        df: DataFrame
+        metrics_plan: План {столбец: [метрики]}; метрики вне каталога игнорируются
+            (см. split_metrics_plan)
+        approximate: Приближенный режим для числовых и категориальных столбцов
+            от approx_min_rows значений (nunique, квантили и мода по скетчам)
+        approx_min_rows: Порог числа значений для приближенного режима
+
+    Returns:
+        Словарь {столбец: {метрика: значение}} со значениями стандартных
+        типов Python (NaN -> None), в формате metrics_results. Для приближенных
+        значений добавляется ключ APPROX_ERRORS_KEY с методом и границей ошибки.
+    """
+    builtin, _ = split_metrics_plan(df, metrics_plan)
+    numeric_plan: Dict[str, List[str]] = {}
+    numeric_columns: Dict[str, pd.Series] = {}
+    results: Dict[str, Dict[str, Any]] = {}
+
+    for col, metrics in builtin.items():
+        kind, series = _column_kind(df[col], metrics)
+        approximable = set(metrics) & (MODE_METRICS | {"nunique", "iqr"}) or any(
+            quantile_level(m) is not None for m in metrics)
+        if (approximate and kind != "datetime" and approximable
+                and series.notna().sum() >= approx_min_rows):
+            results[col] = _approximate_metrics(series, kind, metrics)
+        elif kind == "numeric":
+            numeric_plan[col] = metrics
+            numeric_columns[col] = series
+        elif kind == "datetime":
+            results[col] = _datetime_metrics(series, metrics)
+        else:
+            values = _frequency_metrics(series, metrics)
+            results[col] = {m: values.get(m) for m in metrics}
+
+    if numeric_plan:
+        results.update(_numeric_block_metrics(numeric_columns, numeric_plan))
+
+    ordered = {col: results[col] for col in builtin if col in results}
+    return {
+        col: {m: v if m == APPROX_ERRORS_KEY else _to_python(v) for m, v in values.items()}
+        for col, values in ordered.items()
+    }
+
+
+def parse_metrics_output(output: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Разбирает вывод print(metrics_results) из сгенерированного кода.
+
+    Returns:
+        Словарь метрик или None, если вывод не является словарем
+    """
+    if not isinstance(output, str):
+        return None
+    text = output.strip().splitlines()[-1] if output.strip() else ""
+    try:
+        parsed = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def merge_metrics_results(base: Dict[str, Dict[str, Any]],
+                          extra: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Добавляет метрики из extra к base по столбцам (base не изменяется)."""
+    merged = {col: dict(values) for col, values in base.items()}
+    for col, values in extra.items():
+        if isinstance(values, dict):
+            merged.setdefault(col, {}).update(values)
+    return merged
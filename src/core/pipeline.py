@@ -0,0 +1,143 @@
+"""
+Оркестрация этапов анализа в виде графа зависимостей (DAG).
+
+Этапы, все зависимости которых выполнены, запускаются параллельно в пуле
+потоков. Для этапов, обращающихся к LLM, задается ограничение числа
+одновременных запросов к каждой модели.
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+@dataclass
+class PipelineStep:
+    """
+    Этап пайплайна.
+
+    Attributes:
+        name: Уникальное имя этапа
+        func: Функция этапа; получает словарь результатов зависимостей {имя: результат}
+        depends_on: Имена этапов, результаты которых нужны этому этапу
+        model: Ключ модели LLM (для ограничения параллельных запросов) или None
+    """
+    name: str
+    func: Callable[[Dict[str, Any]], Any]
+    depends_on: Tuple[str, ...] = ()
+    model: Optional[str] = None
+
+
+@dataclass
+class PipelineResult:
+    """Результаты выполнения пайплайна."""
+    results: Dict[str, Any] = field(default_factory=dict)
+    errors: Dict[str, BaseException] = field(default_factory=dict)
+    skipped: List[str] = field(default_factory=list)
+    durations: Dict[str, float] = field(default_factory=dict)
+
+
+class AnalysisPipeline:
+    """
+    Пайплайн этапов с параллельным запуском независимых этапов.
+
+    Обратный вызов on_step_done выполняется в вызывающем потоке
+    (это важно для Streamlit: вывод в интерфейс только из потока скрипта).
+
+    Example:
+        pipeline = AnalysisPipeline(model_limits={"analyst": 1, "coder": 1})
+        pipeline.add_step("analysis", run_analysis, model="analyst")
+        pipeline.add_step("viz_code", generate_viz, model="coder")
+        pipeline.add_step("report", make_report, depends_on=("analysis",), model="analyst")
+        result = pipeline.execute()
+    """
+
+    def __init__(self, model_limits: Optional[Dict[str, int]] = None, max_workers: int = 4,
+                 thread_initializer: Optional[Callable[[], None]] = None):
+        self.steps: Dict[str, PipelineStep] = {}
+        self.max_workers = max_workers
+        self.thread_initializer = thread_initializer
+        self._semaphores = {
+            model: threading.BoundedSemaphore(max(1, limit)) for model, limit in (model_limits or {}).items()
+        }
+
+    def add_step(self, name: str, func: Callable[[Dict[str, Any]], Any],
+                 depends_on: Tuple[str, ...] = (), model: Optional[str] = None) -> None:
+        """Добавляет этап; зависимости должны быть добавлены раньше."""
+        if name in self.steps:
+            raise ValueError(f"Этап '{name}' уже добавлен.")
+        missing = [dep for dep in depends_on if dep not in self.steps]
+        if missing:
+            raise ValueError(f"Неизвестные зависимости этапа '{name}': {missing}")
+        self.steps[name] = PipelineStep(name, func, tuple(depends_on), model)
+
+    def _execute(self, step: PipelineStep, inputs: Dict[str, Any]) -> Tuple[Any, float]:
+        semaphore = self._semaphores.get(step.model)
+        if semaphore is not None:
+            semaphore.acquire()
+        try:
+            started = time.perf_counter()
+            logger.info(f"Этап '{step.name}' запущен")
+            value = step.func(inputs)
+            return value, time.perf_counter() - started
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+    def execute(self, on_step_done: Optional[Callable[[str, Any, Optional[BaseException]], None]] = None,
+                on_tick: Optional[Callable[[], None]] = None, tick_interval: float = 0.25) -> PipelineResult:
+        """
+        Выполняет все этапы с учетом зависимостей.
+
+        Если этап завершился ошибкой, зависящие от него этапы пропускаются.
+
+        Args:
+            on_step_done: Вызывается после каждого этапа: (имя, результат, исключение или None)
+            on_tick: Вызывается в вызывающем потоке не реже раза в tick_interval секунд
+                (например, для отрисовки потоковой генерации)
+            tick_interval: Период вызова on_tick в секундах
+
+        Returns:
+            PipelineResult с результатами, ошибками, пропущенными этапами и длительностями
+        """
+        outcome = PipelineResult()
+        pending = dict(self.steps)
+        running: Dict[Future, str] = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, initializer=self.thread_initializer) as executor:
+            while pending or running:
+                for name, step in list(pending.items()):
+                    if any(dep in outcome.errors or dep in outcome.skipped for dep in step.depends_on):
+                        logger.warning(f"Этап '{name}' пропущен: зависимость завершилась ошибкой")
+                        outcome.skipped.append(name)
+                        del pending[name]
+                    elif all(dep in outcome.results for dep in step.depends_on):
+                        inputs = {dep: outcome.results[dep] for dep in step.depends_on}
+                        running[executor.submit(self._execute, step, inputs)] = name
+                        del pending[name]
+
+                if not running:
+                    continue
+                done, _ = wait(running, timeout=tick_interval if on_tick else None,
+                               return_when=FIRST_COMPLETED)
+                if on_tick is not None:
+                    on_tick()
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    value = None
+                    if error is None:
+                        value, duration = future.result()
+                        outcome.results[name] = value
+                        outcome.durations[name] = duration
+                        logger.info(f"Этап '{name}' завершен за {duration:.1f} с")
+                    else:
+                        outcome.errors[name] = error
+                        logger.error(f"Этап '{name}' завершился ошибкой: {error}")
+                    if on_step_done is not None:
+                        on_step_done(name, value, error)
+        return outcome
@@ -0,0 +1,222 @@
+"""
+Детерминированный профиль столбцов для анализа структуры.
+
+Для каждого столбца векторно считаются тип pandas, доля пропусков, число
+уникальных значений, доля значений выборки, приводимых к числу и к дате
+(src.data.datetimes), и min/max. Если профиль однозначно определяет вид
+столбца, тип и описание формируются без LLM; в промпт анализа структуры
+попадают только неоднозначные столбцы в компактном виде.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+import pandas as pd
+from config.settings import PROFILE_CATEGORY_MAX_UNIQUE, PROFILE_CONCLUSIVE_RATE, PROFILE_SAMPLE_ROWS
+from src.data.datetimes import best_datetime_format
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+BOOLEAN_VALUES = {"0", "1", "true", "false", "да", "нет", "yes", "no", "y", "n"}
+
+
+@dataclass
+class ColumnProfile:
+    """
+    Профиль столбца.
+
+    Attributes:
+        name: Имя столбца
+        dtype: Тип pandas
+        null_ratio: Доля пропусков
+        nunique: Число уникальных значений (без пропусков)
+        unique_ratio: nunique / число непустых значений
+        numeric_rate: Доля непустых значений выборки, приводимых к числу
+        date_rate: Доля непустых значений выборки, разбираемых форматом date_format
+        date_format: Лучший формат дат для текстового столбца
+        min: Минимум (числа и даты)
+        max: Максимум (числа и даты)
+        examples: Несколько значений столбца
+        type: Тип для описания структуры или None, если профиль неоднозначен
+    """
+    name: str
+    dtype: str
+    null_ratio: float
+    nunique: int
+    unique_ratio: float
+    numeric_rate: float = 0.0
+    date_rate: float = 0.0
+    date_format: Optional[str] = None
+    min: Any = None
+    max: Any = None
+    examples: List[str] = field(default_factory=list)
+    type: Optional[str] = None
+
+    @property
+    def conclusive(self) -> bool:
+        return self.type is not None
+
+    @property
+    def is_datetime(self) -> bool:
+        return bool(self.type and self.type.startswith("datetime"))
+
+    def description(self) -> str:
+        """Описание столбца по профилю (для столбцов, определенных без LLM)."""
+        parts = [f"пропусков {self.null_ratio:.0%}", f"уникальных значений {self.nunique}"]
+        if self.min is not None:
+            parts.append(f"диапазон {self.min} - {self.max}")
+        return "Определено профилированием: " + ", ".join(parts)
+
+
+def _classify(profile: ColumnProfile, series: pd.Series) -> Optional[str]:
+    """Тип столбца, если профиль однозначен, иначе None."""
+    dtype = series.dtype
+    count = profile.nunique
+    if pd.api.types.is_bool_dtype(dtype):
+        return "boolean"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    if pd.api.types.is_numeric_dtype(dtype):
+        if count <= 2 and set(map(str, series.dropna().unique())) <= {"0", "1", "0.0", "1.0"}:
+            return "boolean"
+        if pd.api.types.is_integer_dtype(dtype) and profile.unique_ratio == 1.0 and series.is_monotonic_increasing:
+            return "numerical (integer, identifier)"
+        if count <= PROFILE_CATEGORY_MAX_UNIQUE:
+            # Мало значений: это может быть и код категории, и число - решает LLM
+            return None
+        return "numerical (integer)" if pd.api.types.is_integer_dtype(dtype) else "numerical (float)"
+    if count == 0:
+        return None
+    if count <= 2 and set(str(v).strip().lower() for v in series.dropna().unique()) <= BOOLEAN_VALUES:
+        return "boolean"
+    if profile.numeric_rate >= PROFILE_CONCLUSIVE_RATE:
+        return None if count <= PROFILE_CATEGORY_MAX_UNIQUE else "numerical (text)"
+    if profile.date_rate >= PROFILE_CONCLUSIVE_RATE:
+        return f"datetime (text, format {profile.date_format})"
+    if profile.numeric_rate > 1 - PROFILE_CONCLUSIVE_RATE or profile.date_rate > 1 - PROFILE_CONCLUSIVE_RATE:
+        # Часть значений похожа на числа или даты - смешанный столбец
+        return None
+    if count <= PROFILE_CATEGORY_MAX_UNIQUE or profile.unique_ratio <= 1 - PROFILE_CONCLUSIVE_RATE:
+        return "categorical (object)"
+    if profile.unique_ratio >= PROFILE_CONCLUSIVE_RATE:
+        return "textual (free text)"
+    return None
+
+
+def _bound(value: Any) -> Any:
+    if value is None or pd.isna(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return str(value)
+    return value.item() if hasattr(value, "item") else value
+
+
+def profile_column(series: pd.Series, sample: pd.Series) -> ColumnProfile:
+    """
+    Профиль одного столбца.
+
+    Args:
+        series: Столбец целиком (пропуски, уникальные значения, min/max)
+        sample: Тот же столбец на выборке строк (доли чисел и дат)
+    """
+    total = len(series)
+    non_null_count = int(series.notna().sum())
+    nunique = int(series.nunique(dropna=True))
+    profile = ColumnProfile(
+        name=str(series.name),
+        dtype=str(series.dtype),
+        null_ratio=1 - non_null_count / total if total else 0.0,
+        nunique=nunique,
+        unique_ratio=nunique / non_null_count if non_null_count else 0.0,
+        examples=[str(v)[:40] for v in sample.dropna().unique()[:3]],
+    )
+    dtype = series.dtype
+    if (pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)) \
+            or pd.api.types.is_datetime64_any_dtype(dtype):
+        profile.numeric_rate = 1.0 if pd.api.types.is_numeric_dtype(dtype) else 0.0
+        profile.min, profile.max = _bound(series.min()), _bound(series.max())
+    elif not pd.api.types.is_bool_dtype(dtype):
+        values = sample.dropna()
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(str)
+        if len(values):
+            profile.numeric_rate = float(pd.to_numeric(values, errors="coerce").notna().mean())
+            if profile.numeric_rate < PROFILE_CONCLUSIVE_RATE:
+                profile.date_format, profile.date_rate = best_datetime_format(values)
+    profile.type = _classify(profile, series)
+    return profile
+
+
+def profile_dataframe(df: pd.DataFrame, sample_rows: int = PROFILE_SAMPLE_ROWS) -> List[ColumnProfile]:
+    """
+    Профили всех столбцов DataFrame.
+
+    Args:
+        df: DataFrame
+        sample_rows: Размер случайной выборки строк для долей чисел и дат
+
+    Returns:
+        Список ColumnProfile в порядке столбцов
+    """
+    sample = df.sample(sample_rows, random_state=0) if len(df) > sample_rows else df
+    profiles = [profile_column(df.iloc[:, i], sample.iloc[:, i]) for i in range(df.shape[1])]
+    conclusive = sum(p.conclusive for p in profiles)
+    logger.info(f"Профиль столбцов: {conclusive} из {len(profiles)} определены без LLM.")
+    return profiles
+
+
+def format_profiles(profiles: List[ColumnProfile], rows: int) -> str:
+    """
+    Компактное описание столбцов для промпта анализа структуры (одна строка на столбец).
+
+    Args:
+        profiles: Профили столбцов
+        rows: Число строк датасета
+    """
+    lines = [f"Строк: {rows}. Профиль столбцов (имя | тип pandas | пропуски | уникальных | "
+             f"доля чисел | доля дат (формат) | min..max | примеры):"]
+    for p in profiles:
+        dates = f"{p.date_rate:.0%} ({p.date_format})" if p.date_format else "-"
+        bounds = f"{p.min}..{p.max}" if p.min is not None else "-"
+        lines.append(f"{p.name} | {p.dtype} | {p.null_ratio:.0%} | {p.nunique} | {p.numeric_rate:.0%} | "
+                     f"{dates} | {bounds} | {'; '.join(p.examples)}")
+    return "\n".join(lines)
+
+
+def split_profiles(profiles: List[ColumnProfile]) -> Tuple[Dict[str, Any], List[ColumnProfile]]:
+    """
+    Делит профили на определенные без LLM и неоднозначные.
+
+    Returns:
+        Кортеж (структура в формате parse_struct_analyze_response для однозначных
+        столбцов, список неоднозначных профилей)
+    """
+    structure: Dict[str, Any] = {"columns": [], "datetime_candidates": []}
+    ambiguous = []
+    for p in profiles:
+        if not p.conclusive:
+            ambiguous.append(p)
+            continue
+        structure["columns"].append({"name": p.name, "type": p.type, "description": p.description()})
+        if p.is_datetime:
+            structure["datetime_candidates"].append(p.name)
+    return structure, ambiguous
+
+
+def merge_structure(profiles: List[ColumnProfile], known: Dict[str, Any],
+                    llm_structure: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Объединяет структуру из профиля и ответ LLM по неоднозначным столбцам.
+
+    Столбцы идут в порядке DataFrame; для однозначных столбцов ответ LLM не используется.
+    """
+    llm_structure = llm_structure or {}
+    by_name = {c["name"]: c for c in llm_structure.get("columns", []) if c.get("name")}
+    by_name.update({c["name"]: c for c in known.get("columns", [])})
+    known_names = {c["name"] for c in known.get("columns", [])}
+    candidates = list(known.get("datetime_candidates", []))
+    candidates += [c for c in llm_structure.get("datetime_candidates", [])
+                   if c not in known_names and c not in candidates]
+    return {
+        "columns": [by_name[p.name] for p in profiles if p.name in by_name],
+        "datetime_candidates": candidates,
+    }
@@ -0,0 +1,3 @@
+"""
+Data модуль - загрузка, предобработка и расчет метрик по данным
+"""
@@ -0,0 +1,161 @@
+"""
+Векторное преобразование текста в даты с выводом формата по столбцу.
+
+pd.to_datetime без формата на текстовом столбце разбирает значения по
+одному. Здесь формат подбирается один раз по выборке значений (из
+DATETIME_FORMATS, включая русские '%d.%m.%Y %H:%M'), весь столбец
+разбирается векторно с этим форматом, а поэлементный разбор применяется
+только к значениям, которые формату не соответствуют.
+"""
+from typing import Optional, Tuple
+import pandas as pd
+from config.settings import DATETIME_FORMAT_MIN_MATCH, DATETIME_FORMAT_SAMPLE_SIZE
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Порядок важен: при равной доле совпадений выбирается более ранний формат
+# (день перед месяцем - для неоднозначных дат вида 01/02/2024)
+DATETIME_FORMATS = [
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%d.%m.%Y",
+    "%d.%m.%Y %H:%M",
+    "%d.%m.%Y %H:%M:%S",
+    "%d.%m.%y",
+    "%d.%m.%y %H:%M",
+    "%d/%m/%Y",
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y %H:%M:%S",
+    "%m/%d/%Y",
+    "%m/%d/%Y %H:%M",
+    "%m/%d/%Y %H:%M:%S",
+    "%d-%m-%Y",
+    "%d-%m-%Y %H:%M",
+    "%Y/%m/%d",
+    "%Y/%m/%d %H:%M:%S",
+]
+
+DATE_PREFIX_PATTERN = r"\d{1,4}[-./]\d{1,2}[-./]\d{1,4}"
+
+
+def _is_text(series: pd.Series) -> bool:
+    if pd.api.types.is_object_dtype(series.dtype):
+        return True
+    return pd.api.types.is_string_dtype(series.dtype) and not isinstance(series.dtype, pd.CategoricalDtype)
+
+
+def best_datetime_format(series: pd.Series,
+                         sample_size: int = DATETIME_FORMAT_SAMPLE_SIZE) -> Tuple[Optional[str], float]:
+    """
+    Формат из DATETIME_FORMATS, разбирающий наибольшую долю случайной выборки значений.
+
+    Args:
+        series: Текстовый столбец
+        sample_size: Размер выборки непустых значений
+
+    Returns:
+        Кортеж (формат или None, доля разобранных значений выборки)
+    """
+    non_null = series.dropna()
+    if non_null.empty:
+        return None, 0.0
+    if len(non_null) > sample_size:
+        non_null = non_null.sample(sample_size, random_state=0)
+    sample = non_null.astype(str)
+    # Все форматы начинаются с трех групп цифр через '-', '.' или '/': остальные значения не перебираются
+    shaped = sample.str.match(DATE_PREFIX_PATTERN).to_numpy(dtype=bool)
+    shaped_rate = float(shaped.mean())
+    if shaped_rate == 0.0:
+        return None, 0.0
+    sample = sample[shaped]
+    best_format, best_rate = None, 0.0
+    for fmt in DATETIME_FORMATS:
+        rate = float(pd.to_datetime(sample, format=fmt, errors="coerce").notna().mean()) * shaped_rate
+        if rate > best_rate:
+            best_format, best_rate = fmt, rate
+        if rate == shaped_rate:
+            break
+    return best_format, best_rate
+
+
+def infer_datetime_format(series: pd.Series, sample_size: int = DATETIME_FORMAT_SAMPLE_SIZE,
+                          min_match: float = DATETIME_FORMAT_MIN_MATCH) -> Optional[str]:
+    """
+    Подбирает формат дат по случайной выборке значений столбца.
+
+    Args:
+        series: Текстовый столбец
+        sample_size: Размер выборки непустых значений
+        min_match: Минимальная доля значений выборки, разобранных форматом
+
+    Returns:
+        Формат из DATETIME_FORMATS с наибольшей долей совпадений или None
+    """
+    best_format, best_rate = best_datetime_format(series, sample_size)
+    return best_format if best_rate >= min_match else None
+
+
+def _parse_mixed(values: pd.Series) -> pd.Series:
+    """
+    Поэлементный разбор значений разных форматов.
+
+    Сначала векторно разбираются даты ISO 8601 (с dayfirst dateutil прочитал бы
+    '2024-05-06' как 5 июня), остальные - поэлементно, день перед месяцем.
+    """
+    # utc=True допускает разные смещения; значения без пояса не сдвигаются
+    parsed = pd.to_datetime(values, errors="coerce", format="ISO8601", utc=True).dt.tz_convert(None)
+    rest = parsed.isna().to_numpy() & values.notna().to_numpy()
+    if not rest.any():
+        return parsed
+    try:
+        other = pd.to_datetime(values[rest], errors="coerce", format="mixed", dayfirst=True)
+    except (ValueError, TypeError):
+        # Значения с разными часовыми поясами приводятся к UTC
+        other = pd.to_datetime(values[rest], errors="coerce", format="mixed", dayfirst=True, utc=True)
+    if getattr(other.dtype, "tz", None) is not None:
+        other = other.dt.tz_convert(None)
+    parsed = parsed.copy()
+    parsed[rest] = other.to_numpy()
+    return parsed
+
+
+def parse_datetimes(series: pd.Series, fmt: Optional[str] = None) -> Tuple[pd.Series, Optional[str]]:
+    """
+    Преобразует столбец в datetime (нераспознанные значения -> NaT).
+
+    Args:
+        series: Столбец любого типа
+        fmt: Известный формат (например, из метаданных датасета); None - подобрать
+
+    Returns:
+        Кортеж (столбец datetime, использованный формат или None)
+    """
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return series, None
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Разбираются только категории, значения собираются по кодам
+        categories, fmt = parse_datetimes(pd.Series(series.cat.categories), fmt)
+        values = pd.api.extensions.take(categories.to_numpy(), series.cat.codes.to_numpy(), allow_fill=True)
+        return pd.Series(values, index=series.index, name=series.name), fmt
+    if not _is_text(series):
+        return pd.to_datetime(series, errors="coerce"), None
+
+    fmt = fmt or infer_datetime_format(series)
+    if fmt is None:
+        logger.debug(f"Формат дат столбца '{series.name}' не определен, поэлементный разбор.")
+        return _parse_mixed(series), None
+    parsed = pd.to_datetime(series, format=fmt, errors="coerce")
+    residue = parsed.isna().to_numpy() & series.notna().to_numpy()
+    if residue.any():
+        logger.debug(f"Столбец '{series.name}': {int(residue.sum())} значений не в формате {fmt}, "
+                     f"поэлементный разбор.")
+        fallback = _parse_mixed(series[residue])
+        if fallback.notna().any():
+            parsed = parsed.copy()
+            parsed[residue] = fallback.to_numpy()
+    return parsed, fmt
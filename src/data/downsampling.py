@@ -0,0 +1,250 @@
+"""
+Прореживание и агрегация данных для графиков по большим DataFrame.
+
+Ниже порога PLOT_DOWNSAMPLE_THRESHOLD строк данные возвращаются без
+изменений. Выше порога:
+- для диаграмм рассеяния - стратифицированная выборка (доли групп сохраняются);
+- для линейных графиков и временных рядов - LTTB или min-max прореживание;
+- для гистограмм - предварительный подсчет по интервалам.
+
+Для интерактивных графиков режим отрисовки (SVG, WebGL или растр)
+выбирается по числу точек, см. choose_render_mode.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+from config.settings import (
+    PLOT_DOWNSAMPLE_THRESHOLD,
+    PLOT_LINE_POINTS,
+    PLOT_RASTER_SIZE,
+    PLOT_RASTER_THRESHOLD,
+    PLOT_SCATTER_POINTS,
+    PLOT_WEBGL_THRESHOLD,
+)
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def _as_numeric(values) -> np.ndarray:
+    """Приводит значения к float (даты - в секунды, нечисловые - по позиции)."""
+    series = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        series = series - pd.Timestamp(0, tz=getattr(series.dt, "tz", None))
+    if pd.api.types.is_timedelta64_dtype(series):
+        return series.dt.total_seconds().to_numpy(dtype=float, na_value=np.nan)
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.to_numpy(dtype=float, na_value=np.nan)
+    return np.arange(len(series), dtype=float)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Индексы точек, отобранных алгоритмом Largest-Triangle-Three-Buckets.
+
+    Сохраняет визуальную форму ряда: из каждого интервала берется точка,
+    образующая наибольший треугольник с соседними интервалами.
+
+    Args:
+        x: Значения по оси X (отсортированные, без NaN)
+        y: Значения по оси Y (без NaN)
+        n_out: Число точек на выходе
+
+    Returns:
+        Отсортированный массив индексов
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    every = (n - 2) / (n_out - 2)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_start = end
+        next_end = min(int((i + 2) * every) + 1, n) if i < n_out - 3 else n
+        if i == n_out - 3:
+            next_start = n - 1
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        xs, ys = x[start:end], y[start:end]
+        area = np.abs((x[a] - avg_x) * (ys - y[a]) - (x[a] - xs) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Индексы минимума и максимума в каждом из n_out/2 интервалов.
+
+    Сохраняет выбросы и размах колебаний; подходит для плотных рядов.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+    edges = np.linspace(0, n, n_out // 2 + 1).astype(np.int64)
+    picked = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end > start:
+            window = y[start:end]
+            picked.extend((start + int(np.argmin(window)), start + int(np.argmax(window))))
+    return np.unique(np.asarray(picked, dtype=np.int64))
+
+
+def sample_for_scatter(df: pd.DataFrame, n: int = PLOT_SCATTER_POINTS, by: Optional[str] = None,
+                       threshold: int = PLOT_DOWNSAMPLE_THRESHOLD, seed: int = 0) -> pd.DataFrame:
+    """
+    Стратифицированная выборка строк для диаграммы рассеяния.
+
+    Доли групп столбца by (например, hue/color) сохраняются, каждая группа
+    представлена хотя бы одной строкой. Порядок строк сохраняется.
+
+    Args:
+        df: DataFrame
+        n: Размер выборки
+        by: Столбец для стратификации (None - простая случайная выборка)
+        threshold: Порог числа строк, ниже которого выборка не делается
+        seed: Начальное значение генератора
+
+    Returns:
+        DataFrame не более чем из n строк (плюс по строке на редкие группы)
+    """
+    if len(df) <= max(n, threshold):
+        return df
+    rng = np.random.default_rng(seed)
+    if by is None:
+        positions = np.sort(rng.choice(len(df), size=n, replace=False))
+        return df.iloc[positions]
+    groups = df.groupby(by, observed=True, dropna=False, sort=False).indices
+    total = len(df)
+    chosen = []
+    for positions in groups.values():
+        quota = min(len(positions), max(1, round(n * len(positions) / total)))
+        chosen.append(rng.choice(positions, size=quota, replace=False))
+    positions = np.sort(np.concatenate(chosen)) if chosen else np.arange(0)
+    logger.debug(f"Стратифицированная выборка для графика: {len(df)} -> {len(positions)} строк")
+    return df.iloc[positions]
+
+
+def decimate_for_line(df: pd.DataFrame, x: Optional[str] = None, y: Union[str, Iterable[str], None] = None,
+                      n_points: int = PLOT_LINE_POINTS, by: Optional[str] = None, method: str = "lttb",
+                      threshold: int = PLOT_DOWNSAMPLE_THRESHOLD) -> pd.DataFrame:
+    """
+    Прореживание строк для линейного графика или временного ряда.
+
+    Строки сортируются по x (или по индексу, если x не указан). Для
+    нескольких столбцов y берется объединение отобранных точек; для
+    столбца by прореживание выполняется в каждой группе отдельно.
+
+    Args:
+        df: DataFrame
+        x: Столбец оси X (None - индекс)
+        y: Столбец или список столбцов оси Y (None - все числовые)
+        n_points: Точек на линию после прореживания
+        by: Столбец группировки (отдельная линия на группу)
+        method: 'lttb' или 'minmax'
+        threshold: Порог числа строк, ниже которого данные не меняются
+
+    Returns:
+        DataFrame с отобранными строками
+    """
+    if len(df) <= max(n_points, threshold):
+        return df
+    if by is not None:
+        groups = [group for _, group in df.groupby(by, observed=True, sort=False)]
+        per_group = max(3, n_points // max(1, len(groups)))
+        return pd.concat([decimate_for_line(group, x, y, per_group, None, method, threshold=0)
+                          for group in groups])
+    y_columns = [y] if isinstance(y, str) else list(y) if y is not None else \
+        df.select_dtypes(include="number").columns.drop(x, errors="ignore").tolist()
+    x_values = _as_numeric(df[x] if x is not None else df.index)
+    order = np.argsort(x_values, kind="stable")
+    x_sorted = x_values[order]
+    picked: List[np.ndarray] = []
+    for column in y_columns:
+        y_sorted = _as_numeric(df[column])[order]
+        valid = np.flatnonzero(~np.isnan(x_sorted) & ~np.isnan(y_sorted))
+        if method == "minmax":
+            local = minmax_indices(y_sorted[valid], n_points)
+        else:
+            local = lttb_indices(x_sorted[valid], y_sorted[valid], n_points)
+        picked.append(valid[local])
+    positions = order[np.unique(np.concatenate(picked))] if picked else order[:0]
+    logger.debug(f"Прореживание ({method}) для графика: {len(df)} -> {len(positions)} строк")
+    return df.iloc[positions]
+
+
+def binned_hist(values, bins: Union[int, str] = 30,
+                value_range: Optional[Tuple[float, float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Предварительно посчитанная гистограмма (NaN и бесконечности отбрасываются).
+
+    Args:
+        values: Значения (Series или массив)
+        bins: Число интервалов или правило numpy ('auto', 'fd', ...)
+        value_range: Диапазон значений
+
+    Returns:
+        Кортеж (частоты, границы интервалов), как у numpy.histogram
+    """
+    array = _as_numeric(values)
+    array = array[np.isfinite(array)]
+    return np.histogram(array, bins=bins, range=value_range)
+
+
+RENDER_MODES = ("auto", "svg", "webgl", "raster")
+
+
+def choose_render_mode(n_points: int, requested: str = "auto") -> str:
+    """
+    Режим отрисовки интерактивного графика.
+
+    SVG удобен до нескольких тысяч точек, WebGL (Scattergl) - до сотен
+    тысяч, дальше браузеру передается только растр плотности точек.
+
+    Args:
+        n_points: Число точек на графике
+        requested: Режим, выбранный пользователем ('auto', 'svg', 'webgl', 'raster')
+
+    Returns:
+        'svg', 'webgl' или 'raster'
+    """
+    if requested not in RENDER_MODES:
+        raise ValueError(f"Неизвестный режим отрисовки: {requested}. Допустимые: {RENDER_MODES}")
+    if requested != "auto":
+        return requested
+    if n_points <= PLOT_WEBGL_THRESHOLD:
+        return "svg"
+    if n_points <= PLOT_RASTER_THRESHOLD:
+        return "webgl"
+    return "raster"
+
+
+def rasterize_points(x, y, size: Tuple[int, int] = PLOT_RASTER_SIZE) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Растр плотности точек (как у datashader): число точек в каждой ячейке сетки.
+
+    Args:
+        x: Значения по оси X
+        y: Значения по оси Y
+        size: Ширина и высота сетки в ячейках
+
+    Returns:
+        Кортеж (матрица частот [высота, ширина], границы по X, границы по Y)
+    """
+    x_values, y_values = _as_numeric(x), _as_numeric(y)
+    finite = np.isfinite(x_values) & np.isfinite(y_values)
+    width, height = size
+    counts, x_edges, y_edges = np.histogram2d(x_values[finite], y_values[finite], bins=(width, height))
+    return counts.T, x_edges, y_edges
+
+
+# Функции, доступные коду графиков, сгенерированному LLM
+PLOT_HELPERS: Dict[str, object] = {
+    "sample_for_scatter": sample_for_scatter,
+    "decimate_for_line": decimate_for_line,
+    "binned_hist": binned_hist,
+}
@@ -0,0 +1,189 @@
+"""
+Сжатие типов столбцов DataFrame после загрузки.
+
+pandas по умолчанию хранит числа как int64/float64, а текст - как object
+(в pandas 3 - Arrow-строки). Проход сжатия:
+- понижает разрядность целых до наименьшего типа, вмещающего значения
+  (не ниже DTYPE_MIN_INT_BITS);
+- переводит float64 в float32, только если значения не меняются
+  (по настройке DTYPE_DOWNCAST_FLOATS);
+- переводит текст с малой долей уникальных значений в category,
+  остальной текст - в строки на Arrow.
+
+Типы столбцов из анализа структуры LLM (parse_struct_analyze_response)
+используются как подсказки: свободный текст, идентификаторы, даты и числа
+в виде текста не становятся category, явные категории - становятся
+независимо от доли уникальных значений.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+import pandas as pd
+from config.settings import CATEGORY_MAX_UNIQUE_RATIO, DTYPE_DOWNCAST_FLOATS, DTYPE_MIN_INT_BITS
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Ключевые слова в типе столбца от LLM -> вид столбца. Просто "textual" подсказкой
+# не считается: решение принимается по доле уникальных значений
+TYPE_HINT_KEYWORDS = {
+    "datetime": ("date", "time", "дат", "врем"),
+    "categorical": ("categor", "категор", "bool", "логич"),
+    "text": ("free", "свободн", "identifier", "идентиф", "uuid", "comment", "коммент"),
+    "numeric": ("numer", "числ", "integer", "float", "целое", "веществ"),
+}
+
+
+@dataclass
+class DtypeReport:
+    """
+    Результат сжатия типов.
+
+    Attributes:
+        bytes_before: Память DataFrame до сжатия (memory_usage(deep=True))
+        bytes_after: Память после сжатия
+        changes: Измененные столбцы {столбец: (старый тип, новый тип)}
+    """
+    bytes_before: int
+    bytes_after: int
+    changes: Dict[str, Tuple[str, str]] = field(default_factory=dict)
+
+    @property
+    def ratio(self) -> float:
+        """Во сколько раз уменьшилась память."""
+        return self.bytes_before / self.bytes_after if self.bytes_after else 1.0
+
+    def summary(self) -> str:
+        """Краткое описание для интерфейса и журнала."""
+        return (f"Память DataFrame: {self.bytes_before / 2 ** 20:.1f} МБ -> {self.bytes_after / 2 ** 20:.1f} МБ "
+                f"(в {self.ratio:.1f} раза), изменены типы {len(self.changes)} столбцов")
+
+
+def type_hints_from_structure(columns: Iterable[Dict[str, str]]) -> Dict[str, str]:
+    """
+    Подсказки видов столбцов из разобранного ответа LLM о структуре.
+
+    Args:
+        columns: Список {"name": ..., "type": ...} (parsed_structure["columns"])
+
+    Returns:
+        Словарь {столбец: вид}, вид - один из ключей TYPE_HINT_KEYWORDS
+    """
+    hints = {}
+    for column in columns or ():
+        name, type_text = column.get("name"), str(column.get("type", "")).lower()
+        if not name:
+            continue
+        for kind, keywords in TYPE_HINT_KEYWORDS.items():
+            if any(keyword in type_text for keyword in keywords):
+                hints[name] = kind
+                break
+    return hints
+
+
+def _arrow_string_dtype():
+    """Строковый тип на Arrow с NaN в качестве пропуска или None, если он недоступен."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+    try:
+        return pd.StringDtype("pyarrow", na_value=np.nan)  # pandas >= 2.3
+    except TypeError:
+        pass
+    try:
+        return pd.StringDtype("pyarrow_numpy")  # pandas 2.1-2.2
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_text(series: pd.Series) -> bool:
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return False
+    if pd.api.types.is_object_dtype(series.dtype):
+        return pd.api.types.infer_dtype(series, skipna=True) == "string"
+    return pd.api.types.is_string_dtype(series.dtype)
+
+
+def _downcast_integer(series: pd.Series) -> Optional[np.dtype]:
+    """Наименьший целый тип не уже DTYPE_MIN_INT_BITS, вмещающий значения (None - без изменений)."""
+    if series.empty:
+        return None
+    low, high = series.min(), series.max()
+    kind = "u" if series.dtype.kind == "u" else "i"
+    for bits in (8, 16, 32, 64):
+        if bits < DTYPE_MIN_INT_BITS:
+            continue
+        candidate = np.dtype(f"{kind}{bits // 8}")
+        if candidate.itemsize >= series.dtype.itemsize:
+            return None
+        info = np.iinfo(candidate)
+        if info.min <= low and high <= info.max:
+            return candidate
+    return None
+
+
+def _downcast_float(series: pd.Series) -> Optional[np.dtype]:
+    """float32, если все значения представимы в нем точно (None - без изменений)."""
+    if series.dtype != np.float64:
+        return None
+    values = series.to_numpy()
+    narrowed = values.astype(np.float32)
+    if np.array_equal(narrowed.astype(np.float64), values, equal_nan=True):
+        return np.dtype(np.float32)
+    return None
+
+
+def _text_dtype(series: pd.Series, hint: Optional[str]):
+    """Тип для текстового столбца: 'category', строки Arrow или None (без изменений)."""
+    count = int(series.notna().sum())
+    if count and hint not in ("text", "numeric", "datetime"):
+        unique = int(series.nunique(dropna=True))
+        repeated = unique < count if hint == "categorical" else unique <= CATEGORY_MAX_UNIQUE_RATIO * count
+        if repeated:
+            return "category"
+    if pd.api.types.is_object_dtype(series.dtype):
+        return _arrow_string_dtype()
+    return None
+
+
+def optimize_dtypes(df: pd.DataFrame,
+                    type_hints: Optional[Dict[str, str]] = None) -> Tuple[pd.DataFrame, DtypeReport]:
+    """
+    Сжимает типы столбцов без изменения значений.
+
+    Args:
+        df: Исходный DataFrame (не изменяется)
+        type_hints: Подсказки видов столбцов {столбец: вид} (см. type_hints_from_structure)
+
+    Returns:
+        Кортеж (DataFrame со сжатыми типами, DtypeReport)
+    """
+    type_hints = type_hints or {}
+    bytes_before = int(df.memory_usage(deep=True).sum())
+    optimized = df.copy(deep=False)
+    changes: Dict[str, Tuple[str, str]] = {}
+    for col in df.columns[~df.columns.duplicated(keep=False)]:
+        series = df[col]
+        dtype = series.dtype
+        if isinstance(dtype, pd.api.extensions.ExtensionDtype) and not _is_text(series):
+            continue
+        if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_datetime64_any_dtype(dtype):
+            continue
+        if pd.api.types.is_integer_dtype(dtype):
+            target = _downcast_integer(series)
+        elif pd.api.types.is_float_dtype(dtype):
+            target = _downcast_float(series) if DTYPE_DOWNCAST_FLOATS else None
+        elif _is_text(series):
+            target = _text_dtype(series, type_hints.get(col))
+        else:
+            target = None
+        if target is None:
+            continue
+        optimized[col] = series.astype(target)
+        changes[str(col)] = (str(dtype), str(optimized[col].dtype))
+
+    report = DtypeReport(bytes_before, int(optimized.memory_usage(deep=True).sum()), changes)
+    logger.info(report.summary())
+    logger.debug(f"Изменения типов: {changes}")
+    return optimized, report
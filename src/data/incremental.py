@@ -0,0 +1,304 @@
+"""
+Инкрементальный пересчет метрик для файлов, к которым дописываются строки.
+
+После расчета метрик сливаемые аккумуляторы столбцов (моменты, KLL-скетч,
+HyperLogLog, таблица частот - см. src.data.streaming) сохраняются рядом
+с результатами вместе с отпечатком обработанной части источника. При повторном запуске:
+- если источник не изменился, метрики берутся из сохраненных аккумуляторов;
+- если к источнику только дописаны строки (отпечаток начала файла совпадает,
+  размер вырос), в аккумуляторы добавляются только новые строки;
+- иначе метрики пересчитываются полностью.
+
+Для CSV отпечаток - хэши блоков файла по HASH_BLOCK_SIZE байт. При
+повторном запуске заново хэшируются только первый и последний сохраненные
+блоки и дописанные байты, поэтому проверка стоит O(новых строк), а не
+O(файла); изменения в середине файла при этом не обнаруживаются. Новые
+строки читаются с байтового смещения. Для уже загруженного DataFrame
+(например, из .xlsx) отпечаток - хэш первых N строк.
+"""
+import hashlib
+import os
+import pickle
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import pandas as pd
+from config.settings import STREAMING_CHUNK_ROWS
+from src.data.loader import detect_csv_format
+from src.data.streaming import ColumnAccumulator, accumulate_chunks, iter_csv_chunks
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Версия формата состояния: при несовпадении состояние игнорируется
+STATE_VERSION = 3
+HASH_BLOCK_SIZE = 1 << 20
+
+
+@dataclass
+class IncrementalUpdate:
+    """
+    Как были получены метрики.
+
+    Attributes:
+        mode: 'full' - полный расчет, 'append' - добавлены новые строки,
+            'unchanged' - источник не изменился
+        total_rows: Строк учтено всего
+        new_rows: Строк обработано в этом запуске
+    """
+    mode: str
+    total_rows: int
+    new_rows: int
+
+
+def _state_path(state_dir: Path, source_id: str, metrics_plan: Optional[Dict[str, List[str]]],
+                datetime_columns: Iterable[str]) -> Path:
+    """Файл состояния для источника, плана метрик и datetime-столбцов (от плана зависит состав аккумуляторов)."""
+    plan = sorted((col, sorted(metrics)) for col, metrics in metrics_plan.items()) if metrics_plan else None
+    key = repr((source_id, plan, sorted(datetime_columns or ())))
+    return Path(state_dir) / f"{hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()}.pkl"
+
+
+def _load_state(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:  # поврежденный файл или классы другой версии кода: состояние строится заново
+        logger.warning(f"Состояние метрик {path} не прочитано ({type(e).__name__}: {e}), пересчет полностью.")
+        return None
+    return state if isinstance(state, dict) and state.get("version") == STATE_VERSION else None
+
+
+def _save_state(path: Path, state: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        pickle.dump({**state, "version": STATE_VERSION}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def file_block_hashes(file_path: str, first_block: int = 0, end: Optional[int] = None) -> List[str]:
+    """
+    Хэши (BLAKE2b) блоков файла по HASH_BLOCK_SIZE байт.
+
+    Args:
+        file_path: Путь к файлу
+        first_block: Номер первого хэшируемого блока
+        end: Байтовое смещение, до которого хэшировать (по умолчанию - до конца файла);
+            последний блок может быть неполным
+
+    Returns:
+        Хэши блоков first_block, first_block + 1, ...
+    """
+    hashes: List[str] = []
+    position = first_block * HASH_BLOCK_SIZE
+    with open(file_path, "rb") as f:
+        f.seek(position)
+        while end is None or position < end:
+            block = f.read(HASH_BLOCK_SIZE if end is None else min(HASH_BLOCK_SIZE, end - position))
+            if not block:
+                break
+            hashes.append(hashlib.blake2b(block, digest_size=16).hexdigest())
+            position += len(block)
+    return hashes
+
+
+def _same_prefix(file_path: str, size: int, state: Dict[str, Any]) -> bool:
+    """
+    Первые state["size"] байт файла, вероятно, не изменились.
+
+    Сверяются первый и последний сохраненные блоки: замена файла меняет
+    начало (заголовок), а перезапись с другим концом - последний блок.
+    """
+    stored = state["block_hashes"]
+    if not stored or state["size"] > size:
+        return False
+    last = len(stored) - 1
+    if file_block_hashes(file_path, last, state["size"]) != stored[-1:]:
+        return False
+    return last == 0 or file_block_hashes(file_path, 0, HASH_BLOCK_SIZE) == stored[:1]
+
+
+def frame_prefix_hashes(df: pd.DataFrame, sizes: Iterable[int]) -> Dict[int, str]:
+    """Хэши столбцов и первых size строк DataFrame (без учета индекса) для нескольких size."""
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    header = repr(list(map(str, df.columns))).encode("utf-8")
+    hashes: Dict[int, str] = {}
+    for size in set(sizes):
+        digest = hashlib.blake2b(header, digest_size=16)
+        digest.update(row_hashes[:size].tobytes())
+        hashes[size] = digest.hexdigest()
+    return hashes
+
+
+def _results(accumulators: Dict[str, ColumnAccumulator],
+             metrics_plan: Optional[Dict[str, List[str]]]) -> Dict[str, Dict[str, Any]]:
+    return {
+        col: accumulator.result(metrics_plan.get(col) if metrics_plan else None)
+        for col, accumulator in accumulators.items()
+    }
+
+
+def _merge_into(accumulators: Dict[str, ColumnAccumulator], delta: Dict[str, ColumnAccumulator]) -> bool:
+    """
+    Сливает аккумуляторы новых строк с сохраненными.
+
+    Returns:
+        False, если тип столбца в новых строках другой (например, в числовом
+        столбце появился текст) - тогда нужен полный пересчет
+    """
+    changed = [col for col, accumulator in delta.items()
+               if col in accumulators and accumulators[col].kind != accumulator.kind]
+    if changed:
+        logger.warning(f"Тип столбцов {changed} в новых строках изменился, метрики пересчитываются полностью.")
+        return False
+    for col, accumulator in delta.items():
+        if col in accumulators:
+            accumulators[col].merge(accumulator)
+        else:
+            accumulators[col] = accumulator
+    return True
+
+
+def _counting(chunks: Iterable[pd.DataFrame], counter: Dict[str, int]) -> Iterator[pd.DataFrame]:
+    for chunk in chunks:
+        counter["rows"] += len(chunk)
+        yield chunk
+
+
+def _iter_csv_tail(file_path: str, offset: int, columns: List[str], csv_format: Dict[str, str],
+                   chunksize: int) -> Iterator[pd.DataFrame]:
+    """Читает строки CSV, начиная с байтового смещения (без строки заголовка)."""
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        with pd.read_csv(f, encoding=csv_format["encoding"], sep=csv_format["delimiter"],
+                         header=None, names=columns, chunksize=chunksize) as reader:
+            for chunk in reader:
+                yield chunk
+
+
+def _ends_with_newline(file_path: str, size: int) -> bool:
+    if size == 0:
+        return False
+    with open(file_path, "rb") as f:
+        f.seek(size - 1)
+        return f.read(1) in (b"\n", b"\r")
+
+
+def compute_incremental_csv_metrics(file_path: str, state_dir: Path,
+                                    metrics_plan: Optional[Dict[str, List[str]]] = None,
+                                    datetime_columns: Optional[Iterable[str]] = None,
+                                    chunksize: int = STREAMING_CHUNK_ROWS
+                                    ) -> Tuple[Dict[str, Dict[str, Any]], IncrementalUpdate]:
+    """
+    Потоковые метрики по CSV с дочитыванием только дописанных строк.
+
+    Args:
+        file_path: Путь к CSV файлу
+        state_dir: Директория для сохранения аккумуляторов
+        metrics_plan: План метрик {столбец: [метрики]}
+        datetime_columns: Столбцы, которые нужно трактовать как даты
+        chunksize: Число строк в части
+
+    Returns:
+        Кортеж (метрики {столбец: {метрика: значение}}, IncrementalUpdate)
+    """
+    datetime_columns = list(datetime_columns or ())
+    columns = list(metrics_plan) if metrics_plan else None
+    path = _state_path(state_dir, os.path.abspath(file_path), metrics_plan, datetime_columns)
+    size = os.path.getsize(file_path)
+    state = _load_state(path)
+    same_prefix = state is not None and _same_prefix(file_path, size, state)
+
+    if same_prefix and state["size"] == size:
+        logger.info(f"Файл не изменился, метрики взяты из сохраненных аккумуляторов: {path}")
+        return _results(state["accumulators"], metrics_plan), IncrementalUpdate("unchanged", state["rows"], 0)
+
+    appended = same_prefix and state["ends_with_newline"]
+    counter = {"rows": 0}
+    if appended:
+        delta = accumulate_chunks(
+            _counting(_iter_csv_tail(file_path, state["size"], state["header"], state["csv_format"], chunksize),
+                      counter),
+            datetime_columns, columns, metrics_plan=metrics_plan)
+        accumulators = state["accumulators"]
+        appended = _merge_into(accumulators, delta)
+    if appended:
+        csv_format, header = state["csv_format"], state["header"]
+        # Заново хэшируются только последний (неполный) сохраненный блок и дописанные байты
+        last = len(state["block_hashes"]) - 1
+        block_hashes = state["block_hashes"][:last] + file_block_hashes(file_path, last, size)
+        update = IncrementalUpdate("append", state["rows"] + counter["rows"], counter["rows"])
+        logger.info(f"К файлу дописано {counter['rows']} строк: пересчитаны только новые строки.")
+    else:
+        if state is not None and not same_prefix:
+            logger.info("Начало файла изменилось, метрики пересчитываются полностью.")
+        counter["rows"] = 0
+        csv_format = detect_csv_format(file_path)
+        header = list(pd.read_csv(file_path, encoding=csv_format["encoding"], sep=csv_format["delimiter"],
+                                  nrows=0).columns)
+        accumulators = accumulate_chunks(_counting(iter_csv_chunks(file_path, chunksize, csv_format), counter),
+                                         datetime_columns, columns, metrics_plan=metrics_plan)
+        block_hashes = file_block_hashes(file_path, end=size)
+        update = IncrementalUpdate("full", counter["rows"], counter["rows"])
+
+    # Смещение дочитывания должно приходиться на начало строки; UTF-16 по байтам не дочитывается
+    _save_state(path, {
+        "size": size,
+        "block_hashes": block_hashes,
+        "ends_with_newline": _ends_with_newline(file_path, size) and not csv_format["encoding"].lower().startswith("utf-16"),
+        "rows": update.total_rows,
+        "header": header,
+        "csv_format": csv_format,
+        "accumulators": accumulators,
+    })
+    return _results(accumulators, metrics_plan), update
+
+
+def compute_incremental_frame_metrics(df: pd.DataFrame, source_id: str, state_dir: Path,
+                                      metrics_plan: Optional[Dict[str, List[str]]] = None,
+                                      datetime_columns: Optional[Iterable[str]] = None
+                                      ) -> Tuple[Dict[str, Dict[str, Any]], IncrementalUpdate]:
+    """
+    Метрики по загруженному DataFrame с учетом только новых строк в конце.
+
+    Args:
+        df: Исходный DataFrame (строки в порядке файла)
+        source_id: Идентификатор источника (например, абсолютный путь к файлу)
+        state_dir: Директория для сохранения аккумуляторов
+        metrics_plan: План метрик {столбец: [метрики]}
+        datetime_columns: Столбцы, которые нужно трактовать как даты
+
+    Returns:
+        Кортеж (метрики {столбец: {метрика: значение}}, IncrementalUpdate)
+    """
+    datetime_columns = list(datetime_columns or ())
+    columns = list(metrics_plan) if metrics_plan else None
+    path = _state_path(state_dir, source_id, metrics_plan, datetime_columns)
+    state = _load_state(path)
+    rows = len(df)
+    hashes = frame_prefix_hashes(df, [rows] + ([state["rows"]] if state and state["rows"] <= rows else []))
+
+    appended = False
+    if state is not None and state["rows"] <= rows and hashes[state["rows"]] == state["prefix_hash"]:
+        accumulators = state["accumulators"]
+        new_rows = rows - state["rows"]
+        if not new_rows:
+            update = IncrementalUpdate("unchanged", rows, 0)
+            logger.info(f"Источник не изменился, метрики взяты из сохраненных аккумуляторов: {path}")
+            return _results(accumulators, metrics_plan), update
+        delta = accumulate_chunks([df.iloc[state["rows"]:]], datetime_columns, columns, metrics_plan=metrics_plan)
+        appended = _merge_into(accumulators, delta)
+        if appended:
+            update = IncrementalUpdate("append", rows, new_rows)
+            logger.info(f"К источнику добавлено {new_rows} строк: пересчитаны только новые строки.")
+    elif state is not None:
+        logger.info("Начало данных изменилось, метрики пересчитываются полностью.")
+    if not appended:
+        accumulators = accumulate_chunks([df], datetime_columns, columns, metrics_plan=metrics_plan)
+        update = IncrementalUpdate("full", rows, rows)
+
+    _save_state(path, {"rows": rows, "prefix_hash": hashes[rows], "accumulators": accumulators})
+    return _results(accumulators, metrics_plan), update
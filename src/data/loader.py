@@ -0,0 +1,248 @@
+"""
+Загрузка данных из файлов (CSV, Excel)
+"""
+import codecs
+import csv
+import os
+from typing import Any, Dict, Optional, Tuple
+import pandas as pd
+from src.utils.file_handler import ColumnarCache, compute_content_hash
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Версия формата кэша: меняется при изменении логики чтения файлов
+CACHE_FORMAT_VERSION = "v2"
+
+# Размер выборки для определения кодировки и разделителя CSV
+CSV_SAMPLE_BYTES = 64 * 1024
+CSV_DELIMITERS = ",;\t|"
+
+
+def _read_sample(source, size: int) -> bytes:
+    """Читает первые size байт источника, не сдвигая позицию file-like объекта."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read(size)
+    position = source.tell()
+    source.seek(0)
+    sample = source.read(size)
+    source.seek(position)
+    return sample
+
+
+def _guess_single_byte_encoding(data: bytes) -> str:
+    """
+    Выбирает между cp1251 и latin1 для данных, не являющихся UTF-8.
+
+    В русском тексте в cp1251 байты 0xC0-0xFF (буквы кириллицы) идут
+    подряд, образуя слова; в западноевропейском latin1 такие байты -
+    одиночные акцентированные буквы между ASCII-символами.
+    """
+    try:
+        decoded = data.decode("cp1251")
+    except UnicodeDecodeError:
+        return "latin1"
+    non_ascii = [ch for ch in decoded if ord(ch) > 127]
+    if not non_ascii:
+        return "latin1"
+    cyrillic = sum(1 for ch in non_ascii if "\u0400" <= ch <= "\u04ff")
+    high = [i for i, b in enumerate(data) if b >= 0xC0]
+    paired = sum(1 for i in high if (i + 1 < len(data) and data[i + 1] >= 0xC0)
+                 or (i > 0 and data[i - 1] >= 0xC0))
+    if cyrillic / len(non_ascii) >= 0.9 and high and paired / len(high) >= 0.5:
+        return "cp1251"
+    return "latin1"
+
+
+def detect_encoding(sample: bytes) -> str:
+    """
+    Определяет кодировку по ограниченной выборке байт.
+
+    Args:
+        sample: Начало файла
+
+    Returns:
+        Имя кодировки для pandas ('utf-8-sig', 'utf-8', 'cp1251' или 'latin1')
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        # final=False: выборка может обрываться посреди многобайтного символа
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return _guess_single_byte_encoding(sample)
+
+
+def detect_delimiter(text_sample: str) -> str:
+    """Определяет разделитель CSV по выборке текста (по умолчанию ',')."""
+    lines = text_sample.splitlines()
+    if len(lines) > 1:
+        # Последняя строка выборки может быть обрезана
+        text_sample = "\n".join(lines[:-1])
+    try:
+        return csv.Sniffer().sniff(text_sample, delimiters=CSV_DELIMITERS).delimiter
+    except csv.Error:
+        return ","
+
+
+def detect_csv_format(source, sample_size: int = CSV_SAMPLE_BYTES) -> Dict[str, str]:
+    """
+    Определяет кодировку и разделитель CSV по выборке из начала файла.
+
+    Args:
+        source: Путь к файлу или file-like объект
+        sample_size: Размер выборки в байтах
+
+    Returns:
+        Словарь {"encoding": ..., "delimiter": ...}
+    """
+    sample = _read_sample(source, sample_size)
+    encoding = detect_encoding(sample)
+    text = sample.decode(encoding, errors="ignore")
+    return {"encoding": encoding, "delimiter": detect_delimiter(text)}
+
+
+def read_csv_once(source, csv_format: Optional[Dict[str, str]] = None) -> Tuple[pd.DataFrame, Dict[str, str]]:
+    """
+    Читает CSV за один проход с заранее определенными кодировкой и разделителем.
+
+    Если выборка была чисто ASCII, а дальше в файле встретились байты не из
+    UTF-8, кодировка уточняется по фрагменту с ошибкой и файл читается повторно.
+
+    Args:
+        source: Путь к файлу или file-like объект
+        csv_format: Известные параметры чтения (например, из метаданных кэша)
+
+    Returns:
+        Кортеж (DataFrame, параметры чтения)
+    """
+    csv_format = dict(csv_format or detect_csv_format(source))
+    logger.info(f"Чтение CSV: кодировка {csv_format['encoding']}, разделитель {csv_format['delimiter']!r}")
+    try:
+        return _read_csv(source, csv_format), csv_format
+    except UnicodeDecodeError as e:
+        if not csv_format["encoding"].startswith("utf-8"):
+            raise
+        window = e.object[max(0, e.start - CSV_SAMPLE_BYTES // 2):e.start + CSV_SAMPLE_BYTES // 2]
+        csv_format["encoding"] = _guess_single_byte_encoding(bytes(window))
+        logger.warning(f"Файл не в UTF-8 за пределами выборки, повторное чтение в {csv_format['encoding']}")
+        return _read_csv(source, csv_format), csv_format
+
+
+def _read_csv(source, csv_format: Dict[str, str]) -> pd.DataFrame:
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return pd.read_csv(source, encoding=csv_format["encoding"], sep=csv_format["delimiter"])
+
+
+def read_csv_sample(source, nrows: int) -> pd.DataFrame:
+    """Читает первые nrows строк CSV (для предпросмотра и анализа структуры)."""
+    csv_format = detect_csv_format(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return pd.read_csv(source, encoding=csv_format["encoding"], sep=csv_format["delimiter"], nrows=nrows)
+
+
+def _load_with_format(file_path: Optional[str] = None,
+                      uploaded_file=None) -> Tuple[pd.DataFrame, Dict[str, str]]:
+    """Загружает DataFrame и возвращает параметры чтения (для CSV)."""
+    if uploaded_file is not None:
+        source, name = uploaded_file, uploaded_file.name
+    elif file_path:
+        source, name = file_path, file_path
+    else:
+        raise ValueError("Путь к файлу или загруженный файл не указаны.")
+
+    logger.info(f"Чтение файла: {name}")
+    if name.endswith(".csv"):
+        return read_csv_once(source)
+    if name.endswith((".xlsx", ".xls")):
+        return pd.read_excel(source), {}
+    raise ValueError("Неподдерживаемый формат файла.")
+
+
+def load_dataframe(file_path: Optional[str] = None, uploaded_file=None) -> pd.DataFrame:
+    """
+    Загружает DataFrame из файла по пути или из загруженного через Streamlit файла.
+
+    Args:
+        file_path: Путь к файлу
+        uploaded_file: Загруженный файл (file-like объект с атрибутом name)
+
+    Returns:
+        Загруженный DataFrame
+
+    Raises:
+        ValueError: Если источник не указан или формат файла не поддерживается
+    """
+    df, _ = _load_with_format(file_path, uploaded_file)
+    return df
+
+
+def dataset_cache_key(file_path: Optional[str] = None, uploaded_file=None) -> str:
+    """Ключ колоночного кэша для версии файла (хэш содержимого запоминается для путей)."""
+    if uploaded_file is None and not file_path:
+        raise ValueError("Путь к файлу или загруженный файл не указаны.")
+    source = uploaded_file if uploaded_file is not None else file_path
+    return f"{CACHE_FORMAT_VERSION}-{compute_content_hash(source)}"
+
+
+def read_dataset_metadata(file_path: Optional[str] = None, uploaded_file=None,
+                          cache: Optional[ColumnarCache] = None) -> Dict[str, Any]:
+    """Метаданные версии файла из колоночного кэша (пустой словарь, если их нет)."""
+    cache = cache or ColumnarCache()
+    if not cache.enabled:
+        return {}
+    return cache.metadata(dataset_cache_key(file_path, uploaded_file))
+
+
+def update_dataset_metadata(updates: Dict[str, Any], file_path: Optional[str] = None, uploaded_file=None,
+                            cache: Optional[ColumnarCache] = None) -> bool:
+    """
+    Дополняет метаданные версии файла в колоночном кэше.
+
+    Returns:
+        True, если запись кэша для файла есть и метаданные обновлены
+    """
+    cache = cache or ColumnarCache()
+    if not cache.enabled:
+        return False
+    key = dataset_cache_key(file_path, uploaded_file)
+    if not cache.data_path(key).exists():
+        return False
+    cache.write_metadata(key, {**cache.metadata(key), **updates})
+    return True
+
+
+def load_dataframe_cached(file_path: Optional[str] = None, uploaded_file=None,
+                          cache: Optional[ColumnarCache] = None) -> pd.DataFrame:
+    """
+    Загружает DataFrame через колоночный кэш.
+
+    При первом чтении версии файла (ключ - хэш содержимого) DataFrame
+    сохраняется в Feather с уже выведенными типами; последующие чтения
+    отображают этот файл в память вместо разбора CSV/Excel.
+
+    Args:
+        file_path: Путь к файлу
+        uploaded_file: Загруженный файл (file-like объект с атрибутом name)
+        cache: Колоночный кэш (по умолчанию - в OUTPUT_DIR)
+
+    Returns:
+        Загруженный DataFrame
+    """
+    cache = cache or ColumnarCache()
+    if not cache.enabled:
+        return load_dataframe(file_path, uploaded_file)
+
+    key = dataset_cache_key(file_path, uploaded_file)
+    df = cache.load(key)
+    if df is not None:
+        return df
+
+    df, read_options = _load_with_format(file_path, uploaded_file)
+    name = uploaded_file.name if uploaded_file is not None else os.path.basename(file_path)
+    cache.save(key, df, {"source": name, **read_options})
+    return df
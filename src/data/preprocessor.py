@@ -0,0 +1,166 @@
+"""
+Предобработка данных: преобразование дат, обработка пропусков
+
+Кадр целиком не копируется: функции работают с поверхностной копией
+(столбцы заменяются присваиванием, исходный кадр не меняется), строки
+с пропущенными датами удаляются одним фильтром по общей маске всех
+datetime-столбцов, а пропуски заполняются только в столбцах, где они есть.
+"""
+from io import StringIO
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+import streamlit as st
+from src.data.datetimes import parse_datetimes
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def preprocess_dates_based_on_llm(df: pd.DataFrame, datetime_columns: list,
+                                  datetime_formats: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    Преобразует указанные столбцы в datetime.
+    Args:
+        df (pd.DataFrame): Исходный DataFrame.
+        datetime_columns (list): Список имен столбцов для преобразования.
+        datetime_formats (dict, optional): Известные форматы {столбец: формат}; подобранные
+            для остальных столбцов форматы добавляются в этот словарь.
+    Returns:
+        pd.DataFrame: DataFrame с преобразованными столбцами.
+    """
+    df_processed = df.copy(deep=False)
+    successfully_converted = []
+    if not datetime_columns:
+        logger.info("Список datetime-столбцов пуст. Преобразование не требуется.")
+        st.info("LLM не идентифицировала столбцы с датами для преобразования.")
+        return df_processed
+
+    logger.info(f"Начало обработки дат для столбцов: {datetime_columns}")
+    st.info(
+        f"LLM идентифицировала потенциальные столбцы с датами: {', '.join(datetime_columns)}. Начинается преобразование...")
+
+    for col in datetime_columns:
+        if col not in df_processed.columns:
+            logger.warning(f"Столбец '{col}', указанный LLM как datetime, не найден в DataFrame.")
+            st.warning(f"Столбец '{col}', указанный как datetime, не найден в данных.")
+            continue
+        try:
+            logger.debug(f"Преобразование столбца '{col}'...")
+            known_format = datetime_formats.get(col) if datetime_formats is not None else None
+            # Недействительные значения преобразуются в NaT
+            df_processed[col], used_format = parse_datetimes(df_processed[col], known_format)
+            if used_format and datetime_formats is not None:
+                datetime_formats[col] = used_format
+            successfully_converted.append(col)
+            logger.info(f"Столбец '{col}' успешно преобразован в datetime"
+                        f"{f' (формат {used_format})' if used_format else ''}.")
+            st.success(f"Столбец '{col}' успешно преобразован в datetime.")
+        except Exception as e:
+            logger.error(f"Не удалось преобразовать столбец '{col}' в datetime: {e}")
+            st.error(f"Не удалось преобразовать столбец '{col}' в datetime: {e}")
+
+    if successfully_converted:
+        success_msg = f"Преобразованы следующие столбцы в datetime: {', '.join(successfully_converted)}"
+        logger.info(success_msg)
+        st.success(success_msg)
+    else:
+        logger.info("Ни один из указанных столбцов не был успешно преобразован.")
+        st.info("Указанные столбцы не были преобразованы из-за ошибок.")
+
+    return df_processed
+
+
+def handle_missing_values_before_analysis(df: pd.DataFrame, metrics_plan_dict: dict) -> pd.DataFrame:
+    """
+    Обрабатывает пропущенные значения в DataFrame перед анализом/визуализацией.
+    Применяется только к столбцам, упомянутым в metrics_plan_dict.
+
+    Args:
+        df (pd.DataFrame): Исходный DataFrame.
+        metrics_plan_dict (dict): Словарь {столбец: [метрики]} от LLM.
+
+    Returns:
+        pd.DataFrame: DataFrame с обработанными пропусками.
+    """
+    if not metrics_plan_dict:
+        logger.info("План метрик пуст. Обработка пропусков не требуется.")
+        return df.copy(deep=False)
+
+    columns_to_process = list(metrics_plan_dict.keys())
+    logger.info(f"Начало обработки пропусков для столбцов: {columns_to_process}")
+    st.info(f"Начало обработки пропусков для столбцов, участвующих в анализе: {', '.join(columns_to_process)}")
+
+    present = []
+    for col in columns_to_process:
+        if col not in df.columns:
+            logger.warning(f"Столбец '{col}' из плана метрик не найден в DataFrame. Пропущен.")
+            st.warning(f"Столбец '{col}' из плана метрик не найден в данных. Пропущен.")
+            continue
+        present.append(col)
+
+    # 1. Удаление строк с пустыми значениями в datetime столбцах: одна общая маска и один фильтр
+    datetime_cols = [col for col in present if pd.api.types.is_datetime64_any_dtype(df[col].dtype)]
+    keep = np.ones(len(df), dtype=bool)
+    for col in datetime_cols:
+        column_keep = df[col].notna().to_numpy()
+        removed = int(np.count_nonzero(keep & ~column_keep))
+        keep &= column_keep
+        logger.info(f"Столбец '{col}' (datetime): удалено {removed} строк с NaT.")
+        st.info(f"✅ Столбец '{col}' (datetime): удалено {removed} строк с пропущенными датами.")
+    filtered = not keep.all()
+    # Отфильтрованный кадр - собственная копия, его можно заполнять на месте
+    df_handled = df[keep] if filtered else df.copy(deep=False)
+
+    # 2. Заполнение для остальных типов: значения собираются по столбцам и применяются одним fillna
+    fill_values = {}
+    for col in present:
+        if col in datetime_cols:
+            continue
+        # Столбец не сохраняется в переменной: ссылка на блок данных помешала бы заполнению на месте
+        dtype = df_handled[col].dtype
+        logger.debug(f"Обработка столбца '{col}' (тип: {dtype})")
+        if not df_handled[col].isna().any():
+            logger.debug(f"Столбец '{col}' не содержит пропусков.")
+            continue
+        if pd.api.types.is_numeric_dtype(dtype):
+            # Заполняем числовые столбцы 0
+            fill_values[col] = 0
+            logger.info(f"Столбец '{col}' (числовой): заполнены пропуски значением 0.")
+            st.info(f"✅ Столбец '{col}' (числовой): заполнены пропуски значением 0.")
+        else:
+            # Заполняем нечисловые столбцы 'нет данных'
+            fill_values[col] = 'нет данных'
+            if isinstance(dtype, pd.CategoricalDtype) and fill_values[col] not in dtype.categories:
+                df_handled[col] = df_handled[col].cat.add_categories([fill_values[col]])
+            logger.info(f"Столбец '{col}' (другой тип): заполнены пропуски значением 'нет данных'.")
+            st.info(f"Столбец '{col}' (другой тип): заполнены пропуски значением 'нет данных'.")
+    if fill_values:
+        if filtered:
+            df_handled.fillna(fill_values, inplace=True)
+        else:
+            df_handled = df_handled.fillna(fill_values)
+
+    logger.info("Обработка пропусков перед анализом завершена.")
+    st.success("Обработка пропусков для участвующих в анализе столбцов завершена.")
+    return df_handled
+
+
+def get_df_info(df, title="DataFrame"):
+    """Получает строковое представление информации о DataFrame для отладки."""
+    if df is None:
+        return f"{title} is None"
+    if df.empty:
+        return f"{title} is empty"
+    buffer = StringIO()
+    df.info(buf=buffer)
+    info_str = buffer.getvalue()
+    return (
+        f"--- {title} ---\n"
+        f"Shape: {df.shape}\n"
+        f"Columns: {list(df.columns)}\n"
+        f"Dtypes:\n{df.dtypes.to_string()}\n"
+        f"Head:\n{df.head(2).to_string()}\n"
+        f"Info:\n{info_str}\n"
+        f"-------------------\n"
+    )
@@ -0,0 +1,225 @@
+"""
+Сливаемые (mergeable) скетчи для приближенной статистики по потоку данных
+"""
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+
+class KLLSketch:
+    """
+    Квантильный скетч KLL (Karnin, Lang, Liberty).
+
+    Хранит O(k · log(n/k)) значений; ошибка ранга квантиля с высокой
+    вероятностью не превышает ~1.7/k (для k=200 - около 1% ранга).
+    Скетчи, построенные по частям данных, сливаются через `merge`.
+
+    Example:
+        sketch = KLLSketch(k=200)
+        sketch.update(np.array([1.0, 2.0, 3.0]))
+        sketch.quantiles([0.25, 0.5])
+    """
+
+    def __init__(self, k: int = 200, seed: Optional[int] = None):
+        self.k = k
+        self.n = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def rank_error(self) -> float:
+        """Оценка нормированной ошибки ранга."""
+        return 1.7 / self.k
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                buffer = np.sort(self.levels[level])
+                if len(buffer) % 2:
+                    self.levels[level] = buffer[-1:]
+                    buffer = buffer[:-1]
+                else:
+                    self.levels[level] = np.empty(0)
+                offset = int(self._rng.integers(2))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], buffer[offset::2]])
+            level += 1
+
+    def update(self, values: Iterable[float]) -> None:
+        """Добавляет пачку значений (NaN игнорируются)."""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        self.n += int(values.size)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: "KLLSketch") -> None:
+        """Сливает другой скетч в текущий."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+
+    def quantiles(self, qs: Iterable[float]) -> List[Optional[float]]:
+        """Приближенные квантили для долей qs (None для пустого скетча)."""
+        qs = list(qs)
+        if self.n == 0:
+            return [None] * len(qs)
+        if len(self.levels) == 1:
+            # Сжатий не было - скетч хранит все значения, квантили точные
+            return [float(v) for v in np.quantile(self.levels[0], qs)]
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lvl), 2 ** h, dtype=float) for h, lvl in enumerate(self.levels)])
+        order = np.argsort(items, kind="mergesort")
+        items, cumulative = items[order], np.cumsum(weights[order])
+        total = cumulative[-1]
+        positions = np.searchsorted(cumulative, np.asarray(qs, dtype=float) * total, side="left")
+        positions = np.clip(positions, 0, len(items) - 1)
+        return [float(items[p]) for p in positions]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Сериализуемое представление скетча."""
+        return {"k": self.k, "n": self.n, "levels": [lvl.tolist() for lvl in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "KLLSketch":
+        """Восстанавливает скетч из `to_dict`."""
+        sketch = cls(k=data["k"])
+        sketch.n = data["n"]
+        sketch.levels = [np.asarray(lvl, dtype=float) for lvl in data["levels"]] or [np.empty(0)]
+        return sketch
+
+
+def _hash64(values) -> np.ndarray:
+    """64-битные хэши значений (NaN/None пропускаются)."""
+    series = pd.Series(values)
+    series = series[series.notna()]
+    return pd.util.hash_pandas_object(series, index=False).to_numpy()
+
+
+class HyperLogLog:
+    """
+    Оценка числа различных значений HyperLogLog (Flajolet et al.).
+
+    Хранит 2^p однобайтовых регистров независимо от числа значений;
+    относительная стандартная ошибка - 1.04/sqrt(2^p) (для p=14 - около 0.8%).
+    Скетчи, построенные по частям данных, сливаются через `merge`.
+
+    Example:
+        hll = HyperLogLog(p=14)
+        hll.update(df["user_id"])
+        hll.estimate()
+    """
+
+    def __init__(self, p: int = 14):
+        if not 4 <= p <= 18:
+            raise ValueError(f"Точность HyperLogLog должна быть от 4 до 18, получено: {p}")
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    @property
+    def relative_error(self) -> float:
+        """Относительная стандартная ошибка оценки."""
+        return 1.04 / math.sqrt(self.m)
+
+    def update(self, values) -> None:
+        """Добавляет пачку значений (пропуски игнорируются)."""
+        hashes = _hash64(values)
+        if hashes.size == 0:
+            return
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        # Номер первой единицы в оставшихся битах: frexp дает точную длину числа в битах
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (64 - self.p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        """Сливает другой скетч той же точности."""
+        if other.p != self.p:
+            raise ValueError("Нельзя слить HyperLogLog разной точности.")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        """Оценка числа различных значений."""
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m ** 2 / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * self.m and zeros:
+            # Поправка для малых мощностей (linear counting)
+            return int(round(self.m * math.log(self.m / zeros)))
+        return int(round(raw))
+
+
+class SpaceSaving:
+    """
+    Сливаемая сводка частых значений (Misra-Gries / Space-Saving).
+
+    Хранит не более capacity счетчиков. Оценка частоты значения занижена
+    не более чем на error (сумма вычтенных порогов, error <= N/(capacity+1)),
+    поэтому значение с частотой больше N/(capacity+1) гарантированно
+    присутствует в сводке. Части обрабатываются векторно: счетчики части
+    складываются со сводкой, затем (capacity+1)-й по величине счетчик
+    вычитается из всех (слияние по Agarwal et al., Mergeable Summaries).
+
+    Example:
+        summary = SpaceSaving(capacity=1000)
+        summary.update(df["status"])
+        value, count = summary.mode()
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=float)
+        self.n = 0
+        self.error = 0.0
+
+    def _trim(self) -> None:
+        if len(self.counts) > self.capacity:
+            threshold = float(self.counts.nlargest(self.capacity + 1).iloc[-1])
+            self.counts = self.counts - threshold
+            self.counts = self.counts[self.counts > 0]
+            self.error += threshold
+
+    def update(self, values) -> None:
+        """Добавляет пачку значений (пропуски игнорируются)."""
+        chunk_counts = pd.Series(values).value_counts(dropna=True)
+        chunk_counts = chunk_counts[chunk_counts.to_numpy() > 0]
+        self.n += int(chunk_counts.sum())
+        self.counts = self.counts.add(chunk_counts.astype(float), fill_value=0.0)
+        self._trim()
+
+    def merge(self, other: "SpaceSaving") -> None:
+        """Сливает другую сводку."""
+        self.counts = self.counts.add(other.counts, fill_value=0.0)
+        self.n += other.n
+        self.error += other.error
+        self._trim()
+
+    def mode(self) -> Tuple[Any, Optional[int]]:
+        """
+        Самое частое значение и нижняя граница его частоты.
+
+        Истинная частота лежит в [count, count + error].
+        """
+        if self.counts.empty:
+            return None, None
+        top = self.counts.max()
+        tied = self.counts.index[self.counts.to_numpy() == top]
+        try:
+            value = min(tied)
+        except TypeError:
+            value = tied[0]
+        return value, int(top)
@@ -0,0 +1,181 @@
+"""
+Кэш статистик датасета: корреляционная матрица, describe() и число пропусков.
+
+Статистики считаются один раз на отпечаток датасета и используются всеми
+потребителями: страницами интерфейса, кодом графиков LLM и пайплайном.
+Запрос подмножества столбцов обслуживается срезом уже посчитанных
+статистик по всем столбцам (корреляция считается попарно, поэтому срез
+совпадает с расчетом по подмножеству).
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Hashable, Iterable, Optional, Tuple
+import numpy as np
+import pandas as pd
+from config.settings import STATS_CACHE_MAX_ENTRIES
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+@dataclass
+class DatasetStats:
+    """
+    Статистики датасета.
+
+    Attributes:
+        corr: Корреляционная матрица Пирсона по числовым столбцам
+        describe: Результат DataFrame.describe() по числовым столбцам
+        missing: Число пропусков по всем столбцам
+        rows: Число строк
+    """
+    corr: pd.DataFrame
+    describe: pd.DataFrame
+    missing: pd.Series
+    rows: int
+
+    def subset(self, columns: Iterable[str]) -> "DatasetStats":
+        """Статистики только для указанных столбцов."""
+        columns = list(columns)
+        numeric = [col for col in columns if col in self.corr.columns]
+        return DatasetStats(
+            corr=self.corr.loc[numeric, numeric],
+            describe=self.describe[[col for col in columns if col in self.describe.columns]],
+            missing=self.missing.reindex([col for col in columns if col in self.missing.index]),
+            rows=self.rows,
+        )
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Отпечаток содержимого DataFrame (столбцы, типы и хэш значений).
+
+    Используется, если у вызывающего кода нет более дешевого ключа
+    (например, отпечатка файла из DatasetStore).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((df.shape, list(map(str, df.columns)), list(map(str, df.dtypes)))).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _correlation(numeric: pd.DataFrame) -> pd.DataFrame:
+    """
+    Корреляция Пирсона; без пропусков - одним матричным произведением (np.corrcoef),
+    с пропусками - попарно, как pandas.
+    """
+    values = numeric.to_numpy(dtype=float, na_value=np.nan)
+    if numeric.shape[1] == 0 or np.isnan(values).any():
+        return numeric.corr()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        matrix = np.atleast_2d(np.corrcoef(values, rowvar=False))
+    return pd.DataFrame(matrix, index=numeric.columns, columns=numeric.columns)
+
+
+def compute_stats(df: pd.DataFrame) -> DatasetStats:
+    """Считает корреляцию, describe() и число пропусков датасета."""
+    numeric = df.select_dtypes(include="number")
+    describe = numeric.describe() if numeric.shape[1] else pd.DataFrame()
+    return DatasetStats(corr=_correlation(numeric), describe=describe, missing=df.isna().sum(), rows=len(df))
+
+
+class StatsCache:
+    """
+    LRU-кэш статистик по отпечатку датасета и набору столбцов.
+
+    Расчет можно запустить заранее в фоновом потоке (prefetch); запрос тех же
+    статистик до окончания расчета дожидается его, а не считает заново.
+
+    Example:
+        cache = get_stats_cache()
+        cache.prefetch(df, key=store_key)
+        corr = cache.get(df, key=store_key).corr
+    """
+
+    def __init__(self, max_entries: int = STATS_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Future]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stats")
+        self.computations = 0
+
+    def _compute(self, df: pd.DataFrame) -> DatasetStats:
+        stats = compute_stats(df)
+        with self._lock:
+            self.computations += 1
+        logger.info(f"Статистики датасета посчитаны: {df.shape}")
+        return stats
+
+    def _entry(self, df: pd.DataFrame, key: Optional[Hashable], columns: Optional[Iterable[str]],
+               background: bool) -> Tuple[Future, Optional[list]]:
+        """Запись кэша для (отпечаток, столбцы); создает ее при отсутствии."""
+        fingerprint = key if key is not None else frame_fingerprint(df)
+        columns = list(columns) if columns is not None else None
+        with self._lock:
+            full = self._entries.get((fingerprint, None))
+            if full is not None:
+                self._entries.move_to_end((fingerprint, None))
+                return full, columns
+            entry_key = (fingerprint, tuple(columns) if columns is not None else None)
+            future = self._entries.get(entry_key)
+            if future is not None:
+                self._entries.move_to_end(entry_key)
+                return future, None
+            frame = df[columns] if columns is not None else df
+            if background:
+                future = self._executor.submit(self._compute, frame)
+            else:
+                future = Future()
+            self._entries[entry_key] = future
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if not background:
+            try:
+                future.set_result(self._compute(frame))
+            except Exception as e:
+                future.set_exception(e)
+                with self._lock:
+                    self._entries.pop(entry_key, None)
+        return future, None
+
+    def get(self, df: pd.DataFrame, key: Optional[Hashable] = None,
+            columns: Optional[Iterable[str]] = None) -> DatasetStats:
+        """
+        Статистики датасета (из кэша или посчитанные сейчас).
+
+        Args:
+            df: DataFrame
+            key: Отпечаток датасета (по умолчанию - хэш содержимого df)
+            columns: Подмножество столбцов (None - все)
+
+        Returns:
+            DatasetStats
+        """
+        future, subset = self._entry(df, key, columns, background=False)
+        stats = future.result()
+        return stats.subset(subset) if subset is not None else stats
+
+    def prefetch(self, df: pd.DataFrame, key: Optional[Hashable] = None,
+                 columns: Optional[Iterable[str]] = None) -> None:
+        """Запускает расчет статистик в фоновом потоке, если их еще нет в кэше."""
+        self._entry(df, key, columns, background=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_stats_cache: Optional[StatsCache] = None
+_stats_cache_lock = threading.Lock()
+
+
+def get_stats_cache() -> StatsCache:
+    """Общий для процесса кэш статистик (страницы и сессии Streamlit работают в одном процессе)."""
+    global _stats_cache
+    with _stats_cache_lock:
+        if _stats_cache is None:
+            _stats_cache = StatsCache()
+        return _stats_cache
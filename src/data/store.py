@@ -0,0 +1,237 @@
+"""
+Хранилище датасета в рамках одного запуска анализа.
+
+Файл читается с диска один раз, а подготовленные кадры (после обработки дат
+и пропусков) кэшируются по ключу из отпечатка файла, списка datetime-столбцов
+и плана метрик. Этапы получают представление только для чтения.
+
+CSV больше MAX_FILE_SIZE_MB целиком не загружаются: хранилище работает в
+потоковом режиме и отдает выборку первых STREAMING_SAMPLE_ROWS строк, а
+метрики считаются по всему файлу в src.data.streaming.
+
+После анализа структуры типы исходного кадра сжимаются (src.data.dtypes),
+и все подготовленные кадры строятся уже по сжатому.
+
+Форматы дат, подобранные при преобразовании столбцов (src.data.datetimes),
+сохраняются в метаданных файла в колоночном кэше и при следующей загрузке
+той же версии файла не подбираются заново.
+"""
+import os
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+import pandas as pd
+from config.settings import MAX_FILE_SIZE_MB, STREAMING_SAMPLE_ROWS
+from src.data.dtypes import DtypeReport, optimize_dtypes
+from src.data.loader import (
+    load_dataframe_cached,
+    read_csv_sample,
+    read_dataset_metadata,
+    update_dataset_metadata,
+)
+from src.data.preprocessor import (
+    preprocess_dates_based_on_llm,
+    handle_missing_values_before_analysis,
+)
+from src.data.stats_cache import DatasetStats, get_stats_cache
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+def _freeze_plan(metrics_plan: Optional[Dict[str, list]]) -> Tuple:
+    """Преобразует план метрик в хэшируемый кортеж для ключа кэша."""
+    if not metrics_plan:
+        return ()
+    return tuple(sorted((str(col), tuple(metrics)) for col, metrics in metrics_plan.items()))
+
+
+def read_only_view(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Возвращает поверхностную копию DataFrame без копирования данных.
+
+    Изменения столбцов в представлении (присваивание, удаление) не
+    затрагивают кэшированный кадр; при включенном Copy-on-Write
+    это касается и изменений значений на месте.
+    """
+    return df.copy(deep=False)
+
+
+class DatasetStore:
+    """
+    Кэш датасета на один запуск анализа.
+
+    Example:
+        store = DatasetStore(file_path="data.csv")
+        df_raw = store.raw()
+        df_ready = store.prepared(["date"], {"price": ["mean"]})
+        corr = store.stats(["date"], {"price": ["mean"]}).corr
+    """
+
+    def __init__(self, file_path: Optional[str] = None, uploaded_file=None):
+        self.file_path = file_path
+        self.uploaded_file = uploaded_file
+        self._raw: Optional[pd.DataFrame] = None
+        self._raw_key: Optional[Tuple] = None
+        self._prepared: Dict[Hashable, pd.DataFrame] = {}
+        self._type_hints: Optional[Dict[str, str]] = None
+        self.dtype_report: Optional[DtypeReport] = None
+        self.datetime_formats: Dict[str, str] = {}
+        self.loads = 0
+
+    def fingerprint(self) -> Tuple:
+        """
+        Отпечаток источника: путь, время изменения и размер файла.
+
+        Для загруженного через Streamlit файла используются имя и размер.
+        """
+        if self.uploaded_file is not None:
+            size = getattr(self.uploaded_file, "size", None)
+            return ("upload", self.uploaded_file.name, size)
+        if not self.file_path:
+            raise ValueError("Путь к файлу или загруженный файл не указаны.")
+        stat = os.stat(self.file_path)
+        return (os.path.abspath(self.file_path), stat.st_mtime_ns, stat.st_size)
+
+    @property
+    def streaming(self) -> bool:
+        """True, если файл - CSV больше MAX_FILE_SIZE_MB (потоковый режим)."""
+        if self.uploaded_file is not None or not self.file_path:
+            return False
+        if not self.file_path.endswith(".csv"):
+            return False
+        return os.path.getsize(self.file_path) > MAX_FILE_SIZE_MB * 1024 * 1024
+
+    def _ensure_raw(self) -> pd.DataFrame:
+        key = self.fingerprint()
+        if self._raw is None or key != self._raw_key:
+            if self._raw is not None:
+                logger.info("Файл изменился с момента загрузки, кэш датасета сброшен.")
+            self._prepared.clear()
+            if self.uploaded_file is not None:
+                self.uploaded_file.seek(0)
+            if self.streaming:
+                logger.info(f"Файл больше {MAX_FILE_SIZE_MB} МБ: потоковый режим, "
+                            f"в память загружается выборка из {STREAMING_SAMPLE_ROWS} строк.")
+                self._raw = read_csv_sample(self.file_path, STREAMING_SAMPLE_ROWS)
+            else:
+                self._raw = load_dataframe_cached(self.file_path, self.uploaded_file)
+            self.datetime_formats = self._stored_datetime_formats()
+            self._raw_key = key
+            self.loads += 1
+            logger.info(f"Датасет загружен в хранилище: {self._raw.shape}")
+            if self._type_hints is not None:
+                self._raw, self.dtype_report = optimize_dtypes(self._raw, self._type_hints)
+        return self._raw
+
+    def _stored_datetime_formats(self) -> Dict[str, str]:
+        """Форматы дат из метаданных колоночного кэша (для потокового режима кэша нет)."""
+        if self.streaming:
+            return {}
+        try:
+            return dict(read_dataset_metadata(self.file_path, self.uploaded_file).get("datetime_formats", {}))
+        except OSError as e:
+            logger.warning(f"Не удалось прочитать метаданные датасета: {e}")
+            return {}
+
+    def optimize_dtypes(self, type_hints: Optional[Dict[str, str]] = None) -> DtypeReport:
+        """
+        Сжимает типы исходного кадра (src.data.dtypes.optimize_dtypes).
+
+        Подготовленные кадры сбрасываются; при перезагрузке измененного файла
+        сжатие повторяется с теми же подсказками.
+
+        Args:
+            type_hints: Подсказки видов столбцов {столбец: вид}
+
+        Returns:
+            DtypeReport с памятью до и после сжатия
+        """
+        hints = dict(type_hints or {})
+        raw = self._ensure_raw()
+        if self._type_hints == hints and self.dtype_report is not None:
+            return self.dtype_report
+        self._type_hints = hints
+        self._raw, self.dtype_report = optimize_dtypes(raw, hints)
+        self._prepared.clear()
+        return self.dtype_report
+
+    def raw(self) -> pd.DataFrame:
+        """Исходный DataFrame (представление только для чтения)."""
+        return read_only_view(self._ensure_raw())
+
+    def prepared(self, datetime_candidates: Optional[Iterable[str]] = None,
+                 metrics_plan: Optional[Dict[str, list]] = None) -> pd.DataFrame:
+        """
+        DataFrame после обработки дат и (если передан план метрик) пропусков.
+
+        Args:
+            datetime_candidates: Столбцы для преобразования в datetime
+            metrics_plan: План метрик {столбец: [метрики]}
+
+        Returns:
+            Подготовленный DataFrame (представление только для чтения)
+        """
+        raw = self._ensure_raw()
+        candidates = tuple(datetime_candidates or ())
+        plan_key = _freeze_plan(metrics_plan)
+        key = (self._raw_key, candidates, plan_key)
+        if key not in self._prepared:
+            dates_key = (self._raw_key, candidates, ())
+            if dates_key not in self._prepared:
+                df = raw
+                if candidates:
+                    known_formats = dict(self.datetime_formats)
+                    df = preprocess_dates_based_on_llm(raw, list(candidates), self.datetime_formats)
+                    if self.datetime_formats != known_formats and not self.streaming:
+                        update_dataset_metadata({"datetime_formats": self.datetime_formats},
+                                                self.file_path, self.uploaded_file)
+                self._prepared[dates_key] = df
+            df = self._prepared[dates_key]
+            if plan_key:
+                df = handle_missing_values_before_analysis(df, metrics_plan)
+            self._prepared[key] = df
+        else:
+            logger.debug("Подготовленный датасет взят из кэша.")
+        return read_only_view(self._prepared[key])
+
+    def frame_key(self, datetime_candidates: Optional[Iterable[str]] = None,
+                  metrics_plan: Optional[Dict[str, list]] = None) -> Tuple:
+        """
+        Ключ содержимого подготовленного кадра для публикации процессам (src.utils.frame_transport).
+
+        prepared() каждый раз возвращает новое представление, поэтому публикации
+        одного и того же подготовленного кадра сопоставляются по этому ключу.
+        """
+        self._ensure_raw()
+        return ("dataset", self._raw_key, tuple(datetime_candidates or ()), _freeze_plan(metrics_plan))
+
+    def stats(self, datetime_candidates: Optional[Iterable[str]] = None,
+              metrics_plan: Optional[Dict[str, list]] = None,
+              background: bool = False) -> Optional[DatasetStats]:
+        """
+        Статистики подготовленного DataFrame из общего кэша (src.data.stats_cache).
+
+        Ключ кэша строится из отпечатка файла и параметров подготовки,
+        поэтому содержимое кадра повторно не хэшируется.
+
+        Args:
+            datetime_candidates: Столбцы для преобразования в datetime
+            metrics_plan: План метрик {столбец: [метрики]}
+            background: Только запустить расчет в фоновом потоке и вернуть None
+
+        Returns:
+            DatasetStats или None при background=True
+        """
+        df = self.prepared(datetime_candidates, metrics_plan)
+        key = self.frame_key(datetime_candidates, metrics_plan)
+        if background:
+            get_stats_cache().prefetch(df, key=key)
+            return None
+        return get_stats_cache().get(df, key=key)
+
+    def clear(self) -> None:
+        """Освобождает все закэшированные кадры."""
+        self._raw = None
+        self._raw_key = None
+        self._prepared.clear()
+        self.dtype_report = None
+        self.datetime_formats = {}
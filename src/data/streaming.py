@@ -0,0 +1,410 @@
+"""
+Потоковый расчет метрик по CSV, не помещающимся в память.
+
+Файл читается частями; для каждого столбца поддерживаются сливаемые
+аккумуляторы (моменты, минимум/максимум, квантильный скетч, HyperLogLog,
+таблица частот), поэтому стандартный набор метрик из METRICS_PLAN_PROMPT
+считается за один проход с ограниченным потреблением памяти. Таблица частот
+строится только для моды и дат, nunique без нее - оценка HyperLogLog.
+"""
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import numpy as np
+import pandas as pd
+from config.settings import (
+    HLL_PRECISION,
+    STREAMING_CHUNK_ROWS,
+    STREAMING_MAX_DISTINCT,
+    QUANTILE_SKETCH_K,
+)
+from src.data.datetimes import parse_datetimes
+from src.data.loader import detect_csv_format
+from src.data.sketches import HyperLogLog, KLLSketch
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+NUMERIC_METRICS = [
+    "count", "mean", "median", "mode", "std", "var", "min", "max",
+    "quantile_25", "quantile_75", "quantile_90", "quantile_95",
+    "skew", "kurtosis", "iqr",
+]
+CATEGORICAL_METRICS = ["count", "nunique", "mode", "mode_count", "mode_rel_freq"]
+DATETIME_METRICS = ["count", "min_date", "max_date", "date_range_days", "unique_dates", "dates_per_month"]
+MODE_METRICS = {"mode", "mode_count", "mode_rel_freq"}
+# Метрики, которые аккумуляторы считают точно (моменты, границы, таблица дней);
+# квантили (KLL), nunique (HyperLogLog) и мода (усекаемая таблица частот) могут быть приближенными
+EXACT_METRICS = {"count", "mean", "std", "var", "min", "max", "skew", "kurtosis",
+                 "min_date", "max_date", "date_range_days", "unique_dates", "dates_per_month"}
+
+_QUANTILE_RE = re.compile(r"^quantile_(\d{1,2})$")
+
+
+def quantile_level(metric: str) -> Optional[float]:
+    """Доля для метрик вида quantile_NN и median, иначе None."""
+    if metric == "median":
+        return 0.5
+    match = _QUANTILE_RE.match(metric)
+    return int(match.group(1)) / 100 if match else None
+
+
+class MomentAccumulator:
+    """
+    Сливаемые центральные моменты до 4-го порядка (формулы Chan/Pébay).
+
+    Оценки skew и kurtosis совпадают с pandas (несмещенные, эксцесс).
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.m3 = 0.0
+        self.m4 = 0.0
+        self.min = None
+        self.max = None
+
+    def update(self, values: np.ndarray) -> None:
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        other = MomentAccumulator()
+        other.n = int(values.size)
+        other.mean = float(values.mean())
+        delta = values - other.mean
+        delta2 = delta * delta
+        other.m2 = float(delta2.sum())
+        other.m3 = float((delta2 * delta).sum())
+        other.m4 = float((delta2 * delta2).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        self.merge(other)
+
+    def merge(self, other: "MomentAccumulator") -> None:
+        if other.n == 0:
+            return
+        if self.n == 0:
+            self.__dict__.update(other.__dict__)
+            return
+        na, nb = self.n, other.n
+        n = na + nb
+        delta = other.mean - self.mean
+        delta2 = delta * delta
+        m2 = self.m2 + other.m2 + delta2 * na * nb / n
+        m3 = (self.m3 + other.m3 + delta2 * delta * na * nb * (na - nb) / n ** 2
+              + 3 * delta * (na * other.m2 - nb * self.m2) / n)
+        m4 = (self.m4 + other.m4
+              + delta2 * delta2 * na * nb * (na * na - na * nb + nb * nb) / n ** 3
+              + 6 * delta2 * (na * na * other.m2 + nb * nb * self.m2) / n ** 2
+              + 4 * delta * (na * other.m3 - nb * self.m3) / n)
+        self.mean += delta * nb / n
+        self.n, self.m2, self.m3, self.m4 = n, m2, m3, m4
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def var(self) -> Optional[float]:
+        return self.m2 / (self.n - 1) if self.n > 1 else None
+
+    @property
+    def std(self) -> Optional[float]:
+        var = self.var
+        return float(np.sqrt(var)) if var is not None else None
+
+    @property
+    def skew(self) -> Optional[float]:
+        n = self.n
+        if n < 3 or self.m2 == 0:
+            return None
+        g1 = np.sqrt(n) * self.m3 / self.m2 ** 1.5
+        return float(np.sqrt(n * (n - 1)) / (n - 2) * g1)
+
+    @property
+    def kurtosis(self) -> Optional[float]:
+        n = self.n
+        if n < 4 or self.m2 == 0:
+            return None
+        g2 = n * self.m4 / self.m2 ** 2 - 3
+        return float(((n + 1) * g2 + 6) * (n - 1) / ((n - 2) * (n - 3)))
+
+
+class FrequencyTable:
+    """
+    Сливаемая таблица частот с ограничением на число различных значений.
+
+    Пока число значений не превышает max_items, счетчики точные. При
+    переполнении остаются самые частые значения, и таблица помечается
+    как неточная: nunique становится нижней границей, mode - оценкой.
+    """
+
+    def __init__(self, max_items: int = STREAMING_MAX_DISTINCT):
+        self.max_items = max_items
+        self.counts = pd.Series(dtype="int64")
+        self.exact = True
+
+    def update(self, values: pd.Series) -> None:
+        counts = values.value_counts(dropna=True)
+        counts = counts[counts.to_numpy() > 0]  # у category value_counts включает значения с нулевой частотой
+        if isinstance(counts.index, pd.CategoricalIndex):
+            counts.index = counts.index.astype(object)
+        self._add(counts)
+
+    def merge(self, other: "FrequencyTable") -> None:
+        self.exact = self.exact and other.exact
+        self._add(other.counts)
+
+    def _add(self, counts: pd.Series) -> None:
+        # Счетчики складываются векторно по индексу значений
+        if self.counts.empty:
+            self.counts = counts.astype("int64")
+        elif not counts.empty:
+            self.counts = self.counts.add(counts, fill_value=0).astype("int64")
+        if len(self.counts) > self.max_items:
+            self.counts = self.counts.nlargest(self.max_items // 2)
+            self.exact = False
+
+    @property
+    def nunique(self) -> int:
+        return len(self.counts)
+
+    def mode(self):
+        if self.counts.empty:
+            return None, None
+        value = self.counts.idxmax()
+        return value, int(self.counts[value])
+
+
+class ColumnAccumulator:
+    """
+    Аккумулятор метрик одного столбца (numeric, categorical или datetime).
+
+    Таблица частот ведется только для дат и при запрошенной моде, HyperLogLog -
+    при запрошенном nunique; metrics=None - стандартный набор метрик типа.
+    """
+
+    def __init__(self, kind: str, sketch_k: int = QUANTILE_SKETCH_K, metrics: Optional[Iterable[str]] = None):
+        self.kind = kind
+        self.count = 0
+        requested = set(metrics or _default_metrics(kind))
+        self.moments = MomentAccumulator() if kind == "numeric" else None
+        self.sketch = KLLSketch(k=sketch_k) if kind == "numeric" else None
+        self.frequencies = FrequencyTable() if kind == "datetime" or requested & MODE_METRICS else None
+        self.hll = HyperLogLog(HLL_PRECISION) if kind != "datetime" and "nunique" in requested else None
+        self.datetime_format: Optional[str] = None
+
+    def update(self, series: pd.Series) -> None:
+        if self.kind == "numeric":
+            values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+            self.moments.update(values)
+            self.sketch.update(values)
+            self.count += int((~np.isnan(values)).sum())
+            self._update_distinct(pd.Series(values))
+        elif self.kind == "datetime":
+            # Формат подбирается по первой части и используется для остальных
+            dates, fmt = parse_datetimes(series, getattr(self, "datetime_format", None))
+            self.datetime_format = fmt
+            dates = dates.dropna()
+            self.count += len(dates)
+            self.frequencies.update(dates.dt.normalize())
+        else:
+            non_null = series.dropna()
+            self.count += len(non_null)
+            self._update_distinct(non_null)
+
+    def _update_distinct(self, values: pd.Series) -> None:
+        if self.frequencies is not None:
+            self.frequencies.update(values)
+        if self.hll is not None:
+            self.hll.update(values)
+
+    def merge(self, other: "ColumnAccumulator") -> None:
+        if other.kind != self.kind:
+            raise ValueError(f"Нельзя слить аккумуляторы разных типов: {self.kind} и {other.kind}")
+        self.datetime_format = getattr(self, "datetime_format", None) or getattr(other, "datetime_format", None)
+        self.count += other.count
+        if self.moments is not None:
+            self.moments.merge(other.moments)
+            self.sketch.merge(other.sketch)
+        if self.frequencies is not None and other.frequencies is not None:
+            self.frequencies.merge(other.frequencies)
+        if self.hll is not None and other.hll is not None:
+            self.hll.merge(other.hll)
+
+    def result(self, metrics: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Значения запрошенных метрик (неподдерживаемые метрики пропускаются)."""
+        metrics = list(metrics or _default_metrics(self.kind))
+        values = self._compute(metrics)
+        skipped = [m for m in metrics if m not in values]
+        if skipped:
+            logger.debug(f"Метрики не поддерживаются в потоковом режиме: {skipped}")
+        result = {m: values[m] for m in metrics if m in values}
+        errors = self._approx_errors([m for m in metrics if m in values])
+        if errors:
+            result["approx_errors"] = errors
+        return result
+
+    def _approx_errors(self, metrics: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Методы и границы ошибок метрик, посчитанных приближенно (формат metrics_engine)."""
+        errors: Dict[str, Dict[str, Any]] = {}
+        if self.kind == "numeric" and len(self.sketch.levels) > 1:
+            bound = {"method": "KLL", "rank_error": round(self.sketch.rank_error, 4)}
+            errors.update({m: bound for m in metrics if quantile_level(m) is not None or m == "iqr"})
+        if self.frequencies is not None and not self.frequencies.exact:
+            bound = {"method": "усеченная таблица частот", "lower_bound": True}
+            errors.update({m: bound for m in metrics if m in ("unique_dates", "mode", "mode_count",
+                                                              "mode_rel_freq", "dates_per_month")})
+        if "nunique" in metrics and not self._exact_nunique():
+            errors["nunique"] = {"method": "HyperLogLog", "relative_std_error": round(self.hll.relative_error, 4)}
+        return errors
+
+    def _exact_nunique(self) -> bool:
+        """nunique берется из точной таблицы частот, иначе - оценка HyperLogLog."""
+        return self.hll is None or (self.frequencies is not None and self.frequencies.exact)
+
+    def _compute(self, metrics: List[str]) -> Dict[str, Any]:
+        values: Dict[str, Any] = {"count": self.count}
+        if self.kind == "datetime":
+            days = self.frequencies.counts.sort_index()
+            if len(days):
+                min_date, max_date = days.index[0], days.index[-1]
+                # Как в metrics_engine: строк в месяц, месяцы без дат в диапазоне считаются с нулем
+                months = days.resample("MS").sum()
+                values.update({
+                    "min_date": str(min_date),
+                    "max_date": str(max_date),
+                    "date_range_days": int((max_date - min_date).days),
+                    "unique_dates": self.frequencies.nunique,
+                    "dates_per_month": float(months.mean()),
+                })
+            return values
+
+        if self._exact_nunique():
+            nunique = self.frequencies.nunique if self.frequencies is not None else None
+        else:
+            nunique = min(self.hll.estimate(), self.count)
+        mode_value, mode_count = self.frequencies.mode() if self.frequencies is not None else (None, None)
+        values.update({
+            "nunique": nunique,
+            "mode": mode_value.item() if isinstance(mode_value, np.generic) else mode_value,
+            "mode_count": mode_count,
+            "mode_rel_freq": mode_count / self.count if self.count and mode_count else None,
+        })
+        if self.kind != "numeric":
+            return values
+
+        moments = self.moments
+        values.update({
+            "mean": moments.mean if moments.n else None,
+            "std": moments.std,
+            "var": moments.var,
+            "min": moments.min,
+            "max": moments.max,
+            "skew": moments.skew,
+            "kurtosis": moments.kurtosis,
+        })
+        levels = {m: quantile_level(m) for m in metrics + ["quantile_25", "quantile_75"]}
+        levels = {m: q for m, q in levels.items() if q is not None}
+        quantiles = dict(zip(levels, self.sketch.quantiles(levels.values())))
+        values.update(quantiles)
+        if quantiles.get("quantile_25") is not None:
+            values["iqr"] = quantiles["quantile_75"] - quantiles["quantile_25"]
+        return values
+
+
+def is_exact_plan(metrics_plan: Optional[Dict[str, List[str]]]) -> bool:
+    """True, если все метрики плана аккумуляторы считают точно (см. EXACT_METRICS)."""
+    return bool(metrics_plan) and all(set(metrics) <= EXACT_METRICS for metrics in metrics_plan.values())
+
+
+def _default_metrics(kind: str) -> List[str]:
+    if kind == "numeric":
+        return NUMERIC_METRICS
+    if kind == "datetime":
+        return DATETIME_METRICS
+    return CATEGORICAL_METRICS
+
+
+def _column_kind(series: pd.Series, datetime_columns: Iterable[str]) -> str:
+    if series.name in datetime_columns or pd.api.types.is_datetime64_any_dtype(series):
+        return "datetime"
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return "numeric"
+    return "categorical"
+
+
+def iter_csv_chunks(file_path: str, chunksize: int = STREAMING_CHUNK_ROWS,
+                    csv_format: Optional[Dict[str, str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Читает CSV частями по chunksize строк.
+
+    Args:
+        file_path: Путь к CSV файлу
+        chunksize: Число строк в части
+        csv_format: Кодировка и разделитель (по умолчанию определяются по выборке)
+    """
+    csv_format = csv_format or detect_csv_format(file_path)
+    with pd.read_csv(file_path, encoding=csv_format["encoding"], sep=csv_format["delimiter"],
+                     chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def accumulate_chunks(chunks: Iterable[pd.DataFrame],
+                      datetime_columns: Optional[Iterable[str]] = None,
+                      columns: Optional[Iterable[str]] = None,
+                      counter: Optional[Dict[str, int]] = None,
+                      metrics_plan: Optional[Dict[str, List[str]]] = None) -> Dict[str, ColumnAccumulator]:
+    """
+    Строит аккумуляторы по последовательности частей DataFrame.
+
+    Тип столбца (numeric/categorical/datetime) определяется по первой части;
+    по metrics_plan выбираются структуры аккумулятора (таблица частот только
+    для моды). Если задан counter, в counter["rows"] записывается число
+    прочитанных строк.
+    """
+    datetime_columns = set(datetime_columns or ())
+    accumulators: Dict[str, ColumnAccumulator] = {}
+    rows = 0
+    for chunk in chunks:
+        selected = [c for c in (columns or chunk.columns) if c in chunk.columns]
+        for col in selected:
+            if col not in accumulators:
+                accumulators[col] = ColumnAccumulator(_column_kind(chunk[col], datetime_columns),
+                                                      metrics=metrics_plan.get(col) if metrics_plan else None)
+            accumulators[col].update(chunk[col])
+        rows += len(chunk)
+    logger.info(f"Потоковый проход завершен: {rows} строк, {len(accumulators)} столбцов.")
+    if counter is not None:
+        counter["rows"] = rows
+    return accumulators
+
+
+def compute_streaming_metrics(file_path: str,
+                              metrics_plan: Optional[Dict[str, List[str]]] = None,
+                              datetime_columns: Optional[Iterable[str]] = None,
+                              chunksize: int = STREAMING_CHUNK_ROWS,
+                              counter: Optional[Dict[str, int]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Считает метрики по CSV за один потоковый проход.
+
+    Args:
+        file_path: Путь к CSV файлу
+        metrics_plan: План метрик {столбец: [метрики]}; если не задан -
+            стандартный набор для всех столбцов
+        datetime_columns: Столбцы, которые нужно трактовать как даты
+        chunksize: Число строк в части
+        counter: Если задан, в counter["rows"] записывается число строк файла
+
+    Returns:
+        Словарь {столбец: {метрика: значение}}; квантили - приближенные
+        (KLL-скетч), nunique без моды - оценка HyperLogLog, mad не
+        поддерживается (требует второго прохода)
+    """
+    columns = list(metrics_plan) if metrics_plan else None
+    accumulators = accumulate_chunks(iter_csv_chunks(file_path, chunksize), datetime_columns, columns, counter,
+                                     metrics_plan)
+    results = {}
+    for col, accumulator in accumulators.items():
+        plan_metrics = metrics_plan.get(col) if metrics_plan else None
+        results[col] = accumulator.result(plan_metrics)
+    return results
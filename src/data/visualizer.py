@@ -0,0 +1,246 @@
+"""
+Генерация и выполнение визуализаций: разбиение плана графиков на группы
+и параллельное построение графиков в пуле процессов
+"""
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import pandas as pd
+from config.settings import (
+    CODE_EXECUTION_TIMEOUT,
+    DEFAULT_NUM_PLOTS,
+    PLOT_WORKERS,
+    VIZ_PLOTS_PER_GROUP,
+)
+from src.data.downsampling import PLOT_HELPERS
+from src.data.stats_cache import DatasetStats
+from src.utils.code_executor import CodeExecutor
+from src.utils.code_validator import validate_code
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Маркер начала графика в сгенерированном коде: "# График 3: ..."
+PLOT_MARKER_PATTERN = re.compile(r"^[ \t]*#+[ \t]*График[ \t]*(\d+)", re.IGNORECASE | re.MULTILINE)
+
+
+def plot_group_count(num_plots: Optional[int] = None, group_size: Optional[int] = None) -> int:
+    """Число групп графиков, на которое разбивается план из num_plots графиков."""
+    num_plots = num_plots or DEFAULT_NUM_PLOTS
+    group_size = max(1, group_size or VIZ_PLOTS_PER_GROUP)
+    return math.ceil(num_plots / group_size)
+
+
+def split_plot_plan(plot_plan: List[Dict[str, Any]], num_plots: Optional[int] = None,
+                    group_size: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+    """
+    Разбивает план графиков на группы для параллельной генерации кода.
+
+    Графики сверх num_plots отбрасываются; число групп не превышает
+    plot_group_count(num_plots, group_size), и группы получаются примерно равными.
+
+    Args:
+        plot_plan: План графиков (см. parse_plot_plan_response)
+        num_plots: Сколько графиков строить (по умолчанию DEFAULT_NUM_PLOTS)
+        group_size: Графиков в группе (по умолчанию VIZ_PLOTS_PER_GROUP)
+
+    Returns:
+        Список групп графиков
+    """
+    num_plots = num_plots or DEFAULT_NUM_PLOTS
+    plot_plan = plot_plan[:num_plots]
+    if not plot_plan:
+        return []
+    groups_count = min(plot_group_count(num_plots, group_size), len(plot_plan))
+    base, extra = divmod(len(plot_plan), groups_count)
+    groups, start = [], 0
+    for index in range(groups_count):
+        size = base + (1 if index < extra else 0)
+        groups.append(plot_plan[start:start + size])
+        start += size
+    return groups
+
+
+def format_plot_specs(group: List[Dict[str, Any]]) -> str:
+    """Форматирует группу графиков для промпта генерации кода."""
+    return "\n".join(
+        f"График {plot['number']}: {plot['type']} | {', '.join(plot['columns'])} | {plot['idea']}".rstrip(" |")
+        for plot in group
+    )
+
+
+def split_plot_code(code: str) -> Tuple[str, List[Tuple[int, str]]]:
+    """
+    Разбивает сгенерированный код визуализации по маркерам "# График N:".
+
+    Args:
+        code: Код визуализации
+
+    Returns:
+        Кортеж (общая преамбула до первого маркера, [(номер графика, код графика), ...]).
+        Если маркеров нет, весь код возвращается одним фрагментом с номером 0.
+    """
+    markers = list(PLOT_MARKER_PATTERN.finditer(code))
+    if not markers:
+        return "", [(0, code)]
+    preamble = code[:markers[0].start()]
+    snippets = []
+    for index, marker in enumerate(markers):
+        end = markers[index + 1].start() if index + 1 < len(markers) else len(code)
+        snippets.append((int(marker.group(1)), code[marker.start():end]))
+    return preamble, snippets
+
+
+@dataclass
+class PlotResult:
+    """Результат построения одного графика."""
+    number: int
+    ok: bool
+    output: str = ""
+    error: Optional[str] = None
+    duration: float = 0.0
+    peak_rss_mb: Optional[float] = None
+    rewrites: List[str] = field(default_factory=list)
+
+
+# Состояние процесса-исполнителя: DataFrame и матрица корреляций подключаются один раз
+_worker_df: Optional[pd.DataFrame] = None
+_worker_corr: Optional[pd.DataFrame] = None
+
+
+def plot_namespace(corr: Optional[pd.DataFrame], df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Имена для кода графиков в процессе-исполнителе (CodeExecutor namespace_factory).
+
+    Функции прореживания (sample_for_scatter, decimate_for_line, binned_hist)
+    и corr_matrix доступны коду без импорта.
+
+    Args:
+        corr: Матрица корреляций из кэша статистик (None - считается по df)
+        df: Подключенный DataFrame
+
+    Returns:
+        Словарь имен для пространства имен кода
+    """
+    global _worker_df, _worker_corr
+    _worker_df, _worker_corr = df, corr
+    return {"corr_matrix": corr_matrix, **PLOT_HELPERS}
+
+
+def corr_matrix(columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Корреляционная матрица числовых столбцов df для кода графиков.
+
+    Берется из кэша статистик, посчитанного в основном процессе; если его
+    нет, считается по df процесса.
+
+    Args:
+        columns: Подмножество столбцов (None - все числовые)
+
+    Returns:
+        Корреляционная матрица
+    """
+    corr = _worker_corr
+    if corr is None:
+        corr = _worker_df.select_dtypes(include="number").corr()
+    if columns is None:
+        return corr.copy()
+    columns = [col for col in columns if col in corr.columns]
+    return corr.loc[columns, columns].copy()
+
+
+class PlotRenderer:
+    """
+    Параллельное построение графиков в пуле процессов с бэкендом Agg.
+
+    Графики выполняются процессами src.utils.code_executor.CodeExecutor:
+    подготовленный DataFrame публикуется один раз (src.utils.frame_transport),
+    каждый процесс отображает его в память без копирования; задачи передают
+    только код графика. Ошибка в одном графике не влияет на остальные, а
+    график, превысивший время, прерывается: его процесс завершается и заменяется.
+    Код каждого графика перед выполнением проверяется (src.utils.code_validator):
+    график с запрещенными импортами не строится, медленные шаблоны переписываются.
+
+    Если передан ключ кадра (DatasetStore.frame_key), уже опубликованный для
+    выполнения кода файл переиспользуется, а не записывается повторно.
+
+    Если переданы статистики датасета (src.data.stats_cache), корреляционная
+    матрица передается процессам вместе с DataFrame и доступна коду графиков
+    через corr_matrix() без повторного расчета.
+
+    Example:
+        with PlotRenderer(df, stats=store.stats(), frame_key=store.frame_key()) as renderer:
+            results = renderer.render(viz_code, required_imports=["import seaborn as sns"])
+    """
+
+    def __init__(self, df: pd.DataFrame, max_workers: Optional[int] = None,
+                 timeout: float = CODE_EXECUTION_TIMEOUT, stats: Optional[DatasetStats] = None,
+                 frame_key: Optional[Hashable] = None):
+        self.timeout = timeout
+        workers = max_workers or PLOT_WORKERS
+        self._executor = CodeExecutor(
+            workers=workers,
+            timeout=timeout,
+            namespace_factory=partial(plot_namespace, stats.corr if stats is not None else None),
+        )
+        # По ключу кадра (DatasetStore.frame_key) переиспользуется публикация этапа выполнения кода
+        self.frame = self._executor.publish(df, frame_key)
+        self.frame_path = self.frame.path
+        # Потоки только ожидают процессы: запуски графиков идут параллельно по свободным процессам
+        self._threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plots")
+
+    def _run_plot(self, number: int, code: str) -> PlotResult:
+        result = self._executor.run(code, self.frame, stage=f"график {number}")
+        return PlotResult(number, result.ok, result.output, result.error, result.duration, result.peak_rss_mb)
+
+    def render(self, code: str, required_imports: Optional[List[str]] = None) -> List[PlotResult]:
+        """
+        Строит графики из кода визуализации, по одному графику на задачу.
+
+        Args:
+            code: Код визуализации с маркерами "# График N:"
+            required_imports: Строки импорта, добавляемые перед кодом каждого графика
+
+        Returns:
+            Результаты по графикам в порядке номеров
+        """
+        preamble, snippets = split_plot_code(code)
+        results = []
+        futures = {}
+        rewrites = {}
+        for number, snippet in snippets:
+            validation = validate_code(preamble + snippet, f"график {number}")
+            if not validation.ok:
+                results.append(PlotResult(number, False, error=f"Код отклонен проверкой: {'; '.join(validation.errors)}"))
+                continue
+            rewrites[number] = [str(rewrite) for rewrite in validation.rewrites]
+            plot_code = "\n".join(list(required_imports or []) + [validation.code])
+            futures[self._threads.submit(self._run_plot, number, plot_code)] = number
+        # Каждый запуск ограничен по времени в CodeExecutor.run, поэтому ожидание конечно
+        for future, number in futures.items():
+            try:
+                result = future.result()
+            except Exception as e:
+                result = PlotResult(number, False, error=f"{type(e).__name__}: {e}")
+            result.rewrites = rewrites[number]
+            results.append(result)
+        failed = sum(1 for result in results if not result.ok)
+        peaks = [result.peak_rss_mb for result in results if result.peak_rss_mb is not None]
+        logger.info(f"Построено графиков: {len(results) - failed} из {len(results)}"
+                    f"{f', пик памяти процесса {max(peaks):.0f} МБ' if peaks else ''}")
+        return sorted(results, key=lambda result: result.number)
+
+    def close(self) -> None:
+        """Завершает процессы (не дожидаясь выполняющихся графиков) и освобождает публикацию DataFrame."""
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        self._executor.close(kill=True)
+        self.frame.release()
+
+    def __enter__(self) -> "PlotRenderer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,305 @@
+"""
+Бюджет размера промптов.
+
+Время prefill локальной модели растет линейно с длиной промпта, а на
+широких таблицах полный вывод metrics_results не помещается в контекст.
+Модуль оценивает число токенов по разделам промпта, сжимает метрики в
+плотные таблицы (округление, удаление метрик, выводимых из других) и при
+превышении бюджета оставляет самые информативные столбцы.
+"""
+import math
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.prompts import PromptTemplate
+from config.settings import PROMPT_MAX_LIST_ITEMS, PROMPT_SIGNIFICANT_DIGITS
+from src.core.metrics_engine import APPROX_ERRORS_KEY, MODE_METRICS
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Токенизаторы моделей Ollama (llama, qwen) делят числа по цифрам, латиницу - на
+# части по ~4 символа, кириллицу - по ~2.5 символа
+_TOKEN_RE = re.compile(r"\d|[A-Za-z_]+|[^\x00-\x7f\s\d]+|\S")
+ASCII_CHARS_PER_TOKEN = 4.0
+OTHER_CHARS_PER_TOKEN = 2.5
+
+# Метрика -> метрики, из которых она выводится (при их наличии в промпт не попадает)
+REDUNDANT_METRICS = {
+    "var": ("std",),
+    "iqr": ("quantile_25", "quantile_75"),
+    "median": ("quantile_50",),
+    "mode_rel_freq": ("mode_count", "count"),
+    "unique_dates": ("nunique",),
+    "date_range_days": ("min_date", "max_date"),
+}
+MAX_CELL_CHARS = 40
+MAX_DROPPED_NAMES = 20
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Оценка числа токенов текста без токенизатора модели.
+
+    Args:
+        text: Текст
+
+    Returns:
+        Приблизительное число токенов
+    """
+    tokens = 0
+    for match in _TOKEN_RE.finditer(text or ""):
+        piece = match.group()
+        if len(piece) == 1:
+            tokens += 1
+        elif piece.isascii():
+            tokens += math.ceil(len(piece) / ASCII_CHARS_PER_TOKEN)
+        else:
+            tokens += math.ceil(len(piece) / OTHER_CHARS_PER_TOKEN)
+    return tokens
+
+
+def prompt_section_tokens(prompt: PromptTemplate, variables: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+    """
+    Токены по разделам промпта: текст шаблона и каждая переменная.
+
+    Args:
+        prompt: Шаблон промпта (с partial-переменными)
+        variables: Значения остальных переменных
+
+    Returns:
+        Словарь {"template": ..., переменная: ...}
+    """
+    values = {**prompt.partial_variables, **(variables or {})}
+    sections = {"template": estimate_tokens(prompt.format(**{name: "" for name in values}))}
+    for name, value in values.items():
+        sections[name] = estimate_tokens(str(value))
+    return sections
+
+
+def log_prompt_tokens(stage: str, prompt: PromptTemplate, variables: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Записывает в журнал оценку токенов промпта этапа по разделам.
+
+    Returns:
+        Оценка числа токенов всего промпта
+    """
+    sections = prompt_section_tokens(prompt, variables)
+    total = sum(sections.values())
+    details = ", ".join(f"{name}={tokens}" for name, tokens in sections.items())
+    logger.info(f"Промпт этапа {stage}: ~{total} токенов ({details})")
+    return total
+
+
+def _format_number(value: float, digits: int) -> str:
+    if math.isnan(value) or math.isinf(value):
+        return "-"
+    if value.is_integer() and abs(value) < 10 ** 15:
+        return str(int(value))
+    if abs(value) >= 10 ** digits:
+        return str(round(value))
+    return f"{value:.{digits}g}"
+
+
+def compact_value(value: Any, digits: int = PROMPT_SIGNIFICANT_DIGITS,
+                  max_items: int = PROMPT_MAX_LIST_ITEMS) -> str:
+    """
+    Короткая запись значения метрики для таблицы.
+
+    Числа округляются до digits значащих цифр, у дат отбрасывается нулевое
+    время, списки и словари сокращаются до max_items элементов.
+    """
+    if value is None:
+        return "-"
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return _format_number(value, digits)
+    if isinstance(value, dict):
+        items = [f"{compact_value(k, digits)}:{compact_value(v, digits)}" for k, v in list(value.items())[:max_items]]
+        rest = len(value) - max_items
+        return "{" + ", ".join(items) + (f", …+{rest}" if rest > 0 else "") + "}"
+    if isinstance(value, (list, tuple)):
+        items = [compact_value(v, digits) for v in value[:max_items]]
+        rest = len(value) - max_items
+        return "[" + ", ".join(items) + (f", …+{rest}" if rest > 0 else "") + "]"
+    text = str(value)
+    if text.endswith(" 00:00:00"):
+        text = text[:-len(" 00:00:00")]
+    text = text.replace("|", "/").replace("\n", " ")
+    return text if len(text) <= MAX_CELL_CHARS else text[:MAX_CELL_CHARS - 1] + "…"
+
+
+def drop_redundant_metrics(metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Убирает метрики, которые модель может вывести из остальных.
+
+    var при наличии std, iqr при наличии квартилей и т.д. (REDUNDANT_METRICS);
+    у столбцов, где все значения уникальны, - mode, mode_count, mode_rel_freq.
+    """
+    kept = {}
+    count, nunique = metrics.get("count"), metrics.get("nunique")
+    all_unique = isinstance(count, int) and count > 1 and nunique == count
+    for metric, value in metrics.items():
+        sources = REDUNDANT_METRICS.get(metric)
+        if sources and all(metrics.get(source) is not None for source in sources):
+            continue
+        if all_unique and metric in MODE_METRICS:
+            continue
+        kept[metric] = value
+    return kept
+
+
+def _as_float(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return None if math.isnan(value) else float(value)
+
+
+def informativeness(metrics: Dict[str, Any], rows: Optional[int] = None) -> float:
+    """
+    Оценка информативности столбца по его метрикам (больше - информативнее).
+
+    Постоянные столбцы получают 0, столбцы из уникальных значений
+    (идентификаторы) - пониженную оценку; асимметрия, эксцесс, разброс
+    относительно среднего и доля пропусков оценку повышают.
+
+    Args:
+        metrics: Метрики столбца
+        rows: Число строк датасета (для доли пропусков)
+    """
+    if not isinstance(metrics, dict):
+        return 0.5
+    count, nunique = _as_float(metrics.get("count")), _as_float(metrics.get("nunique"))
+    std, mean = _as_float(metrics.get("std")), _as_float(metrics.get("mean"))
+    if (nunique is not None and nunique <= 1) or std == 0:
+        return 0.0
+    score = 1.0
+    if count and nunique is not None and nunique >= 0.99 * count:
+        score -= 0.5
+    skew, kurtosis = _as_float(metrics.get("skew")), _as_float(metrics.get("kurtosis"))
+    if skew is not None:
+        score += min(abs(skew), 5.0) / 5
+    if kurtosis is not None:
+        score += min(abs(kurtosis), 10.0) / 10
+    if std is not None and mean:
+        score += min(std / abs(mean), 2.0) / 2
+    if rows and count is not None:
+        score += 1 - min(count / rows, 1.0)
+    return score
+
+
+def _approx_notes(results: Dict[str, Any]) -> List[str]:
+    notes = []
+    for column, metrics in results.items():
+        errors = metrics.get(APPROX_ERRORS_KEY) if isinstance(metrics, dict) else None
+        for metric, bound in (errors or {}).items():
+            details = ", ".join(f"{key}={value}" for key, value in bound.items())
+            notes.append(f"{column}.{metric}: {details}")
+    return notes
+
+
+def format_metrics_table(results: Dict[str, Any], digits: int = PROMPT_SIGNIFICANT_DIGITS,
+                         max_items: int = PROMPT_MAX_LIST_ITEMS) -> str:
+    """
+    Метрики в виде таблиц: столбцы с одинаковым набором метрик - строки одной таблицы.
+
+    Приближенные значения (approx_errors) помечаются '~', методы и границы
+    ошибок перечисляются после таблиц.
+
+    Args:
+        results: {столбец: {метрика: значение}}
+        digits: Значащих цифр у чисел
+        max_items: Элементов списков и словарей
+
+    Returns:
+        Текст таблиц
+    """
+    groups: Dict[Tuple[str, ...], List[str]] = {}
+    for column, metrics in results.items():
+        if not isinstance(metrics, dict):
+            metrics = {"value": metrics}
+        header = tuple(metric for metric in metrics if metric != APPROX_ERRORS_KEY)
+        approx = set(metrics.get(APPROX_ERRORS_KEY) or ())
+        cells = [compact_value(column, digits, max_items)]
+        cells += [compact_value(metrics[m], digits, max_items) + ("~" if m in approx else "") for m in header]
+        groups.setdefault(header, []).append(" | ".join(cells))
+
+    blocks = ["\n".join(["столбец | " + " | ".join(header)] + rows) for header, rows in groups.items()]
+    notes = _approx_notes(results)
+    if notes:
+        blocks.append("Приближенные значения (~), метод и граница ошибки:\n" + "\n".join(notes))
+    return "\n\n".join(blocks)
+
+
+def fit_metrics_to_budget(results: Dict[str, Any], max_tokens: int,
+                          rows: Optional[int] = None) -> Tuple[str, List[str]]:
+    """
+    Сжатые метрики для промпта в пределах бюджета токенов.
+
+    Если все столбцы не помещаются, остаются самые информативные
+    (см. informativeness) в исходном порядке, а в конце перечисляются опущенные.
+
+    Args:
+        results: {столбец: {метрика: значение}}
+        max_tokens: Бюджет токенов
+        rows: Число строк датасета
+
+    Returns:
+        Кортеж (текст для промпта, список опущенных столбцов)
+    """
+    compacted = {column: drop_redundant_metrics(metrics) if isinstance(metrics, dict) else metrics
+                 for column, metrics in results.items()}
+    text = format_metrics_table(compacted)
+    if estimate_tokens(text) <= max_tokens:
+        return text, []
+
+    columns = list(compacted)
+    ranked = sorted(columns, key=lambda column: informativeness(compacted[column], rows), reverse=True)
+
+    def render(keep_count: int) -> str:
+        kept = set(ranked[:keep_count])
+        dropped = [column for column in columns if column not in kept]
+        names = ", ".join(str(column) for column in dropped[:MAX_DROPPED_NAMES])
+        if len(dropped) > MAX_DROPPED_NAMES:
+            names += f", …+{len(dropped) - MAX_DROPPED_NAMES}"
+        table = format_metrics_table({column: compacted[column] for column in columns if column in kept})
+        return f"{table}\n\nОпущены менее информативные столбцы ({len(dropped)}): {names}"
+
+    # Наибольшее число столбцов, при котором текст помещается в бюджет
+    low, high = 0, len(columns) - 1
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(render(middle)) <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    kept = set(ranked[:low])
+    dropped = [column for column in columns if column not in kept]
+    logger.info(f"Метрики не помещаются в бюджет {max_tokens} токенов: оставлено {low} из {len(columns)} столбцов.")
+    return render(low), dropped
+
+
+def fit_text_to_budget(text: str, max_tokens: int) -> str:
+    """
+    Текст в пределах бюджета токенов: сохраняются начальные абзацы целиком.
+
+    Args:
+        text: Текст (например, анализ метрик для итогового отчета)
+        max_tokens: Бюджет токенов
+
+    Returns:
+        Исходный или сокращенный текст
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    kept, used = [], 0
+    for paragraph in text.split("\n\n"):
+        cost = estimate_tokens(paragraph)
+        if used + cost > max_tokens:
+            break
+        kept.append(paragraph)
+        used += cost
+    logger.info(f"Текст сокращен до {used} из ~{estimate_tokens(text)} токенов ({len(kept)} абзацев).")
+    return "\n\n".join(kept + ["[…сокращено]"])
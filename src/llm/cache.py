@@ -0,0 +1,168 @@
+"""
+Дисковый кэш ответов LLM.
+
+Ответы моделей Ollama сохраняются в SQLite по ключу из хэша имени модели,
+температуры, base_url и отрисованного промпта. При превышении размера
+удаляются записи, к которым дольше всего не обращались (LRU).
+Повторный анализ неизмененного файла берет ответы из кэша.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.outputs import Generation
+from config.settings import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_FRESH_STAGES,
+    LLM_CACHE_MAX_MB,
+    LLM_CACHE_PATH,
+)
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Этапы анализа, вызывающие LLM
+LLM_STAGES = ("structure", "metrics_plan", "code_gen", "analysis", "viz_plan", "viz_code", "final_report")
+
+
+def make_cache_key(model: str, temperature: Any, base_url: str, prompt: str, llm_string: str = "") -> str:
+    """
+    Ключ кэша: хэш параметров модели и отрисованного промпта.
+
+    Args:
+        model: Имя модели
+        temperature: Температура генерации
+        base_url: Адрес сервера Ollama
+        prompt: Отрисованный промпт
+        llm_string: Прочие параметры вызова (stop-последовательности и т.п.)
+
+    Returns:
+        Шестнадцатеричный хэш
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (model, repr(temperature), base_url, llm_string, prompt):
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    Кэш ответов LLM в SQLite с вытеснением по размеру (LRU).
+
+    Подключается к модели LangChain через атрибут `cache`; один экземпляр
+    обслуживает одну конфигурацию модели.
+
+    Example:
+        cache = SQLiteLLMCache(model="llama2", temperature=0.5, base_url="http://localhost:11434")
+        llm = Ollama(model="llama2", temperature=0.5, cache=cache)
+    """
+
+    def __init__(self, model: str, temperature: Any, base_url: str,
+                 db_path: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self.model = model
+        self.temperature = temperature
+        self.base_url = base_url
+        self.db_path = Path(db_path or LLM_CACHE_PATH)
+        self.max_bytes = max_bytes if max_bytes is not None else LLM_CACHE_MAX_MB * 1024 * 1024
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, value TEXT, size INTEGER, last_access REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _key(self, prompt: str, llm_string: str) -> str:
+        return make_cache_key(self.model, self.temperature, self.base_url, prompt, llm_string)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """Возвращает сохраненный ответ или None."""
+        key = self._key(prompt, llm_string)
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        logger.info(f"Ответ модели {self.model} взят из кэша")
+        return [Generation(**item) for item in json.loads(row[0])]
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """Сохраняет ответ и вытесняет старые записи при превышении размера."""
+        value = json.dumps(
+            [{"text": gen.text, "generation_info": gen.generation_info} for gen in return_val],
+            ensure_ascii=False, default=str,
+        )
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            logger.warning(f"Ответ модели {self.model} больше лимита кэша, не сохраняется")
+            return
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (self._key(prompt, llm_string), self.model, value, size, time.time()),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        removed = 0
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            removed += 1
+        logger.info(f"Кэш LLM: вытеснено записей - {removed}")
+
+    def clear(self, **kwargs: Any) -> None:
+        """Удаляет все ответы этой модели."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM responses WHERE model = ?", (self.model,))
+
+
+def for_stage(llm, stage: str, fresh_stages: Optional[Iterable[str]] = None):
+    """
+    Возвращает модель для этапа анализа с учетом отключения кэша.
+
+    Args:
+        llm: Модель LangChain
+        stage: Имя этапа (см. LLM_STAGES)
+        fresh_stages: Этапы без кэша (по умолчанию LLM_CACHE_FRESH_STAGES)
+
+    Returns:
+        Исходная модель или ее копия с отключенным кэшем
+    """
+    fresh = LLM_CACHE_FRESH_STAGES if fresh_stages is None else fresh_stages
+    if stage in fresh and getattr(llm, "cache", None) is not None:
+        logger.info(f"Этап {stage}: кэш LLM отключен, ответ генерируется заново")
+        return llm.model_copy(update={"cache": False})
+    return llm
+
+
+def build_llm_cache(config: dict) -> Optional[SQLiteLLMCache]:
+    """Создает кэш для конфигурации модели из MODELS_CONFIG (None, если кэш выключен)."""
+    if not LLM_CACHE_ENABLED:
+        return None
+    try:
+        return SQLiteLLMCache(config["model"], config["temperature"], config["base_url"])
+    except sqlite3.Error as e:
+        logger.warning(f"Кэш LLM недоступен: {e}")
+        return None
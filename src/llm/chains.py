@@ -0,0 +1,101 @@
+"""
+Запуск промптов LangChain с потоковой выдачей токенов
+"""
+import threading
+from typing import Any, Callable, Dict, Optional
+from langchain_core.caches import BaseCache
+from langchain_core.globals import get_llm_cache
+from langchain_core.outputs import Generation
+from langchain_core.prompts import PromptTemplate
+from src.llm.budget import log_prompt_tokens
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class StreamBuffer:
+    """
+    Потокобезопасный накопитель текста генерации.
+
+    Этап в рабочем потоке дописывает фрагменты, поток интерфейса
+    периодически забирает накопленный текст и перерисовывает вывод.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._parts = []
+        self.version = 0
+
+    def append(self, chunk: str) -> None:
+        """Добавляет фрагмент текста."""
+        with self._lock:
+            self._parts.append(chunk)
+            self.version += 1
+
+    @property
+    def text(self) -> str:
+        """Текст, полученный к текущему моменту."""
+        with self._lock:
+            return "".join(self._parts)
+
+
+def _resolve_cache(llm) -> Optional[BaseCache]:
+    cache = getattr(llm, "cache", None)
+    if isinstance(cache, BaseCache):
+        return cache
+    if cache is None:
+        return get_llm_cache()
+    return None
+
+
+def _llm_string(llm) -> str:
+    """Строка параметров модели в том же виде, что использует LangChain для ключа кэша."""
+    params = llm._dict_for_compat() if hasattr(llm, "_dict_for_compat") else llm.dict()
+    params["stop"] = None
+    return str(sorted(params.items()))
+
+
+def stream_chain(llm, prompt: PromptTemplate, variables: Optional[Dict[str, Any]] = None,
+                 on_chunk: Optional[Callable[[str], None]] = None, stage: Optional[str] = None) -> str:
+    """
+    Генерирует ответ модели по промпту с потоковой выдачей фрагментов.
+
+    Кэш ответов модели (src.llm.cache) учитывается так же, как при invoke:
+    при попадании в кэш ответ выдается одним фрагментом, новый ответ
+    сохраняется в кэш после окончания генерации.
+
+    Args:
+        llm: Модель LangChain
+        prompt: Шаблон промпта
+        variables: Значения переменных шаблона
+        on_chunk: Вызывается для каждого полученного фрагмента
+        stage: Имя этапа: оценка токенов промпта по разделам записывается в журнал
+
+    Returns:
+        Полный текст ответа
+    """
+    if stage is not None:
+        log_prompt_tokens(stage, prompt, variables)
+    rendered = prompt.format(**(variables or {}))
+    cache = _resolve_cache(llm)
+    llm_string = _llm_string(llm) if cache is not None else ""
+
+    if cache is not None:
+        cached = cache.lookup(rendered, llm_string)
+        if cached:
+            text = "".join(gen.text for gen in cached)
+            if on_chunk is not None:
+                on_chunk(text)
+            return text
+
+    parts = []
+    for chunk in llm.stream(rendered):
+        parts.append(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk)
+    text = "".join(parts)
+    logger.info(f"Потоковая генерация завершена: {len(text)} символов")
+
+    if cache is not None:
+        cache.update(rendered, llm_string, [Generation(text=text)])
+    return text
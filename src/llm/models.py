@@ -4,6 +4,7 @@
 import streamlit as st
 from langchain_community.llms import Ollama
 from config.models_config import MODELS_CONFIG
+from src.llm.cache import build_llm_cache
 from src.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -13,6 +14,9 @@ logger = setup_logger(__name__)
 def get_llms():
     """
     Инициализация моделей LLM с кэшированием
+
+    Каждая модель получает дисковый кэш ответов (см. src.llm.cache);
+    для отдельных этапов он отключается через for_stage.
     
     Returns:
         Tuple[Ollama, Ollama]: Модели для анализа и генерации кода
@@ -27,13 +31,15 @@ def get_llms():
         llm_analyst = Ollama(
             model=analyst_config["model"],
             temperature=analyst_config["temperature"],
-            base_url=analyst_config["base_url"]
+            base_url=analyst_config["base_url"],
+            cache=build_llm_cache(analyst_config)
         )
         
         llm_coder = Ollama(
             model=coder_config["model"],
             temperature=coder_config["temperature"],
-            base_url=coder_config["base_url"]
+            base_url=coder_config["base_url"],
+            cache=build_llm_cache(coder_config)
         )
         
         logger.info("Модели LLM успешно инициализированы")
@@ -2,7 +2,7 @@
 Парсеры ответов от LLM
 """
 import re
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 from src.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -29,23 +29,7 @@ def parse_struct_analyze_response(response_text: str) -> Dict[str, Any]:
     # Извлечение блока столбцов
     columns_match = re.search(r"---COLUMNS_START---(.*?)---COLUMNS_END---", response_text, re.DOTALL)
     if columns_match:
-        columns_text = columns_match.group(1).strip()
-        # Разбиваем на блоки для каждого столбца
-        column_blocks = re.split(r'\n\s*\n', columns_text)
-        for block in column_blocks:
-            if not block.strip():
-                continue
-            lines = block.strip().split('\n')
-            col_info = {}
-            for line in lines:
-                if line.startswith("Столбец:"):
-                    col_info["name"] = line[len("Столбец:"):].strip()
-                elif line.startswith("Тип:"):
-                    col_info["type"] = line[len("Тип:"):].strip()
-                elif line.startswith("Описание:"):
-                    col_info["description"] = line[len("Описание:"):].strip()
-            if col_info:
-                parsed_data["columns"].append(col_info)
+        parsed_data["columns"] = parse_columns_block(columns_match.group(1))
     else:
         logger.warning("Не найден блок ---COLUMNS_START---...---COLUMNS_END---")
         return {}
@@ -57,11 +41,7 @@ def parse_struct_analyze_response(response_text: str) -> Dict[str, Any]:
         re.DOTALL
     )
     if datetime_match:
-        datetime_text = datetime_match.group(1).strip()
-        if datetime_text:
-            parsed_data["datetime_candidates"] = [
-                name.strip() for name in datetime_text.split(',') if name.strip()
-            ]
+        parsed_data["datetime_candidates"] = parse_datetime_candidates_block(datetime_match.group(1))
     
     logger.info("Структура данных успешно распарсена из строки.")
     return parsed_data
@@ -109,3 +89,120 @@ def parse_metrics_plan_response(response_text: str) -> Dict[str, List[str]]:
     logger.info("План метрик успешно распарсен из строки.")
     return parsed_data
 
+
+def parse_plot_plan_response(response_text: str) -> List[Dict[str, Any]]:
+    """
+    Парсит план графиков из блока ---PLOT_PLAN_START---...---PLOT_PLAN_END---.
+    
+    Строки плана имеют вид "График N: <тип> | <столбцы> | <инсайт>".
+    Если маркеры отсутствуют, разбирается весь текст.
+    
+    Args:
+        response_text: Текст ответа от LLM
+        
+    Returns:
+        Список графиков [{"number": int, "type": str, "columns": [str], "idea": str}, ...]
+    """
+    plan_match = re.search(r"---PLOT_PLAN_START---(.*?)---PLOT_PLAN_END---", response_text, re.DOTALL)
+    plan_text = plan_match.group(1) if plan_match else response_text
+    plots = []
+    for line in plan_text.splitlines():
+        line_match = re.match(r"\s*(?:[-*]\s*)?(?:График\s*)?(\d+)\s*[:.)]\s*(.+)", line)
+        if not line_match:
+            continue
+        parts = [part.strip() for part in line_match.group(2).split("|")]
+        if len(parts) < 2 or not parts[0]:
+            continue
+        plots.append({
+            "number": len(plots) + 1,
+            "type": parts[0],
+            "columns": [col.strip() for col in parts[1].split(",") if col.strip()],
+            "idea": parts[2] if len(parts) > 2 else "",
+        })
+    if not plots:
+        logger.warning("План графиков не найден в ответе LLM")
+    return plots
+
+
+# Маркер конца блока вида ---COLUMNS_END---
+BLOCK_END_PATTERN = re.compile(r"---([A-Z][A-Z_]*)_END---")
+
+
+def parse_columns_block(columns_text: str) -> List[Dict[str, str]]:
+    """
+    Парсит содержимое блока ---COLUMNS_START---...---COLUMNS_END---.
+    
+    Args:
+        columns_text: Текст между маркерами блока
+        
+    Returns:
+        Список описаний столбцов [{"name": str, "type": str, "description": str}, ...]
+    """
+    columns = []
+    # Разбиваем на блоки для каждого столбца
+    column_blocks = re.split(r'\n\s*\n', columns_text.strip())
+    for block in column_blocks:
+        if not block.strip():
+            continue
+        lines = block.strip().split('\n')
+        col_info = {}
+        for line in lines:
+            if line.startswith("Столбец:"):
+                col_info["name"] = line[len("Столбец:"):].strip()
+            elif line.startswith("Тип:"):
+                col_info["type"] = line[len("Тип:"):].strip()
+            elif line.startswith("Описание:"):
+                col_info["description"] = line[len("Описание:"):].strip()
+        if col_info:
+            columns.append(col_info)
+    return columns
+
+
+def parse_datetime_candidates_block(datetime_text: str) -> List[str]:
+    """Парсит содержимое блока ---DATETIME_CANDIDATES_START---...---DATETIME_CANDIDATES_END---."""
+    return [name.strip() for name in datetime_text.strip().split(',') if name.strip()]
+
+
+class StreamingBlockParser:
+    """
+    Инкрементальный разбор блоков ---NAME_START---...---NAME_END--- из потока токенов.
+    
+    Блок становится доступен сразу после получения его закрывающего маркера,
+    не дожидаясь окончания генерации.
+    
+    Example:
+        parser = StreamingBlockParser()
+        for chunk in llm.stream(prompt):
+            for name, content in parser.feed(chunk):
+                if name == "COLUMNS":
+                    show_columns(parse_columns_block(content))
+    """
+    
+    def __init__(self):
+        self.text = ""
+        self.blocks: Dict[str, str] = {}
+        self._scan_pos = 0
+    
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """
+        Добавляет фрагмент ответа.
+        
+        Args:
+            chunk: Очередной фрагмент текста
+            
+        Returns:
+            Список блоков (имя, содержимое), закрывшихся в этом фрагменте
+        """
+        self.text += chunk
+        closed = []
+        for match in BLOCK_END_PATTERN.finditer(self.text, self._scan_pos):
+            name = match.group(1)
+            start_marker = f"---{name}_START---"
+            start = self.text.rfind(start_marker, 0, match.start())
+            if start != -1:
+                content = self.text[start + len(start_marker):match.start()]
+                self.blocks[name] = content
+                closed.append((name, content))
+                logger.debug(f"Блок {name} получен из потока")
+            self._scan_pos = match.end()
+        return closed
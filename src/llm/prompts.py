@@ -9,6 +9,8 @@ from config.prompts_config import (
     FINAL_REPORT_PROMPT,
     METRICS_CODE_GEN_PROMPT,
     VISUALIZATION_CODE_PROMPT,
+    VISUALIZATION_PLAN_PROMPT,
+    VISUALIZATION_GROUP_CODE_PROMPT,
 )
 from config.settings import DEFAULT_NUM_PLOTS
 
@@ -49,3 +51,18 @@ def get_visualization_code_prompt(num_plots: int = None) -> PromptTemplate:
     prompt_template = VISUALIZATION_CODE_PROMPT.format(num_plots=num_plots)
     return PromptTemplate.from_template(prompt_template)
 
+
+def get_visualization_plan_prompt(num_plots: int = None) -> PromptTemplate:
+    """
+    Промпт для компактного плана графиков
+    
+    Args:
+        num_plots: Количество графиков в плане
+    """
+    num_plots = num_plots or DEFAULT_NUM_PLOTS
+    return PromptTemplate.from_template(VISUALIZATION_PLAN_PROMPT).partial(num_plots=str(num_plots))
+
+
+def get_visualization_group_prompt() -> PromptTemplate:
+    """Промпт для генерации кода группы графиков из плана"""
+    return PromptTemplate.from_template(VISUALIZATION_GROUP_CODE_PROMPT)
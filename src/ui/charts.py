@@ -0,0 +1,111 @@
+"""
+Построение интерактивных графиков Plotly с выбором режима отрисовки.
+
+SVG-трассы (px.scatter, go.Scatter) перестают отзываться в браузере после
+десятков тысяч точек, поэтому для больших DataFrame используются WebGL-трассы
+(Scattergl) или растр плотности точек (см. src.data.downsampling).
+"""
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from config.settings import PLOT_WEBGL_MAX_POINTS
+from src.data.downsampling import (
+    binned_hist,
+    choose_render_mode,
+    decimate_for_line,
+    rasterize_points,
+    sample_for_scatter,
+)
+
+
+def _axis_values(edges: np.ndarray, source: pd.Series):
+    """Центры интервалов растра в единицах исходного столбца."""
+    centers = (edges[:-1] + edges[1:]) / 2
+    if pd.api.types.is_datetime64_any_dtype(source):
+        moments = pd.to_datetime(centers, unit="s", utc=True)
+        return moments.tz_convert(source.dt.tz) if source.dt.tz is not None else moments.tz_localize(None)
+    return centers
+
+
+def raster_figure(df: pd.DataFrame, x: str, y: str, title: str) -> go.Figure:
+    """Растр плотности точек: в браузер передается матрица частот, а не точки."""
+    counts, x_edges, y_edges = rasterize_points(df[x], df[y])
+    fig = go.Figure(go.Heatmap(
+        z=np.log1p(counts),
+        x=_axis_values(x_edges, df[x]),
+        y=_axis_values(y_edges, df[y]),
+        colorscale="Viridis",
+        colorbar={"title": "log(1+N)"},
+        hovertemplate=f"{x}=%{{x}}<br>{y}=%{{y}}<extra></extra>",
+    ))
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title=y)
+    return fig
+
+
+def scatter_figure(df: pd.DataFrame, x: str, y: str, color: Optional[str] = None,
+                   mode: str = "auto", title: Optional[str] = None) -> go.Figure:
+    """
+    Диаграмма рассеяния в режиме SVG, WebGL или растр.
+
+    Args:
+        df: DataFrame
+        x: Столбец оси X
+        y: Столбец оси Y
+        color: Столбец цветовой группировки (в режиме растра не используется)
+        mode: 'auto', 'svg', 'webgl' или 'raster'
+        title: Заголовок
+
+    Returns:
+        Фигура Plotly
+    """
+    title = title or f"{y} vs {x}"
+    mode = choose_render_mode(len(df), mode)
+    if mode == "raster":
+        return raster_figure(df, x, y, title)
+    if mode == "webgl":
+        data = sample_for_scatter(df, n=PLOT_WEBGL_MAX_POINTS, by=color, threshold=PLOT_WEBGL_MAX_POINTS)
+    else:
+        data = sample_for_scatter(df, by=color)
+    return px.scatter(data, x=x, y=y, color=color, title=title, render_mode=mode)
+
+
+def line_figure(df: pd.DataFrame, x: str, y: str, color: Optional[str] = None,
+                mode: str = "auto", title: Optional[str] = None) -> go.Figure:
+    """
+    Линейный график: в режиме SVG ряд прореживается LTTB до PLOT_LINE_POINTS точек,
+    в режимах WebGL и растр - до PLOT_WEBGL_MAX_POINTS точек и рисуется WebGL-трассами.
+    """
+    title = title or f"{y} по {x}"
+    if choose_render_mode(len(df), mode) == "svg":
+        return px.line(decimate_for_line(df, x=x, y=y, by=color), x=x, y=y, color=color,
+                       title=title, render_mode="svg")
+    data = decimate_for_line(df, x=x, y=y, by=color, n_points=PLOT_WEBGL_MAX_POINTS,
+                             threshold=PLOT_WEBGL_MAX_POINTS)
+    return px.line(data, x=x, y=y, color=color, title=title, render_mode="webgl")
+
+
+def multi_line_figure(df: pd.DataFrame, columns: List[str], mode: str = "auto",
+                      title: str = "Сравнение нескольких показателей") -> go.Figure:
+    """Несколько числовых столбцов по индексу DataFrame, по трассе на столбец."""
+    webgl = choose_render_mode(len(df), mode) != "svg"
+    trace = go.Scattergl if webgl else go.Scatter
+    fig = go.Figure()
+    for column in columns:
+        if webgl:
+            data = decimate_for_line(df, y=column, n_points=PLOT_WEBGL_MAX_POINTS, threshold=PLOT_WEBGL_MAX_POINTS)
+        else:
+            data = decimate_for_line(df, y=column)
+        fig.add_trace(trace(x=data.index, y=data[column], mode="lines", name=column))
+    fig.update_layout(title=title, xaxis_title="Индекс", yaxis_title="Значение", hovermode="x unified")
+    return fig
+
+
+def prebinned_histogram_figure(values: pd.Series, title: str, bins: int = 30) -> go.Figure:
+    """Гистограмма по заранее посчитанным интервалам: в браузер передаются только столбцы."""
+    counts, edges = binned_hist(values, bins=bins)
+    fig = px.bar(x=(edges[:-1] + edges[1:]) / 2, y=counts,
+                 labels={"x": values.name, "y": "count"}, title=title)
+    fig.update_traces(width=np.diff(edges))
+    return fig
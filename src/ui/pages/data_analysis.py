@@ -3,6 +3,7 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import io
+from src.data.stats_cache import get_stats_cache
 
 # Заголовок страницы
 st.header("📊 Анализ данных и обработка файлов")
@@ -57,6 +58,9 @@ with col1:
             st.subheader("📋 Предпросмотр данных")
             st.dataframe(df.head(20), use_container_width=True)
 
+            # describe(), пропуски и корреляции считаются один раз на датасет (общий кэш статистик)
+            stats = get_stats_cache().get(df)
+
             # Основная статистика
             st.subheader("📊 Основная статистика")
             stats_col1, stats_col2, stats_col3 = st.columns(3)
@@ -66,13 +70,13 @@ with col1:
             with stats_col2:
                 st.metric("Всего колонок", df.shape[1])
             with stats_col3:
-                missing_values = df.isnull().sum().sum()
+                missing_values = int(stats.missing.sum())
                 st.metric("Пропущенные значения", missing_values)
 
             # Детальная статистика для числовых колонок
             if df.select_dtypes(include=[np.number]).shape[1] > 0:
                 st.subheader("📈 Статистика числовых данных")
-                numeric_stats = df.describe()
+                numeric_stats = stats.describe
                 st.dataframe(numeric_stats, use_container_width=True)
 
             # Анализ пропущенных значений
@@ -80,8 +84,8 @@ with col1:
             missing_df = pd.DataFrame({
                 'Колонка': df.columns,
                 'Тип данных': df.dtypes.values,
-                'Пропущенные': df.isnull().sum().values,
-                'Заполненность %': (100 - (df.isnull().sum() / len(df) * 100)).round(2)
+                'Пропущенные': stats.missing.values,
+                'Заполненность %': (100 - (stats.missing / len(df) * 100)).round(2)
             })
             st.dataframe(missing_df, use_container_width=True)
 
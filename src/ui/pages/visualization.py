@@ -2,8 +2,11 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
-import plotly.graph_objects as go
 import matplotlib.pyplot as plt
+from config.settings import PLOT_DOWNSAMPLE_THRESHOLD
+from src.data.downsampling import choose_render_mode
+from src.data.stats_cache import get_stats_cache
+from src.ui.charts import line_figure, multi_line_figure, prebinned_histogram_figure, scatter_figure
 
 st.header("📈 Визуализация данных")
 
@@ -59,18 +62,23 @@ if chart_type in ["Столбчатая диаграмма", "Точечная 
     if color_column == "Нет":
         color_column = None
 
+# Режим отрисовки: SVG для небольших данных, WebGL и растр - для сотен тысяч и миллионов точек
+render_modes = {"Авто": "auto", "SVG": "svg", "WebGL": "webgl", "Растр плотности": "raster"}
+render_label = st.radio("Режим отрисовки", list(render_modes), horizontal=True)
+render_mode = render_modes[render_label]
+
 # Создание графика
 if st.button("Создать график"):
     fig = None
 
     try:
+        if chart_type in ["Линейный график", "Точечная диаграмма"]:
+            st.caption(f"Строк: {len(df):,}. Режим отрисовки: {choose_render_mode(len(df), render_mode)}.")
+        elif chart_type == "Гистограмма" and len(df) > PLOT_DOWNSAMPLE_THRESHOLD:
+            st.caption(f"Строк: {len(df):,}. Интервалы гистограммы посчитаны заранее.")
+
         if chart_type == "Линейный график":
-            if color_column:
-                fig = px.line(df, x=x_column, y=y_column, color=color_column,
-                              title=f"{y_column} по {x_column}")
-            else:
-                fig = px.line(df, x=x_column, y=y_column,
-                              title=f"{y_column} по {x_column}")
+            fig = line_figure(df, x_column, y_column, color=color_column, mode=render_mode)
 
         elif chart_type == "Столбчатая диаграмма":
             if color_column:
@@ -86,16 +94,15 @@ if st.button("Создать график"):
                          title=f"Распределение по {x_column}")
 
         elif chart_type == "Точечная диаграмма":
-            if color_column:
-                fig = px.scatter(df, x=x_column, y=y_column, color=color_column,
-                                 title=f"{y_column} vs {x_column}")
-            else:
-                fig = px.scatter(df, x=x_column, y=y_column,
-                                 title=f"{y_column} vs {x_column}")
+            fig = scatter_figure(df, x_column, y_column, color=color_column, mode=render_mode)
 
         elif chart_type == "Гистограмма":
-            fig = px.histogram(df, x=y_column, nbins=30,
-                               title=f"Распределение {y_column}")
+            if len(df) > PLOT_DOWNSAMPLE_THRESHOLD:
+                # Интервалы считаются здесь: в браузер передаются 30 столбцов, а не все строки
+                fig = prebinned_histogram_figure(df[y_column], title=f"Распределение {y_column}")
+            else:
+                fig = px.histogram(df, x=y_column, nbins=30,
+                                   title=f"Распределение {y_column}")
 
         elif chart_type == "Box plot":
             fig = px.box(df, x=x_column, y=y_column,
@@ -107,7 +114,8 @@ if st.button("Создать график"):
                 title_font_size=20,
                 xaxis_title_font_size=14,
                 yaxis_title_font_size=14,
-                hovermode='x unified'
+                # Общая подсказка по оси X перебирает все точки - для больших данных только ближайшая
+                hovermode='x unified' if choose_render_mode(len(df), render_mode) == "svg" else 'closest'
             )
             st.plotly_chart(fig, use_container_width=True)
 
@@ -129,21 +137,7 @@ if st.checkbox("Показать несколько графиков однов
     )
 
     if selected_cols:
-        fig_multi = go.Figure()
-        for col in selected_cols:
-            fig_multi.add_trace(go.Scatter(
-                x=df.index,
-                y=df[col],
-                mode='lines',
-                name=col
-            ))
-
-        fig_multi.update_layout(
-            title="Сравнение нескольких показателей",
-            xaxis_title="Индекс",
-            yaxis_title="Значение",
-            hovermode='x unified'
-        )
+        fig_multi = multi_line_figure(df, selected_cols, mode=render_mode)
         st.plotly_chart(fig_multi, use_container_width=True)
 
 # Статистические графики
@@ -155,9 +149,9 @@ stats_option = st.selectbox(
 
 if st.button("Показать статистический график"):
     if stats_option == "Корреляционная матрица":
-        numeric_df = df.select_dtypes(include=[np.number])
-        if len(numeric_df.columns) > 1:
-            corr_matrix = numeric_df.corr()
+        # Матрица считается один раз на датасет и берется из общего кэша статистик
+        corr_matrix = get_stats_cache().get(df).corr
+        if len(corr_matrix.columns) > 1:
             fig_corr = px.imshow(corr_matrix,
                                  text_auto=True,
                                  aspect="auto",
@@ -172,7 +166,10 @@ if st.button("Показать статистический график"):
             df.select_dtypes(include=[np.number]).columns
         )
         if selected_col:
-            fig_dist = px.histogram(df, x=selected_col, nbins=30,
-                                    marginal="box",
-                                    title=f"Распределение {selected_col}")
+            if len(df) > PLOT_DOWNSAMPLE_THRESHOLD:
+                fig_dist = prebinned_histogram_figure(df[selected_col], title=f"Распределение {selected_col}")
+            else:
+                fig_dist = px.histogram(df, x=selected_col, nbins=30,
+                                        marginal="box",
+                                        title=f"Распределение {selected_col}")
             st.plotly_chart(fig_dist, use_container_width=True)
\ No newline at end of file
@@ -0,0 +1,337 @@
+"""
+Выполнение сгенерированного кода в пуле прогретых процессов.
+
+Код LLM выполняется не в процессе Streamlit, а в дочерних процессах, где
+pandas, numpy, matplotlib и seaborn уже импортированы, а подготовленный
+DataFrame уже подключен (src.utils.frame_transport: файл Arrow в
+разделяемой памяти отображается процессами без копирования).
+Каждый запуск выполняется в новом пространстве имен, скопированном из
+базового (импорты уже привязаны), после запуска оно очищается, а память
+возвращается системе; пик RSS процесса за запуск попадает в результат.
+Каждый запуск ограничен по времени (CODE_EXECUTION_TIMEOUT), процесс -
+по памяти (CODE_EXECUTION_MEMORY_MB). Процесс, превысивший время, не
+хвативший памяти или завершившийся аварийно, заменяется новым, поэтому
+зависший цикл в сгенерированном коде не блокирует приложение.
+"""
+import contextlib
+import importlib
+import io
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set
+import pandas as pd
+from config.settings import CODE_EXECUTION_MEMORY_MB, CODE_EXECUTION_TIMEOUT, CODE_EXECUTOR_WORKERS
+from src.utils.frame_transport import SharedFrame, attach_frame, share_frame
+from src.utils.logger import setup_logger
+from src.utils.memory import peak_rss_mb, release_memory, reset_peak_rss
+
+logger = setup_logger(__name__)
+
+# Модули, импортируемые процессом при запуске: имя в коде -> модуль
+PRELOADED_MODULES = {
+    "pd": "pandas",
+    "np": "numpy",
+    "plt": "matplotlib.pyplot",
+    "sns": "seaborn",
+    "json": "json",
+}
+CODE_FILENAME = "<сгенерированный код>"
+# Дополнительные имена кода для подключенного DataFrame (функция уровня модуля или partial от нее)
+NamespaceFactory = Callable[[pd.DataFrame], Dict[str, Any]]
+
+
+@dataclass
+class ExecutionResult:
+    """Результат выполнения кода."""
+    ok: bool
+    output: str = ""
+    error: Optional[str] = None
+    duration: float = 0.0
+    timed_out: bool = False
+    crashed: bool = False
+    peak_rss_mb: Optional[float] = None
+
+
+def _limit_memory(limit_mb: int) -> None:
+    if not limit_mb:
+        return
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - Windows
+        return
+    limit = limit_mb * 2 ** 20
+    resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+
+
+def _base_namespace() -> Dict[str, Any]:
+    """Базовое пространство имен: модули PRELOADED_MODULES, импортированные один раз при запуске процесса."""
+    import matplotlib
+    matplotlib.use("Agg")
+    namespace: Dict[str, Any] = {"__name__": "__generated__"}
+    for alias, name in PRELOADED_MODULES.items():
+        try:
+            namespace[alias] = importlib.import_module(name)
+        except ImportError:
+            pass
+    return namespace
+
+
+def _describe_error(error: BaseException) -> str:
+    """Тип и текст исключения со строкой сгенерированного кода, где оно возникло."""
+    lines = [frame.lineno for frame in traceback.extract_tb(error.__traceback__) if frame.filename == CODE_FILENAME]
+    location = f" (строка {lines[-1]})" if lines else ""
+    return f"{type(error).__name__}: {error}{location}"
+
+
+def _worker_main(conn, memory_limit_mb: int, namespace_factory: Optional[NamespaceFactory] = None) -> None:
+    """Цикл процесса-исполнителя: ("attach", путь) подключает DataFrame, ("run", код, путь) выполняет код."""
+    _limit_memory(memory_limit_mb)
+    base_namespace = _base_namespace()
+    plt = base_namespace.get("plt")
+    conn.send(("ready",))
+    frame_path: Optional[str] = None
+    df: Optional[pd.DataFrame] = None
+    extras: Dict[str, Any] = {}
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message[0] == "stop":
+            break
+        path = message[1] if message[0] == "attach" else message[2]
+        started = time.perf_counter()
+        stdout = io.StringIO()
+        recycle = False
+        namespace: Dict[str, Any] = {}
+        try:
+            if path != frame_path:
+                df, frame_path, extras = None, None, {}
+                if path is not None:
+                    df, frame_path = attach_frame(path), path
+                    extras = namespace_factory(df) if namespace_factory is not None else {}
+            if message[0] == "attach":
+                continue
+            # Новое пространство имен из базового; df - поверхностная копия:
+            # запись в столбцы копирует их, подключенный df не меняется
+            namespace = dict(base_namespace, **extras)
+            namespace["df"] = df.copy(deep=False) if df is not None else None
+            reset_peak_rss()
+            with contextlib.redirect_stdout(stdout):
+                exec(compile(message[1], CODE_FILENAME, "exec"), namespace)
+            result = (True, stdout.getvalue(), None)
+        except MemoryError as e:
+            # После нехватки памяти состояние процесса ненадежно: он завершается и заменяется
+            result, recycle = (False, stdout.getvalue(), _describe_error(e)), True
+        except Exception as e:
+            result = (False, stdout.getvalue(), _describe_error(e))
+        finally:
+            if plt is not None:
+                plt.close("all")
+            # Промежуточные объекты кода освобождаются сразу, а не при следующем запуске
+            namespace.clear()
+        if message[0] == "run":
+            peak = peak_rss_mb()
+            release_memory()
+            conn.send(("done", *result, time.perf_counter() - started, peak, recycle))
+            if recycle:
+                break
+
+
+class _Worker:
+    """Процесс-исполнитель и его канал связи."""
+
+    def __init__(self, context, memory_limit_mb: int, namespace_factory: Optional[NamespaceFactory] = None):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_limit_mb, namespace_factory),
+                                       daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self) -> None:
+        """Ждет окончания импорта модулей процессом: прогрев не входит во время выполнения кода."""
+        if not self.ready:
+            self.conn.recv()
+            self.ready = True
+
+    def stop(self, kill: bool = False) -> None:
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class CodeExecutor:
+    """
+    Пул прогретых процессов для выполнения сгенерированного кода.
+
+    DataFrame публикуется один раз (publish) и подключается свободными
+    процессами заранее; публикацию освобождает вызывающий (SharedFrame.release),
+    после чего detach() отключает файл от процессов. Запуски из разных
+    потоков распределяются по свободным процессам. namespace_factory
+    добавляет в пространство имен кода имена, зависящие от DataFrame
+    (например, функции для кода графиков).
+
+    Example:
+        executor = CodeExecutor()
+        with executor.publish(df) as frame:
+            result = executor.run("print(df.shape)", frame)
+        executor.detach()
+    """
+
+    def __init__(self, workers: int = CODE_EXECUTOR_WORKERS, timeout: float = CODE_EXECUTION_TIMEOUT,
+                 memory_limit_mb: int = CODE_EXECUTION_MEMORY_MB,
+                 namespace_factory: Optional[NamespaceFactory] = None):
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.recycled = 0
+        self._namespace_factory = namespace_factory
+        # spawn: процессы не наследуют потоки Streamlit и состояние pyplot родителя
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers = max(workers, 1)
+        self._live: Set[_Worker] = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(self._workers):
+            self._idle.put(self._start_worker())
+        logger.info(f"Пул выполнения кода: {self._workers} процессов, таймаут {timeout} с, "
+                    f"память {memory_limit_mb or 'без ограничения'} МБ")
+
+    def publish(self, df: pd.DataFrame, key: Optional[Hashable] = None) -> SharedFrame:
+        """
+        Публикует DataFrame (share_frame) и подключает его к свободным процессам.
+
+        Args:
+            df: DataFrame
+            key: Ключ содержимого кадра: кадр с уже опубликованным ключом повторно не записывается
+
+        Returns:
+            SharedFrame для run(); вызывающий освобождает его через release()
+        """
+        frame = share_frame(df, "executor", key)
+        self._send_idle(("attach", str(frame.path)))
+        return frame
+
+    def detach(self) -> None:
+        """Отключает DataFrame от свободных процессов (освобождает отображенную память)."""
+        self._send_idle(("attach", None))
+
+    def _send_idle(self, message) -> None:
+        idle: List[_Worker] = []
+        while True:
+            try:
+                idle.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        for worker in idle:
+            try:
+                worker.conn.send(message)
+            except (BrokenPipeError, OSError):
+                pass
+            self._idle.put(worker)
+
+    def _start_worker(self) -> _Worker:
+        worker = _Worker(self._context, self.memory_limit_mb, self._namespace_factory)
+        with self._lock:
+            self._live.add(worker)
+        return worker
+
+    def _replace(self, worker: _Worker, kill: bool) -> _Worker:
+        worker.stop(kill=kill)
+        with self._lock:
+            self._live.discard(worker)
+        if self._closed:
+            return worker
+        self.recycled += 1
+        return self._start_worker()
+
+    def run(self, code: str, frame: Optional[SharedFrame] = None, timeout: Optional[float] = None,
+            stage: str = "код") -> ExecutionResult:
+        """
+        Выполняет код в свободном процессе; df доступен в коде как переменная df.
+
+        Args:
+            code: Python-код
+            frame: Публикация из publish() (None - без DataFrame)
+            timeout: Ограничение времени в секундах (по умолчанию CODE_EXECUTION_TIMEOUT)
+            stage: Имя этапа для журнала
+
+        Returns:
+            ExecutionResult с выводом print и описанием ошибки
+        """
+        timeout = self.timeout if timeout is None else timeout
+        worker = self._idle.get()
+        started = time.perf_counter()
+        try:
+            if self._closed:
+                return ExecutionResult(False, error="Пул выполнения кода остановлен")
+            if not worker.process.is_alive():
+                worker = self._replace(worker, kill=True)
+            try:
+                worker.wait_ready()
+                worker.conn.send(("run", code, str(frame.path) if frame is not None else None))
+                reply = worker.conn.recv() if worker.conn.poll(timeout) else None
+            except (EOFError, OSError):
+                if self._closed:  # процесс завершен close(kill=True) из другого потока
+                    return ExecutionResult(False, error="Пул выполнения кода остановлен",
+                                           duration=time.perf_counter() - started, crashed=True)
+                worker.process.join(timeout=5)
+                exitcode = worker.process.exitcode
+                logger.error(f"Процесс выполнения кода завершился аварийно (код {exitcode}), заменяется.")
+                worker = self._replace(worker, kill=True)
+                return ExecutionResult(False, error=f"Процесс выполнения завершился аварийно (код {exitcode})",
+                                       duration=time.perf_counter() - started, crashed=True)
+            if reply is None:
+                logger.warning(f"Код выполняется дольше {timeout} с: процесс {worker.process.pid} заменяется.")
+                worker = self._replace(worker, kill=True)
+                return ExecutionResult(False, error=f"Превышено время выполнения ({timeout} с)",
+                                       duration=time.perf_counter() - started, timed_out=True)
+            _, ok, output, error, duration, peak, recycle = reply
+            if recycle:
+                worker = self._replace(worker, kill=False)
+            logger.info(f"Этап '{stage}': {duration:.2f} с, пик памяти процесса "
+                        f"{f'{peak:.0f} МБ' if peak is not None else 'неизвестен'}")
+            return ExecutionResult(ok, output, error, duration, peak_rss_mb=peak)
+        finally:
+            self._idle.put(worker)
+
+    def close(self, kill: bool = False) -> None:
+        """
+        Останавливает процессы.
+
+        Args:
+            kill: Не ждать выполняющийся код: все процессы завершаются принудительно
+        """
+        self._closed = True
+        if kill:
+            with self._lock:
+                workers = list(self._live)
+                self._live.clear()
+            for worker in workers:
+                worker.stop(kill=True)
+            return
+        for _ in range(self._workers):
+            worker = self._idle.get()
+            worker.stop()
+            with self._lock:
+                self._live.discard(worker)
+
+    def __enter__(self) -> "CodeExecutor":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
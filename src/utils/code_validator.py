@@ -0,0 +1,549 @@
+"""
+Проверка сгенерированного кода по AST и переписывание медленных шаблонов pandas.
+
+Перед выполнением код метрик и графиков разбирается в AST:
+- импорты вне ALLOWED_IMPORTS, вызовы __import__ и обращения к os отклоняются
+  (код не выполняется);
+- известные медленные шаблоны переписываются, если замена равносильна:
+  * apply(lambda row: ..., axis=1) с арифметикой и сравнениями над row["col"] -
+    векторное выражение над столбцами;
+  * цикл по iterrows(), где строка читается только как row["col"], - ленивый
+    проход zip() по читаемым столбцам без создания Series на каждую строку;
+  * df[col].copy() - df[col]: процессы выполнения работают в режиме
+    copy-on-write, столбец копируется только при записи в него;
+  * один и тот же quantile, вычисленный несколько раз в блоке, - одна переменная;
+  * plt.savefig() без plt.close() - фигура закрывается после последнего savefig;
+- шаблоны, которые нельзя переписать без риска, попадают в предупреждения.
+
+Правки вносятся в исходный текст по позициям узлов AST, поэтому
+комментарии (в том числе маркеры "# График N:") сохраняются.
+"""
+import ast
+import copy
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from config.settings import ALLOWED_IMPORTS
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Имя подготовленного DataFrame в пространстве имен процессов выполнения
+FRAME_NAME = "df"
+# Повторных проходов: вложенные шаблоны переписываются на следующем проходе
+MAX_PASSES = 3
+
+_VECTOR_BINOPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.BitAnd, ast.BitOr)
+_VECTOR_UNARYOPS = (ast.UAdd, ast.USub, ast.Invert)
+_VECTOR_CMPOPS = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+_SCOPES = (ast.Lambda, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef,
+           ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+_MUTATING_METHODS = {"update", "insert", "pop"}
+_FIGURE_FACTORIES = {"figure", "subplots", "subplot_mosaic"}
+# Модули, имена которых нельзя использовать без разрешенного импорта (даже если они доступны в процессе)
+_UNSAFE_NAMES = {"os"}
+
+
+@dataclass
+class CodeRewrite:
+    """Переписанный фрагмент кода."""
+    line: int
+    kind: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"строка {self.line}: {self.message}"
+
+
+@dataclass
+class ValidationResult:
+    """Результат проверки: код для выполнения, внесенные правки, предупреждения и ошибки."""
+    code: str
+    rewrites: List[CodeRewrite] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        """Код можно выполнять."""
+        return not self.errors
+
+
+@dataclass
+class _Edit:
+    start: int
+    end: int
+    text: str
+    rewrite: CodeRewrite
+
+
+class _Source:
+    """Исходный текст и перевод позиций узлов AST (столбцы в байтах UTF-8) в индексы строки."""
+
+    def __init__(self, code: str):
+        self.code = code
+        self.lines = code.split("\n")
+        self.starts = [0]
+        for line in self.lines:
+            self.starts.append(self.starts[-1] + len(line) + 1)
+
+    def offset(self, lineno: int, col: int) -> int:
+        line = self.lines[lineno - 1]
+        return self.starts[lineno - 1] + len(line.encode("utf-8")[:col].decode("utf-8", errors="ignore"))
+
+    def span(self, node: ast.AST) -> Tuple[int, int]:
+        return self.offset(node.lineno, node.col_offset), self.offset(node.end_lineno, node.end_col_offset)
+
+    def text(self, node: ast.AST) -> str:
+        start, end = self.span(node)
+        return self.code[start:end]
+
+    def starts_line(self, node: ast.stmt) -> bool:
+        """Оператор стоит в начале своей строки (не после "if x:" или ";")."""
+        line = self.lines[node.lineno - 1]
+        return not line.encode("utf-8")[:node.col_offset].strip()
+
+    def indent(self, node: ast.stmt) -> str:
+        return self.lines[node.lineno - 1].encode("utf-8")[:node.col_offset].decode("utf-8")
+
+
+def _dotted(node: ast.AST) -> Optional[str]:
+    """Имя вида "plt.figure" для Name/Attribute, иначе None."""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = _dotted(node.value)
+        return f"{base}.{node.attr}" if base else None
+    return None
+
+
+def _is_constant(node: ast.AST) -> bool:
+    if isinstance(node, ast.Constant):
+        return True
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        return _is_constant(node.operand)
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return all(_is_constant(element) for element in node.elts)
+    return False
+
+
+def _is_stable(node: ast.AST) -> bool:
+    """Выражение без вызовов (имя, атрибут, индексация константой): его можно вычислить повторно."""
+    if isinstance(node, ast.Name):
+        return True
+    if isinstance(node, ast.Attribute):
+        return _is_stable(node.value)
+    if isinstance(node, ast.Subscript):
+        return _is_stable(node.value) and _is_constant(node.slice)
+    return False
+
+
+def _root_name(node: ast.AST) -> Optional[str]:
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        node = node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _is_column_of(node: ast.AST, name: str) -> bool:
+    """node - это name["столбец"] (чтение)."""
+    return (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id == name
+            and isinstance(node.ctx, ast.Load) and isinstance(node.slice, ast.Constant)
+            and isinstance(node.slice.value, str))
+
+
+def _blocks(tree: ast.AST) -> Iterable[List[ast.stmt]]:
+    """Все списки операторов (тела модуля, циклов, условий, функций, обработчиков)."""
+    for node in ast.walk(tree):
+        for name in ("body", "orelse", "finalbody"):
+            block = getattr(node, name, None)
+            if isinstance(block, list) and block and isinstance(block[0], ast.stmt):
+                yield block
+
+
+def _check_imports(tree: ast.AST, allowed: Iterable[str]) -> List[str]:
+    allowed = set(allowed)
+    errors = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                errors.append(f"строка {node.lineno}: относительный импорт запрещен")
+                continue
+            modules = [node.module or ""]
+        elif isinstance(node, ast.Call) and _dotted(node.func) in ("__import__", "builtins.__import__"):
+            errors.append(f"строка {node.lineno}: динамический импорт (__import__) запрещен")
+            continue
+        elif isinstance(node, ast.Name) and node.id in _UNSAFE_NAMES and node.id not in allowed:
+            errors.append(f"строка {node.lineno}: обращение к '{node.id}' запрещено")
+            continue
+        else:
+            continue
+        for module in modules:
+            if module.split(".")[0] not in allowed:
+                errors.append(f"строка {node.lineno}: импорт '{module}' запрещен "
+                              f"(разрешены: {', '.join(sorted(allowed))})")
+    return errors
+
+
+class _ColumnSubstituter(ast.NodeTransformer):
+    """Заменяет row["col"] на <frame>["col"]."""
+
+    def __init__(self, param: str, frame: ast.AST):
+        self.param = param
+        self.frame = frame
+
+    def visit_Subscript(self, node: ast.Subscript) -> ast.AST:
+        if _is_column_of(node, self.param):
+            return ast.Subscript(value=copy.deepcopy(self.frame), slice=node.slice, ctx=ast.Load())
+        return self.generic_visit(node)
+
+
+def _vectorizable(node: ast.AST, param: str) -> bool:
+    """Выражение из арифметики и одиночных сравнений над param["col"] и числами."""
+    if _is_column_of(node, param):
+        return True
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, (int, float)) and not isinstance(node.value, bool)
+    if isinstance(node, ast.BinOp):
+        return (isinstance(node.op, _VECTOR_BINOPS) and _vectorizable(node.left, param)
+                and _vectorizable(node.right, param))
+    if isinstance(node, ast.UnaryOp):
+        return isinstance(node.op, _VECTOR_UNARYOPS) and _vectorizable(node.operand, param)
+    if isinstance(node, ast.Compare):
+        return (len(node.ops) == 1 and isinstance(node.ops[0], _VECTOR_CMPOPS)
+                and _vectorizable(node.left, param) and _vectorizable(node.comparators[0], param))
+    return False
+
+
+def _is_row_apply(node: ast.AST) -> bool:
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "apply"):
+        return False
+    return any(keyword.arg == "axis" and isinstance(keyword.value, ast.Constant)
+               and keyword.value.value in (1, "columns") for keyword in node.keywords)
+
+
+def _rewrite_row_apply(node: ast.Call, source: _Source) -> Optional[_Edit]:
+    receiver = node.func.value
+    if len(node.args) != 1 or len(node.keywords) != 1 or not _is_stable(receiver):
+        return None
+    function = node.args[0]
+    if not isinstance(function, ast.Lambda):
+        return None
+    arguments = function.args
+    if (len(arguments.args) != 1 or arguments.vararg or arguments.kwarg or arguments.kwonlyargs
+            or arguments.defaults or getattr(arguments, "posonlyargs", [])):
+        return None
+    param = arguments.args[0].arg
+    if not _vectorizable(function.body, param) or not any(
+            _is_column_of(child, param) for child in ast.walk(function.body)):
+        return None
+    body = _ColumnSubstituter(param, receiver).visit(copy.deepcopy(function.body))
+    start, end = source.span(node)
+    return _Edit(start, end, f"({ast.unparse(body)})", CodeRewrite(
+        node.lineno, "apply_axis1", "apply(axis=1) заменен векторным выражением над столбцами"))
+
+
+def _rewrite_iterrows(loop: ast.For, tree: ast.AST, source: _Source) -> List[_Edit]:
+    receiver = loop.iter.func.value
+    target = loop.target
+    if (loop.iter.args or loop.iter.keywords or not _is_stable(receiver)
+            or not (isinstance(target, ast.Tuple) and len(target.elts) == 2
+                    and all(isinstance(element, ast.Name) for element in target.elts))):
+        return []
+    row = target.elts[1].id
+    # Другие циклы с той же переменной строки связывают ее заново
+    rebound = set()
+    for other in ast.walk(tree):
+        if other is not loop and isinstance(other, ast.For) and any(
+                isinstance(name, ast.Name) and name.id == row for name in ast.walk(other.target)):
+            rebound.update(id(child) for child in ast.walk(other))
+    # Строка должна использоваться только как row["столбец"] внутри тела цикла
+    reads = [child for statement in loop.body for child in ast.walk(statement)
+             if _is_column_of(child, row) and id(child) not in rebound]
+    allowed = rebound | {id(target.elts[1])} | {id(read.value) for read in reads}
+    if not reads or any(isinstance(child, ast.Name) and child.id == row and id(child) not in allowed
+                        for child in ast.walk(tree)):
+        return []
+    # Проход только по читаемым столбцам: итераторы столбцов не копируют данные,
+    # а row["столбец"] становится row[позиция] в кортеже значений
+    columns = list(dict.fromkeys(read.slice.value for read in reads))
+    frame = source.text(receiver)
+    rewrite = CodeRewrite(loop.lineno, "iterrows",
+                          f"цикл по iterrows() заменен проходом по столбцам {', '.join(map(repr, columns))}")
+    start, end = source.span(loop.iter)
+    values = ", ".join(f"{frame}[{column!r}]" for column in columns)
+    edits = [_Edit(start, end, f"zip({frame}.index, zip({values}))", rewrite)]
+    for read in reads:
+        start, end = source.span(read)
+        edits.append(_Edit(start, end, f"{row}[{columns.index(read.slice.value)}]", rewrite))
+    return edits
+
+
+def _rewrite_copy(node: ast.Call, source: _Source) -> Optional[_Edit]:
+    receiver = node.func.value
+    if not (isinstance(receiver, ast.Subscript) and isinstance(receiver.value, ast.Name)
+            and receiver.value.id == FRAME_NAME and not node.args):
+        return None
+    if any(not (keyword.arg == "deep" and isinstance(keyword.value, ast.Constant) and keyword.value.value is True)
+           for keyword in node.keywords):
+        return None
+    start, end = source.span(node)
+    text = source.text(receiver)
+    return _Edit(start, end, text, CodeRewrite(
+        node.lineno, "copy", f"{text}.copy() заменен на {text}: при copy-on-write копия создается только при записи"))
+
+
+class _QuantileCollector(ast.NodeVisitor):
+    """Безусловно вычисляемые вызовы quantile с константными аргументами."""
+
+    def __init__(self):
+        self.calls: List[ast.Call] = []
+
+    def visit_Call(self, node: ast.Call) -> None:
+        if (isinstance(node.func, ast.Attribute) and node.func.attr == "quantile" and _is_stable(node.func.value)
+                and all(_is_constant(arg) for arg in node.args)
+                and all(keyword.arg and _is_constant(keyword.value) for keyword in node.keywords)):
+            self.calls.append(node)
+        self.generic_visit(node)
+
+    def visit_IfExp(self, node: ast.IfExp) -> None:
+        self.visit(node.test)
+
+    def visit_BoolOp(self, node: ast.BoolOp) -> None:
+        self.visit(node.values[0])
+
+    def generic_visit(self, node: ast.AST) -> None:
+        if isinstance(node, _SCOPES):
+            return
+        super().generic_visit(node)
+
+
+def _modifies(statements: List[ast.stmt], names: Set[str]) -> bool:
+    """Операторы присваивают, удаляют или меняют на месте объекты с корнем из names."""
+    for statement in statements:
+        for node in ast.walk(statement):
+            if isinstance(node, (ast.Name, ast.Subscript, ast.Attribute)) and isinstance(node.ctx, (ast.Store, ast.Del)):
+                if _root_name(node) in names:
+                    return True
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) \
+                    and _root_name(node.func.value) in names:
+                if node.func.attr in _MUTATING_METHODS or any(keyword.arg == "inplace" for keyword in node.keywords):
+                    return True
+    return False
+
+
+def _rewrite_quantiles(block: List[ast.stmt], source: _Source, taken: Set[str]) -> List[_Edit]:
+    groups: Dict[str, List[Tuple[int, ast.Call]]] = {}
+    for index, statement in enumerate(block):
+        if any(isinstance(getattr(statement, name, None), list) for name in ("body", "orelse", "handlers")):
+            continue  # выражения составных операторов не поднимаются
+        collector = _QuantileCollector()
+        collector.visit(statement)
+        for call in collector.calls:
+            groups.setdefault(ast.dump(call), []).append((index, call))
+    edits = []
+    for occurrences in groups.values():
+        if len(occurrences) < 2:
+            continue
+        first, last = occurrences[0][0], occurrences[-1][0]
+        names = {child.id for child in ast.walk(occurrences[0][1].func.value) if isinstance(child, ast.Name)}
+        # Объект не должен меняться между первым и последним вычислением
+        if not source.starts_line(block[first]) or _modifies(block[first:last], names):
+            continue
+        variable = next(f"_q{n}" for n in range(1, len(taken) + 2) if f"_q{n}" not in taken)
+        taken.add(variable)
+        call = occurrences[0][1]
+        call_text = source.text(call)
+        start = source.starts[block[first].lineno - 1]
+        rewrite = CodeRewrite(call.lineno, "quantile",
+                              f"{call_text} вычислялся {len(occurrences)} раза: результат сохранен в {variable}")
+        edits.append(_Edit(start, start, f"{source.indent(block[first])}{variable} = {call_text}\n", rewrite))
+        for _, occurrence in occurrences:
+            occurrence_start, occurrence_end = source.span(occurrence)
+            edits.append(_Edit(occurrence_start, occurrence_end, variable, rewrite))
+    return edits
+
+
+def _pyplot_aliases(tree: ast.AST) -> Set[str]:
+    aliases = {"plt"}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            aliases.update(alias.asname for alias in node.names if alias.name == "matplotlib.pyplot" and alias.asname)
+        elif isinstance(node, ast.ImportFrom) and node.module == "matplotlib":
+            aliases.update(alias.asname or alias.name for alias in node.names if alias.name == "pyplot")
+    return aliases
+
+
+def _is_close(statement: ast.stmt, aliases: Set[str]) -> bool:
+    return (isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Call)
+            and isinstance(statement.value.func, ast.Attribute) and statement.value.func.attr == "close"
+            and _dotted(statement.value.func.value) in aliases)
+
+
+def _is_savefig(node: ast.AST) -> bool:
+    return isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "savefig"
+
+
+def _saved_again(statement: ast.stmt, positions: Dict[int, Tuple[List[ast.stmt], int, ast.AST]],
+                 aliases: Set[str]) -> bool:
+    """Есть ли после statement еще один savefig до создания новой фигуры (во внешних блоках тоже)."""
+    node = statement
+    while id(node) in positions:
+        block, index, owner = positions[id(node)]
+        for following in block[index + 1:]:
+            nodes = list(ast.walk(following))
+            if any(isinstance(child, ast.Call) and isinstance(child.func, ast.Attribute)
+                   and child.func.attr in _FIGURE_FACTORIES and _dotted(child.func.value) in aliases
+                   for child in nodes):
+                return False
+            if any(_is_savefig(child) for child in nodes):
+                return True
+        if isinstance(owner, (ast.Module, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            return False
+        node = owner
+    return False
+
+
+def _rewrite_figures(tree: ast.Module, source: _Source) -> List[_Edit]:
+    aliases = _pyplot_aliases(tree)
+    calls = [node for node in ast.walk(tree) if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)]
+    created = [node for node in calls if node.func.attr in _FIGURE_FACTORIES and _dotted(node.func.value) in aliases]
+    if not created or any(node.func.attr == "close" and _dotted(node.func.value) in aliases for node in calls):
+        return []
+    alias = _dotted(created[0].func.value)
+    rewrite = CodeRewrite(created[0].lineno, "plt_close",
+                          f"{alias}.{created[0].func.attr}() без {alias}.close(): фигуры закрываются после сохранения")
+    # оператор -> (блок, позиция, владелец блока); обработчики except относятся к своему try
+    positions = {}
+    for node in ast.walk(tree):
+        owners = [(node, node)] + [(handler, node) for handler in getattr(node, "handlers", [])]
+        for holder, owner in owners:
+            for name in ("body", "orelse", "finalbody"):
+                for index, statement in enumerate(getattr(holder, name, None) or []):
+                    if isinstance(statement, ast.stmt):
+                        positions[id(statement)] = (getattr(holder, name), index, owner)
+    edits = []
+    for block in _blocks(tree):
+        for index, statement in enumerate(block):
+            if not (isinstance(statement, ast.Expr) and _is_savefig(statement.value)):
+                continue
+            following = block[index + 1] if index + 1 < len(block) else None
+            if not source.starts_line(statement) or (following is not None and _is_close(following, aliases)):
+                continue
+            # фигура закрывается только после последнего savefig: plt.savefig('a.png'); plt.savefig('b.pdf')
+            if _saved_again(statement, positions, aliases):
+                continue
+            # fig.savefig(...) -> plt.close(fig), plt.savefig(...) -> plt.close()
+            figure = statement.value.func.value
+            target = "" if _dotted(figure) in aliases else source.text(figure)
+            end = source.starts[statement.end_lineno] - 1
+            edits.append(_Edit(end, end, f"\n{source.indent(statement)}{alias}.close({target})", rewrite))
+    if not edits:
+        end = len(source.code)
+        separator = "" if source.code.endswith("\n") else "\n"
+        edits.append(_Edit(end, end, f"{separator}{alias}.close('all')\n", rewrite))
+    return edits
+
+
+def _warnings(tree: ast.AST) -> List[str]:
+    """Шаблоны, оставшиеся после переписывания."""
+    warnings = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "iterrows":
+            warnings.append(f"строка {node.lineno}: цикл по iterrows() создает Series на каждую строку; "
+                            f"используйте векторные операции над столбцами")
+        elif _is_row_apply(node):
+            warnings.append(f"строка {node.lineno}: apply(axis=1) вызывает Python-функцию для каждой строки; "
+                            f"используйте векторные операции над столбцами")
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "resample" \
+                and _root_name(node.func.value) == FRAME_NAME \
+                and not any(isinstance(child, ast.Call) and isinstance(child.func, ast.Attribute)
+                            and child.func.attr == "set_index" for child in ast.walk(node.func.value)):
+            warnings.append(f"строка {node.lineno}: resample по {FRAME_NAME} без set_index: индекс не DatetimeIndex, "
+                            f"используйте {FRAME_NAME}.set_index('столбец_даты').resample(...)")
+    return warnings
+
+
+def _collect_edits(tree: ast.Module, source: _Source) -> List[_Edit]:
+    edits = []
+    for node in ast.walk(tree):
+        edit = None
+        if _is_row_apply(node):
+            edit = _rewrite_row_apply(node, source)
+        elif isinstance(node, ast.For) and isinstance(node.iter, ast.Call) \
+                and isinstance(node.iter.func, ast.Attribute) and node.iter.func.attr == "iterrows":
+            edits.extend(_rewrite_iterrows(node, tree, source))
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "copy":
+            edit = _rewrite_copy(node, source)
+        if edit is not None:
+            edits.append(edit)
+    taken = {node.id for node in ast.walk(tree) if isinstance(node, ast.Name)}
+    for block in _blocks(tree):
+        edits.extend(_rewrite_quantiles(block, source, taken))
+    edits.extend(_rewrite_figures(tree, source))
+    return edits
+
+
+def _apply_edits(code: str, edits: List[_Edit]) -> Tuple[str, List[CodeRewrite]]:
+    """Применяет непересекающиеся правки; пересекающиеся откладываются до следующего прохода."""
+    accepted: List[_Edit] = []
+    last_end = -1
+    for edit in sorted(edits, key=lambda e: (e.start, e.end)):
+        if edit.start < last_end:
+            continue
+        accepted.append(edit)
+        last_end = max(last_end, edit.end)
+    # Правка группы (quantile, iterrows) применяется целиком или не применяется
+    accepted_ids = {id(edit) for edit in accepted}
+    rejected = {id(edit.rewrite) for edit in edits if id(edit) not in accepted_ids}
+    accepted = [edit for edit in accepted if id(edit.rewrite) not in rejected]
+    for edit in sorted(accepted, key=lambda e: (e.start, e.end), reverse=True):
+        code = code[:edit.start] + edit.text + code[edit.end:]
+    rewrites: List[CodeRewrite] = []
+    for edit in accepted:
+        if all(edit.rewrite is not rewrite for rewrite in rewrites):
+            rewrites.append(edit.rewrite)
+    return code, sorted(rewrites, key=lambda rewrite: rewrite.line)
+
+
+def validate_code(code: str, context_name: str = "", allowed_imports: Optional[Iterable[str]] = None) -> ValidationResult:
+    """
+    Проверяет сгенерированный код и переписывает медленные шаблоны.
+
+    Args:
+        code: Python-код (без преамбулы с обязательными импортами)
+        context_name: Имя этапа для журнала
+        allowed_imports: Разрешенные модули верхнего уровня (по умолчанию ALLOWED_IMPORTS)
+
+    Returns:
+        ValidationResult: переписанный код, правки, предупреждения; при ошибках код не выполняется
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        logger.warning(f"Проверка кода ({context_name}): синтаксическая ошибка: {e}")
+        return ValidationResult(code, errors=[f"Синтаксическая ошибка: {e}"])
+    errors = _check_imports(tree, ALLOWED_IMPORTS if allowed_imports is None else allowed_imports)
+    if errors:
+        logger.warning(f"Проверка кода ({context_name}): код отклонен: {errors}")
+        return ValidationResult(code, errors=errors)
+
+    result = ValidationResult(code)
+    for _ in range(MAX_PASSES):
+        edits = _collect_edits(tree, _Source(result.code))
+        if not edits:
+            break
+        rewritten, rewrites = _apply_edits(result.code, edits)
+        try:
+            tree = ast.parse(rewritten)
+        except SyntaxError as e:  # pragma: no cover - правки сохраняют синтаксис
+            logger.error(f"Проверка кода ({context_name}): переписанный код не разбирается ({e}), правки отменены")
+            break
+        result.code = rewritten
+        result.rewrites.extend(rewrites)
+    result.warnings = _warnings(tree)
+    for rewrite in result.rewrites:
+        logger.info(f"Проверка кода ({context_name}): {rewrite}")
+    for warning in result.warnings:
+        logger.warning(f"Проверка кода ({context_name}): {warning}")
+    return result
@@ -0,0 +1,198 @@
+"""
+Работа с файлами: хэширование исходных файлов, колоночный кэш (Feather)
+и передача DataFrame в дочерние процессы через файл
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from config.settings import FILE_CACHE_DIR, FILE_CACHE_ENABLED
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - зависит от окружения
+    pa = None
+    feather = None
+
+HASH_CHUNK_SIZE = 1 << 20
+
+# Хэши уже прочитанных файлов: (путь, mtime, размер) -> хэш содержимого
+_hash_memo: Dict[Tuple[str, int, int], str] = {}
+
+
+def compute_content_hash(source) -> str:
+    """
+    Вычисляет хэш содержимого файла (BLAKE2b).
+
+    Для файлов на диске результат запоминается по (путь, mtime, размер),
+    поэтому повторные вызовы для неизменного файла не читают его заново.
+
+    Args:
+        source: Путь к файлу или file-like объект
+
+    Returns:
+        Шестнадцатеричная строка хэша
+    """
+    if isinstance(source, (str, os.PathLike)):
+        stat = os.stat(source)
+        memo_key = (os.path.abspath(source), stat.st_mtime_ns, stat.st_size)
+        if memo_key in _hash_memo:
+            return _hash_memo[memo_key]
+        digest = hashlib.blake2b(digest_size=16)
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        _hash_memo[memo_key] = digest.hexdigest()
+        return _hash_memo[memo_key]
+
+    digest = hashlib.blake2b(digest_size=16)
+    position = source.tell() if hasattr(source, "tell") else None
+    source.seek(0)
+    for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    if position is not None:
+        source.seek(position)
+    return digest.hexdigest()
+
+
+class ColumnarCache:
+    """
+    Кэш DataFrame в формате Feather (Arrow IPC) с ключом по хэшу содержимого.
+
+    Рядом с каждым `.feather` файлом хранится `.json` с метаданными
+    (источник, размерность, параметры чтения). Файлы пишутся без сжатия,
+    чтобы при чтении их можно было отобразить в память.
+    """
+
+    def __init__(self, cache_dir: Optional[Path] = None, enabled: bool = FILE_CACHE_ENABLED):
+        self.cache_dir = Path(cache_dir or FILE_CACHE_DIR)
+        self.enabled = enabled and feather is not None
+        if enabled and feather is None:
+            logger.warning("pyarrow не установлен. Колоночный кэш файлов отключен.")
+
+    def data_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.feather"
+
+    def meta_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def load(self, key: str) -> Optional[pd.DataFrame]:
+        """Читает DataFrame из кэша (memory-map) или возвращает None."""
+        if not self.enabled or not self.data_path(key).exists():
+            return None
+        try:
+            table = feather.read_table(str(self.data_path(key)), memory_map=True)
+            df = table.to_pandas()
+            logger.info(f"DataFrame загружен из колоночного кэша: {self.data_path(key)}")
+            return df
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать кэш {self.data_path(key)}: {e}")
+            return None
+
+    def save(self, key: str, df: pd.DataFrame, metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Сохраняет DataFrame в кэш.
+
+        Returns:
+            True если кэш записан, False если формат не поддерживает данные
+        """
+        if not self.enabled:
+            return False
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.data_path(key).with_suffix(".feather.tmp")
+            feather.write_feather(df, str(tmp_path), compression="uncompressed")
+            os.replace(tmp_path, self.data_path(key))
+            meta = dict(metadata or {})
+            meta.update({"rows": int(df.shape[0]), "columns": int(df.shape[1])})
+            self.write_metadata(key, meta)
+            logger.info(f"DataFrame сохранен в колоночный кэш: {self.data_path(key)}")
+            return True
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить DataFrame в кэш: {e}")
+            return False
+
+    def metadata(self, key: str) -> Dict[str, Any]:
+        """Метаданные записи кэша (пустой словарь, если их нет)."""
+        try:
+            with open(self.meta_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write_metadata(self, key: str, metadata: Dict[str, Any]) -> None:
+        """Перезаписывает метаданные записи кэша."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.meta_path(key), "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+
+def _frame_table(df: pd.DataFrame) -> "pa.Table":
+    """
+    Таблица Arrow для передачи DataFrame; NaN в столбцах float остаются значениями.
+
+    Arrow по умолчанию превращает NaN в null, и при чтении такой столбец
+    собирается заново; без null буфер float отображается в numpy без копирования.
+    """
+    table = pa.Table.from_pandas(df)
+    for i in range(df.shape[1]):
+        dtype = df.dtypes.iloc[i]
+        if isinstance(dtype, np.dtype) and dtype.kind == "f" and table.column(i).null_count:
+            table = table.set_column(i, table.schema.field(i), pa.array(df.iloc[:, i].to_numpy()))
+    return table
+
+
+def write_frame_file(df: pd.DataFrame, path_base: Path) -> Path:
+    """
+    Сохраняет DataFrame в файл для передачи в дочерние процессы.
+
+    Используется Feather (Arrow IPC) без сжатия: процессы отображают файл
+    в память и собирают DataFrame поверх его буферов (см. read_frame_file);
+    если pyarrow недоступен или не поддерживает типы столбцов - pickle.
+
+    Args:
+        df: DataFrame
+        path_base: Путь к файлу без расширения
+
+    Returns:
+        Путь к записанному файлу (.feather или .pkl)
+    """
+    path_base = Path(path_base)
+    path_base.parent.mkdir(parents=True, exist_ok=True)
+    if feather is not None:
+        path = path_base.with_suffix(".feather")
+        try:
+            table = _frame_table(df)
+            with pa.OSFile(str(path), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            return path
+        except Exception as e:
+            logger.warning(f"DataFrame не сохраняется в Feather ({e}), используется pickle")
+            path.unlink(missing_ok=True)
+    path = path_base.with_suffix(".pkl")
+    df.to_pickle(path)
+    return path
+
+
+def read_frame_file(path: Path) -> pd.DataFrame:
+    """
+    Читает DataFrame, записанный write_frame_file.
+
+    Feather отображается в память: столбцы чисел, дат, строк и категорий без
+    пропусков ссылаются на страницы файла без копирования (только для чтения,
+    запись в них копирует столбец). Bool и столбцы с null копируются.
+    """
+    path = Path(path)
+    if path.suffix == ".feather":
+        table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+        # split_blocks: каждый столбец - отдельный блок, без объединения (и копирования) в 2D-массивы
+        return table.to_pandas(split_blocks=True)
+    return pd.read_pickle(path)
@@ -0,0 +1,134 @@
+"""
+Передача подготовленного DataFrame дочерним процессам без копирования.
+
+Кадр публикуется один раз как Arrow IPC (write_frame_file) в разделяемой
+памяти (FRAME_SHM_DIR, обычно /dev/shm) или, если там мало места, в
+FRAME_TRANSPORT_DIR. Процессы графиков и выполнения кода отображают файл
+в память только для чтения (attach_frame) и не копируют столбцы.
+
+Публикации считают ссылки: повторная публикация того же объекта DataFrame
+(или кадра с тем же ключом, например ключом подготовленного кадра в
+DatasetStore, который каждый раз отдает новое представление) возвращает тот
+же файл, файл удаляется после освобождения последней ссылки.
+"""
+import shutil
+import threading
+import uuid
+import weakref
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional
+import pandas as pd
+from config.settings import FRAME_SHM_DIR, FRAME_TRANSPORT_DIR
+from src.utils.file_handler import read_frame_file, write_frame_file
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Запас места в разделяемой памяти относительно размера кадра
+SHM_HEADROOM = 1.5
+
+
+class SharedFrame:
+    """
+    Опубликованный DataFrame: путь к файлу и счетчик ссылок.
+
+    Example:
+        with share_frame(df) as frame:
+            executor.run(code, frame)
+    """
+
+    def __init__(self, path: Path, nbytes: int, source: pd.DataFrame, key: Optional[Hashable] = None):
+        self.path = path
+        self.nbytes = nbytes
+        self.refs = 1
+        self.key = key
+        self._source = weakref.ref(source)
+
+    def matches(self, df: pd.DataFrame, key: Optional[Hashable]) -> bool:
+        """Публикация того же кадра: по ключу, если он задан, иначе по объекту."""
+        return self.key == key if key is not None else self._source() is df
+
+    def release(self) -> None:
+        """Освобождает ссылку; после последней файл удаляется."""
+        with _lock:
+            if self.refs == 0:
+                return
+            self.refs -= 1
+            if self.refs:
+                return
+            _published.pop(self.path, None)
+        try:
+            self.path.unlink(missing_ok=True)
+        except OSError as e:  # Windows: файл еще отображен в память процессом
+            logger.warning(f"Не удалось удалить файл DataFrame {self.path}: {e}")
+        logger.info(f"Файл DataFrame освобожден: {self.path}")
+
+    def __enter__(self) -> "SharedFrame":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+    def __repr__(self) -> str:
+        return f"SharedFrame({self.path}, refs={self.refs})"
+
+
+_lock = threading.Lock()
+_published: Dict[Path, SharedFrame] = {}
+
+
+def _frame_dir(nbytes: int) -> Path:
+    """Каталог для файла: разделяемая память, если в ней хватает места."""
+    try:
+        if FRAME_SHM_DIR.is_dir() and shutil.disk_usage(FRAME_SHM_DIR).free > nbytes * SHM_HEADROOM:
+            return FRAME_SHM_DIR
+    except OSError:
+        pass
+    return FRAME_TRANSPORT_DIR
+
+
+def share_frame(df: pd.DataFrame, prefix: str = "frame", key: Optional[Hashable] = None) -> SharedFrame:
+    """
+    Публикует DataFrame для дочерних процессов или добавляет ссылку на уже опубликованный.
+
+    Args:
+        df: DataFrame (после публикации не должен изменяться на месте)
+        prefix: Префикс имени файла
+        key: Ключ содержимого кадра (None - кадры сравниваются как объекты)
+
+    Returns:
+        SharedFrame; вызывающий освобождает его через release()
+    """
+    with _lock:
+        for frame in _published.values():
+            if frame.matches(df, key):
+                frame.refs += 1
+                return frame
+    nbytes = int(df.memory_usage(deep=True).sum())
+    path = write_frame_file(df, _frame_dir(nbytes) / f"ai-ds-{prefix}-{uuid.uuid4().hex}")
+    frame = SharedFrame(path, nbytes, df, key)
+    with _lock:
+        _published[path] = frame
+    logger.info(f"DataFrame опубликован для процессов: {path} ({nbytes / 2 ** 20:.1f} МБ)")
+    return frame
+
+
+def attach_frame(path) -> pd.DataFrame:
+    """
+    DataFrame из опубликованного файла (в дочернем процессе, без копирования столбцов).
+
+    Столбцы ссылаются на память только для чтения: коду передается
+    поверхностная копия (df.copy(deep=False)), и copy-on-write копирует
+    столбец при первой записи в него.
+    """
+    if int(pd.__version__.split(".")[0]) < 3:
+        # В pandas 2 copy-on-write включается явно (в pandas 3 он всегда включен)
+        pd.set_option("mode.copy_on_write", True)
+    return read_frame_file(Path(path))
+
+
+def published_frames() -> List[SharedFrame]:
+    """Опубликованные и еще не освобожденные кадры."""
+    with _lock:
+        return list(_published.values())
+
@@ -0,0 +1,58 @@
+"""
+Пиковая память процесса и возврат освобожденной памяти системе.
+
+Используется процессами выполнения сгенерированного кода: перед этапом
+пик RSS сбрасывается, после этапа читается и передается в отчет.
+"""
+import ctypes
+import ctypes.util
+import gc
+import re
+import sys
+from typing import Optional
+
+_HWM_RE = re.compile(r"VmHWM:\s+(\d+)\s+kB")
+
+
+def reset_peak_rss() -> bool:
+    """
+    Сбрасывает пик RSS процесса (Linux, /proc/self/clear_refs).
+
+    Returns:
+        True, если пик сброшен; иначе peak_rss_mb вернет пик за все время процесса
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Пик RSS процесса в МБ с последнего reset_peak_rss (None, если недоступен)."""
+    try:
+        with open("/proc/self/status") as f:
+            match = _HWM_RE.search(f.read())
+        if match:
+            return int(match.group(1)) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss: килобайты в Linux, байты в macOS
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def release_memory() -> None:
+    """Собирает мусор и возвращает освобожденную память malloc системе (glibc)."""
+    gc.collect()
+    if not sys.platform.startswith("linux"):
+        return
+    try:
+        ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
@@ -0,0 +1,114 @@
+"""
+Unit тесты для модуля budget (бюджет размера промптов)
+"""
+import numpy as np
+import pandas as pd
+from langchain_core.prompts import PromptTemplate
+from src.core.metrics_engine import compute_catalogue_metrics
+from src.llm.budget import (
+    compact_value,
+    drop_redundant_metrics,
+    estimate_tokens,
+    fit_metrics_to_budget,
+    fit_text_to_budget,
+    format_metrics_table,
+    informativeness,
+    prompt_section_tokens,
+)
+
+
+def wide_metrics(columns=60):
+    """Метрики широкой таблицы, рассчитанные встроенным движком"""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({f"c{i}": rng.lognormal(size=2000) * (i + 1) for i in range(columns)})
+    metrics = ["count", "nunique", "mean", "median", "std", "var", "min", "max",
+               "quantile_25", "quantile_75", "iqr", "skew", "kurtosis"]
+    return compute_catalogue_metrics(df, {col: metrics for col in df.columns})
+
+
+class TestEstimateTokens:
+    """Тесты для функций estimate_tokens и prompt_section_tokens"""
+
+    def test_digits_cost_more_than_words(self):
+        """Тест что числа оцениваются по цифрам, а слова - частями"""
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("1234567890") == 10
+        assert estimate_tokens("metrics") == 2
+        assert estimate_tokens("метрики") == 3
+
+    def test_sections(self):
+        """Тест разбиения промпта на шаблон и переменные"""
+        prompt = PromptTemplate.from_template("Метрики: {metrics} Анализ: {summary}").partial(metrics="123")
+        sections = prompt_section_tokens(prompt, {"summary": "краткий"})
+        assert sections == {"template": estimate_tokens("Метрики:  Анализ: "), "metrics": 3, "summary": 3}
+
+
+class TestCompaction:
+    """Тесты для функций compact_value, drop_redundant_metrics и format_metrics_table"""
+
+    def test_compact_value(self):
+        """Тест округления чисел, сокращения дат и списков"""
+        assert compact_value(3.14159265) == "3.142"
+        assert compact_value(1234567.891) == "1234568"
+        assert compact_value(12.0) == "12"
+        assert compact_value(None) == "-"
+        assert compact_value("2024-01-05 00:00:00") == "2024-01-05"
+        assert compact_value(list(range(8))) == "[0, 1, 2, 3, 4, …+3]"
+
+    def test_drop_redundant_metrics(self):
+        """Тест удаления метрик, выводимых из других"""
+        metrics = {"count": 10, "nunique": 10, "std": 2.0, "var": 4.0, "quantile_25": 1, "quantile_75": 3,
+                   "iqr": 2, "mode": 1, "mode_count": 1}
+        assert set(drop_redundant_metrics(metrics)) == {"count", "nunique", "std", "quantile_25", "quantile_75"}
+        assert "var" in drop_redundant_metrics({"var": 4.0})
+
+    def test_table_groups_and_approx_marks(self):
+        """Тест что столбцы с одинаковыми метриками идут одной таблицей, приближенные помечены"""
+        results = {
+            "a": {"count": 5, "mean": 1.5},
+            "b": {"count": 7, "mean": 2.25},
+            "c": {"nunique": 1000, "approx_errors": {"nunique": {"method": "HyperLogLog",
+                                                                 "relative_std_error": 0.0081}}},
+        }
+        text = format_metrics_table(results)
+        assert "столбец | count | mean\na | 5 | 1.5\nb | 7 | 2.25" in text
+        assert "c | 1000~" in text
+        assert "c.nunique: method=HyperLogLog, relative_std_error=0.0081" in text
+
+
+class TestBudget:
+    """Тесты для функций fit_metrics_to_budget, informativeness и fit_text_to_budget"""
+
+    def test_compact_metrics_fit_without_dropping(self):
+        """Тест что сжатые метрики намного короче полного вывода словаря"""
+        results = wide_metrics(20)
+        text, dropped = fit_metrics_to_budget(results, 10 ** 6)
+        assert dropped == []
+        assert estimate_tokens(text) * 3 < estimate_tokens(str(results))
+
+    def test_over_budget_keeps_informative_columns(self):
+        """Тест что при превышении бюджета опускаются наименее информативные столбцы"""
+        results = wide_metrics(60)
+        results["const"] = {"count": 2000, "nunique": 1, "mean": 5.0, "std": 0.0}
+        text, dropped = fit_metrics_to_budget(results, 1000, rows=2000)
+        assert estimate_tokens(text) <= 1000
+        assert dropped and "const" in dropped
+        assert f"Опущены менее информативные столбцы ({len(dropped)})" in text
+        kept = [column for column in results if column not in dropped]
+        assert min(informativeness(results[c]) for c in kept) >= max(informativeness(results[c]) for c in dropped)
+
+    def test_informativeness(self):
+        """Тест оценки: постоянный столбец - 0, пропуски и асимметрия повышают оценку"""
+        assert informativeness({"count": 10, "nunique": 1}) == 0.0
+        base = {"count": 100, "nunique": 50, "mean": 10.0, "std": 1.0, "skew": 0.1}
+        assert informativeness({**base, "skew": 3.0}) > informativeness(base)
+        assert informativeness(base, rows=200) > informativeness(base, rows=100)
+
+    def test_fit_text_to_budget(self):
+        """Тест сокращения текста по абзацам"""
+        text = "\n\n".join(f"Абзац номер {i} с выводами." for i in range(50))
+        assert fit_text_to_budget(text, 10 ** 6) == text
+        short = fit_text_to_budget(text, 100)
+        assert short.startswith("Абзац номер 0")
+        assert short.endswith("[…сокращено]")
+        assert estimate_tokens(short) < estimate_tokens(text)
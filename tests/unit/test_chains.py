@@ -0,0 +1,36 @@
+"""
+Unit тесты для модуля chains (потоковая генерация)
+"""
+import pytest
+from langchain_core.language_models.fake import FakeListLLM
+from langchain_core.prompts import PromptTemplate
+from src.llm.cache import SQLiteLLMCache
+from src.llm.chains import StreamBuffer, stream_chain
+
+
+@pytest.fixture
+def prompt():
+    """Фикстура шаблона промпта"""
+    return PromptTemplate.from_template("Отчёт по {topic}")
+
+
+class TestStreamChain:
+    """Тесты для функции stream_chain"""
+
+    def test_chunks_delivered_and_joined(self, prompt):
+        """Тест передачи фрагментов и сборки полного ответа"""
+        buffer = StreamBuffer()
+        llm = FakeListLLM(responses=["итоговый отчёт"])
+        text = stream_chain(llm, prompt, {"topic": "продажам"}, on_chunk=buffer.append)
+        assert text == "итоговый отчёт"
+        assert buffer.text == text
+        assert buffer.version >= 1
+
+    def test_shares_cache_with_invoke(self, prompt, tmp_path):
+        """Тест что потоковая генерация использует тот же кэш, что и invoke"""
+        cache = SQLiteLLMCache("m", 0.1, "url", db_path=tmp_path / "llm.sqlite")
+        llm = FakeListLLM(responses=["первый", "второй", "третий"], cache=cache)
+        assert llm.invoke(prompt.format(topic="a")) == "первый"
+        assert stream_chain(llm, prompt, {"topic": "a"}) == "первый"
+        assert stream_chain(llm, prompt, {"topic": "b"}) == "второй"
+        assert llm.invoke(prompt.format(topic="b")) == "второй"
@@ -0,0 +1,87 @@
+"""
+Unit тесты для модуля code_executor (пул процессов для сгенерированного кода)
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from src.utils.code_executor import CodeExecutor
+
+
+@pytest.fixture(scope="module")
+def executor(tmp_path_factory):
+    """Фикстура пула из одного процесса с коротким таймаутом"""
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.setattr("src.utils.frame_transport.FRAME_SHM_DIR", tmp_path_factory.mktemp("frames"))
+    pool = CodeExecutor(workers=1, timeout=20, memory_limit_mb=0)
+    yield pool
+    pool.close()
+    monkeypatch.undo()
+
+
+@pytest.fixture
+def df():
+    """Фикстура с DataFrame"""
+    return pd.DataFrame({"a": np.arange(100), "b": ["x", "y"] * 50})
+
+
+class TestCodeExecutor:
+    """Тесты для класса CodeExecutor"""
+
+    def test_runs_with_preloaded_modules_and_df(self, executor, df):
+        """Тест что df и импорты доступны без преамбулы"""
+        frame = executor.publish(df)
+        assert executor.publish(df) is frame
+        assert frame.refs == 2
+        result = executor.run("print(int(np.sum(df['a'])), pd.api.types.is_string_dtype(df['b']))", frame)
+        assert result.ok
+        assert result.output.strip() == "4950 True"
+
+    def test_namespace_not_shared_between_runs(self, executor, df):
+        """Тест что переменные одного запуска не видны в следующем"""
+        frame = executor.publish(df)
+        assert executor.run("leftover = 1", frame).ok
+        result = executor.run("print(leftover)", frame)
+        assert not result.ok
+        assert result.error == "NameError: name 'leftover' is not defined (строка 1)"
+
+    def test_peak_rss_reported_per_run(self, executor):
+        """Тест что пик памяти считается для каждого запуска отдельно"""
+        heavy = executor.run("block = np.ones(300 * 2 ** 17)\nprint(block.nbytes)")
+        light = executor.run("print(1)")
+        assert heavy.ok and light.ok
+        if heavy.peak_rss_mb is None:
+            pytest.skip("пик RSS недоступен на этой платформе")
+        assert heavy.peak_rss_mb > light.peak_rss_mb + 200
+
+    def test_writes_to_df_not_shared_between_runs(self, executor, df):
+        """Тест что запись в df (память только для чтения) копирует столбец и не видна следующему запуску"""
+        frame = executor.publish(df)
+        result = executor.run("df.loc[0, 'a'] = -1\nprint(df.loc[0, 'a'])", frame)
+        assert result.ok, result.error
+        assert result.output.strip() == "-1"
+        assert executor.run("print(df.loc[0, 'a'])", frame).output.strip() == "0"
+
+    def test_timeout_recycles_worker(self, executor, df):
+        """Тест что зависший код прерывается, а пул продолжает работать"""
+        frame = executor.publish(df)
+        recycled = executor.recycled
+        result = executor.run("while True:\n    pass", frame, timeout=0.5)
+        assert result.timed_out and not result.ok
+        assert executor.recycled == recycled + 1
+        assert executor.run("print(len(df))", frame).output.strip() == "100"
+
+    def test_crash_recycles_worker(self, executor):
+        """Тест что аварийное завершение процесса не ломает пул"""
+        result = executor.run("import os\nos._exit(3)")
+        assert result.crashed
+        assert "код 3" in result.error
+        assert executor.run("print('ok')").output.strip() == "ok"
+
+    def test_detach_after_release(self, executor, df):
+        """Тест что после освобождения публикации файл удален, а процессы работают без df"""
+        frame = executor.publish(df.copy())
+        assert executor.run("print(len(df))", frame).ok
+        frame.release()
+        executor.detach()
+        assert not frame.path.exists()
+        assert executor.run("print(df is None)").output.strip() == "True"
@@ -0,0 +1,139 @@
+"""
+Unit тесты для модуля code_validator (проверка и переписывание сгенерированного кода)
+"""
+import contextlib
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from src.utils.code_validator import validate_code
+
+
+@pytest.fixture
+def df():
+    """Фикстура с DataFrame"""
+    return pd.DataFrame({"a": np.arange(20, dtype=float), "b": np.arange(20) % 3, "c": ["x", "y"] * 10})
+
+
+def run(code, df):
+    """Выполняет код как процесс-исполнитель и возвращает вывод print"""
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        exec(code, {"pd": pd, "np": np, "df": df.copy()})
+    return stdout.getvalue()
+
+
+class TestImports:
+    """Тесты проверки импортов"""
+
+    def test_forbidden_imports_rejected(self):
+        """Тест что импорты вне списка разрешенных и __import__ отклоняют код"""
+        result = validate_code("import subprocess\nfrom os import path\nfrom . import x\n__import__('socket')")
+        assert not result.ok
+        assert result.errors[0].startswith("строка 1: импорт 'subprocess' запрещен")
+        assert result.errors[1].startswith("строка 2: импорт 'os' запрещен")
+        assert result.errors[2:] == ["строка 3: относительный импорт запрещен",
+                                     "строка 4: динамический импорт (__import__) запрещен"]
+
+    def test_os_import_rejected(self):
+        """Тест что os нельзя ни импортировать, ни использовать без импорта"""
+        result = validate_code("import os\nos.system('echo pwned')")
+        assert not result.ok and result.errors[0].startswith("строка 1: импорт 'os' запрещен")
+        assert validate_code("os.remove('data.csv')").errors == ["строка 1: обращение к 'os' запрещено"]
+
+    def test_allowed_imports_and_syntax_error(self):
+        """Тест разрешенных импортов и синтаксической ошибки"""
+        assert validate_code("import numpy as np\nimport matplotlib.pyplot as plt\nfrom scipy import stats").ok
+        assert not validate_code("import math", allowed_imports=["pandas"]).ok
+        result = validate_code("print(")
+        assert not result.ok and result.errors[0].startswith("Синтаксическая ошибка")
+
+
+class TestRewrites:
+    """Тесты переписывания медленных шаблонов"""
+
+    def test_row_apply_vectorized(self, df):
+        """Тест что apply(axis=1) над столбцами становится векторным выражением с тем же результатом"""
+        code = "s = df.apply(lambda r: (r['a'] * 2 - r['b']) > 5, axis=1)\nprint(s.sum(), s.dtype)"
+        result = validate_code(code)
+        assert [rewrite.kind for rewrite in result.rewrites] == ["apply_axis1"]
+        assert "apply" not in result.code
+        assert run(result.code, df) == run(code, df)
+
+    def test_row_apply_with_calls_only_warned(self):
+        """Тест что apply(axis=1) с вызовами функций не переписывается, а попадает в предупреждения"""
+        result = validate_code("s = df.apply(lambda r: str(r['c']), axis=1)")
+        assert result.rewrites == []
+        assert result.warnings[0].startswith("строка 1: apply(axis=1)")
+
+    def test_iterrows_rewritten_when_row_read_by_column(self, df):
+        """Тест что iterrows с чтением row['col'] переписывается, а с row как Series - нет"""
+        code = ("total = 0\nfor i, row in df.iterrows():\n    total += row['a'] * row['b']\n"
+                "for _, row in df[['a']].iterrows():\n    total += row['a']\nprint(total)")
+        result = validate_code(code)
+        assert [rewrite.kind for rewrite in result.rewrites] == ["iterrows", "iterrows"]
+        assert "for i, row in zip(df.index, zip(df['a'], df['b'])):\n    total += row[0] * row[1]\n" in result.code
+        assert "to_dict" not in result.code
+        assert run(result.code, df) == run(code, df)
+
+        kept = validate_code("for _, row in df.iterrows():\n    print(row.sum())")
+        assert kept.rewrites == [] and "iterrows" in kept.warnings[0]
+
+    def test_iterrows_with_dynamic_columns_kept(self):
+        """Тест что цикл с row[col] (столбцы не известны до выполнения) не переписывается"""
+        code = "for _, row in df.iterrows():\n    for col in cols:\n        print(row[col], row['a'])"
+        result = validate_code(code)
+        assert result.code == code and result.rewrites == []
+        assert result.warnings[0].startswith("строка 1: цикл по iterrows()")
+
+    def test_column_copy_removed(self):
+        """Тест что df[col].copy() заменяется на df[col], другие copy() не трогаются"""
+        result = validate_code("for col in df.columns:\n    series = df[col].copy()\nother = series.copy()")
+        assert result.code == "for col in df.columns:\n    series = df[col]\nother = series.copy()"
+
+    def test_repeated_quantile_computed_once(self, df):
+        """Тест что одинаковые quantile в блоке вычисляются один раз"""
+        code = ("for col in ['a', 'b']:\n"
+                "    series = df[col]\n"
+                "    q1 = series.quantile(0.25)  # первый квартиль\n"
+                "    iqr = series.quantile(0.75) - series.quantile(0.25)\n"
+                "    print(q1, iqr)")
+        result = validate_code(code)
+        assert [rewrite.kind for rewrite in result.rewrites] == ["quantile"]
+        assert "    _q1 = series.quantile(0.25)\n    q1 = _q1  # первый квартиль\n" in result.code
+        assert result.code.count("quantile(0.25)") == 1
+        assert run(result.code, df) == run(code, df)
+
+    def test_quantile_not_hoisted_across_changes(self):
+        """Тест что quantile не объединяется, если объект меняется между вычислениями"""
+        code = ("q = series.quantile(0.5)\nseries = series.dropna()\nm = series.quantile(0.5)\n"
+                "x = s.quantile(0.5) if len(s) else None\ny = s.quantile(0.5)")
+        assert validate_code(code).code == code
+
+    def test_figures_closed_after_savefig(self):
+        """Тест что после savefig добавляется close, маркеры графиков сохраняются"""
+        code = ("# График 1: гистограмма\nfig, ax = plt.subplots()\nax.hist(df['a'])\nfig.savefig('1.png')\n"
+                "# График 2: линия\nplt.figure()\nplt.plot(df['a'])\nplt.savefig('2.png')\n")
+        result = validate_code(code)
+        assert result.code == ("# График 1: гистограмма\nfig, ax = plt.subplots()\nax.hist(df['a'])\n"
+                               "fig.savefig('1.png')\nplt.close(fig)\n"
+                               "# График 2: линия\nplt.figure()\nplt.plot(df['a'])\nplt.savefig('2.png')\nplt.close()\n")
+        assert [rewrite.kind for rewrite in result.rewrites] == ["plt_close"]
+        assert validate_code(result.code).rewrites == []
+
+    def test_figure_closed_after_last_savefig(self):
+        """Тест что фигура, сохраняемая в несколько файлов, закрывается только после последнего savefig"""
+        code = ("plt.figure()\nplt.plot(df['a'])\ntry:\n    plt.savefig('a.png')\nexcept OSError:\n    pass\n"
+                "plt.savefig('b.pdf')\nplt.figure()\nplt.savefig('c.png')\n")
+        result = validate_code(code)
+        assert result.code == ("plt.figure()\nplt.plot(df['a'])\ntry:\n    plt.savefig('a.png')\n"
+                               "except OSError:\n    pass\nplt.savefig('b.pdf')\nplt.close()\n"
+                               "plt.figure()\nplt.savefig('c.png')\nplt.close()\n")
+        assert validate_code("plt.figure()\nplt.savefig('a.png')\nplt.savefig('b.pdf')").code == \
+            "plt.figure()\nplt.savefig('a.png')\nplt.savefig('b.pdf')\nplt.close()"
+
+    def test_clean_code_unchanged(self):
+        """Тест что код без медленных шаблонов не меняется"""
+        code = "metrics_results = {'a': float(df['a'].mean())}\nprint(metrics_results)"
+        result = validate_code(code)
+        assert (result.code, result.rewrites, result.warnings) == (code, [], [])
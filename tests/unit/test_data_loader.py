@@ -0,0 +1,92 @@
+"""
+Unit тесты для модуля loader (определение кодировки и разделителя CSV)
+"""
+import io
+import pandas as pd
+import pytest
+from unittest.mock import patch
+from src.data.loader import (
+    detect_encoding,
+    detect_delimiter,
+    read_csv_once,
+    load_dataframe_cached,
+)
+from src.utils.file_handler import ColumnarCache
+
+
+class TestDetectEncoding:
+    """Тесты для функции detect_encoding"""
+
+    def test_utf8(self):
+        """Тест определения UTF-8"""
+        assert detect_encoding("Город,Сумма\nМосква,10\n".encode("utf-8")) == "utf-8"
+
+    def test_utf8_bom(self):
+        """Тест определения UTF-8 с BOM"""
+        assert detect_encoding("﻿a,b\n".encode("utf-8")) == "utf-8-sig"
+
+    def test_truncated_multibyte_char_is_utf8(self):
+        """Тест что обрезанный в конце выборки символ не ломает определение UTF-8"""
+        sample = "Москва".encode("utf-8")[:-1]
+        assert detect_encoding(sample) == "utf-8"
+
+    def test_cp1251(self):
+        """Тест что cp1251 не принимается за latin1"""
+        sample = "Город;Сумма\nМосква;10\nКазань;20\n".encode("cp1251")
+        assert detect_encoding(sample) == "cp1251"
+
+    def test_latin1(self):
+        """Тест определения latin1 для западноевропейского текста"""
+        sample = "name,city\nJosé,Málaga\nFrançois,Besançon\n".encode("latin1")
+        assert detect_encoding(sample) == "latin1"
+
+
+class TestDetectDelimiter:
+    """Тесты для функции detect_delimiter"""
+
+    @pytest.mark.parametrize("delimiter", [",", ";", "\t", "|"])
+    def test_known_delimiters(self, delimiter):
+        """Тест определения распространенных разделителей"""
+        text = delimiter.join(["a", "b", "c"]) + "\n" + delimiter.join(["1", "2", "3"]) + "\n"
+        assert detect_delimiter(text) == delimiter
+
+    def test_single_column_defaults_to_comma(self):
+        """Тест что для одного столбца используется запятая"""
+        assert detect_delimiter("a\n1\n2\n") == ","
+
+
+class TestReadCsvOnce:
+    """Тесты для функции read_csv_once"""
+
+    def test_cp1251_semicolon_file_parsed_once(self):
+        """Тест что файл в cp1251 читается за один разбор и без искажений"""
+        data = io.BytesIO("Город;Сумма\nМосква;10\nКазань;20\n".encode("cp1251"))
+        with patch("src.data.loader.pd.read_csv", wraps=pd.read_csv) as mock_read:
+            df, csv_format = read_csv_once(data)
+        assert mock_read.call_count == 1
+        assert csv_format == {"encoding": "cp1251", "delimiter": ";"}
+        assert list(df.columns) == ["Город", "Сумма"]
+        assert df["Город"].tolist() == ["Москва", "Казань"]
+
+    def test_non_utf8_after_sample(self):
+        """Тест что байты cp1251 за пределами ASCII-выборки обрабатываются"""
+        rows = "id,name\n" + "".join(f"{i},abc\n" for i in range(20000)) + "1,Привет мир\n"
+        df, csv_format = read_csv_once(io.BytesIO(rows.encode("cp1251")))
+        assert csv_format["encoding"] == "cp1251"
+        assert df["name"].iloc[-1] == "Привет мир"
+
+
+class TestLoadDataframeCachedMetadata:
+    """Тесты записи параметров чтения в метаданные кэша"""
+
+    def test_format_recorded_in_metadata(self, tmp_path):
+        """Тест что кодировка и разделитель записываются в метаданные кэша"""
+        path = tmp_path / "data.csv"
+        path.write_bytes("Город;Сумма\nМосква;10\n".encode("cp1251"))
+        cache = ColumnarCache(tmp_path / "cache")
+        load_dataframe_cached(str(path), cache=cache)
+        meta_files = list((tmp_path / "cache").glob("*.json"))
+        assert len(meta_files) == 1
+        key = meta_files[0].stem
+        assert cache.metadata(key)["encoding"] == "cp1251"
+        assert cache.metadata(key)["delimiter"] == ";"
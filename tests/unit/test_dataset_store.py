@@ -0,0 +1,131 @@
+"""
+Unit тесты для модуля store (хранилище датасета на запуск)
+"""
+import os
+import pandas as pd
+import pytest
+from unittest.mock import patch
+from src.data.store import DatasetStore
+
+
+@pytest.fixture(autouse=True)
+def isolated_file_cache(tmp_path, monkeypatch):
+    """Колоночный кэш файлов во временной директории"""
+    monkeypatch.setattr("src.utils.file_handler.FILE_CACHE_DIR", tmp_path / "cache")
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    """Фикстура с небольшим CSV файлом"""
+    path = tmp_path / "data.csv"
+    pd.DataFrame({
+        "date": ["2024-01-01", "2024-01-02", None],
+        "value": [1.0, None, 3.0],
+        "category": ["a", None, "b"],
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+class TestDatasetStore:
+    """Тесты для класса DatasetStore"""
+
+    def test_file_is_read_once(self, csv_file):
+        """Тест что повторные обращения не перечитывают файл"""
+        store = DatasetStore(file_path=csv_file)
+        with patch("src.data.store.load_dataframe_cached",
+                   side_effect=lambda path, upload: pd.read_csv(path)) as mock_load:
+            store.raw()
+            store.prepared(["date"])
+            store.prepared(["date"], {"value": ["mean"]})
+            store.prepared(["date"], {"value": ["mean"]})
+        assert mock_load.call_count == 1
+        assert store.loads == 1
+
+    def test_prepared_is_cached_by_key(self, csv_file):
+        """Тест что подготовленный кадр кэшируется по плану метрик"""
+        store = DatasetStore(file_path=csv_file)
+        with patch("src.data.store.handle_missing_values_before_analysis",
+                   side_effect=lambda df, plan: df) as mock_missing:
+            store.prepared([], {"value": ["mean"]})
+            store.prepared([], {"value": ["mean"]})
+            store.prepared([], {"category": ["mode"]})
+        assert mock_missing.call_count == 2
+
+    def test_view_does_not_leak_column_changes(self, csv_file):
+        """Тест что изменения представления не влияют на кэш"""
+        store = DatasetStore(file_path=csv_file)
+        view = store.raw()
+        view["value"] = 0
+        view["extra"] = 1
+        fresh = store.raw()
+        assert "extra" not in fresh.columns
+        assert fresh["value"].isna().sum() == 1
+
+    def test_file_change_invalidates_cache(self, csv_file):
+        """Тест что изменение файла сбрасывает кэш"""
+        store = DatasetStore(file_path=csv_file)
+        store.raw()
+        pd.DataFrame({"value": [1, 2, 3, 4]}).to_csv(csv_file, index=False)
+        stat = os.stat(csv_file)
+        os.utime(csv_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert len(store.raw()) == 4
+        assert store.loads == 2
+
+    def test_missing_source_raises(self):
+        """Тест ошибки при отсутствии источника"""
+        with pytest.raises(ValueError):
+            DatasetStore().raw()
+
+    def test_streaming_mode_loads_sample(self, tmp_path, monkeypatch):
+        """Тест что большой CSV загружается выборкой в потоковом режиме"""
+        path = tmp_path / "big.csv"
+        pd.DataFrame({"value": range(1000)}).to_csv(path, index=False)
+        monkeypatch.setattr("src.data.store.MAX_FILE_SIZE_MB", 0)
+        monkeypatch.setattr("src.data.store.STREAMING_SAMPLE_ROWS", 100)
+        store = DatasetStore(file_path=str(path))
+        assert store.streaming
+        assert len(store.raw()) == 100
+
+    def test_stats_keyed_by_preparation(self, csv_file, monkeypatch):
+        """Тест что статистики кэшируются по отпечатку файла и параметрам подготовки"""
+        from src.data.stats_cache import StatsCache
+        cache = StatsCache()
+        monkeypatch.setattr("src.data.store.get_stats_cache", lambda: cache)
+        store = DatasetStore(file_path=csv_file)
+        stats = store.stats(["date"])
+        assert store.stats(["date"]) is stats
+        assert stats.missing["value"] == 1
+        store.stats(["date"], {"value": ["mean"]})
+        assert cache.computations == 2
+
+    def test_optimize_dtypes_applies_to_prepared(self, tmp_path):
+        """Тест что сжатые типы используются подготовленными кадрами и пропуски category заполняются"""
+        csv_file = tmp_path / "repeated.csv"
+        pd.DataFrame({
+            "date": ["2024-01-01", "2024-01-02", None] * 4,
+            "category": ["a", None, "a"] * 4,
+        }).to_csv(csv_file, index=False)
+        store = DatasetStore(file_path=str(csv_file))
+        store.prepared(["date"], {"category": ["mode"]})
+        report = store.optimize_dtypes({"date": "datetime"})
+        assert report.changes["category"][1] == "category"
+        assert "date" not in report.changes
+        prepared = store.prepared(["date"], {"category": ["mode"]})
+        assert isinstance(prepared["category"].dtype, pd.CategoricalDtype)
+        assert "нет данных" in set(prepared["category"])
+        assert store.optimize_dtypes({"date": "datetime"}) is report
+
+    def test_datetime_formats_cached_in_metadata(self, tmp_path):
+        """Тест что подобранный формат дат сохраняется в метаданных и используется повторно"""
+        csv_file = tmp_path / "ru.csv"
+        pd.DataFrame({"date": ["01.02.2024 10:00", "15.03.2024 11:30", None]}).to_csv(csv_file, index=False)
+        store = DatasetStore(file_path=str(csv_file))
+        prepared = store.prepared(["date"])
+        assert prepared["date"].iloc[0] == pd.Timestamp("2024-02-01 10:00")
+        assert store.datetime_formats == {"date": "%d.%m.%Y %H:%M"}
+
+        fresh = DatasetStore(file_path=str(csv_file))
+        with patch("src.data.datetimes.infer_datetime_format") as mock_infer:
+            fresh.prepared(["date"])
+        mock_infer.assert_not_called()
+        assert fresh.datetime_formats == {"date": "%d.%m.%Y %H:%M"}
@@ -0,0 +1,63 @@
+"""
+Unit тесты для модуля datetimes (преобразование дат с выводом формата)
+"""
+import pandas as pd
+import pytest
+from src.data.datetimes import infer_datetime_format, parse_datetimes
+
+
+@pytest.fixture
+def russian_dates():
+    """Фикстура с датами в русском формате, ISO-выбросом, пропуском и мусором"""
+    dates = pd.Series(pd.date_range("2024-01-01", periods=3000, freq="7h"))
+    values = dates.dt.strftime("%d.%m.%Y %H:%M").astype(object)
+    values[10] = "2024-05-06"
+    values[11] = None
+    values[12] = "не дата"
+    return dates, values
+
+
+class TestInferDatetimeFormat:
+    """Тесты для функции infer_datetime_format"""
+
+    @pytest.mark.parametrize("fmt", ["%d.%m.%Y %H:%M", "%d.%m.%Y", "%Y-%m-%d %H:%M:%S", "%m/%d/%Y"])
+    def test_known_formats(self, fmt):
+        """Тест подбора распространенных форматов"""
+        values = pd.Series(pd.date_range("2024-01-01", periods=500, freq="13h")).dt.strftime(fmt)
+        assert infer_datetime_format(values) == fmt
+
+    def test_ambiguous_prefers_day_first(self):
+        """Тест что при неоднозначности день идет перед месяцем"""
+        assert infer_datetime_format(pd.Series(["01/02/2024", "03/04/2024"])) == "%d/%m/%Y"
+
+    def test_not_dates(self):
+        """Тест что для не-дат формат не подбирается"""
+        assert infer_datetime_format(pd.Series(["a", "b", None])) is None
+        assert infer_datetime_format(pd.Series([None, None], dtype=object)) is None
+
+
+class TestParseDatetimes:
+    """Тесты для функции parse_datetimes"""
+
+    def test_format_with_residue_fallback(self, russian_dates):
+        """Тест разбора по формату и поэлементного разбора остатка"""
+        dates, values = russian_dates
+        parsed, fmt = parse_datetimes(values)
+        assert fmt == "%d.%m.%Y %H:%M"
+        assert parsed[10] == pd.Timestamp("2024-05-06")
+        assert parsed[[11, 12]].isna().all()
+        assert (parsed.drop([10, 11, 12]) == dates.drop([10, 11, 12])).all()
+
+    def test_known_format_and_category(self, russian_dates):
+        """Тест переданного формата и разбора категорий по кодам"""
+        _, values = russian_dates
+        expected, _ = parse_datetimes(values, "%d.%m.%Y %H:%M")
+        parsed, fmt = parse_datetimes(values.astype("category"))
+        assert fmt == "%d.%m.%Y %H:%M"
+        pd.testing.assert_series_equal(parsed, expected, check_dtype=False)
+
+    def test_datetime_and_numeric_passthrough(self):
+        """Тест что datetime возвращается как есть, а формат не подбирается"""
+        dates = pd.Series(pd.date_range("2024-01-01", periods=3))
+        assert parse_datetimes(dates)[0] is dates
+        assert parse_datetimes(pd.Series([0, 10 ** 18]))[1] is None
@@ -0,0 +1,133 @@
+"""
+Unit тесты для модуля downsampling (прореживание данных для графиков)
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from src.data.downsampling import (
+    binned_hist,
+    choose_render_mode,
+    decimate_for_line,
+    lttb_indices,
+    minmax_indices,
+    rasterize_points,
+    sample_for_scatter,
+)
+
+
+@pytest.fixture
+def large_df():
+    """Фикстура с большим DataFrame"""
+    rng = np.random.default_rng(0)
+    n = 20000
+    return pd.DataFrame({
+        "date": pd.date_range("2024-01-01", periods=n, freq="min"),
+        "value": np.sin(np.linspace(0, 20, n)) + rng.normal(0, 0.1, n),
+        "other": rng.normal(size=n),
+        "group": rng.choice(["A", "B", "C"], size=n, p=[0.7, 0.29, 0.01]),
+    })
+
+
+class TestLineDecimation:
+    """Тесты для LTTB и min-max прореживания"""
+
+    def test_lttb_keeps_endpoints_and_size(self):
+        """Тест сохранения крайних точек и размера выборки"""
+        x = np.arange(1000, dtype=float)
+        y = np.sin(x / 50)
+        indices = lttb_indices(x, y, 100)
+        assert len(indices) == 100
+        assert indices[0] == 0 and indices[-1] == 999
+        assert np.all(np.diff(indices) > 0)
+
+    def test_lttb_keeps_spike(self):
+        """Тест сохранения одиночного выброса"""
+        y = np.zeros(1000)
+        y[537] = 100.0
+        indices = lttb_indices(np.arange(1000, dtype=float), y, 50)
+        assert 537 in indices
+
+    def test_minmax_keeps_extremes(self):
+        """Тест сохранения минимума и максимума ряда"""
+        y = np.random.default_rng(1).normal(size=5000)
+        indices = minmax_indices(y, 100)
+        assert len(indices) <= 100
+        assert int(np.argmax(y)) in indices and int(np.argmin(y)) in indices
+
+    def test_small_input_unchanged(self):
+        """Тест возврата всех точек, если их меньше требуемого"""
+        assert list(lttb_indices(np.arange(5.0), np.arange(5.0), 10)) == [0, 1, 2, 3, 4]
+
+    def test_decimate_for_line_with_datetime_x(self, large_df):
+        """Тест прореживания временного ряда"""
+        result = decimate_for_line(large_df, x="date", y="value", n_points=500, threshold=1000)
+        assert len(result) == 500
+        assert result["date"].is_monotonic_increasing
+        assert result["value"].max() == large_df["value"].max()
+
+    def test_decimate_for_line_by_group(self, large_df):
+        """Тест прореживания отдельно по группам"""
+        result = decimate_for_line(large_df, x="date", y="value", by="group", n_points=600, threshold=1000)
+        assert set(result["group"]) == {"A", "B", "C"}
+        assert len(result) <= 600
+
+    def test_below_threshold_unchanged(self, large_df):
+        """Тест: ниже порога данные не меняются"""
+        assert decimate_for_line(large_df, x="date", y="value", threshold=10 ** 6) is large_df
+
+
+class TestScatterSampling:
+    """Тесты для стратифицированной выборки"""
+
+    def test_stratified_sample_keeps_rare_group(self, large_df):
+        """Тест сохранения редкой группы и долей групп"""
+        result = sample_for_scatter(large_df, n=1000, by="group", threshold=1000)
+        assert abs(len(result) - 1000) <= 3
+        assert set(result["group"]) == {"A", "B", "C"}
+        share = result["group"].value_counts(normalize=True)["A"]
+        assert share == pytest.approx(0.7, abs=0.05)
+        assert result.index.is_monotonic_increasing
+
+    def test_simple_sample_is_deterministic(self, large_df):
+        """Тест воспроизводимости выборки"""
+        first = sample_for_scatter(large_df, n=100, threshold=1000)
+        second = sample_for_scatter(large_df, n=100, threshold=1000)
+        assert first.index.equals(second.index)
+        assert len(first) == 100
+
+
+class TestBinnedHist:
+    """Тесты для предварительно посчитанной гистограммы"""
+
+    def test_matches_numpy_and_skips_nan(self):
+        """Тест совпадения с numpy.histogram и пропуска NaN"""
+        values = pd.Series([1.0, 2.0, np.nan, 3.0, np.inf, 4.0])
+        counts, edges = binned_hist(values, bins=3)
+        expected_counts, expected_edges = np.histogram([1.0, 2.0, 3.0, 4.0], bins=3)
+        assert list(counts) == list(expected_counts)
+        assert np.allclose(edges, expected_edges)
+
+
+class TestRenderMode:
+    """Тесты для выбора режима отрисовки и растра плотности"""
+
+    def test_auto_mode_by_point_count(self, monkeypatch):
+        """Тест переключения SVG -> WebGL -> растр по числу точек"""
+        monkeypatch.setattr("src.data.downsampling.PLOT_WEBGL_THRESHOLD", 5000)
+        monkeypatch.setattr("src.data.downsampling.PLOT_RASTER_THRESHOLD", 1000000)
+        assert choose_render_mode(1000) == "svg"
+        assert choose_render_mode(50000) == "webgl"
+        assert choose_render_mode(2000000) == "raster"
+
+    def test_explicit_mode_and_unknown_mode(self):
+        """Тест явного режима и ошибки при неизвестном режиме"""
+        assert choose_render_mode(10, "webgl") == "webgl"
+        with pytest.raises(ValueError):
+            choose_render_mode(10, "canvas")
+
+    def test_rasterize_counts_all_points(self, large_df):
+        """Тест что растр учитывает все конечные точки"""
+        counts, x_edges, y_edges = rasterize_points(large_df["date"], large_df["value"], size=(40, 20))
+        assert counts.shape == (20, 40)
+        assert counts.sum() == len(large_df)
+        assert len(x_edges) == 41 and len(y_edges) == 21
@@ -0,0 +1,64 @@
+"""
+Unit тесты для модуля dtypes (сжатие типов столбцов)
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from src.data.dtypes import optimize_dtypes, type_hints_from_structure
+
+
+@pytest.fixture
+def wide_df():
+    """Фикстура с числами по умолчанию и текстом разной кардинальности"""
+    rng = np.random.default_rng(0)
+    n = 10_000
+    return pd.DataFrame({
+        "age": rng.integers(18, 90, n),
+        "big": np.arange(n, dtype=np.int64) * 10 ** 10,
+        "score": rng.normal(size=n),
+        "city": pd.Series(rng.choice(["Москва", "Казань", None], n), dtype=object),
+        "note": pd.Series([f"запись {i}" for i in range(n)], dtype=object),
+        "mixed": pd.Series([1, "a"] * (n // 2), dtype=object),
+        "flag": rng.random(n) > 0.5,
+    })
+
+
+class TestOptimizeDtypes:
+    """Тесты для функции optimize_dtypes"""
+
+    def test_values_kept_and_memory_reduced(self, wide_df):
+        """Тест что значения не меняются, а память уменьшается"""
+        optimized, report = optimize_dtypes(wide_df)
+        assert report.bytes_after < report.bytes_before / 2
+        assert optimized["age"].dtype == np.int32
+        assert isinstance(optimized["city"].dtype, pd.CategoricalDtype)
+        assert not isinstance(optimized["note"].dtype, pd.CategoricalDtype)
+        assert set(report.changes) == {"age", "city", "note"}
+        for col in wide_df.columns:
+            assert optimized[col].astype(object).equals(wide_df[col].astype(object)) or \
+                optimized[col].astype(str).equals(wide_df[col].astype(str))
+        assert wide_df["city"].dtype == object
+
+    def test_min_int_bits_and_float_downcast(self, wide_df, monkeypatch):
+        """Тест нижней границы разрядности и float32 только без потерь"""
+        monkeypatch.setattr("src.data.dtypes.DTYPE_MIN_INT_BITS", 8)
+        monkeypatch.setattr("src.data.dtypes.DTYPE_DOWNCAST_FLOATS", True)
+        frame = wide_df.assign(half=np.arange(len(wide_df)) / 2)
+        optimized, report = optimize_dtypes(frame)
+        assert optimized["age"].dtype == np.int8
+        assert optimized["big"].dtype == np.int64
+        assert optimized["half"].dtype == np.float32
+        assert optimized["score"].dtype == np.float64
+
+    def test_type_hints(self, wide_df):
+        """Тест подсказок типов из ответа LLM"""
+        hints = type_hints_from_structure([
+            {"name": "city", "type": "free text (object)"},
+            {"name": "note", "type": "categorical (object)"},
+            {"name": "age", "type": "numerical (integer)"},
+            {"name": "x", "type": "textual (object)"},
+        ])
+        assert hints == {"city": "text", "note": "categorical", "age": "numeric"}
+        optimized, _ = optimize_dtypes(wide_df.assign(note=["a", "b"] * (len(wide_df) // 2)), hints)
+        assert not isinstance(optimized["city"].dtype, pd.CategoricalDtype)
+        assert isinstance(optimized["note"].dtype, pd.CategoricalDtype)
@@ -0,0 +1,103 @@
+"""
+Unit тесты для модуля file_handler (колоночный кэш файлов)
+"""
+import io
+import pandas as pd
+import pytest
+from unittest.mock import patch
+from src.utils.file_handler import ColumnarCache, compute_content_hash, read_frame_file, write_frame_file
+from src.data.loader import load_dataframe, load_dataframe_cached
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    """Фикстура с CSV файлом"""
+    path = tmp_path / "data.csv"
+    path.write_text("id,name,score\n1,a,1.5\n2,b,2.5\n3,c,\n", encoding="utf-8")
+    return str(path)
+
+
+class TestComputeContentHash:
+    """Тесты для функции compute_content_hash"""
+
+    def test_same_content_same_hash(self, csv_file):
+        """Тест что хэш файла и file-like объекта с тем же содержимым совпадает"""
+        with open(csv_file, "rb") as f:
+            buffer = io.BytesIO(f.read())
+        assert compute_content_hash(csv_file) == compute_content_hash(buffer)
+
+    def test_file_like_position_restored(self):
+        """Тест что позиция file-like объекта восстанавливается"""
+        buffer = io.BytesIO(b"abc")
+        buffer.seek(2)
+        compute_content_hash(buffer)
+        assert buffer.tell() == 2
+
+    def test_different_content_different_hash(self):
+        """Тест что разное содержимое дает разный хэш"""
+        assert compute_content_hash(io.BytesIO(b"a")) != compute_content_hash(io.BytesIO(b"b"))
+
+
+class TestColumnarCache:
+    """Тесты для класса ColumnarCache"""
+
+    def test_roundtrip_preserves_dtypes(self, tmp_path):
+        """Тест что типы сохраняются при записи и чтении кэша"""
+        cache = ColumnarCache(tmp_path)
+        df = pd.DataFrame({
+            "i": [1, 2],
+            "f": [1.5, None],
+            "d": pd.to_datetime(["2024-01-01", "2024-02-01"]),
+        })
+        assert cache.save("key", df, {"source": "x.csv"})
+        loaded = cache.load("key")
+        pd.testing.assert_frame_equal(loaded, df)
+        assert cache.metadata("key")["rows"] == 2
+
+    def test_missing_key_returns_none(self, tmp_path):
+        """Тест что отсутствующий ключ возвращает None"""
+        assert ColumnarCache(tmp_path).load("missing") is None
+
+    def test_disabled_cache(self, tmp_path):
+        """Тест что выключенный кэш ничего не пишет"""
+        cache = ColumnarCache(tmp_path, enabled=False)
+        assert cache.save("key", pd.DataFrame({"a": [1]})) is False
+        assert cache.load("key") is None
+
+
+class TestLoadDataframeCached:
+    """Тесты для функции load_dataframe_cached"""
+
+    def test_second_load_uses_cache(self, csv_file, tmp_path):
+        """Тест что повторная загрузка не разбирает CSV"""
+        cache = ColumnarCache(tmp_path / "cache")
+        first = load_dataframe_cached(csv_file, cache=cache)
+        with patch("src.data.loader.load_dataframe") as mock_load:
+            second = load_dataframe_cached(csv_file, cache=cache)
+        mock_load.assert_not_called()
+        pd.testing.assert_frame_equal(first, second)
+
+    def test_cached_equals_direct_load(self, csv_file, tmp_path):
+        """Тест что результат совпадает с прямой загрузкой"""
+        cache = ColumnarCache(tmp_path / "cache")
+        load_dataframe_cached(csv_file, cache=cache)
+        pd.testing.assert_frame_equal(load_dataframe_cached(csv_file, cache=cache), load_dataframe(csv_file))
+
+
+class TestFrameFile:
+    """Тесты для передачи DataFrame в процессы через файл"""
+
+    def test_feather_roundtrip(self, tmp_path):
+        """Тест записи в Feather и чтения с отображением в память"""
+        df = pd.DataFrame({"a": [1, 2], "d": pd.to_datetime(["2024-01-01", "2024-02-01"])})
+        path = write_frame_file(df, tmp_path / "frame")
+        assert path.suffix == ".feather"
+        pd.testing.assert_frame_equal(read_frame_file(path), df)
+
+    def test_pickle_fallback_for_unsupported_types(self, tmp_path):
+        """Тест перехода на pickle для типов, не поддерживаемых Arrow"""
+        df = pd.DataFrame({"mixed": [1, "a", 2.5]}, dtype=object)
+        path = write_frame_file(df, tmp_path / "frame")
+        assert path.suffix == ".pkl"
+        assert read_frame_file(path)["mixed"].tolist() == [1, "a", 2.5]
+        assert not (tmp_path / "frame.feather").exists()
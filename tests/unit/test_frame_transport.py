@@ -0,0 +1,82 @@
+"""
+Unit тесты для модуля frame_transport (передача DataFrame процессам без копирования)
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from src.utils.frame_transport import attach_frame, published_frames, share_frame
+
+
+@pytest.fixture(autouse=True)
+def frames_dir(tmp_path, monkeypatch):
+    """Временный каталог вместо разделяемой памяти"""
+    monkeypatch.setattr("src.utils.frame_transport.FRAME_SHM_DIR", tmp_path / "shm")
+    monkeypatch.setattr("src.utils.frame_transport.FRAME_TRANSPORT_DIR", tmp_path / "frames")
+    (tmp_path / "shm").mkdir()
+    return tmp_path
+
+
+@pytest.fixture
+def df():
+    """Фикстура со столбцами разных типов, включая NaN"""
+    n = 1000
+    return pd.DataFrame({
+        "i": np.arange(n),
+        "f": np.where(np.arange(n) % 7 == 0, np.nan, 1.5),
+        "s": pd.Series(["a", "bb"] * (n // 2), dtype="str"),
+        "c": pd.Categorical(["x", "y"] * (n // 2)),
+        "d": pd.date_range("2024-01-01", periods=n, freq="h"),
+    })
+
+
+class TestShareFrame:
+    """Тесты для функций share_frame и attach_frame"""
+
+    def test_refcounted_publication(self, df, frames_dir):
+        """Тест что повторная публикация увеличивает счетчик, файл удаляется после последнего release"""
+        frame = share_frame(df)
+        assert frame.path.parent == frames_dir / "shm"
+        assert share_frame(df) is frame
+        assert frame.refs == 2
+        frame.release()
+        assert frame.path.exists()
+        frame.release()
+        assert not frame.path.exists()
+        assert frame not in published_frames()
+
+    def test_keyed_publication_shared_between_views(self, tmp_path, monkeypatch):
+        """Тест что разные представления подготовленного кадра с одним ключом публикуются одним файлом"""
+        from src.data.store import DatasetStore
+        monkeypatch.setattr("src.utils.file_handler.FILE_CACHE_DIR", tmp_path / "cache")
+        path = tmp_path / "data.csv"
+        pd.DataFrame({"value": [1.0, None, 3.0]}).to_csv(path, index=False)
+        store = DatasetStore(file_path=str(path))
+        plan = {"value": ["mean"]}
+        first = share_frame(store.prepared([], plan), key=store.frame_key([], plan))
+        second = share_frame(store.prepared([], plan), key=store.frame_key([], plan))
+        other = share_frame(store.prepared([]), key=store.frame_key([]))
+        assert second is first and first.refs == 2
+        assert other is not first
+        for frame in (first, second, other):
+            frame.release()
+        assert first not in published_frames() and other not in published_frames()
+
+    def test_zero_copy_read_only_attach(self, df):
+        """Тест что столбцы подключаются без копирования (только чтение), значения и NaN сохраняются"""
+        with share_frame(df) as frame:
+            attached = attach_frame(frame.path)
+            pd.testing.assert_frame_equal(attached, df)
+            for col in ("i", "f"):
+                assert not attached[col].to_numpy().flags.writeable
+            # Запись в поверхностную копию копирует столбец, подключенный df и файл не меняются
+            working = attached.copy(deep=False)
+            working.loc[0, "i"] = -1
+            assert working.loc[0, "i"] == -1
+            assert attached.loc[0, "i"] == 0
+            assert attach_frame(frame.path).loc[0, "i"] == 0
+
+    def test_falls_back_when_shared_memory_is_small(self, df, frames_dir, monkeypatch):
+        """Тест перехода в FRAME_TRANSPORT_DIR, если разделяемой памяти не хватает"""
+        monkeypatch.setattr("src.utils.frame_transport.SHM_HEADROOM", 10 ** 12)
+        with share_frame(df) as frame:
+            assert frame.path.parent == frames_dir / "frames"
@@ -0,0 +1,134 @@
+"""
+Unit тесты для модуля incremental (инкрементальный пересчет метрик)
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from unittest.mock import patch
+from src.data import incremental
+from src.data.incremental import compute_incremental_csv_metrics, compute_incremental_frame_metrics
+
+PLAN = {"value": ["count", "mean", "std", "min", "max", "skew"], "category": ["count", "nunique", "mode"]}
+
+
+def make_frame(start, n):
+    """Часть журнала со строками start..start+n"""
+    rng = np.random.default_rng(start)
+    return pd.DataFrame({
+        "value": rng.gamma(2.0, 3.0, size=n).round(3),
+        "category": rng.choice(["a", "b", "c"], size=n),
+        "date": pd.date_range("2024-01-01", periods=n, freq="h").astype(str),
+    })
+
+
+def assert_metrics_equal(actual, expected):
+    """Сравнение метрик с допуском для чисел с плавающей точкой"""
+    assert actual.keys() == expected.keys()
+    for col in expected:
+        for metric, value in expected[col].items():
+            if isinstance(value, float):
+                assert actual[col][metric] == pytest.approx(value, rel=1e-9), (col, metric)
+            else:
+                assert actual[col][metric] == value, (col, metric)
+
+
+class TestIncrementalCsvMetrics:
+    """Тесты для функции compute_incremental_csv_metrics"""
+
+    def test_append_reads_only_new_rows(self, tmp_path):
+        """Тест дочитывания только дописанных строк и совпадения с полным пересчетом"""
+        path = tmp_path / "log.csv"
+        state_dir = tmp_path / "state"
+        make_frame(0, 3000).to_csv(path, index=False)
+        _, first = compute_incremental_csv_metrics(str(path), state_dir, PLAN, ["date"], chunksize=1000)
+        assert (first.mode, first.total_rows) == ("full", 3000)
+
+        make_frame(3000, 500).to_csv(path, mode="a", header=False, index=False)
+        with patch("src.data.incremental.iter_csv_chunks") as full_read:
+            results, update = compute_incremental_csv_metrics(str(path), state_dir, PLAN, ["date"], chunksize=1000)
+        full_read.assert_not_called()
+        assert (update.mode, update.new_rows, update.total_rows) == ("append", 500, 3500)
+
+        expected, _ = compute_incremental_csv_metrics(str(path), tmp_path / "fresh", PLAN, ["date"])
+        assert_metrics_equal(results, expected)
+        assert results["value"]["count"] == 3500
+
+    def test_unchanged_file(self, tmp_path):
+        """Тест повторного запуска без изменений файла"""
+        path = tmp_path / "log.csv"
+        make_frame(0, 100).to_csv(path, index=False)
+        expected, _ = compute_incremental_csv_metrics(str(path), tmp_path / "state", PLAN)
+        results, update = compute_incremental_csv_metrics(str(path), tmp_path / "state", PLAN)
+        assert update.mode == "unchanged" and update.new_rows == 0
+        assert_metrics_equal(results, expected)
+
+    def test_rewritten_prefix_triggers_full_recompute(self, tmp_path):
+        """Тест полного пересчета при изменении начала файла"""
+        path = tmp_path / "log.csv"
+        df = make_frame(0, 200)
+        df.to_csv(path, index=False)
+        compute_incremental_csv_metrics(str(path), tmp_path / "state", PLAN)
+        df.loc[0, "value"] = 999.0
+        pd.concat([df, make_frame(200, 50)]).to_csv(path, index=False)
+        results, update = compute_incremental_csv_metrics(str(path), tmp_path / "state", PLAN)
+        assert (update.mode, update.total_rows) == ("full", 250)
+        assert results["value"]["max"] == 999.0
+
+    def test_append_rehashes_only_last_block_and_tail(self, tmp_path, monkeypatch):
+        """Тест что проверка дописанного файла не хэширует весь сохраненный префикс"""
+        monkeypatch.setattr("src.data.incremental.HASH_BLOCK_SIZE", 1024)
+        path = tmp_path / "log.csv"
+        make_frame(0, 2000).to_csv(path, index=False)
+        compute_incremental_csv_metrics(str(path), tmp_path / "state", PLAN)
+        old_size = path.stat().st_size
+        make_frame(2000, 20).to_csv(path, mode="a", header=False, index=False)
+        with patch("src.data.incremental.file_block_hashes", wraps=incremental.file_block_hashes) as hashed:
+            _, update = compute_incremental_csv_metrics(str(path), tmp_path / "state", PLAN)
+        assert update.mode == "append"
+        first_blocks = [call.args[1] for call in hashed.call_args_list]
+        assert first_blocks == [old_size // 1024, 0, old_size // 1024]
+        assert hashed.call_args_list[1].args[2] == 1024
+
+    def test_column_kind_change_triggers_full_recompute(self, tmp_path):
+        """Тест полного пересчета, если в числовом столбце дописаны строки с текстом"""
+        path = tmp_path / "log.csv"
+        make_frame(0, 100).to_csv(path, index=False)
+        compute_incremental_csv_metrics(str(path), tmp_path / "state", PLAN)
+        make_frame(100, 10).assign(value="unknown").to_csv(path, mode="a", header=False, index=False)
+        results, update = compute_incremental_csv_metrics(str(path), tmp_path / "state", PLAN)
+        assert (update.mode, update.total_rows) == ("full", 110)
+        expected, _ = compute_incremental_csv_metrics(str(path), tmp_path / "fresh", PLAN)
+        assert_metrics_equal(results, expected)
+
+    def test_unreadable_state_ignored(self, tmp_path):
+        """Тест что состояние, которое не распаковывается, приводит к полному пересчету"""
+        path = tmp_path / "log.csv"
+        make_frame(0, 100).to_csv(path, index=False)
+        compute_incremental_csv_metrics(str(path), tmp_path / "state", PLAN)
+        for state_file in (tmp_path / "state").iterdir():
+            state_file.write_bytes(b"cmissing_module_for_test\nThing\n.")
+        _, update = compute_incremental_csv_metrics(str(path), tmp_path / "state", PLAN)
+        assert update.mode == "full"
+
+
+class TestIncrementalFrameMetrics:
+    """Тесты для функции compute_incremental_frame_metrics"""
+
+    def test_appended_rows_folded_in(self, tmp_path):
+        """Тест добавления новых строк DataFrame к сохраненным аккумуляторам"""
+        base = make_frame(0, 1000)
+        compute_incremental_frame_metrics(base, "airflow.xlsx", tmp_path, PLAN, ["date"])
+        grown = pd.concat([base, make_frame(1000, 100)], ignore_index=True)
+        results, update = compute_incremental_frame_metrics(grown, "airflow.xlsx", tmp_path, PLAN, ["date"])
+        assert (update.mode, update.new_rows) == ("append", 100)
+        assert results["value"]["mean"] == pytest.approx(grown["value"].mean())
+        assert results["value"]["std"] == pytest.approx(grown["value"].std())
+        assert results["category"]["nunique"] == 3
+
+    def test_shrunk_frame_recomputed(self, tmp_path):
+        """Тест полного пересчета, если строк стало меньше"""
+        base = make_frame(0, 1000)
+        compute_incremental_frame_metrics(base, "src", tmp_path, PLAN)
+        results, update = compute_incremental_frame_metrics(base.iloc[:10], "src", tmp_path, PLAN)
+        assert update.mode == "full"
+        assert results["value"]["count"] == 10
@@ -0,0 +1,77 @@
+"""
+Unit тесты для модуля cache (дисковый кэш ответов LLM)
+"""
+import sqlite3
+import pytest
+from langchain_core.language_models.fake import FakeListLLM
+from langchain_core.outputs import Generation
+from src.llm.cache import SQLiteLLMCache, for_stage, make_cache_key
+
+
+@pytest.fixture
+def llm_cache(tmp_path):
+    """Фикстура кэша во временной директории"""
+    return SQLiteLLMCache("llama2", 0.5, "http://localhost:11434", db_path=tmp_path / "llm.sqlite")
+
+
+class TestMakeCacheKey:
+    """Тесты для функции make_cache_key"""
+
+    def test_key_depends_on_all_parameters(self):
+        """Тест что ключ меняется при изменении любого параметра"""
+        base = make_cache_key("llama2", 0.5, "http://a", "prompt")
+        assert base == make_cache_key("llama2", 0.5, "http://a", "prompt")
+        assert base != make_cache_key("qwen", 0.5, "http://a", "prompt")
+        assert base != make_cache_key("llama2", 0.2, "http://a", "prompt")
+        assert base != make_cache_key("llama2", 0.5, "http://b", "prompt")
+        assert base != make_cache_key("llama2", 0.5, "http://a", "prompt 2")
+
+
+class TestSQLiteLLMCache:
+    """Тесты для класса SQLiteLLMCache"""
+
+    def test_lookup_miss_and_hit(self, llm_cache):
+        """Тест сохранения и чтения ответа"""
+        assert llm_cache.lookup("prompt", "params") is None
+        llm_cache.update("prompt", "params", [Generation(text="ответ")])
+        cached = llm_cache.lookup("prompt", "params")
+        assert [gen.text for gen in cached] == ["ответ"]
+
+    def test_persists_between_instances(self, llm_cache):
+        """Тест что кэш сохраняется на диске"""
+        llm_cache.update("prompt", "params", [Generation(text="ответ")])
+        reopened = SQLiteLLMCache("llama2", 0.5, "http://localhost:11434", db_path=llm_cache.db_path)
+        assert reopened.lookup("prompt", "params")[0].text == "ответ"
+
+    def test_lru_eviction_by_size(self, tmp_path):
+        """Тест вытеснения давно не использованных записей"""
+        cache = SQLiteLLMCache("m", 0.0, "url", db_path=tmp_path / "llm.sqlite", max_bytes=200)
+        cache.update("a", "", [Generation(text="x" * 60)])
+        cache.update("b", "", [Generation(text="y" * 60)])
+        cache.lookup("a", "")  # "a" становится последней использованной
+        cache.update("c", "", [Generation(text="z" * 60)])
+        assert cache.lookup("a", "") is not None
+        assert cache.lookup("b", "") is None
+        assert cache.lookup("c", "") is not None
+        with sqlite3.connect(cache.db_path) as conn:
+            assert conn.execute("SELECT SUM(size) FROM responses").fetchone()[0] <= 200
+
+    def test_cached_llm_skips_generation(self, llm_cache):
+        """Тест что повторный вызов модели берет ответ из кэша"""
+        llm = FakeListLLM(responses=["первый", "второй"], cache=llm_cache)
+        assert llm.invoke("prompt") == "первый"
+        assert llm.invoke("prompt") == "первый"
+
+
+class TestForStage:
+    """Тесты для функции for_stage"""
+
+    def test_fresh_stage_disables_cache(self, llm_cache):
+        """Тест отключения кэша для выбранного этапа"""
+        llm = FakeListLLM(responses=["первый", "второй"], cache=llm_cache)
+        assert for_stage(llm, "structure", fresh_stages=[]) is llm
+        fresh = for_stage(llm, "final_report", fresh_stages=["final_report"])
+        assert fresh.cache is False
+        assert llm.cache is llm_cache
+        assert fresh.invoke("prompt") == "первый"
+        assert fresh.invoke("prompt") == "второй"
@@ -0,0 +1,24 @@
+"""
+Unit тесты для модуля memory (пиковая память процесса)
+"""
+import sys
+import numpy as np
+import pytest
+from src.utils.memory import peak_rss_mb, release_memory, reset_peak_rss
+
+
+class TestPeakRss:
+    """Тесты для функций reset_peak_rss и peak_rss_mb"""
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="сброс пика RSS есть только в Linux")
+    def test_reset_and_measure(self):
+        """Тест что пик растет при выделении памяти и сбрасывается"""
+        if not reset_peak_rss():
+            pytest.skip("/proc/self/clear_refs недоступен")
+        base = peak_rss_mb()
+        block = np.ones(200 * 2 ** 17)  # 200 МБ
+        assert peak_rss_mb() > base + 150
+        del block
+        release_memory()
+        assert reset_peak_rss()
+        assert peak_rss_mb() < base + 150
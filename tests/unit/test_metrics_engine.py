@@ -0,0 +1,222 @@
+"""
+Unit тесты для модуля metrics_engine (встроенный расчет метрик)
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from src.core.metrics_engine import (
+    APPROX_ERRORS_KEY,
+    compute_catalogue_metrics,
+    split_metrics_plan,
+    parse_metrics_output,
+    merge_metrics_results,
+)
+
+NUMERIC_PLAN = [
+    "count", "mean", "median", "mode", "std", "var", "mad", "skew", "kurtosis", "min", "max",
+    "quantile_25", "quantile_75", "quantile_90", "quantile_95", "iqr", "nunique", "mode_count", "mode_rel_freq",
+]
+
+
+@pytest.fixture
+def metrics_df():
+    """Фикстура DataFrame со столбцами разных типов"""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "age": np.where(rng.random(200) < 0.1, np.nan, rng.integers(18, 80, 200)),
+        "score": rng.normal(50, 10, 200),
+        "sex": rng.choice(["m", "f"], 200),
+        "numeric_text": [str(i) if i % 7 else "n/a" for i in range(200)],
+        "signup": pd.date_range("2023-01-01", periods=200, freq="D"),
+    })
+
+
+class TestSplitMetricsPlan:
+    """Тесты для функции split_metrics_plan"""
+
+    def test_split_known_and_unknown(self, metrics_df):
+        """Тест разделения плана на каталог и остаток"""
+        builtin, residual = split_metrics_plan(metrics_df, {
+            "age": ["mean", "entropy"],
+            "sex": ["mode"],
+            "missing_col": ["mean"],
+        })
+        assert builtin == {"age": ["mean"], "sex": ["mode"]}
+        assert residual == {"age": ["entropy"]}
+
+
+class TestComputeCatalogueMetrics:
+    """Тесты для функции compute_catalogue_metrics"""
+
+    def test_numeric_metrics_match_pandas(self, metrics_df):
+        """Тест совпадения числовых метрик с расчетом pandas по столбцу"""
+        result = compute_catalogue_metrics(metrics_df, {"age": NUMERIC_PLAN, "score": NUMERIC_PLAN})
+        for col in ["age", "score"]:
+            series = metrics_df[col]
+            values = result[col]
+            assert list(values) == NUMERIC_PLAN
+            assert values["count"] == series.count()
+            assert values["mean"] == pytest.approx(series.mean())
+            assert values["median"] == pytest.approx(series.median())
+            assert values["mode"] == pytest.approx(series.mode()[0])
+            assert values["std"] == pytest.approx(series.std())
+            assert values["mad"] == pytest.approx((series - series.mean()).abs().mean())
+            assert values["skew"] == pytest.approx(series.skew())
+            assert values["kurtosis"] == pytest.approx(series.kurtosis())
+            assert values["quantile_90"] == pytest.approx(series.quantile(0.9))
+            assert values["iqr"] == pytest.approx(series.quantile(0.75) - series.quantile(0.25))
+            assert values["nunique"] == series.nunique()
+            assert values["mode_count"] == (series == series.mode()[0]).sum()
+
+    def test_wide_numeric_block_matches_pandas(self):
+        """Тест батчевого расчета по широкой таблице с пропусками разной длины"""
+        rng = np.random.default_rng(1)
+        data = rng.normal(size=(300, 40))
+        data[rng.random(data.shape) < 0.2] = np.nan
+        df = pd.DataFrame(data, columns=[f"c{i}" for i in range(40)])
+        plan = ["mean", "std", "skew", "kurtosis", "min", "max", "median", "quantile_95", "nunique"]
+        result = compute_catalogue_metrics(df, {col: plan for col in df.columns})
+        quantiles = df.quantile([0.5, 0.95])
+        for col in df.columns:
+            assert result[col]["mean"] == pytest.approx(df[col].mean())
+            assert result[col]["std"] == pytest.approx(df[col].std())
+            assert result[col]["skew"] == pytest.approx(df[col].skew())
+            assert result[col]["kurtosis"] == pytest.approx(df[col].kurtosis())
+            assert result[col]["min"] == df[col].min()
+            assert result[col]["max"] == df[col].max()
+            assert result[col]["median"] == pytest.approx(quantiles.loc[0.5, col])
+            assert result[col]["quantile_95"] == pytest.approx(quantiles.loc[0.95, col])
+            assert result[col]["nunique"] == df[col].nunique()
+
+    def test_block_split_and_empty_column(self, monkeypatch):
+        """Тест что разбиение на блоки не меняет результат, а пустой столбец дает None"""
+        monkeypatch.setattr("src.core.metrics_engine.NUMERIC_BLOCK_COLUMNS", 2)
+        df = pd.DataFrame({"a": [1, 2, 2, 5], "b": [0.5, np.nan, 1.5, 1.5], "empty": [np.nan] * 4})
+        plan = ["count", "mean", "min", "max", "median", "mode", "nunique"]
+        result = compute_catalogue_metrics(df, {col: plan for col in df.columns})
+        assert result["a"] == {"count": 4, "mean": 2.5, "min": 1.0, "max": 5.0, "median": 2.0, "mode": 2, "nunique": 3}
+        assert result["b"] == {"count": 3, "mean": 1.1666666666666667, "min": 0.5, "max": 1.5, "median": 1.5,
+                               "mode": 1.5, "nunique": 2}
+        assert result["empty"] == {"count": 0, "mean": None, "min": None, "max": None, "median": None,
+                                   "mode": None, "nunique": 0}
+
+    def test_constant_and_short_columns(self):
+        """Тест постоянного столбца и столбца с малым числом значений"""
+        df = pd.DataFrame({"const": [3, 3, 3, 3, 3], "short": [1.0, 2.0, np.nan, np.nan, np.nan]})
+        result = compute_catalogue_metrics(df, {
+            "const": ["skew", "kurtosis", "mode", "iqr"],
+            "short": ["std", "skew", "max", "median"],
+        })
+        assert result["const"] == {"skew": 0.0, "kurtosis": 0.0, "mode": 3, "iqr": 0.0}
+        assert type(result["const"]["mode"]) is int
+        assert result["short"]["std"] == pytest.approx(df["short"].std())
+        assert result["short"]["skew"] is None
+        assert result["short"]["max"] == 2.0
+        assert result["short"]["median"] == pytest.approx(1.5)
+
+    def test_categorical_metrics(self, metrics_df):
+        """Тест метрик категориального столбца"""
+        result = compute_catalogue_metrics(metrics_df, {"sex": ["count", "nunique", "mode", "mode_rel_freq"]})
+        counts = metrics_df["sex"].value_counts()
+        assert result["sex"] == {
+            "count": 200,
+            "nunique": 2,
+            "mode": counts.index[0],
+            "mode_rel_freq": pytest.approx(counts.iloc[0] / 200),
+        }
+
+    def test_text_column_coerced_to_numeric(self, metrics_df):
+        """Тест приведения текстового столбца с числами"""
+        result = compute_catalogue_metrics(metrics_df, {"numeric_text": ["mean", "count"]})
+        expected = pd.to_numeric(metrics_df["numeric_text"], errors="coerce")
+        assert result["numeric_text"]["mean"] == pytest.approx(expected.mean())
+        assert result["numeric_text"]["count"] == expected.count()
+
+    def test_numeric_metric_on_category_is_none(self, metrics_df):
+        """Тест что числовая метрика для категории возвращает None"""
+        assert compute_catalogue_metrics(metrics_df, {"sex": ["mean"]}) == {"sex": {"mean": None}}
+
+    def test_datetime_metrics(self, metrics_df):
+        """Тест метрик для столбца с датами"""
+        result = compute_catalogue_metrics(metrics_df, {
+            "signup": ["count", "min_date", "max_date", "date_range_days", "unique_dates", "dates_per_month"],
+        })["signup"]
+        assert result["count"] == 200
+        assert result["min_date"].startswith("2023-01-01")
+        assert result["date_range_days"] == 199
+        assert result["unique_dates"] == 200
+        assert isinstance(result["dates_per_month"], float)
+
+    def test_datetime_median_and_quantiles(self, metrics_df):
+        """Тест что median и квантили столбца с датами рассчитываются, а не возвращаются None"""
+        df = metrics_df.assign(signup=metrics_df["signup"].where(metrics_df.index % 10 > 0))
+        result = compute_catalogue_metrics(df, {"signup": ["median", "quantile_25"]})["signup"]
+        assert result["median"] == str(df["signup"].median())
+        assert result["quantile_25"] == str(df["signup"].quantile(0.25))
+
+    def test_results_are_python_types(self, metrics_df):
+        """Тест что результаты содержат только стандартные типы Python"""
+        df = metrics_df.assign(empty=np.nan)
+        result = compute_catalogue_metrics(df, {"age": NUMERIC_PLAN, "empty": ["mean", "std"]})
+        assert result["empty"] == {"mean": None, "std": None}
+        for value in result["age"].values():
+            assert value is None or type(value) in (int, float, str)
+
+
+class TestApproximateMetrics:
+    """Тесты для приближенного режима (скетчи)"""
+
+    @pytest.fixture
+    def big_df(self):
+        """Фикстура с большими числовым и категориальным столбцами"""
+        rng = np.random.default_rng(0)
+        n = 300_000
+        return pd.DataFrame({
+            "value": rng.normal(size=n),
+            "user": pd.Series(rng.integers(0, 50_000, n)).map("u{}".format),
+        })
+
+    def test_values_within_documented_bounds(self, big_df, monkeypatch):
+        """Тест что приближенные значения укладываются в записанные границы ошибок"""
+        monkeypatch.setattr("src.core.metrics_engine.STREAMING_CHUNK_ROWS", 100_000)
+        plan = {"value": ["count", "mean", "median", "quantile_90", "nunique"],
+                "user": ["nunique", "mode", "mode_count"]}
+        exact = compute_catalogue_metrics(big_df, plan)
+        approx = compute_catalogue_metrics(big_df, plan, approximate=True, approx_min_rows=1000)
+
+        value_errors = approx["value"][APPROX_ERRORS_KEY]
+        assert approx["value"]["count"] == exact["value"]["count"]
+        assert approx["value"]["mean"] == pytest.approx(exact["value"]["mean"])
+        assert "mean" not in value_errors
+        rank = (big_df["value"] <= approx["value"]["quantile_90"]).mean()
+        assert abs(rank - 0.9) <= 2 * value_errors["quantile_90"]["rank_error"]
+        assert value_errors["median"]["method"] == "KLL"
+
+        user_errors = approx["user"][APPROX_ERRORS_KEY]
+        relative = abs(approx["user"]["nunique"] - exact["user"]["nunique"]) / exact["user"]["nunique"]
+        assert relative <= 4 * user_errors["nunique"]["relative_std_error"]
+        true_count = int((big_df["user"] == approx["user"]["mode"]).sum())
+        assert approx["user"]["mode_count"] <= true_count
+        assert true_count <= approx["user"]["mode_count"] + user_errors["mode_count"]["max_undercount"]
+
+    def test_small_columns_stay_exact(self, metrics_df):
+        """Тест что столбцы ниже порога считаются точно и без approx_errors"""
+        plan = {"score": ["median", "nunique"], "sex": ["mode"]}
+        assert compute_catalogue_metrics(metrics_df, plan, approximate=True) == \
+            compute_catalogue_metrics(metrics_df, plan)
+
+
+class TestMetricsOutputHelpers:
+    """Тесты для разбора и слияния результатов метрик"""
+
+    def test_parse_printed_dict(self):
+        """Тест разбора вывода print(metrics_results)"""
+        assert parse_metrics_output("{'a': {'entropy': 1.5}}") == {"a": {"entropy": 1.5}}
+        assert parse_metrics_output("Traceback ...") is None
+
+    def test_merge_does_not_mutate(self):
+        """Тест слияния без изменения исходного словаря"""
+        base = {"a": {"mean": 1}}
+        merged = merge_metrics_results(base, {"a": {"entropy": 2}, "b": {"x": 3}})
+        assert merged == {"a": {"mean": 1, "entropy": 2}, "b": {"x": 3}}
+        assert base == {"a": {"mean": 1}}
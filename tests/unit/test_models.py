@@ -6,6 +6,12 @@ from unittest.mock import patch, MagicMock
 from langchain_community.llms import Ollama
 
 
+@pytest.fixture(autouse=True)
+def isolated_llm_cache(tmp_path, monkeypatch):
+    """Кэш ответов LLM во временной директории"""
+    monkeypatch.setattr("src.llm.cache.LLM_CACHE_PATH", tmp_path / "llm.sqlite")
+
+
 class TestGetLLMs:
     """Тесты для функции get_llms"""
 
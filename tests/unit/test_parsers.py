@@ -2,7 +2,13 @@
 Unit тесты для модуля parsers
 """
 import pytest
-from src.llm.parsers import parse_struct_analyze_response, parse_metrics_plan_response
+from src.llm.parsers import (
+    parse_struct_analyze_response,
+    parse_metrics_plan_response,
+    parse_columns_block,
+    parse_plot_plan_response,
+    StreamingBlockParser,
+)
 
 
 class TestParseStructAnalyzeResponse:
@@ -248,3 +254,53 @@ class TestParseMetricsPlanResponse:
         assert "metric-name_1" in result["Col-Name_1"]
         assert "metric.name_2" in result["Col-Name_1"]
 
+
+class TestStreamingBlockParser:
+    """Тесты для класса StreamingBlockParser"""
+
+    def test_block_available_as_soon_as_closed(self, sample_struct_analyze_response):
+        """Тест выдачи блока сразу после закрывающего маркера, в т.ч. разорванного между фрагментами"""
+        parser = StreamingBlockParser()
+        text = sample_struct_analyze_response
+        columns_end = text.index("---COLUMNS_END---")
+        closed = []
+        # Маркер разрезан между фрагментами
+        for chunk in (text[:columns_end + 5], text[columns_end + 5:columns_end + 17], text[columns_end + 17:]):
+            closed.append([name for name, _ in parser.feed(chunk)])
+        assert closed[0] == []
+        assert closed[1] == ["COLUMNS"]
+        assert closed[2] == ["DATETIME_CANDIDATES"]
+        assert parse_columns_block(parser.blocks["COLUMNS"]) == \
+            parse_struct_analyze_response(text)["columns"]
+
+    def test_token_by_token_feed(self):
+        """Тест посимвольной подачи ответа"""
+        parser = StreamingBlockParser()
+        response = "---METRICS_START---\nСтолбец: Age\nМетрики: mean\n---METRICS_END---"
+        closed = [block for ch in response for block in parser.feed(ch)]
+        assert [name for name, _ in closed] == ["METRICS"]
+        assert parser.text == response
+        assert parse_metrics_plan_response(parser.text) == {"Age": ["mean"]}
+
+
+class TestParsePlotPlanResponse:
+    """Тесты для функции parse_plot_plan_response"""
+
+    def test_parse_plan_block(self):
+        """Тест парсинга плана графиков"""
+        response = """Вот план:
+---PLOT_PLAN_START---
+График 1: hist | Age | Распределение возраста
+График 2: scatter | Age, Fare | Связь возраста и стоимости
+неразборчивая строка
+3. countplot | Sex
+---PLOT_PLAN_END---
+"""
+        plan = parse_plot_plan_response(response)
+        assert [plot["type"] for plot in plan] == ["hist", "scatter", "countplot"]
+        assert plan[1]["columns"] == ["Age", "Fare"]
+        assert plan[2] == {"number": 3, "type": "countplot", "columns": ["Sex"], "idea": ""}
+
+    def test_parse_plan_without_block(self):
+        """Тест пустого результата для ответа без плана"""
+        assert parse_plot_plan_response("Не могу построить план") == []
@@ -0,0 +1,95 @@
+"""
+Unit тесты для модуля pipeline (параллельное выполнение этапов)
+"""
+import threading
+import time
+import pytest
+from src.core.pipeline import AnalysisPipeline
+
+
+def make_tracking_step(tracker, name, delay=0.05, value=None):
+    """Создает этап, отмечающий число одновременно выполняемых этапов"""
+    def step(inputs):
+        with tracker["lock"]:
+            tracker["active"] += 1
+            tracker["peak"] = max(tracker["peak"], tracker["active"])
+        time.sleep(delay)
+        with tracker["lock"]:
+            tracker["active"] -= 1
+        return value if value is not None else name
+    return step
+
+
+@pytest.fixture
+def tracker():
+    """Фикстура счетчика одновременных этапов"""
+    return {"lock": threading.Lock(), "active": 0, "peak": 0}
+
+
+class TestAnalysisPipeline:
+    """Тесты для класса AnalysisPipeline"""
+
+    def test_independent_steps_run_concurrently(self, tracker):
+        """Тест параллельного запуска независимых этапов разных моделей"""
+        pipeline = AnalysisPipeline(model_limits={"analyst": 1, "coder": 1})
+        pipeline.add_step("analysis", make_tracking_step(tracker, "analysis"), model="analyst")
+        pipeline.add_step("viz_code", make_tracking_step(tracker, "viz_code"), model="coder")
+        result = pipeline.execute()
+        assert result.results == {"analysis": "analysis", "viz_code": "viz_code"}
+        assert tracker["peak"] == 2
+
+    def test_model_concurrency_limit(self, tracker):
+        """Тест ограничения числа одновременных запросов к одной модели"""
+        pipeline = AnalysisPipeline(model_limits={"analyst": 1})
+        for i in range(3):
+            pipeline.add_step(f"s{i}", make_tracking_step(tracker, f"s{i}", delay=0.02), model="analyst")
+        pipeline.execute()
+        assert tracker["peak"] == 1
+
+    def test_dependencies_receive_results(self):
+        """Тест передачи результатов зависимостей"""
+        pipeline = AnalysisPipeline()
+        pipeline.add_step("analysis", lambda inputs: "итоги")
+        pipeline.add_step("report", lambda inputs: f"отчёт: {inputs['analysis']}", depends_on=("analysis",))
+        result = pipeline.execute()
+        assert result.results["report"] == "отчёт: итоги"
+        assert set(result.durations) == {"analysis", "report"}
+
+    def test_failed_step_skips_dependents(self):
+        """Тест пропуска этапов, зависящих от упавшего"""
+        def fail(inputs):
+            raise RuntimeError("Ollama недоступна")
+
+        pipeline = AnalysisPipeline()
+        pipeline.add_step("viz_code", fail)
+        pipeline.add_step("plots", lambda inputs: "ok", depends_on=("viz_code",))
+        pipeline.add_step("report", lambda inputs: "отчёт")
+        result = pipeline.execute()
+        assert isinstance(result.errors["viz_code"], RuntimeError)
+        assert result.skipped == ["plots"]
+        assert result.results == {"report": "отчёт"}
+
+    def test_callback_runs_in_calling_thread(self):
+        """Тест вызова on_step_done в потоке, запустившем пайплайн"""
+        calls = []
+        pipeline = AnalysisPipeline()
+        pipeline.add_step("a", lambda inputs: 1)
+        pipeline.add_step("b", lambda inputs: 2, depends_on=("a",))
+        pipeline.execute(on_step_done=lambda name, value, error: calls.append(
+            (name, value, error, threading.current_thread() is threading.main_thread())))
+        assert calls == [("a", 1, None, True), ("b", 2, None, True)]
+
+    def test_on_tick_called_while_waiting(self):
+        """Тест периодического вызова on_tick во время выполнения этапа"""
+        ticks = []
+        pipeline = AnalysisPipeline()
+        pipeline.add_step("slow", lambda inputs: time.sleep(0.1))
+        pipeline.execute(on_tick=lambda: ticks.append(threading.current_thread()), tick_interval=0.01)
+        assert len(ticks) >= 3
+        assert all(thread is threading.main_thread() for thread in ticks)
+
+    def test_unknown_dependency_rejected(self):
+        """Тест ошибки при неизвестной зависимости"""
+        pipeline = AnalysisPipeline()
+        with pytest.raises(ValueError):
+            pipeline.add_step("report", lambda inputs: None, depends_on=("analysis",))
@@ -0,0 +1,58 @@
+"""
+Unit тесты для модуля preprocessor (обработка дат и пропусков)
+"""
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pytest
+from src.data.preprocessor import handle_missing_values_before_analysis, preprocess_dates_based_on_llm
+
+
+@pytest.fixture
+def frame_with_gaps():
+    """Фикстура с пропусками в датах, числах и тексте"""
+    rng = np.random.default_rng(0)
+    n = 200_000
+    first = pd.Series(pd.date_range("2024-01-01", periods=n, freq="min"))
+    second = first.copy()
+    first[rng.random(n) < 0.01] = pd.NaT
+    second[rng.random(n) < 0.01] = pd.NaT
+    columns = {f"x{i}": np.where(rng.random(n) < 0.1, np.nan, rng.normal(size=n)) for i in range(8)}
+    return pd.DataFrame({"d1": first, "d2": second, **columns,
+                         "city": pd.Series(rng.choice(["a", "b", None], n)).astype("category")})
+
+
+class TestHandleMissingValues:
+    """Тесты для функции handle_missing_values_before_analysis"""
+
+    def test_combined_mask_and_fills(self, frame_with_gaps):
+        """Тест удаления строк с NaT по всем datetime-столбцам и заполнения пропусков"""
+        plan = {col: ["count"] for col in frame_with_gaps.columns}
+        result = handle_missing_values_before_analysis(frame_with_gaps, plan)
+        expected_rows = frame_with_gaps[["d1", "d2"]].notna().all(axis=1).sum()
+        assert len(result) == expected_rows
+        assert result.isna().sum().sum() == 0
+        assert (result["city"] == "нет данных").any()
+        assert frame_with_gaps["x0"].isna().any() and frame_with_gaps["city"].isna().any()
+
+    def test_no_dates_does_not_mutate_source(self, frame_with_gaps):
+        """Тест что без удаления строк исходный кадр не меняется"""
+        source = frame_with_gaps.drop(columns=["d1", "d2"])
+        result = handle_missing_values_before_analysis(source, {"x0": ["mean"], "missing": ["mean"]})
+        assert result["x0"].isna().sum() == 0
+        assert source["x0"].isna().sum() > 0
+        assert result["x1"].isna().sum() == source["x1"].isna().sum()
+
+    def test_peak_memory_below_two_frames(self, frame_with_gaps):
+        """Тест что пиковая память обработки дат и пропусков меньше двух размеров кадра"""
+        size = frame_with_gaps.memory_usage(deep=True).sum()
+        plan = {col: ["count"] for col in frame_with_gaps.columns}
+        tracemalloc.start()
+        try:
+            dated = preprocess_dates_based_on_llm(frame_with_gaps, ["d1", "d2"])
+            result = handle_missing_values_before_analysis(dated, plan)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert len(result) < len(frame_with_gaps)
+        assert peak < 2 * size
@@ -0,0 +1,74 @@
+"""
+Unit тесты для модуля profiler (профиль столбцов для анализа структуры)
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from src.core.profiler import format_profiles, merge_structure, profile_dataframe, split_profiles
+
+
+@pytest.fixture
+def profiled_df():
+    """Фикстура со столбцами разных видов, включая неоднозначные"""
+    rng = np.random.default_rng(0)
+    n = 2_000
+    return pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "amount": rng.normal(100, 20, n),
+        "created": pd.Series([f"{d % 28 + 1:02d}.{d % 12 + 1:02d}.2024 10:30" for d in range(n)], dtype=object),
+        "city": pd.Series(rng.choice(["Москва", "Казань", "Омск"], n), dtype=object),
+        "comment": pd.Series([f"комментарий номер {i}" for i in range(n)], dtype=object),
+        "flag": pd.Series(rng.choice(["да", "нет"], n), dtype=object),
+        "grade": rng.integers(1, 6, n),
+        "mixed": pd.Series(["12.5", "2024-01-01", "abc", "x"] * (n // 4), dtype=object),
+    })
+
+
+class TestProfileDataframe:
+    """Тесты для функций profile_dataframe и split_profiles"""
+
+    def test_conclusive_types(self, profiled_df):
+        """Тест что однозначные столбцы определяются без LLM"""
+        types = {p.name: p.type for p in profile_dataframe(profiled_df)}
+        assert types["id"] == "numerical (integer, identifier)"
+        assert types["amount"] == "numerical (float)"
+        assert types["created"] == "datetime (text, format %d.%m.%Y %H:%M)"
+        assert types["city"] == "categorical (object)"
+        assert types["comment"] == "textual (free text)"
+        assert types["flag"] == "boolean"
+
+    def test_ambiguous_columns(self, profiled_df):
+        """Тест что коды с малым числом значений и смешанные столбцы уходят в LLM"""
+        known, ambiguous = split_profiles(profile_dataframe(profiled_df))
+        assert [p.name for p in ambiguous] == ["grade", "mixed"]
+        assert known["datetime_candidates"] == ["created"]
+        assert len(known["columns"]) == 6
+
+    def test_format_profiles_compact(self, profiled_df):
+        """Тест что описание содержит одну строку на столбец"""
+        profiles = profile_dataframe(profiled_df)
+        text = format_profiles(profiles, len(profiled_df))
+        assert len(text.splitlines()) == len(profiles) + 1
+
+
+class TestMergeStructure:
+    """Тесты для функции merge_structure"""
+
+    def test_llm_answer_only_for_ambiguous(self, profiled_df):
+        """Тест что ответ LLM не переопределяет однозначные столбцы, порядок - как в DataFrame"""
+        profiles = profile_dataframe(profiled_df)
+        known, _ = split_profiles(profiles)
+        llm_structure = {
+            "columns": [
+                {"name": "mixed", "type": "textual (object)", "description": "Смешанные значения"},
+                {"name": "grade", "type": "categorical (integer)", "description": "Оценка"},
+                {"name": "amount", "type": "categorical", "description": "Неверно"},
+            ],
+            "datetime_candidates": ["amount", "mixed"],
+        }
+        merged = merge_structure(profiles, known, llm_structure)
+        assert [c["name"] for c in merged["columns"]] == list(profiled_df.columns)
+        by_name = {c["name"]: c for c in merged["columns"]}
+        assert by_name["amount"]["type"] == "numerical (float)"
+        assert by_name["grade"]["type"] == "categorical (integer)"
+        assert merged["datetime_candidates"] == ["created", "mixed"]
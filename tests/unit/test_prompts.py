@@ -10,6 +10,8 @@ from src.llm.prompts import (
     get_final_report_prompt,
     get_metrics_code_gen_prompt,
     get_visualization_code_prompt,
+    get_visualization_plan_prompt,
+    get_visualization_group_prompt,
 )
 
 
@@ -117,3 +119,20 @@ class TestGetPrompts:
         final_report_prompt = get_final_report_prompt()
         assert "{analysis_summary}" in final_report_prompt.input_variables
 
+
+class TestVisualizationGroupPrompts:
+    """Тесты для промптов плана и групп графиков"""
+
+    def test_plan_prompt_substitutes_num_plots(self):
+        """Тест подстановки количества графиков в план"""
+        prompt = get_visualization_plan_prompt(num_plots=12)
+        formatted = prompt.format(df_structure_info="структура", metrics_results_raw="{}")
+        assert "план из 12 графиков" in formatted
+        assert "---PLOT_PLAN_START---" in formatted
+
+    def test_group_prompt_variables(self):
+        """Тест переменных промпта группы графиков"""
+        prompt = get_visualization_group_prompt()
+        assert set(prompt.input_variables) == {"plot_specs", "df_structure_info", "output_dir"}
+        formatted = prompt.format(plot_specs="График 1: hist | a", df_structure_info="s", output_dir="out")
+        assert "plot_{столбцы}_{тип}.png" in formatted
@@ -0,0 +1,103 @@
+"""
+Unit тесты для модуля sketches
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from src.data.sketches import HyperLogLog, KLLSketch, SpaceSaving
+
+
+class TestKLLSketch:
+    """Тесты для класса KLLSketch"""
+
+    def test_small_input_is_exact(self):
+        """Тест что без сжатия квантили совпадают с numpy"""
+        values = np.arange(100, dtype=float)
+        sketch = KLLSketch(k=200)
+        sketch.update(values)
+        assert sketch.quantiles([0.25, 0.5]) == list(np.quantile(values, [0.25, 0.5]))
+
+    def test_large_input_within_rank_error(self):
+        """Тест что ошибка ранга не превышает заявленную"""
+        rng = np.random.default_rng(0)
+        values = rng.normal(size=200_000)
+        sketch = KLLSketch(k=200, seed=1)
+        for chunk in np.array_split(values, 20):
+            sketch.update(chunk)
+        sorted_values = np.sort(values)
+        for q, estimate in zip([0.1, 0.5, 0.9], sketch.quantiles([0.1, 0.5, 0.9])):
+            rank = np.searchsorted(sorted_values, estimate) / len(values)
+            assert abs(rank - q) <= 2 * sketch.rank_error
+
+    def test_memory_is_bounded(self):
+        """Тест что скетч хранит много меньше значений, чем получил"""
+        sketch = KLLSketch(k=200)
+        sketch.update(np.random.default_rng(0).random(100_000))
+        assert sum(len(level) for level in sketch.levels) < 2_000
+        assert sketch.n == 100_000
+
+    def test_merge_and_serialization(self):
+        """Тест слияния и восстановления из словаря"""
+        a, b = KLLSketch(k=50, seed=0), KLLSketch(k=50, seed=1)
+        a.update(np.arange(0, 5000, dtype=float))
+        b.update(np.arange(5000, 10000, dtype=float))
+        a.merge(b)
+        restored = KLLSketch.from_dict(a.to_dict())
+        assert restored.n == 10_000
+        assert abs(restored.quantiles([0.5])[0] - 5000) < 10_000 * 2 * restored.rank_error
+
+    def test_empty_and_nan(self):
+        """Тест пустого скетча и игнорирования NaN"""
+        sketch = KLLSketch()
+        assert sketch.quantiles([0.5]) == [None]
+        sketch.update([np.nan, 1.0])
+        assert sketch.n == 1
+
+
+class TestHyperLogLog:
+    """Тесты для класса HyperLogLog"""
+
+    @pytest.mark.parametrize("cardinality", [50, 5_000, 200_000])
+    def test_estimate_within_error(self, cardinality):
+        """Тест что оценка укладывается в 4 стандартные ошибки"""
+        hll = HyperLogLog(p=14)
+        values = pd.Series([f"id{i}" for i in range(cardinality)])
+        for chunk in np.array_split(values.to_numpy(), 4):
+            hll.update(chunk)
+        hll.update(values.head(100))
+        assert abs(hll.estimate() - cardinality) <= 4 * hll.relative_error * cardinality + 1
+
+    def test_merge_and_missing_values(self):
+        """Тест слияния и игнорирования пропусков"""
+        a, b = HyperLogLog(p=12), HyperLogLog(p=12)
+        a.update(pd.Series([1.0, 2.0, np.nan]))
+        b.update(pd.Series([2.0, 3.0, None]))
+        a.merge(b)
+        assert a.estimate() == 3
+        with pytest.raises(ValueError):
+            a.merge(HyperLogLog(p=10))
+
+
+class TestSpaceSaving:
+    """Тесты для класса SpaceSaving"""
+
+    def test_exact_below_capacity(self):
+        """Тест точной моды, пока значений меньше capacity"""
+        summary = SpaceSaving(capacity=10)
+        summary.update(pd.Series(["b", "a", "a", None, "b", "a"]))
+        assert summary.mode() == ("a", 3)
+        assert summary.error == 0
+
+    def test_heavy_hitter_within_error(self):
+        """Тест что частая мода находится, а ее частота в пределах ошибки"""
+        rng = np.random.default_rng(0)
+        values = rng.zipf(1.5, 300_000)
+        a, b = SpaceSaving(capacity=100), SpaceSaving(capacity=100)
+        a.update(values[:150_000])
+        b.update(values[150_000:])
+        a.merge(b)
+        value, count = a.mode()
+        true_count = int((values == 1).sum())
+        assert value == 1
+        assert count <= true_count <= count + a.error
+        assert a.error <= len(values) / 101 and len(a.counts) <= 100
@@ -0,0 +1,99 @@
+"""
+Unit тесты для модуля stats_cache (кэш статистик датасета)
+"""
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+from unittest.mock import patch
+from src.data.stats_cache import StatsCache, compute_stats, frame_fingerprint
+
+
+@pytest.fixture
+def df():
+    """Фикстура с числовыми и категориальными столбцами"""
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({
+        "a": rng.normal(size=200),
+        "b": rng.normal(size=200),
+        "c": rng.integers(0, 10, size=200),
+        "category": rng.choice(["x", "y"], size=200),
+    })
+    frame["b"] = frame["a"] * 2 + frame["b"] * 0.1
+    return frame
+
+
+class TestComputeStats:
+    """Тесты для функции compute_stats"""
+
+    def test_matches_pandas(self, df):
+        """Тест совпадения с corr(), describe() и isna().sum()"""
+        stats = compute_stats(df)
+        numeric = df.select_dtypes(include="number")
+        pd.testing.assert_frame_equal(stats.corr, numeric.corr())
+        pd.testing.assert_frame_equal(stats.describe, df.describe())
+        pd.testing.assert_series_equal(stats.missing, df.isna().sum())
+
+    def test_pairwise_corr_with_missing(self, df):
+        """Тест попарной корреляции при наличии пропусков"""
+        df.loc[::7, "a"] = np.nan
+        stats = compute_stats(df)
+        pd.testing.assert_frame_equal(stats.corr, df.select_dtypes(include="number").corr())
+        assert stats.missing["a"] == df["a"].isna().sum()
+
+
+class TestStatsCache:
+    """Тесты для класса StatsCache"""
+
+    def test_computed_once_per_dataset(self, df):
+        """Тест что статистики считаются один раз на датасет"""
+        cache = StatsCache()
+        first = cache.get(df)
+        second = cache.get(df.copy())
+        assert first is second
+        assert cache.computations == 1
+
+    def test_changed_data_recomputed(self, df):
+        """Тест пересчета при изменении данных"""
+        cache = StatsCache()
+        cache.get(df)
+        changed = df.copy()
+        changed.loc[0, "a"] = 100.0
+        assert frame_fingerprint(changed) != frame_fingerprint(df)
+        cache.get(changed)
+        assert cache.computations == 2
+
+    def test_subset_served_from_full_stats(self, df):
+        """Тест что подмножество столбцов берется из полных статистик"""
+        cache = StatsCache()
+        cache.get(df, key="ds")
+        subset = cache.get(df, key="ds", columns=["a", "b", "category"])
+        assert list(subset.corr.columns) == ["a", "b"]
+        assert list(subset.missing.index) == ["a", "b", "category"]
+        assert cache.computations == 1
+
+    def test_prefetch_shared_with_get(self, df):
+        """Тест что get дожидается фонового расчета вместо повторного"""
+        started, release = threading.Event(), threading.Event()
+
+        def slow_compute(frame):
+            started.set()
+            release.wait(5)
+            return compute_stats(frame)
+
+        cache = StatsCache()
+        with patch("src.data.stats_cache.compute_stats", side_effect=slow_compute) as mock_compute:
+            cache.prefetch(df, key="ds")
+            assert started.wait(5)
+            threading.Timer(0.05, release.set).start()
+            stats = cache.get(df, key="ds")
+        assert mock_compute.call_count == 1
+        assert stats.rows == len(df)
+
+    def test_lru_eviction(self, df):
+        """Тест вытеснения самых старых записей"""
+        cache = StatsCache(max_entries=2)
+        for key in ("a", "b", "c"):
+            cache.get(df, key=key)
+        cache.get(df, key="a")
+        assert cache.computations == 4
@@ -0,0 +1,156 @@
+"""
+Unit тесты для модуля streaming (потоковый расчет метрик)
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from src.core.metrics_engine import compute_catalogue_metrics
+from src.data.streaming import (
+    ColumnAccumulator,
+    MomentAccumulator,
+    FrequencyTable,
+    compute_streaming_metrics,
+    is_exact_plan,
+)
+
+
+@pytest.fixture
+def large_csv(tmp_path):
+    """Фикстура с CSV, который читается несколькими частями"""
+    rng = np.random.default_rng(42)
+    n = 5000
+    df = pd.DataFrame({
+        "value": rng.gamma(2.0, 3.0, size=n),
+        "category": rng.choice(["a", "b", "c"], size=n, p=[0.6, 0.3, 0.1]),
+        "date": pd.date_range("2024-01-01", periods=n, freq="h").astype(str),
+    })
+    df.loc[::10, "value"] = np.nan
+    path = tmp_path / "large.csv"
+    df.to_csv(path, index=False)
+    return str(path), df
+
+
+class TestMomentAccumulator:
+    """Тесты для класса MomentAccumulator"""
+
+    def test_merged_moments_match_pandas(self):
+        """Тест что слитые по частям моменты совпадают с pandas"""
+        values = np.random.default_rng(0).exponential(size=1000)
+        acc = MomentAccumulator()
+        for chunk in np.array_split(values, 7):
+            acc.update(chunk)
+        series = pd.Series(values)
+        assert acc.mean == pytest.approx(series.mean())
+        assert acc.var == pytest.approx(series.var())
+        assert acc.skew == pytest.approx(series.skew())
+        assert acc.kurtosis == pytest.approx(series.kurtosis())
+        assert acc.min == series.min() and acc.max == series.max()
+
+    def test_degenerate_inputs(self):
+        """Тест вырожденных случаев"""
+        acc = MomentAccumulator()
+        acc.update(np.array([5.0]))
+        assert acc.var is None and acc.skew is None and acc.kurtosis is None
+
+
+class TestFrequencyTable:
+    """Тесты для класса FrequencyTable"""
+
+    def test_exact_mode(self):
+        """Тест точной моды и числа уникальных значений"""
+        table = FrequencyTable()
+        table.update(pd.Series(["a", "b", "a"]))
+        table.update(pd.Series(["a", None]))
+        assert table.mode() == ("a", 3)
+        assert table.nunique == 2 and table.exact
+
+    def test_overflow_marks_inexact(self):
+        """Тест что переполнение помечает таблицу неточной"""
+        table = FrequencyTable(max_items=10)
+        table.update(pd.Series(["hot"] * 50 + [f"id{i}" for i in range(100)]))
+        assert not table.exact
+        assert table.mode()[0] == "hot"
+
+
+class TestIsExactPlan:
+    """Тесты для функции is_exact_plan"""
+
+    def test_moments_and_dates_exact(self):
+        """Тест что моменты и метрики дат точные, а квантили, nunique и пустой план - нет"""
+        assert is_exact_plan({"value": ["count", "mean", "std", "skew"], "date": ["min_date", "dates_per_month"]})
+        assert not is_exact_plan({"value": ["mean", "median"]})
+        assert not is_exact_plan({"category": ["nunique"]})
+        assert not is_exact_plan({})
+
+
+class TestComputeStreamingMetrics:
+    """Тесты для функции compute_streaming_metrics"""
+
+    def test_matches_in_memory_metrics(self, large_csv):
+        """Тест совпадения потоковых метрик с расчетом в памяти"""
+        path, df = large_csv
+        plan = {
+            "value": ["count", "mean", "std", "var", "min", "max", "skew", "kurtosis", "median", "iqr"],
+            "category": ["count", "nunique", "mode", "mode_count", "mode_rel_freq"],
+        }
+        results = compute_streaming_metrics(path, plan, chunksize=700)
+        value = df["value"]
+        assert results["value"]["count"] == value.count()
+        assert results["value"]["mean"] == pytest.approx(value.mean())
+        assert results["value"]["std"] == pytest.approx(value.std())
+        assert results["value"]["skew"] == pytest.approx(value.skew())
+        assert results["value"]["kurtosis"] == pytest.approx(value.kurtosis())
+        assert results["value"]["median"] == pytest.approx(value.median(), rel=0.05)
+        assert set(results["value"]) == set(plan["value"]) | {"approx_errors"}
+        assert set(results["value"]["approx_errors"]) == {"median", "iqr"}
+        assert "approx_errors" not in results["category"]
+        assert results["category"]["mode"] == "a"
+        assert results["category"]["nunique"] == 3
+        assert results["category"]["mode_rel_freq"] == pytest.approx(
+            (df["category"] == "a").mean())
+
+    def test_datetime_metrics(self, large_csv):
+        """Тест метрик для столбца с датами"""
+        path, df = large_csv
+        results = compute_streaming_metrics(path, {"date": ["count", "min_date", "max_date", "unique_dates"]},
+                                            datetime_columns=["date"], chunksize=1000)
+        dates = pd.to_datetime(df["date"])
+        assert results["date"]["count"] == len(df)
+        assert results["date"]["unique_dates"] == dates.dt.normalize().nunique()
+        assert results["date"]["min_date"].startswith("2024-01-01")
+
+    def test_dates_per_month_matches_metrics_engine(self, tmp_path):
+        """Тест что dates_per_month учитывает месяцы без дат так же, как расчет в памяти"""
+        dates = pd.Series(pd.to_datetime(["2024-01-05", "2024-01-20", "2024-04-02", "2024-04-03", "2024-04-09"]))
+        path = tmp_path / "dates.csv"
+        pd.DataFrame({"date": dates.astype(str)}).to_csv(path, index=False)
+        results = compute_streaming_metrics(str(path), {"date": ["dates_per_month"]}, datetime_columns=["date"],
+                                            chunksize=2)
+        expected = compute_catalogue_metrics(pd.DataFrame({"date": dates}), {"date": ["dates_per_month"]})
+        assert results["date"]["dates_per_month"] == expected["date"]["dates_per_month"] == 1.25
+
+    def test_nunique_without_mode_uses_hyperloglog(self, tmp_path):
+        """Тест что без моды таблица частот не строится, а nunique - оценка HyperLogLog"""
+        df = pd.DataFrame({"id": np.arange(20000, dtype=float)})
+        path = tmp_path / "ids.csv"
+        df.to_csv(path, index=False)
+        results = compute_streaming_metrics(str(path), {"id": ["count", "nunique"]}, chunksize=3000)
+        assert results["id"]["nunique"] == pytest.approx(20000, rel=0.03)
+        assert results["id"]["approx_errors"] == {"nunique": {"method": "HyperLogLog", "relative_std_error": 0.0081}}
+        accumulator = ColumnAccumulator("numeric", metrics=["count", "nunique"])
+        assert accumulator.frequencies is None and accumulator.hll is not None
+
+    def test_default_metrics_without_plan(self, large_csv):
+        """Тест стандартного набора метрик без плана"""
+        path, _ = large_csv
+        results = compute_streaming_metrics(path, chunksize=2000)
+        assert {"value", "category", "date"} <= set(results)
+        assert "quantile_95" in results["value"]
+
+    def test_counter_reports_file_rows(self, large_csv):
+        """Тест что counter получает число строк файла, а не число значений столбца"""
+        path, df = large_csv
+        counter = {"rows": 0}
+        results = compute_streaming_metrics(path, {"value": ["count"]}, chunksize=700, counter=counter)
+        assert counter["rows"] == len(df)
+        assert results["value"]["count"] == df["value"].count()
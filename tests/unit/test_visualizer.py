@@ -0,0 +1,151 @@
+"""
+Unit тесты для модуля visualizer (разбиение плана графиков)
+"""
+import contextlib
+import io
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from src.data.visualizer import (
+    PlotRenderer,
+    format_plot_specs,
+    plot_group_count,
+    plot_namespace,
+    split_plot_code,
+    split_plot_plan,
+)
+
+
+def make_plan(size):
+    """Создает план из size графиков"""
+    return [{"number": i + 1, "type": "hist", "columns": [f"c{i}"], "idea": ""} for i in range(size)]
+
+
+def run_plot_code(code, df, corr=None):
+    """Выполняет код графика в пространстве имен процесса графиков и возвращает вывод print"""
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        exec(code, {"df": df, **plot_namespace(corr, df)})
+    return stdout.getvalue()
+
+
+class TestSplitPlotPlan:
+    """Тесты для функции split_plot_plan"""
+
+    def test_groups_driven_by_num_plots(self):
+        """Тест разбиения 30 графиков на группы по 5"""
+        groups = split_plot_plan(make_plan(30), num_plots=30, group_size=5)
+        assert plot_group_count(30, 5) == 6
+        assert [len(group) for group in groups] == [5] * 6
+        assert [plot["number"] for group in groups for plot in group] == list(range(1, 31))
+
+    def test_plan_longer_than_num_plots_truncated(self):
+        """Тест отбрасывания лишних графиков"""
+        groups = split_plot_plan(make_plan(40), num_plots=30, group_size=5)
+        assert sum(len(group) for group in groups) == 30
+
+    def test_short_plan_balanced(self):
+        """Тест равномерного разбиения короткого плана"""
+        groups = split_plot_plan(make_plan(13), num_plots=30, group_size=5)
+        assert len(groups) == 6
+        assert sorted(len(group) for group in groups) == [2, 2, 2, 2, 2, 3]
+        assert split_plot_plan([], num_plots=30, group_size=5) == []
+
+    def test_format_plot_specs(self):
+        """Тест форматирования группы для промпта"""
+        text = format_plot_specs([{"number": 3, "type": "scatter", "columns": ["a", "b"], "idea": "связь"}])
+        assert text == "График 3: scatter | a, b | связь"
+
+
+class TestSplitPlotCode:
+    """Тесты для функции split_plot_code"""
+
+    def test_split_at_markers(self):
+        """Тест разбиения кода по маркерам графиков"""
+        code = "import os\nnum_cols = ['a']\n# График 1: hist\nplot1()\n#График 2 - bar\nplot2()\n"
+        preamble, snippets = split_plot_code(code)
+        assert preamble == "import os\nnum_cols = ['a']\n"
+        assert [number for number, _ in snippets] == [1, 2]
+        assert "plot1()" in snippets[0][1] and "plot2()" not in snippets[0][1]
+
+    def test_code_without_markers(self):
+        """Тест кода без маркеров"""
+        assert split_plot_code("plot()") == ("", [(0, "plot()")])
+
+
+class TestPlotRenderer:
+    """Тесты для класса PlotRenderer"""
+
+    @pytest.fixture(autouse=True)
+    def isolated_frames_dir(self, tmp_path, monkeypatch):
+        """Временная директория для файла с DataFrame"""
+        monkeypatch.setattr("src.utils.frame_transport.FRAME_SHM_DIR", tmp_path / "shm")
+        monkeypatch.setattr("src.utils.frame_transport.FRAME_TRANSPORT_DIR", tmp_path / "frames")
+
+    def test_failures_isolated_per_plot(self, tmp_path):
+        """Тест что ошибка одного графика не мешает остальным"""
+        df = pd.DataFrame({"a": np.arange(50, dtype=float), "b": ["x", "y"] * 25})
+        out = tmp_path / "plots"
+        out.mkdir()
+        code = f"""# График 1: hist
+df['a'].plot.hist()
+plt.savefig(r'{out}/plot_a_hist.png')
+# График 2: ошибка
+df['missing'].plot()
+# График 3: bar
+df['b'] = df['b'].str.upper()
+df['b'].value_counts().plot.bar()
+plt.savefig(r'{out}/plot_b_bar.png')
+print(df['b'].iloc[0])
+"""
+        with PlotRenderer(df, max_workers=1) as renderer:
+            frame_path = renderer.frame_path
+            results = renderer.render(code, required_imports=["import matplotlib.pyplot as plt"])
+        assert [(r.number, r.ok) for r in results] == [(1, True), (2, False), (3, True)]
+        assert "KeyError" in results[1].error
+        assert results[2].output.strip() == "X"
+        assert sorted(p.name for p in out.iterdir()) == ["plot_a_hist.png", "plot_b_bar.png"]
+        assert not frame_path.exists()
+
+    def test_code_validated_per_plot(self):
+        """Тест что график с запрещенным импортом не строится, а переписанные шаблоны попадают в результат"""
+        df = pd.DataFrame({"a": np.arange(10.0), "b": np.arange(10.0)})
+        code = ("# График 1: запрещенный импорт\nimport subprocess\n"
+                "# График 2: apply по строкам\nprint(df.apply(lambda r: r['a'] + r['b'], axis=1).sum())\n")
+        with PlotRenderer(df, max_workers=1) as renderer:
+            results = renderer.render(code)
+        assert [(r.number, r.ok) for r in results] == [(1, False), (2, True)]
+        assert "импорт 'subprocess' запрещен" in results[0].error
+        assert results[1].output.strip() == "90.0"
+        assert results[1].rewrites == ["строка 2: apply(axis=1) заменен векторным выражением над столбцами"]
+
+    def test_timed_out_plot_killed(self):
+        """Тест что зависший график прерывается, остальные строятся, а close() не ждет его"""
+        df = pd.DataFrame({"a": np.arange(10.0)})
+        code = "# График 1: зависание\nwhile True:\n    pass\n# График 2: сумма\nprint(df['a'].sum())\n"
+        renderer = PlotRenderer(df, max_workers=2, timeout=2)
+        try:
+            results = renderer.render(code)
+        finally:
+            started = time.perf_counter()
+            renderer.close()
+        assert time.perf_counter() - started < 10
+        assert [(r.number, r.ok) for r in results] == [(1, False), (2, True)]
+        assert results[0].error == "Превышено время выполнения (2 с)"
+        assert results[1].output.strip() == "45.0"
+
+    def test_downsampling_helpers_available(self):
+        """Тест доступности функций прореживания в коде графика"""
+        code = ("data = sample_for_scatter(df, by='g')\n"
+                "counts, edges = binned_hist(df['a'], bins=2)\n"
+                "print(len(decimate_for_line(data, y='a')), counts.tolist())")
+        output = run_plot_code(code, pd.DataFrame({"a": np.arange(10.0), "g": ["x", "y"] * 5}))
+        assert output.strip() == "10 [5, 5]"
+
+    def test_corr_matrix_uses_cached_stats(self):
+        """Тест что corr_matrix в коде графика берет матрицу из кэша статистик"""
+        cached = pd.DataFrame([[1.0, 0.5], [0.5, 1.0]], index=["a", "b"], columns=["a", "b"])
+        df = pd.DataFrame({"a": [1.0, 2.0, 3.0], "b": [3.0, 1.0, 2.0]})
+        output = run_plot_code("print(corr_matrix(['b', 'missing']).shape, corr_matrix().loc['a', 'b'])", df, cached)
+        assert output.strip() == "(1, 1) 0.5"